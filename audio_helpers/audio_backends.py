@@ -0,0 +1,65 @@
+"""
+音频输入输出后端的选择
+同一条处理流程可以运行在声卡、录音文件、网络音频流或空设备上，由AUDIO_SOURCE/AUDIO_SINK配置：
+- 输入：'pyaudio'（麦克风）、'file'（内存映射读取WAV/原始PCM）、'socket'（TCP/UNIX套接字）、'null'（静音）
+- 输出：'sounddevice'（扬声器）、'socket'（TCP/UNIX套接字）、'null'（丢弃）
+声卡后端依赖PortAudio，只在选中时导入
+"""
+
+from config import AUDIO_SOURCE, AUDIO_SINK, AUDIO_SINK_REALTIME
+
+AUDIO_SOURCES = ('pyaudio', 'file', 'socket', 'null')
+AUDIO_SINKS = ('sounddevice', 'socket', 'null')
+
+
+def create_audio_source(backend=AUDIO_SOURCE):
+    """
+    根据配置创建音频输入
+
+    Args:
+        backend (str): AUDIO_SOURCES之一，文件路径、套接字地址等参数从config读取
+
+    Returns:
+        音频输入，提供start_recording、stop_recording、read_chunk、read_view、mark_sent和get_capture_metrics方法
+
+    Raises:
+        ValueError: 不支持的后端或缺少必需的配置
+    """
+    if backend == 'pyaudio':
+        from audio_helpers.mic_input import MicrophoneInput
+        return MicrophoneInput()
+    if backend == 'file':
+        from audio_helpers.audio_sources import MappedFileSource
+        return MappedFileSource()
+    if backend == 'socket':
+        from audio_helpers.audio_sources import SocketAudioSource
+        return SocketAudioSource()
+    if backend == 'null':
+        from audio_helpers.audio_sources import NullAudioSource
+        return NullAudioSource()
+    raise ValueError(f"不支持的音频输入: {backend}，可选: {', '.join(AUDIO_SOURCES)}")
+
+
+def create_audio_sink(backend=AUDIO_SINK):
+    """
+    根据配置创建音频输出
+
+    Args:
+        backend (str): AUDIO_SINKS之一，套接字地址等参数从config读取
+
+    Returns:
+        音频输出，提供play_stream、play_audio、wait、stop、set_gain和close_stream方法
+
+    Raises:
+        ValueError: 不支持的后端或缺少必需的配置
+    """
+    if backend == 'sounddevice':
+        from audio_helpers.audio_output import AudioOutput
+        return AudioOutput()
+    if backend == 'socket':
+        from audio_helpers.audio_sinks import SocketAudioSink
+        return SocketAudioSink()
+    if backend == 'null':
+        from audio_helpers.audio_sinks import NullAudioSink
+        return NullAudioSink(realtime=AUDIO_SINK_REALTIME)
+    raise ValueError(f"不支持的音频输出: {backend}，可选: {', '.join(AUDIO_SINKS)}")
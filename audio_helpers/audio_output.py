@@ -1,58 +1,123 @@
 """
 音频输出处理模块，负责播放音频
+所有播放都经过常驻的OutputEngine，不再为每段音频新建输出流或临时文件
 """
 
-import os
-import tempfile
-import sounddevice as sd
+import io
+import numpy as np
 import soundfile as sf
+from config import POLLY_PCM_SAMPLE_RATE
+from logger_config import logger
+from audio_helpers.output_engine import OutputEngine
 
 
 class AudioOutput:
     """音频输出处理类"""
-    
-    def __init__(self):
-        """初始化音频输出处理器"""
-        self.temp_dir = tempfile.mkdtemp()
-    
+
+    def __init__(self, engine=None):
+        """
+        初始化音频输出处理器
+
+        Args:
+            engine (OutputEngine, optional): 输出引擎，默认新建一个，输出流在首次播放时打开
+        """
+        self.engine = engine or OutputEngine()
+
+    def prewarm(self):
+        """预热：提前打开常驻输出流"""
+        self.engine.start()
+
     def play_audio(self, audio_data, sample_rate=24000):
         """
-        播放音频数据
-        
+        解码并播放一段编码后的音频（如MP3），等待播放结束
+
         Args:
             audio_data (bytes): 音频数据
+            sample_rate (int): 未使用，实际采样率从音频数据中读取
+
+        Returns:
+            bool: 是否播放成功
+        """
+        try:
+            # 在内存中直接解码为int16，不经过临时文件
+            data, samplerate = sf.read(io.BytesIO(audio_data), dtype='int16')
+            if data.ndim == 2:
+                data = data.mean(axis=1).astype(np.int16)
+            handle = self.engine.play(data.tobytes(), samplerate)
+            handle.wait()
+            return not handle.cancelled
+        except Exception as e:
+            logger.error(f"播放音频时出错: {e}")
+            return False
+
+    def play_pcm(self, pcm, sample_rate=POLLY_PCM_SAMPLE_RATE, on_complete=None):
+        """
+        排队播放一段16位单声道PCM，立即返回
+
+        Args:
+            pcm (bytes): PCM数据
             sample_rate (int): 采样率
+            on_complete: 播放结束后调用的函数，参数为播放句柄
+
+        Returns:
+            PlaybackHandle: 播放句柄，可用于等待或取消
+        """
+        return self.engine.play(pcm, sample_rate, on_complete)
+
+    def play_stream(self, chunks, sample_rate=16000):
         """
+        流式播放16位单声道PCM音频，收到一块就排队一块
+
+        排队的音频超过AUDIO_OUTPUT_MAX_LOOKAHEAD时等待，因此按实时速率推进；
+        返回时最后一块可能还在播放，需要时调用wait()
+
+        Args:
+            chunks (iterable): 产出PCM字节块的可迭代对象
+            sample_rate (int): 采样率
+
+        Returns:
+            bool: 是否播放了音频
+        """
+        handle = None
         try:
-            # 创建临时文件
-            temp_file = os.path.join(self.temp_dir, "temp_audio.mp3")
-            
-            # 写入音频数据
-            with open(temp_file, 'wb') as f:
-                f.write(audio_data)
-            
-            # 读取并播放音频
-            data, samplerate = sf.read(temp_file)
-            sd.play(data, samplerate)
-            sd.wait()  # 等待音频播放完成
-            
-            # 删除临时文件
-            try:
-                os.remove(temp_file)
-            except:
-                pass
-                
-            return True
+            handle = self.engine.open_stream(sample_rate)
+            for chunk in chunks:
+                if not handle.write(chunk):
+                    break
+            handle.finish()
+            return handle.bytes_written > 0 and not handle.cancelled
         except Exception as e:
-            print(f"播放音频时出错: {e}")
+            logger.error(f"流式播放音频时出错: {e}")
+            if handle is not None:
+                handle.cancel()
             return False
-    
+
+    def wait(self, timeout=None):
+        """
+        等待所有排队的音频播放完毕
+
+        Returns:
+            bool: 是否在超时前播放完毕
+        """
+        return self.engine.wait_idle(timeout)
+
+    def stop(self):
+        """立即停止播放，丢弃排队的音频"""
+        self.engine.cancel_all()
+
+    def set_gain(self, gain):
+        """
+        设置播放音量倍数，立即作用于排队中和正在播放的音频
+
+        Args:
+            gain (float): 0到1之间的倍数，1表示原始音量
+        """
+        self.engine.set_gain(gain)
+
+    def close_stream(self):
+        """关闭常驻输出流"""
+        self.engine.close()
+
     def __del__(self):
         """清理资源"""
-        try:
-            # 清理临时目录
-            for file in os.listdir(self.temp_dir):
-                os.remove(os.path.join(self.temp_dir, file))
-            os.rmdir(self.temp_dir)
-        except:
-            pass
+        self.close_stream()
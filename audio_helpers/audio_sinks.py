@@ -0,0 +1,208 @@
+"""
+无声卡环境使用的音频输出，接口与AudioOutput一致
+- NullAudioSink：丢弃音频，只记录首个音频块到达的时间，可按实时速率消费以模拟扬声器
+- SocketAudioSink：把16位单声道PCM写入TCP/UNIX套接字，由对端播放或转发
+"""
+
+import io
+import threading
+import time
+import numpy as np
+from config import POLLY_PCM_SAMPLE_RATE, AUDIO_SINK_ADDRESS, AUDIO_SINK_LISTEN, AUDIO_SINK_REALTIME
+from logger_config import logger
+from audio_helpers.pcm_convert import StreamResampler
+from audio_helpers.pcm_socket import PCMSocket
+from telemetry.tracing import tracer, MARK_PLAYBACK_START, MARK_PLAYBACK_END
+
+
+class AudioSink:
+    """音频输出的公共实现：播放、打断、音量和实时节奏
+
+    子类实现_write，把一块输出采样率的16位单声道PCM交给输出设备
+    """
+
+    def __init__(self, realtime=False, sample_rate=None):
+        """
+        Args:
+            realtime (bool): 为True时按音频时长等待，模拟扬声器播放，可被stop()打断
+            sample_rate (int, optional): 输出采样率，其他采样率的音频先重采样；None表示原样输出
+        """
+        self.realtime = realtime
+        self.sample_rate = sample_rate
+        self.first_audio_time = None
+        self.bytes_played = 0
+        self.gain = 1.0
+        self.stops = 0
+        self.condition = threading.Condition()
+
+    def prewarm(self):
+        """预热：建立连接，默认无需准备"""
+
+    def reset(self):
+        """开始新的一轮，清空首个音频块的时间和播放字节数"""
+        self.first_audio_time = None
+        self.bytes_played = 0
+
+    def play_stream(self, chunks, sample_rate=POLLY_PCM_SAMPLE_RATE):
+        """
+        逐块输出16位单声道PCM，实时模式下在stop()后立即返回
+
+        Args:
+            chunks (iterable): 产出PCM字节块的可迭代对象
+            sample_rate (int): 采样率
+
+        Returns:
+            bool: 是否输出了音频且没有被打断
+        """
+        played = False
+        stops = self.stops
+        deadline = None
+        resampler = None
+        if self.sample_rate is not None and sample_rate != self.sample_rate:
+            resampler = StreamResampler(sample_rate, self.sample_rate)
+        try:
+            for chunk in chunks:
+                if self.stops != stops:
+                    break
+                if not chunk:
+                    continue
+                duration = len(chunk) / 2 / sample_rate
+                if resampler is not None:
+                    chunk = resampler.process(chunk)
+                gain = self.gain
+                if gain != 1.0:
+                    chunk = (np.frombuffer(chunk, dtype=np.int16) * gain).astype(np.int16).tobytes()
+                if self.first_audio_time is None:
+                    self.first_audio_time = time.perf_counter()
+                if not played:
+                    tracer.mark(MARK_PLAYBACK_START)
+                    played = True
+                self._write(chunk)
+                self.bytes_played += len(chunk)
+                if self.realtime:
+                    deadline = (deadline or time.perf_counter()) + duration
+                    with self.condition:
+                        self.condition.wait_for(lambda: self.stops != stops, deadline - time.perf_counter())
+        except Exception as e:
+            logger.error(f"输出音频时出错: {e}")
+            return False
+        if played:
+            tracer.mark(MARK_PLAYBACK_END)
+        return played and self.stops == stops
+
+    def play_audio(self, audio_data, sample_rate=24000):
+        """
+        解码并输出一段编码后的音频（如MP3）
+
+        Args:
+            audio_data (bytes): 音频数据
+            sample_rate (int): 未使用，实际采样率从音频数据中读取
+
+        Returns:
+            bool: 是否输出成功
+        """
+        try:
+            import soundfile as sf
+            data, samplerate = sf.read(io.BytesIO(audio_data), dtype='int16')
+        except Exception as e:
+            logger.error(f"解码音频时出错: {e}")
+            return False
+        if data.ndim == 2:
+            data = data.mean(axis=1).astype(np.int16)
+        return self.play_stream([data.tobytes()], samplerate)
+
+    def wait(self, timeout=None):
+        """音频在play_stream返回前已经交付，直接返回True"""
+        return True
+
+    def stop(self):
+        """打断正在进行的输出"""
+        with self.condition:
+            self.stops += 1
+            self.condition.notify_all()
+
+    def set_gain(self, gain):
+        """
+        设置输出音量倍数，从下一块音频起生效
+
+        Args:
+            gain (float): 0到1之间的倍数，1表示原始音量
+
+        Raises:
+            ValueError: 倍数超出范围
+        """
+        if not 0.0 <= gain <= 1.0:
+            raise ValueError(f"音量倍数必须在0到1之间: {gain}")
+        self.gain = gain
+
+    def close_stream(self):
+        """关闭输出，默认无需清理"""
+
+    def _write(self, chunk):
+        """输出一块PCM，由子类实现"""
+        raise NotImplementedError
+
+
+class NullAudioSink(AudioSink):
+    """丢弃音频的输出，只记录首个音频块到达的时间"""
+
+    def __init__(self, realtime=False):
+        """
+        Args:
+            realtime (bool): 为True时按音频时长等待，模拟扬声器播放，可被stop()打断
+        """
+        super().__init__(realtime)
+
+    def _write(self, chunk):
+        pass
+
+
+class SocketAudioSink(AudioSink):
+    """把PCM写入TCP/UNIX套接字，所有回复按同一采样率首尾相接"""
+
+    def __init__(self, address=AUDIO_SINK_ADDRESS, listen=AUDIO_SINK_LISTEN, realtime=AUDIO_SINK_REALTIME,
+                 sample_rate=POLLY_PCM_SAMPLE_RATE):
+        """
+        初始化套接字输出，连接在首次输出或预热时建立
+
+        Args:
+            address (str): 'tcp://主机:端口'或'unix:///路径'
+            listen (bool): 为True时监听地址并等待对端连接，否则主动连接
+            realtime (bool): 按音频时长等待，避免整条回复瞬间写入对端缓冲区后无法打断
+            sample_rate (int): 写入的PCM采样率
+
+        Raises:
+            ValueError: 地址格式不正确
+        """
+        super().__init__(realtime, sample_rate)
+        self.socket = None
+        self.socket = PCMSocket(address, listen)
+        self.lock = threading.Lock()
+
+    def prewarm(self):
+        """监听模式下绑定地址，主动连接模式下建立连接"""
+        if self.socket.listen:
+            self.socket.bind()
+        else:
+            self.socket.connect()
+
+    def _write(self, chunk):
+        with self.lock:
+            conn = self.socket.connect()
+            if conn is None:
+                raise ConnectionError(f"等待 {self.socket.address} 的对端连接超时")
+            try:
+                conn.sendall(chunk)
+            except OSError:
+                # 对端断开，下一块音频重新连接
+                self.socket.disconnect()
+                raise
+
+    def close_stream(self):
+        """关闭连接"""
+        if self.socket is not None:
+            self.socket.close()
+
+    def __del__(self):
+        """清理资源"""
+        self.close_stream()
@@ -0,0 +1,374 @@
+"""
+无声卡环境使用的音频输入源，接口与MicrophoneInput一致，输出的音频块始终是SAMPLE_RATE的16位单声道PCM
+- MappedFileSource：内存映射读取WAV/原始PCM文件，音频块是映射区域的零拷贝视图，可按实时或加速的节奏读取
+- SocketAudioSource：从TCP/UNIX套接字读取PCM流
+- NullAudioSource：按实时节奏产生静音
+"""
+
+import mmap
+import socket
+import struct
+import time
+from config import (
+    SAMPLE_RATE, CHUNK_SIZE, MIC_READ_TIMEOUT, AUDIO_SOURCE_PATH, AUDIO_SOURCE_SPEED, AUDIO_SOURCE_LOOP,
+    AUDIO_SOURCE_ADDRESS, AUDIO_SOURCE_LISTEN
+)
+from logger_config import logger
+from audio_helpers.pcm_convert import CaptureConverter
+from audio_helpers.pcm_socket import PCMSocket
+
+# WAV格式标签：PCM和WAVE_FORMAT_EXTENSIBLE
+WAV_FORMAT_PCM = 1
+WAV_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def parse_wav_header(data):
+    """
+    解析WAV文件头，找到采样数据所在的位置
+
+    Args:
+        data: 文件内容（支持切片的字节缓冲区）
+
+    Returns:
+        tuple: (采样率, 声道数, 数据起始偏移, 数据字节数)
+
+    Raises:
+        ValueError: 不是16位PCM的WAV文件
+    """
+    if len(data) < 12 or bytes(data[0:4]) != b'RIFF' or bytes(data[8:12]) != b'WAVE':
+        raise ValueError("不是WAV文件")
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = bytes(data[offset:offset + 4])
+        size = struct.unpack_from('<I', data, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b'fmt ':
+            fmt = struct.unpack_from('<HHIIHH', data, body)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("WAV文件缺少fmt块")
+            format_tag, channels, rate, _, _, bits = fmt
+            if format_tag not in (WAV_FORMAT_PCM, WAV_FORMAT_EXTENSIBLE) or bits != 16:
+                raise ValueError(f"只支持16位PCM的WAV文件（格式 {format_tag}，{bits}位）")
+            # 边录边写的WAV文件数据长度可能未填写（0或0xFFFFFFFF）或超出文件，以文件末尾为准
+            if size == 0 or size > len(data) - body:
+                size = len(data) - body
+            return rate, channels, body, size
+        # 块长度为奇数时有一个填充字节
+        offset = body + size + (size & 1)
+    raise ValueError("WAV文件缺少data块")
+
+
+class AudioSource:
+    """音频输入源的公共实现：录音状态、采集指标和读取节奏
+
+    子类实现_read，返回一个音频块的视图；读到输入末尾时设置exhausted，
+    VoiceProcessor据此在输入结束后停止，而不是无限等待
+    """
+
+    # 非交互式输入不需要在每轮之间等待用户按Enter
+    interactive = False
+
+    def __init__(self, chunk_frames=CHUNK_SIZE, speed=0.0):
+        """
+        Args:
+            chunk_frames (int): 每块的采样帧数（SAMPLE_RATE下）
+            speed (float): 读取速度倍数，1.0为实时，大于1加速，0表示不等待
+        """
+        self.chunk_frames = chunk_frames
+        self.speed = speed
+        self.is_recording = False
+        self.exhausted = False
+        self.pace_start = None
+        self.paced_seconds = 0.0
+        self._reset_metrics()
+
+    def prewarm(self):
+        """预热：打开文件或连接，默认无需准备"""
+
+    def start_recording(self):
+        """开始录音，读取节奏从此时重新计时"""
+        self.prewarm()
+        self._reset_metrics()
+        self.pace_start = time.perf_counter()
+        self.paced_seconds = 0.0
+        self.is_recording = True
+
+    def stop_recording(self):
+        """停止录音，输入位置保留到下次录音"""
+        self.is_recording = False
+
+    def read_view(self):
+        """
+        读取一个音频块的视图
+
+        视图指向的缓冲区可能被下一次读取复用并覆盖（如SocketAudioSource的接收缓冲区），
+        需要在下一次读取之后继续使用的数据（预卷缓冲区、交给其他线程的音频块）必须先复制，或改用read_chunk
+
+        Returns:
+            memoryview: 16位单声道SAMPLE_RATE的PCM，在下一次读取前有效；没有数据时返回None
+        """
+        if not self.is_recording or self.exhausted:
+            return None
+        view = self._read()
+        if view is None:
+            return None
+        self._pace(len(view) / 2 / SAMPLE_RATE)
+        self.last_capture_time = time.monotonic()
+        self.chunks_read += 1
+        return view
+
+    def read_chunk(self):
+        """读取一个16位单声道SAMPLE_RATE的音频块，返回调用方独占的bytes"""
+        view = self.read_view()
+        return bytes(view) if view is not None else None
+
+    def mark_sent(self):
+        """记录最近读取的音频块已发送，用于统计读取到发送的延迟"""
+        if self.last_capture_time is None:
+            return
+        latency = time.monotonic() - self.last_capture_time
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.latency_count += 1
+
+    def get_capture_metrics(self):
+        """
+        获取采集指标，字段与MicrophoneInput一致
+
+        Returns:
+            dict: 读取的块数以及读取到发送的平均/最大延迟（秒），溢出计数恒为0
+        """
+        return {
+            'chunks_read': self.chunks_read,
+            'input_overflows': 0,
+            'overrun_events': 0,
+            'overrun_frames': 0,
+            'send_latency_avg': self.latency_total / self.latency_count if self.latency_count else 0.0,
+            'send_latency_max': self.latency_max,
+        }
+
+    def close(self):
+        """释放文件或连接"""
+        self.stop_recording()
+
+    def _read(self):
+        """读取一个音频块的视图，由子类实现"""
+        raise NotImplementedError
+
+    def _pace(self, seconds):
+        """按设定速度等待到这块音频在实时输入中应当读完的时间"""
+        self.paced_seconds += seconds
+        if self.speed > 0:
+            delay = self.pace_start + self.paced_seconds / self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _reset_metrics(self):
+        self.chunks_read = 0
+        self.last_capture_time = None
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_count = 0
+
+    def __del__(self):
+        """清理资源"""
+        self.close()
+
+
+class MappedFileSource(AudioSource):
+    """内存映射读取WAV或原始PCM文件
+
+    文件已是SAMPLE_RATE单声道时，read_view返回映射区域的只读视图，读取时不复制数据，
+    视图在close之前一直有效；read_chunk与其他输入一样返回复制后的bytes。其他格式按块混合并重采样
+    """
+
+    def __init__(self, path=AUDIO_SOURCE_PATH, speed=AUDIO_SOURCE_SPEED, loop=AUDIO_SOURCE_LOOP,
+                 chunk_frames=CHUNK_SIZE):
+        """
+        初始化文件输入，文件在首次录音或预热时映射
+
+        Args:
+            path (str): 文件路径，以RIFF/WAVE开头时按WAV解析，否则视为SAMPLE_RATE的16位单声道原始PCM
+            speed (float): 读取速度倍数，1.0为实时，大于1加速，0表示不等待
+            loop (bool): 读完后是否从头循环
+            chunk_frames (int): 每块的采样帧数（SAMPLE_RATE下）
+
+        Raises:
+            ValueError: 未指定文件路径
+        """
+        super().__init__(chunk_frames, speed)
+        self.path = path
+        self.loop = loop
+        self.file = None
+        self.map = None
+        self.data = None
+        self.converter = None
+        self.chunk_bytes = chunk_frames * 2
+        self.position = 0
+        self.loops = 0
+        if not path:
+            raise ValueError("未配置输入文件路径（AUDIO_SOURCE_PATH）")
+
+    def prewarm(self):
+        """映射文件并解析格式，已映射时直接返回"""
+        if self.map is not None:
+            return
+        file = open(self.path, 'rb')
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            file.close()
+            raise ValueError(f"输入文件为空: {self.path}")
+        view = memoryview(mapped)
+        try:
+            if bytes(view[0:4]) == b'RIFF':
+                rate, channels, offset, size = parse_wav_header(view)
+            else:
+                rate, channels, offset, size = SAMPLE_RATE, 1, 0, len(view)
+        except Exception:
+            view.release()
+            mapped.close()
+            file.close()
+            raise
+        frame_bytes = channels * 2
+        self.data = view[offset:offset + size - size % frame_bytes]
+        self.file, self.map = file, mapped
+        # 每块读取约chunk_frames个目标采样率的帧
+        device_frames = max(1, round(self.chunk_frames * rate / SAMPLE_RATE))
+        self.chunk_bytes = device_frames * frame_bytes
+        if rate != SAMPLE_RATE or channels != 1:
+            self.converter = CaptureConverter(rate, channels)
+            logger.info(f"输入文件为 {rate}Hz/{channels}声道，转换为 {SAMPLE_RATE}Hz单声道")
+        self.source_rate = rate
+        self.frame_bytes = frame_bytes
+        logger.info(f"已映射输入文件 {self.path}: {len(self.data) / frame_bytes / rate:.1f}秒")
+
+    def start_recording(self):
+        """开始录音，从上次停止的位置继续读取"""
+        super().start_recording()
+        if self.converter is not None:
+            # 每次录音从新的滤波器和插值状态开始
+            self.converter = CaptureConverter(self.source_rate, self.frame_bytes // 2)
+
+    def _read(self):
+        if self.position >= len(self.data):
+            if not self.loop:
+                logger.info(f"输入文件已读完: {self.path}")
+                self.exhausted = True
+                return None
+            self.position = 0
+            self.loops += 1
+        end = min(self.position + self.chunk_bytes, len(self.data))
+        view = self.data[self.position:end]
+        self.position = end
+        if self.converter is not None:
+            view = memoryview(self.converter.process(view))
+        return view
+
+    def close(self):
+        """解除映射并关闭文件"""
+        super().close()
+        if self.map is None:
+            return
+        self.data = None
+        try:
+            self.map.close()
+        except BufferError:
+            # 仍有音频块视图在使用，映射随最后一个视图释放
+            logger.debug("输入文件仍有音频块在使用，推迟解除映射")
+        self.file.close()
+        self.map = None
+        self.file = None
+
+
+class SocketAudioSource(AudioSource):
+    """从TCP/UNIX套接字读取SAMPLE_RATE的16位单声道PCM流，读取节奏由对端决定
+
+    所有音频块都接收到同一个预分配的缓冲区中，read_view返回的视图在下一次读取时被覆盖
+    """
+
+    def __init__(self, address=AUDIO_SOURCE_ADDRESS, listen=AUDIO_SOURCE_LISTEN, chunk_frames=CHUNK_SIZE,
+                 read_timeout=MIC_READ_TIMEOUT):
+        """
+        初始化套接字输入，连接在首次录音或预热时建立
+
+        Args:
+            address (str): 'tcp://主机:端口'或'unix:///路径'
+            listen (bool): 为True时监听地址，对端断开后等待下一个连接；否则主动连接，对端断开即输入结束
+            chunk_frames (int): 每块的采样帧数
+            read_timeout (float): 等待音频块的最长时间（秒），超时返回None，调用方可借此检查是否需要停止
+
+        Raises:
+            ValueError: 地址格式不正确
+        """
+        super().__init__(chunk_frames, speed=0.0)
+        self.socket = None
+        self.socket = PCMSocket(address, listen)
+        self.read_timeout = read_timeout
+        # 预分配的接收缓冲区，凑满一块后返回它的视图，下一次读取复用同一块内存
+        self.buffer = bytearray(chunk_frames * 2)
+        self.view = memoryview(self.buffer)
+        self.filled = 0
+
+    def prewarm(self):
+        """监听模式下绑定地址，主动连接模式下建立连接"""
+        if self.socket.listen:
+            self.socket.bind()
+        else:
+            self.socket.connect()
+
+    def _read(self):
+        conn = self.socket.connect(timeout=self.read_timeout)
+        if conn is None:
+            return None
+        conn.settimeout(self.read_timeout)
+        while self.filled < len(self.buffer):
+            try:
+                received = conn.recv_into(self.view[self.filled:])
+            except socket.timeout:
+                return None
+            except OSError as e:
+                logger.warning(f"读取音频流时出错: {e}")
+                received = 0
+            if received == 0:
+                return self._on_disconnect()
+            self.filled += received
+        self.filled = 0
+        return self.view
+
+    def _on_disconnect(self):
+        """对端断开：交付不足一块的剩余数据，主动连接模式下输入结束"""
+        self.socket.disconnect()
+        # 只交付完整的采样
+        remaining = self.filled - self.filled % 2
+        self.filled = 0
+        if not self.socket.listen:
+            logger.info("音频流已结束")
+            self.exhausted = True
+        else:
+            logger.info("音频流对端已断开，等待下一个连接")
+        return self.view[:remaining] if remaining else None
+
+    def close(self):
+        """关闭连接"""
+        super().close()
+        if self.socket is not None:
+            self.socket.close()
+
+
+class NullAudioSource(AudioSource):
+    """按设定节奏产生静音的输入，用于压测和没有输入设备的环境"""
+
+    def __init__(self, speed=AUDIO_SOURCE_SPEED, chunk_frames=CHUNK_SIZE):
+        """
+        Args:
+            speed (float): 速度倍数，1.0为实时，0表示不等待
+            chunk_frames (int): 每块的采样帧数
+        """
+        super().__init__(chunk_frames, speed)
+        self.silence = memoryview(bytes(chunk_frames * 2))
+
+    def _read(self):
+        return self.silence
@@ -1,36 +1,143 @@
 """
 麦克风输入处理模块，负责从麦克风捕获音频并进行预处理
+设备支持SAMPLE_RATE单声道时直接采集；否则按设备的原生采样率和声道数采集，
+读取时再混合为单声道并重采样到SAMPLE_RATE，输出的音频块始终是16位单声道PCM
 """
 
+import threading
+import time
 import pyaudio
 import numpy as np
-from config import SAMPLE_RATE, CHANNELS, CHUNK_SIZE, FORMAT
+from config import (
+    SAMPLE_RATE, CHANNELS, CHUNK_SIZE, FORMAT, MIC_CAPTURE_MODE, MIC_RING_BUFFER_SECONDS, MIC_READ_TIMEOUT,
+    MIC_DEVICE, MIC_DEVICE_RATE, MIC_DEVICE_CHANNELS
+)
+from logger_config import logger
+from audio_helpers.pcm_convert import CaptureConverter
+from audio_helpers.ring_buffer import AudioRingBuffer
 
 
 class MicrophoneInput:
     """麦克风输入处理类"""
     
-    def __init__(self):
-        """初始化麦克风输入处理器"""
-        self.audio = pyaudio.PyAudio()
+    def __init__(self, capture_mode=MIC_CAPTURE_MODE, device=MIC_DEVICE, device_rate=MIC_DEVICE_RATE,
+                 device_channels=MIC_DEVICE_CHANNELS):
+        """
+        初始化麦克风输入处理器
+        
+        Args:
+            capture_mode (str): 'blocking' 使用阻塞式stream.read；
+                'callback' 由PyAudio回调写入预分配的环形缓冲区
+            device (int, optional): 输入设备编号，None表示系统默认设备
+            device_rate (int, optional): 采集采样率，None表示自动选择
+            device_channels (int, optional): 采集声道数，None表示自动选择
+        """
+        # PyAudio初始化会枚举音频设备，推迟到首次录音或预热时执行
+        self.audio = None
+        self.audio_lock = threading.Lock()
         self.stream = None
         self.is_recording = False
+        self.capture_mode = capture_mode
+        self.device = device
+        self.requested_rate = device_rate
+        self.requested_channels = device_channels
+        # 实际的采集格式在第一次录音时确定
+        self.device_rate = None
+        self.device_channels = None
+        self.device_chunk = CHUNK_SIZE
+        self.converter = None
+        self.ring_buffer = None
+        self._reset_metrics()
     
     def start_recording(self):
         """开始录音"""
         if self.stream is not None:
             self.stop_recording()
         
-        self.stream = self.audio.open(
+        audio = self.prewarm()
+        if self.converter is not None:
+            # 每次录音从新的滤波器和插值状态开始
+            self.converter = CaptureConverter(self.device_rate, self.device_channels)
+        
+        self._reset_metrics()
+        stream_kwargs = {}
+        if self.ring_buffer is not None:
+            self.ring_buffer.reset()
+            stream_kwargs['stream_callback'] = self._capture_callback
+        
+        self.stream = audio.open(
             format=pyaudio.paInt16,
-            channels=CHANNELS,
-            rate=SAMPLE_RATE,
+            channels=self.device_channels,
+            rate=self.device_rate,
             input=True,
-            frames_per_buffer=CHUNK_SIZE
+            input_device_index=self.device,
+            frames_per_buffer=self.device_chunk,
+            **stream_kwargs
         )
         self.is_recording = True
         print("开始录音...")
     
+    def _configure_format(self, audio):
+        """
+        确定采集采样率和声道数，并按采集格式创建转换器和环形缓冲区
+        
+        Args:
+            audio (pyaudio.PyAudio): PyAudio实例
+        """
+        rate, channels = self.requested_rate, self.requested_channels
+        if rate is None or channels is None:
+            if self._format_supported(audio, rate or SAMPLE_RATE, channels or CHANNELS):
+                rate, channels = rate or SAMPLE_RATE, channels or CHANNELS
+            else:
+                if self.device is None:
+                    info = audio.get_default_input_device_info()
+                else:
+                    info = audio.get_device_info_by_index(self.device)
+                rate = rate or int(info['defaultSampleRate'])
+                channels = channels or max(1, int(info['maxInputChannels']))
+        
+        self.device_rate = rate
+        self.device_channels = channels
+        # 每次读取的设备帧数对应约CHUNK_SIZE个目标采样率的帧
+        self.device_chunk = max(1, round(CHUNK_SIZE * rate / SAMPLE_RATE))
+        self.converter = None
+        if rate != SAMPLE_RATE or channels != 1:
+            self.converter = CaptureConverter(rate, channels)
+            logger.info(f"麦克风以 {rate}Hz/{channels}声道采集，转换为 {SAMPLE_RATE}Hz单声道")
+        if self.capture_mode == 'callback':
+            # 环形缓冲区按交错采样计数
+            chunk_samples = self.device_chunk * channels
+            capacity = max(int(rate * MIC_RING_BUFFER_SECONDS) * channels, 2 * chunk_samples)
+            self.ring_buffer = AudioRingBuffer(capacity, chunk_samples)
+    
+    def _format_supported(self, audio, rate, channels):
+        """检查设备是否支持以指定采样率和声道数采集16位PCM"""
+        try:
+            return audio.is_format_supported(rate, input_device=self._device_index(audio), input_channels=channels,
+                                             input_format=pyaudio.paInt16)
+        except ValueError:
+            return False
+    
+    def _device_index(self, audio):
+        """返回实际使用的输入设备编号"""
+        if self.device is not None:
+            return self.device
+        return audio.get_default_input_device_info()['index']
+    
+    def prewarm(self):
+        """
+        初始化PyAudio并确定采集格式，已初始化时直接返回
+        
+        Returns:
+            pyaudio.PyAudio: PyAudio实例
+        """
+        with self.audio_lock:
+            if self.audio is None:
+                self.audio = pyaudio.PyAudio()
+            if self.device_rate is None:
+                self._configure_format(self.audio)
+        return self.audio
+    
     def stop_recording(self):
         """停止录音"""
         if self.stream is not None:
@@ -41,16 +148,95 @@ class MicrophoneInput:
             print("停止录音")
     
     def read_chunk(self):
-        """读取一个音频块"""
-        if not self.is_recording or self.stream is None:
+        """读取一个16位单声道SAMPLE_RATE的音频块，返回调用方独占的bytes"""
+        if self.ring_buffer is None:
+            return self._read_blocking()
+        view = self.read_view()
+        return bytes(view) if view is not None else None
+    
+    def read_view(self):
+        """
+        以零拷贝方式读取一个音频块：回调模式下返回环形缓冲区的视图，需要格式转换时返回转换后数据的视图
+        
+        Returns:
+            memoryview: 16位单声道SAMPLE_RATE的PCM，在下一次读取前有效，需要保留时由调用方复制；
+                超时或读取失败返回None
+        """
+        if self.ring_buffer is None:
+            data = self._read_blocking()
+            return memoryview(data) if data is not None else None
+        if not self.is_recording:
             return None
         
+        view, capture_time = self.ring_buffer.read(timeout=MIC_READ_TIMEOUT)
+        if view is not None:
+            self.last_capture_time = capture_time
+            self.chunks_read += 1
+            if self.converter is not None:
+                view = memoryview(self.converter.process(view))
+        return view
+    
+    def _read_blocking(self):
+        """阻塞模式下读取一个音频块"""
+        if not self.is_recording or self.stream is None:
+            return None
         try:
-            data = self.stream.read(CHUNK_SIZE, exception_on_overflow=False)
-            return data
+            data = self.stream.read(self.device_chunk, exception_on_overflow=False)
         except Exception as e:
-            print(f"读取音频时出错: {e}")
+            logger.error(f"读取音频时出错: {e}")
             return None
+        self.last_capture_time = time.monotonic()
+        self.chunks_read += 1
+        if self.converter is not None:
+            data = self.converter.process(data)
+        return data
+    
+    def mark_sent(self):
+        """记录最近读取的音频块已发送，用于统计采集到发送的延迟"""
+        if self.last_capture_time is None:
+            return
+        latency = time.monotonic() - self.last_capture_time
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.latency_count += 1
+    
+    def get_capture_metrics(self):
+        """
+        获取采集指标
+        
+        Returns:
+            dict: 溢出次数、溢出丢弃的帧数以及采集到发送的平均/最大延迟（秒）
+        """
+        metrics = {
+            'chunks_read': self.chunks_read,
+            'input_overflows': self.input_overflows,
+            'overrun_events': 0,
+            'overrun_frames': 0,
+            'send_latency_avg': self.latency_total / self.latency_count if self.latency_count else 0.0,
+            'send_latency_max': self.latency_max,
+        }
+        if self.ring_buffer is not None:
+            metrics['overrun_events'] = self.ring_buffer.overrun_events
+            metrics['overrun_frames'] = self.ring_buffer.overrun_frames
+        return metrics
+    
+    def _capture_callback(self, in_data, frame_count, time_info, status):
+        """PyAudio采集回调，只做一次内存拷贝写入环形缓冲区"""
+        if status & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        self.ring_buffer.write(in_data, time.monotonic())
+        return None, pyaudio.paContinue
+    
+    def _reset_metrics(self):
+        self.chunks_read = 0
+        self.input_overflows = 0
+        self.last_capture_time = None
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_count = 0
+        if self.ring_buffer is not None:
+            self.ring_buffer.overrun_events = 0
+            self.ring_buffer.overrun_frames = 0
     
     def __del__(self):
         """清理资源"""
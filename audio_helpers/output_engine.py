@@ -0,0 +1,375 @@
+"""
+常驻音频输出引擎
+进程内只打开一个16位单声道输出流，由声卡回调从播放队列中取数据：
+- 输入为Polly原生采样率的int16 PCM，设备支持该采样率时直接播放，不支持时才重采样
+- 播放不阻塞调用方，每段音频播放完毕后在通知线程中调用完成回调
+- 可随时调整输出音量倍数（如用户插话时压低回复），从下一次回调起生效
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+import numpy as np
+from config import (
+    POLLY_PCM_SAMPLE_RATE, AUDIO_OUTPUT_DEVICE, AUDIO_OUTPUT_BLOCK_MS, AUDIO_OUTPUT_LATENCY,
+    AUDIO_OUTPUT_MAX_LOOKAHEAD
+)
+from logger_config import logger
+from audio_helpers.pcm_convert import StreamResampler
+from telemetry.tracing import tracer, MARK_PLAYBACK_START, MARK_PLAYBACK_END
+
+
+class PlaybackHandle:
+    """一段排队播放的音频，可以分多次写入"""
+
+    def __init__(self, engine, resampler, on_complete):
+        """
+        初始化播放句柄，由OutputEngine创建
+
+        Args:
+            engine (OutputEngine): 所属的输出引擎
+            resampler (StreamResampler): 采样率与设备不一致时使用的重采样器，一致时为None
+            on_complete: 播放结束（或被取消）后调用的函数，参数为本句柄
+        """
+        self.engine = engine
+        self.resampler = resampler
+        self.on_complete = on_complete
+        # 创建时所在的对话追踪，播放时间点在通知线程中记入
+        self.trace = tracer.active()
+        self.buffer = bytearray()
+        self.remainder = b''
+        self.bytes_written = 0
+        self.finished = False
+        self.cancelled = False
+        self.completed = False
+        self.start_time = None
+        self.end_time = None
+        self.done = threading.Event()
+
+    def write(self, chunk, block=True):
+        """
+        追加PCM数据
+
+        Args:
+            chunk (bytes): 16位单声道PCM
+            block (bool): 排队的数据超过AUDIO_OUTPUT_MAX_LOOKAHEAD时是否等待
+
+        Returns:
+            bool: 句柄已被取消时返回False
+        """
+        # 保证写入的数据按16位采样对齐
+        data = self.remainder + chunk
+        usable = len(data) - (len(data) % 2)
+        self.remainder = data[usable:]
+        if not usable:
+            return not self.cancelled
+        data = data[:usable]
+        if self.resampler is not None:
+            data = self.resampler.process(data)
+        return self.engine._append(self, data, block)
+
+    def finish(self):
+        """标记不再写入数据，排队的数据播放完毕后句柄完成"""
+        self.engine._finish(self)
+
+    def cancel(self):
+        """丢弃尚未播放的数据并立即完成"""
+        self.engine._cancel(self)
+
+    def wait(self, timeout=None):
+        """
+        等待播放结束
+
+        Returns:
+            bool: 是否在超时前结束
+        """
+        return self.done.wait(timeout)
+
+
+class OutputEngine:
+    """常驻输出流和播放队列"""
+
+    def __init__(self, sample_rate=POLLY_PCM_SAMPLE_RATE, device=AUDIO_OUTPUT_DEVICE,
+                 block_ms=AUDIO_OUTPUT_BLOCK_MS, latency=AUDIO_OUTPUT_LATENCY, max_lookahead=AUDIO_OUTPUT_MAX_LOOKAHEAD):
+        """
+        初始化输出引擎，输出流在首次播放时打开
+
+        Args:
+            sample_rate (int): 希望使用的设备采样率，通常为Polly的PCM采样率
+            device: 输出设备编号或名称，None表示默认设备
+            block_ms (int): 每次回调填充的音频时长（毫秒）
+            latency: 输出流延迟设置
+            max_lookahead (float): 流式写入时最多提前排队的音频时长（秒）
+        """
+        self.preferred_rate = sample_rate
+        self.device = device
+        self.block_ms = block_ms
+        self.latency = latency
+        self.max_lookahead = max_lookahead
+        self.device_rate = None
+        self.stream = None
+        self.start_lock = threading.Lock()
+        self.handles = deque()
+        self.queued_bytes = 0
+        self.gain = 1.0
+        self.condition = threading.Condition()
+        self.notifications = queue.SimpleQueue()
+        self.notifier = None
+        self.stats = {'underflows': 0, 'resampled_handles': 0}
+
+    def start(self):
+        """打开输出流和通知线程，已打开时直接返回，可在预热线程中调用"""
+        with self.start_lock:
+            if self.stream is None:
+                self._open()
+
+    def _open(self):
+        """打开输出流和通知线程"""
+        # 延迟导入，没有声卡的环境中也可以导入本模块
+        import sounddevice as sd
+
+        try:
+            sd.check_output_settings(device=self.device, samplerate=self.preferred_rate, channels=1, dtype='int16')
+            self.device_rate = self.preferred_rate
+        except Exception:
+            self.device_rate = int(sd.query_devices(self.device, 'output')['default_samplerate'])
+            logger.info(f"输出设备不支持 {self.preferred_rate}Hz，将重采样到 {self.device_rate}Hz")
+
+        self.stream = sd.RawOutputStream(
+            samplerate=self.device_rate, blocksize=int(self.device_rate * self.block_ms / 1000),
+            device=self.device, channels=1, dtype='int16', latency=self.latency, callback=self._callback
+        )
+        self.stream.start()
+        if self.notifier is None:
+            self.notifier = threading.Thread(target=self._notify_loop, name='audio-output-notify', daemon=True)
+            self.notifier.start()
+        logger.info(f"音频输出流已打开: {self.device_rate}Hz, 输出延迟 {self.stream.latency * 1000:.0f}ms")
+
+    def open_stream(self, sample_rate=POLLY_PCM_SAMPLE_RATE, on_complete=None):
+        """
+        创建一个可以分多次写入的播放句柄，排在已有播放之后
+
+        Args:
+            sample_rate (int): 写入数据的采样率
+            on_complete: 播放结束后调用的函数，参数为句柄
+
+        Returns:
+            PlaybackHandle: 播放句柄
+        """
+        self.start()
+        resampler = None
+        if sample_rate != self.device_rate:
+            resampler = StreamResampler(sample_rate, self.device_rate)
+            self.stats['resampled_handles'] += 1
+        handle = PlaybackHandle(self, resampler, on_complete)
+        with self.condition:
+            self.handles.append(handle)
+        return handle
+
+    def play(self, pcm, sample_rate=POLLY_PCM_SAMPLE_RATE, on_complete=None):
+        """
+        排队播放一段完整的PCM，立即返回
+
+        Args:
+            pcm (bytes): 16位单声道PCM
+            sample_rate (int): 采样率
+            on_complete: 播放结束后调用的函数，参数为句柄
+
+        Returns:
+            PlaybackHandle: 播放句柄
+        """
+        handle = self.open_stream(sample_rate, on_complete)
+        handle.write(pcm, block=False)
+        handle.finish()
+        return handle
+
+    def wait_idle(self, timeout=None):
+        """
+        等待队列中的所有音频播放完毕
+
+        Returns:
+            bool: 是否在超时前播放完毕
+        """
+        with self.condition:
+            handles = list(self.handles)
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for handle in handles:
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            if not handle.wait(remaining):
+                return False
+        return True
+
+    def cancel_all(self):
+        """丢弃所有排队的音频"""
+        with self.condition:
+            handles = list(self.handles)
+        for handle in handles:
+            handle.cancel()
+
+    def set_gain(self, gain):
+        """
+        设置输出音量倍数，作用于排队中和正在播放的音频
+
+        Args:
+            gain (float): 0到1之间的倍数，1表示原始音量
+
+        Raises:
+            ValueError: 倍数超出范围
+        """
+        if not 0.0 <= gain <= 1.0:
+            raise ValueError(f"音量倍数必须在0到1之间: {gain}")
+        self.gain = gain
+
+    def _append(self, handle, data, block):
+        """
+        把数据加入句柄缓冲区，排在它前面（含它自己）的数据过多时等待回调消费
+
+        只统计排在前面的数据：回调只从队列头部取数据，如果按整个队列计数，
+        后面的句柄（如play()排入的整段音频）占满额度时，还没有数据的头部句柄会一直等待，输出只剩静音
+        """
+        limit = int(self.device_rate * self.max_lookahead) * 2
+        with self.condition:
+            if block:
+                self.condition.wait_for(lambda: handle.cancelled or self._queued_through(handle) < limit)
+            if handle.cancelled:
+                return False
+            handle.buffer += data
+            handle.bytes_written += len(data)
+            self.queued_bytes += len(data)
+        return True
+
+    def _queued_through(self, handle):
+        """排在handle前面的句柄和handle自身尚未播放的字节数，调用方需持有condition"""
+        total = 0
+        for queued in self.handles:
+            total += len(queued.buffer)
+            if queued is handle:
+                break
+        return total
+
+    def _finish(self, handle):
+        """标记句柄写入结束，没有待播放数据时立即完成"""
+        with self.condition:
+            handle.finished = True
+            if handle.buffer or handle.start_time is not None or handle.completed:
+                # 由回调在数据播放完时完成
+                return
+            # 句柄没有写入任何数据，直接从队列中移除
+            if handle in self.handles:
+                self.handles.remove(handle)
+            handle.completed = True
+        self._complete(handle, time.perf_counter())
+
+    def _cancel(self, handle):
+        """取消句柄"""
+        with self.condition:
+            if handle.completed:
+                return
+            handle.cancelled = True
+            handle.completed = True
+            handle.finished = True
+            self.queued_bytes -= len(handle.buffer)
+            handle.buffer.clear()
+            if handle in self.handles:
+                self.handles.remove(handle)
+            self.condition.notify_all()
+        self._complete(handle, time.perf_counter())
+
+    def _complete(self, handle, end_time):
+        """交给通知线程在音频实际播放完时完成句柄"""
+        handle.end_time = end_time
+        self.notifications.put(handle)
+
+    def _callback(self, outdata, frames, time_info, status):
+        """声卡回调，在PortAudio线程中执行，只做内存拷贝"""
+        if status.output_underflow:
+            self.stats['underflows'] += 1
+        # 本块数据实际从扬声器发出的时间
+        dac_delay = max(0.0, time_info.outputBufferDacTime - time_info.currentTime)
+        self._fill(outdata, time.perf_counter() + dac_delay)
+
+    def _fill(self, outdata, play_time):
+        """
+        从队列头部取数据填满输出缓冲区，不足部分填充静音
+
+        Args:
+            outdata: 可写的字节缓冲区
+            play_time (float): 缓冲区第一个采样发声时的perf_counter时间
+        """
+        size = len(outdata)
+        filled = 0
+        completed = []
+        with self.condition:
+            while filled < size and self.handles:
+                handle = self.handles[0]
+                if handle.buffer:
+                    if handle.start_time is None:
+                        handle.start_time = play_time + filled / 2 / self.device_rate
+                    count = min(size - filled, len(handle.buffer))
+                    outdata[filled:filled + count] = handle.buffer[:count]
+                    del handle.buffer[:count]
+                    self.queued_bytes -= count
+                    filled += count
+                if handle.buffer:
+                    break
+                if not handle.finished:
+                    # 数据还没到，输出静音等待下一次回调
+                    break
+                self.handles.popleft()
+                handle.completed = True
+                completed.append((handle, play_time + filled / 2 / self.device_rate))
+            if filled:
+                self.condition.notify_all()
+        gain = self.gain
+        if filled and gain != 1.0:
+            samples = np.frombuffer(outdata, dtype=np.int16, count=filled // 2)
+            outdata[:filled] = (samples * gain).astype(np.int16).tobytes()
+        if filled < size:
+            outdata[filled:size] = b'\x00' * (size - filled)
+        for handle, end_time in completed:
+            self._complete(handle, end_time)
+
+    def _notify_loop(self):
+        """通知线程：等到音频实际播放完再记录时间点并调用完成回调"""
+        while True:
+            handle = self.notifications.get()
+            if handle is None:
+                return
+            delay = handle.end_time - time.perf_counter()
+            if delay > 0 and not handle.cancelled:
+                time.sleep(delay)
+            if handle.trace is not None and handle.start_time is not None:
+                handle.trace.mark(MARK_PLAYBACK_START, handle.start_time)
+                handle.trace.mark(MARK_PLAYBACK_END, handle.end_time)
+            handle.done.set()
+            if handle.on_complete is not None:
+                try:
+                    handle.on_complete(handle)
+                except Exception as e:
+                    logger.error(f"播放完成回调出错: {e}")
+
+    def metrics(self):
+        """
+        获取输出指标
+
+        Returns:
+            dict: 设备采样率、输出欠载次数、需要重采样的句柄数和排队的音频时长
+        """
+        with self.condition:
+            queued = self.queued_bytes / 2 / self.device_rate if self.device_rate else 0.0
+        return dict(self.stats, device_rate=self.device_rate, queued_seconds=queued)
+
+    def close(self):
+        """关闭输出流，丢弃排队的音频"""
+        self.cancel_all()
+        if self.stream is not None:
+            try:
+                self.stream.stop()
+                self.stream.close()
+            except Exception:
+                pass
+            self.stream = None
+        if self.notifier is not None:
+            self.notifications.put(None)
+            self.notifier = None
@@ -0,0 +1,170 @@
+"""
+PCM格式转换模块，将任意采样率、任意声道数的音频转换为Transcribe所需的16位单声道PCM
+整段转换使用频域重采样；流式转换（采集、播放）逐块处理，块与块之间保持滤波器和插值状态
+"""
+
+import numpy as np
+from config import SAMPLE_RATE, CAPTURE_FILTER_TAPS, CAPTURE_FILTER_CUTOFF
+
+
+def downmix(samples):
+    """
+    将多声道采样平均为单声道
+
+    Args:
+        samples (np.ndarray): 形状为(帧数,)或(帧数, 声道数)的采样
+
+    Returns:
+        np.ndarray: 单声道float32采样
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    if samples.ndim == 2:
+        samples = samples.mean(axis=1)
+    return samples
+
+
+def resample(samples, sample_rate, target_rate):
+    """
+    对完整的单声道信号做频域重采样，降采样时自然滤除目标奈奎斯特频率以上的成分
+
+    Args:
+        samples (np.ndarray): 单声道float32采样
+        sample_rate (int): 原采样率
+        target_rate (int): 目标采样率
+
+    Returns:
+        np.ndarray: 重采样后的float32采样
+    """
+    if sample_rate == target_rate or len(samples) == 0:
+        return samples
+    target_len = int(round(len(samples) * target_rate / sample_rate))
+    spectrum = np.fft.rfft(samples)
+    keep = min(len(spectrum), target_len // 2 + 1)
+    resampled = np.fft.irfft(spectrum[:keep], target_len) * (target_len / len(samples))
+    return resampled.astype(np.float32)
+
+
+def to_pcm16_mono(samples, sample_rate, target_rate=SAMPLE_RATE):
+    """
+    将浮点采样（取值范围-1到1）转换为目标采样率的16位单声道PCM
+
+    Args:
+        samples (np.ndarray): 形状为(帧数,)或(帧数, 声道数)的采样
+        sample_rate (int): 原采样率
+        target_rate (int): 目标采样率
+
+    Returns:
+        bytes: 16位小端PCM
+    """
+    mono = resample(downmix(samples), sample_rate, target_rate)
+    return (np.clip(mono, -1.0, 1.0) * 32767.0).astype('<i2').tobytes()
+
+
+class StreamResampler:
+    """逐块对16位单声道PCM做线性插值重采样，块与块之间保持相位连续，用于流式播放"""
+
+    def __init__(self, sample_rate, target_rate):
+        """
+        初始化重采样器
+
+        Args:
+            sample_rate (int): 输入采样率
+            target_rate (int): 输出采样率
+        """
+        self.step = sample_rate / target_rate
+        # 下一个输出采样在输入中的位置，相对于上一块的最后一个采样
+        self.position = 0.0
+        self.last = None
+
+    def process(self, pcm):
+        """
+        重采样一块PCM
+
+        Args:
+            pcm (bytes): 16位小端PCM，长度为偶数
+
+        Returns:
+            bytes: 重采样后的PCM
+        """
+        samples = np.frombuffer(pcm, dtype='<i2').astype(np.float32)
+        return np.round(self.process_samples(samples)).astype('<i2').tobytes()
+
+    def process_samples(self, samples):
+        """
+        重采样一块浮点采样
+
+        Args:
+            samples (np.ndarray): 单声道float32采样
+
+        Returns:
+            np.ndarray: 重采样后的采样
+        """
+        if len(samples) == 0:
+            return samples
+        # 下标0是上一块的最后一个采样，第一块直接从第一个采样开始
+        signal = samples if self.last is None else np.concatenate(([self.last], samples))
+        end = len(signal) - 1
+        positions = np.arange(self.position, end, self.step)
+        output = np.interp(positions, np.arange(len(signal)), signal)
+        next_position = positions[-1] + self.step if len(positions) else self.position
+        self.position = next_position - end
+        self.last = samples[-1]
+        return output
+
+
+def lowpass_taps(cutoff, num_taps=CAPTURE_FILTER_TAPS):
+    """
+    设计加Blackman窗的sinc低通滤波器
+
+    Args:
+        cutoff (float): 截止频率与采样率之比（0到0.5之间）
+        num_taps (int): 滤波器阶数，越大过渡带越窄、延迟越大
+
+    Returns:
+        np.ndarray: 直流增益为1的滤波器系数
+    """
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.blackman(num_taps)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+class CaptureConverter:
+    """逐块把采集设备的交错多声道16位PCM转换为目标采样率的单声道PCM"""
+
+    def __init__(self, sample_rate, channels, target_rate=SAMPLE_RATE):
+        """
+        初始化转换器
+
+        Args:
+            sample_rate (int): 设备采样率
+            channels (int): 设备声道数
+            target_rate (int): 目标采样率
+        """
+        self.channels = channels
+        self.resampler = StreamResampler(sample_rate, target_rate) if sample_rate != target_rate else None
+        # 降采样前先滤除目标奈奎斯特频率以上的成分，避免混叠
+        self.taps = None
+        if sample_rate > target_rate:
+            self.taps = lowpass_taps(CAPTURE_FILTER_CUTOFF * target_rate / 2 / sample_rate)
+            self.history = np.zeros(len(self.taps) - 1, dtype=np.float32)
+
+    def process(self, pcm):
+        """
+        转换一块PCM
+
+        Args:
+            pcm (bytes): 交错排列的16位小端PCM，长度为完整帧的整数倍
+
+        Returns:
+            bytes: 目标采样率的16位单声道PCM
+        """
+        samples = np.frombuffer(pcm, dtype='<i2').astype(np.float32)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+        if self.taps is not None:
+            signal = np.concatenate((self.history, samples))
+            self.history = signal[len(signal) - len(self.history):]
+            samples = np.convolve(signal, self.taps, mode='valid')
+        if self.resampler is not None:
+            samples = self.resampler.process_samples(samples)
+        return np.clip(np.round(samples), -32768, 32767).astype('<i2').tobytes()
@@ -0,0 +1,136 @@
+"""
+PCM套接字连接模块，供套接字音频输入和输出共用
+地址格式为'tcp://主机:端口'或'unix:///路径'，可以主动连接对端，也可以监听并等待对端连接
+"""
+
+import os
+import socket
+from urllib.parse import urlsplit
+from config import AUDIO_SOCKET_TIMEOUT
+from logger_config import logger
+
+
+def parse_address(address):
+    """
+    解析套接字地址
+
+    Args:
+        address (str): 'tcp://主机:端口'或'unix:///路径'
+
+    Returns:
+        tuple: (地址族, 传给connect/bind的地址)
+
+    Raises:
+        ValueError: 地址格式不正确
+    """
+    if not address:
+        raise ValueError("未配置套接字地址")
+    parts = urlsplit(address)
+    if parts.scheme == 'unix':
+        path = parts.netloc + parts.path
+        if not path:
+            raise ValueError(f"UNIX套接字地址缺少路径: {address}")
+        return socket.AF_UNIX, path
+    if parts.scheme == 'tcp':
+        if not parts.hostname or parts.port is None:
+            raise ValueError(f"TCP地址必须包含主机和端口: {address}")
+        return socket.AF_INET6 if ':' in parts.hostname else socket.AF_INET, (parts.hostname, parts.port)
+    raise ValueError(f"不支持的套接字地址: {address}，可选: tcp://主机:端口、unix:///路径")
+
+
+class PCMSocket:
+    """一条PCM套接字连接，断开后可以重新连接（主动连接）或等待下一个对端（监听）"""
+
+    def __init__(self, address, listen=False, timeout=AUDIO_SOCKET_TIMEOUT):
+        """
+        初始化连接，实际连接在首次使用时建立
+
+        Args:
+            address (str): 套接字地址
+            listen (bool): 为True时监听地址并等待对端连接，否则主动连接
+            timeout (float): 连接超时和单次读写的超时时间（秒）
+
+        Raises:
+            ValueError: 地址格式不正确
+        """
+        self.address = address
+        self.family, self.sockaddr = parse_address(address)
+        self.listen = listen
+        self.timeout = timeout
+        self.server = None
+        self.conn = None
+        self.connections = 0
+
+    def bind(self):
+        """监听模式下绑定地址，已绑定时直接返回"""
+        if self.server is not None:
+            return
+        server = socket.socket(self.family, socket.SOCK_STREAM)
+        try:
+            if self.family == socket.AF_UNIX:
+                # 上次运行遗留的套接字文件会导致绑定失败
+                if os.path.exists(self.sockaddr):
+                    os.unlink(self.sockaddr)
+            else:
+                server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind(self.sockaddr)
+            server.listen(1)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+        logger.info(f"正在监听 {self.address}")
+
+    def connect(self, timeout=None):
+        """
+        返回当前连接，没有连接时建立一个
+
+        Args:
+            timeout (float, optional): 监听模式下等待对端的时间（秒），None使用构造时的超时
+
+        Returns:
+            socket.socket: 连接，监听模式下等待超时时返回None
+        """
+        if self.conn is not None:
+            return self.conn
+        if self.listen:
+            self.bind()
+            self.server.settimeout(self.timeout if timeout is None else timeout)
+            try:
+                conn, peer = self.server.accept()
+            except socket.timeout:
+                return None
+            logger.info(f"{self.address} 已接受连接: {peer or '本地对端'}")
+        else:
+            conn = socket.socket(self.family, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            try:
+                conn.connect(self.sockaddr)
+            except Exception:
+                conn.close()
+                raise
+            logger.info(f"已连接到 {self.address}")
+        if self.family != socket.AF_UNIX:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn.settimeout(self.timeout)
+        self.conn = conn
+        self.connections += 1
+        return conn
+
+    def disconnect(self):
+        """关闭当前连接，监听套接字保持打开"""
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except OSError:
+                pass
+            self.conn = None
+
+    def close(self):
+        """关闭连接和监听套接字"""
+        self.disconnect()
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+            if self.family == socket.AF_UNIX and os.path.exists(self.sockaddr):
+                os.unlink(self.sockaddr)
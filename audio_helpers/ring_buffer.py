@@ -0,0 +1,130 @@
+"""
+音频环形缓冲区模块，供采集回调线程写入、处理线程读取
+单生产者单消费者：写位置只由生产者修改，读位置只由消费者修改，数据通路无需加锁
+"""
+
+import threading
+import time
+from collections import deque
+import numpy as np
+
+
+class AudioRingBuffer:
+    """预分配的16位PCM环形缓冲区"""
+
+    def __init__(self, capacity_frames, chunk_frames):
+        """
+        初始化环形缓冲区
+
+        Args:
+            capacity_frames (int): 缓冲区容量（采样帧数）
+            chunk_frames (int): 每次读取的采样帧数，也是尾部镜像区的大小
+        """
+        if capacity_frames < 2 * chunk_frames:
+            raise ValueError("环形缓冲区容量至少需要两个音频块")
+
+        self.capacity = capacity_frames
+        self.chunk_frames = chunk_frames
+        # 尾部额外保留chunk_frames帧，镜像缓冲区开头的数据，
+        # 使任意位置开始的一次读取都是连续内存，可以零拷贝返回
+        self.buffer = np.zeros(capacity_frames + chunk_frames, dtype=np.int16)
+        self.view = memoryview(self.buffer).cast('B')
+
+        # 单调递增的读写位置（帧），实际下标为位置对容量取模
+        self.write_pos = 0
+        self.read_pos = 0
+        self.pending_read = 0
+
+        # (写入结束位置, 采集时间) 记录，用于计算采集到发送的延迟
+        self.capture_times = deque(maxlen=capacity_frames // chunk_frames + 1)
+        self.data_ready = threading.Event()
+
+        self.overrun_frames = 0
+        self.overrun_events = 0
+
+    def write(self, data, capture_time=None):
+        """
+        由采集回调线程写入音频数据，空间不足时丢弃新数据并计入溢出
+
+        Args:
+            data (bytes): 16位PCM数据
+            capture_time (float, optional): 数据的采集时间（time.monotonic）
+        """
+        samples = np.frombuffer(data, dtype=np.int16)
+        free = self.capacity - (self.write_pos - self.read_pos)
+        if len(samples) > free:
+            self.overrun_frames += len(samples) - free
+            self.overrun_events += 1
+            samples = samples[:free]
+        if len(samples) == 0:
+            return
+
+        start = self.write_pos % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        if first < len(samples):
+            self.buffer[:len(samples) - first] = samples[first:]
+
+        # 维护尾部镜像区
+        written_end = start + len(samples)
+        if start < self.chunk_frames:
+            end = min(written_end, self.chunk_frames)
+            self.buffer[self.capacity + start:self.capacity + end] = self.buffer[start:end]
+        if written_end > self.capacity:
+            end = min(written_end - self.capacity, self.chunk_frames)
+            self.buffer[self.capacity:self.capacity + end] = self.buffer[:end]
+
+        self.write_pos += len(samples)
+        self.capture_times.append((self.write_pos, capture_time if capture_time is not None else time.monotonic()))
+        self.data_ready.set()
+
+    def read(self, timeout=None):
+        """
+        读取一个音频块的零拷贝视图
+
+        返回的memoryview在下一次调用read之前保持有效，
+        调用方如需长期保留数据，应自行转换为bytes
+
+        Args:
+            timeout (float, optional): 等待数据的最长时间（秒）
+
+        Returns:
+            tuple: (memoryview, 采集时间)，超时返回(None, None)
+        """
+        # 释放上一次读取占用的空间
+        self.read_pos += self.pending_read
+        self.pending_read = 0
+
+        while self.write_pos - self.read_pos < self.chunk_frames:
+            self.data_ready.clear()
+            if self.write_pos - self.read_pos >= self.chunk_frames:
+                break
+            if not self.data_ready.wait(timeout):
+                return None, None
+
+        start = self.read_pos % self.capacity
+        self.pending_read = self.chunk_frames
+
+        # 找到包含本块最后一帧的写入记录作为采集时间
+        read_end = self.read_pos + self.chunk_frames
+        capture_time = None
+        while self.capture_times:
+            end_pos, timestamp = self.capture_times[0]
+            capture_time = timestamp
+            if end_pos >= read_end:
+                break
+            self.capture_times.popleft()
+
+        return self.view[start * 2:(start + self.chunk_frames) * 2], capture_time
+
+    def available(self):
+        """返回可读取的帧数"""
+        return self.write_pos - self.read_pos - self.pending_read
+
+    def reset(self):
+        """清空缓冲区，只能在生产者停止后调用"""
+        self.write_pos = 0
+        self.read_pos = 0
+        self.pending_read = 0
+        self.capture_times.clear()
+        self.data_ready.clear()
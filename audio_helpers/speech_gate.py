@@ -0,0 +1,119 @@
+"""
+语音门控模块，只在检测到语音时向Transcribe发送音频
+门关闭时音频保存在预卷缓冲区中，语音开始时先发送预卷数据，避免首个音节被截掉
+"""
+
+from collections import deque
+from config import SAMPLE_RATE, GATE_ENABLED, GATE_PREROLL_MS, GATE_PAUSE_MS
+from logger_config import logger
+
+
+class SpeechGate:
+    """带预卷缓冲区的语音门控"""
+
+    def __init__(self, enabled=GATE_ENABLED, preroll_ms=GATE_PREROLL_MS, pause_ms=GATE_PAUSE_MS,
+                 sample_rate=SAMPLE_RATE):
+        """
+        初始化语音门控
+
+        Args:
+            enabled (bool): 为False时所有音频直接放行
+            preroll_ms (int): 预卷缓冲区保留的音频时长（毫秒）
+            pause_ms (int): 说话过程中静音超过该时长时关闭门控，停止发送
+            sample_rate (int): 采样率
+        """
+        self.enabled = enabled
+        self.preroll_bytes = int(sample_rate * preroll_ms / 1000) * 2
+        self.pause_ms = pause_ms
+        self.bytes_per_ms = sample_rate * 2 / 1000
+        self.reset()
+
+    def reset(self):
+        """开始新的会话"""
+        self.preroll = deque()
+        self.preroll_size = 0
+        self.is_open = False
+        self.silence_ms = 0.0
+        self.captured_bytes = 0
+        self.sent_bytes = 0
+        self.openings = 0
+
+    def process(self, audio_chunk, is_speech):
+        """
+        处理一个音频块
+
+        Args:
+            audio_chunk (bytes or memoryview): 16位PCM音频数据，可以是只在下一次读取前有效的视图，
+                门控保留到预卷缓冲区的数据会先复制
+            is_speech (bool): VAD对该音频块的判定
+
+        Returns:
+            list: 需要发送到上游的音频块，门关闭时为空列表；当前块原样返回，需要保留时由调用方复制
+        """
+        self.captured_bytes += len(audio_chunk)
+        if not self.enabled:
+            self.sent_bytes += len(audio_chunk)
+            return [audio_chunk]
+
+        if self.is_open:
+            if is_speech:
+                self.silence_ms = 0.0
+            else:
+                self.silence_ms += len(audio_chunk) / self.bytes_per_ms
+                if self.silence_ms >= self.pause_ms:
+                    # 长时间停顿，关闭门控并重新开始缓存预卷数据
+                    self.is_open = False
+                    logger.debug("语音门控关闭")
+                    self._buffer(audio_chunk)
+                    return []
+            self.sent_bytes += len(audio_chunk)
+            return [audio_chunk]
+
+        if not is_speech:
+            self._buffer(audio_chunk)
+            return []
+
+        # 语音开始：先发送预卷数据，再发送当前块
+        self.is_open = True
+        self.silence_ms = 0.0
+        self.openings += 1
+        chunks = list(self.preroll)
+        chunks.append(audio_chunk)
+        self.preroll.clear()
+        self.preroll_size = 0
+        self.sent_bytes += sum(len(c) for c in chunks)
+        logger.debug(f"语音门控打开，发送 {len(chunks) - 1} 个预卷音频块")
+        return chunks
+
+    def _buffer(self, audio_chunk):
+        """复制到预卷缓冲区，超出时长的旧数据被丢弃"""
+        self.preroll.append(bytes(audio_chunk))
+        self.preroll_size += len(audio_chunk)
+        while self.preroll and self.preroll_size - len(self.preroll[0]) >= self.preroll_bytes:
+            self.preroll_size -= len(self.preroll.popleft())
+
+    def stats(self):
+        """
+        获取本次会话的发送统计
+
+        Returns:
+            dict: 采集和发送的字节数、秒数，以及门控打开次数
+        """
+        bytes_per_second = self.bytes_per_ms * 1000
+        return {
+            'captured_bytes': self.captured_bytes,
+            'sent_bytes': self.sent_bytes,
+            'captured_seconds': self.captured_bytes / bytes_per_second,
+            'sent_seconds': self.sent_bytes / bytes_per_second,
+            'openings': self.openings,
+        }
+
+    def log_stats(self):
+        """输出本次会话的发送统计"""
+        stats = self.stats()
+        ratio = stats['sent_bytes'] / stats['captured_bytes'] if stats['captured_bytes'] else 0.0
+        logger.info(
+            f"语音门控统计: 采集 {stats['captured_seconds']:.2f}秒/{stats['captured_bytes'] / 1024:.1f} KB, "
+            f"发送 {stats['sent_seconds']:.2f}秒/{stats['sent_bytes'] / 1024:.1f} KB ({ratio:.1%}), "
+            f"门控打开 {stats['openings']} 次"
+        )
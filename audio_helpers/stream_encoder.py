@@ -0,0 +1,199 @@
+"""
+上行音频流式编码模块，把16位单声道PCM逐块编码为Transcribe流式接口支持的FLAC或Ogg-Opus
+编码由libsndfile（soundfile）完成，每次encode返回本次新产生的字节，可以直接作为音频事件发送
+
+流式FLAC的头部按格式规定把总帧数记为未知，流式解码（如Transcribe）读到流结束即可；
+libsndfile解码这种流时读不到最后一个分块，保存下来的完整编码流先用finalize补上头部再解码
+"""
+
+import time
+import numpy as np
+from config import SAMPLE_RATE, TRANSCRIBE_FLAC_COMPRESSION_LEVEL, TRANSCRIBE_OPUS_PAGE_LATENCY_MS
+from logger_config import logger
+
+# Transcribe的media_encoding -> (libsndfile容器格式, 编码子类型)
+MEDIA_ENCODINGS = {
+    'flac': ('FLAC', 'PCM_16'),
+    'ogg-opus': ('OGG', 'OPUS'),
+}
+
+# libsndfile的sf_command命令：设置Ogg页的最长缓冲时长（毫秒）
+SFC_SET_OGG_PAGE_LATENCY_MS = 0x1302
+
+
+class _EncodedBuffer:
+    """供libsndfile写入的类文件对象，只保留尚未取走的新数据
+
+    编码结束时libsndfile会回到文件开头改写头部（如FLAC的总帧数），
+    这部分数据已经发送，流式解码不依赖这些字段；改写只记录下来，供finalize生成完整的文件
+    """
+
+    def __init__(self):
+        self.pending = bytearray()
+        self.position = 0
+        self.size = 0
+        # 对已发送数据的改写：(位置, 数据)
+        self.rewrites = []
+
+    def write(self, data):
+        if self.position == self.size:
+            self.pending += data
+            self.size += len(data)
+        else:
+            self.rewrites.append((self.position, bytes(data)))
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += self.size
+        self.position = offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def read(self, size=-1):
+        return b''
+
+    def take(self):
+        """取走并清空新产生的数据"""
+        data = bytes(self.pending)
+        self.pending.clear()
+        return data
+
+
+def _set_ogg_page_latency(sf, sound_file, milliseconds):
+    """
+    设置Ogg页的最长缓冲时长，soundfile没有公开sf_command，只能通过其内部的CFFI句柄调用
+
+    Args:
+        sf: soundfile模块
+        sound_file (soundfile.SoundFile): 以写模式打开的Ogg文件
+        milliseconds (float): 最长缓冲时长（毫秒）
+
+    Returns:
+        bool: 是否设置成功，soundfile的内部接口不可用时返回False
+    """
+    ffi = getattr(sf, '_ffi', None)
+    command = getattr(getattr(sf, '_snd', None), 'sf_command', None)
+    handle = getattr(sound_file, '_file', None)
+    if ffi is None or command is None or handle is None:
+        return False
+    try:
+        latency = ffi.new('double*', milliseconds)
+        return command(handle, SFC_SET_OGG_PAGE_LATENCY_MS, latency, ffi.sizeof('double')) == 0
+    except Exception:
+        return False
+
+
+class StreamEncoder:
+    """有状态的流式编码器，同一实例只能被一个线程按顺序调用"""
+
+    def __init__(self, media_encoding, sample_rate=SAMPLE_RATE):
+        """
+        初始化编码器，编码头部在第一次encode时随数据一起返回
+
+        Args:
+            media_encoding (str): 'flac'或'ogg-opus'
+            sample_rate (int): PCM采样率
+
+        Raises:
+            ValueError: 不支持的编码
+        """
+        if media_encoding not in MEDIA_ENCODINGS:
+            raise ValueError(f"不支持的上行编码: {media_encoding}，可选: {', '.join(MEDIA_ENCODINGS)}")
+        # 延迟导入，使用PCM上行时不加载libsndfile
+        import soundfile as sf
+
+        container, subtype = MEDIA_ENCODINGS[media_encoding]
+        self.media_encoding = media_encoding
+        self.sample_rate = sample_rate
+        self.buffer = _EncodedBuffer()
+        if media_encoding == 'flac':
+            self.file = sf.SoundFile(self.buffer, 'w', sample_rate, 1, subtype, format=container,
+                                     compression_level=TRANSCRIBE_FLAC_COMPRESSION_LEVEL)
+        else:
+            self.file = sf.SoundFile(self.buffer, 'w', sample_rate, 1, subtype, format=container)
+            if not _set_ogg_page_latency(sf, self.file, TRANSCRIBE_OPUS_PAGE_LATENCY_MS):
+                logger.warning("当前soundfile版本无法设置Ogg页延迟，使用libsndfile的默认值，上行编码延迟会变大")
+        self.closed = False
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.cpu_time = 0.0
+
+    def encode(self, pcm):
+        """
+        编码一块PCM
+
+        Args:
+            pcm (bytes): 16位单声道PCM
+
+        Returns:
+            bytes: 本次新产生的编码数据，编码器内部缓冲未满一个分块时可能为空
+        """
+        start = time.thread_time()
+        self.file.write(np.frombuffer(pcm, dtype='<i2'))
+        data = self.buffer.take()
+        self.cpu_time += time.thread_time() - start
+        self.input_bytes += len(pcm)
+        self.output_bytes += len(data)
+        return data
+
+    def close(self):
+        """
+        结束编码，输出缓冲中剩余的数据
+
+        Returns:
+            bytes: 剩余的编码数据
+        """
+        if self.closed:
+            return b''
+        self.closed = True
+        start = time.thread_time()
+        self.file.close()
+        data = self.buffer.take()
+        self.cpu_time += time.thread_time() - start
+        self.output_bytes += len(data)
+        return data
+
+    def finalize(self, encoded):
+        """
+        把完整的编码流改写为可以随机访问的文件：补上编码结束时才确定的头部字段（如FLAC的总帧数）
+
+        只用于保存或校验编码结果，发送给Transcribe的流不需要改写
+
+        Args:
+            encoded (bytes): 依次拼接的encode和close的全部返回值
+
+        Returns:
+            bytes: 可以用libsndfile完整解码的文件
+
+        Raises:
+            ValueError: 编码尚未结束
+        """
+        if not self.closed:
+            raise ValueError("编码结束后才能生成完整的文件")
+        data = bytearray(encoded)
+        for position, patch in self.buffer.rewrites:
+            data[position:position + len(patch)] = patch
+        return bytes(data)
+
+    def metrics(self):
+        """
+        获取编码指标
+
+        Returns:
+            dict: 编码方式、输入/输出字节数、压缩比、编码CPU时间和占音频时长的比例
+        """
+        audio_seconds = self.input_bytes / 2 / self.sample_rate
+        return {
+            'encoding': self.media_encoding,
+            'input_bytes': self.input_bytes,
+            'output_bytes': self.output_bytes,
+            'compression_ratio': self.input_bytes / self.output_bytes if self.output_bytes else 0.0,
+            'cpu_seconds': self.cpu_time,
+            'cpu_ratio': self.cpu_time / audio_seconds if audio_seconds else 0.0,
+        }
@@ -0,0 +1,264 @@
+"""
+语音活动检测（VAD）与端点检测模块
+提供两种可替换的检测器：
+- EnergyVAD：平均幅度阈值，与早期实现一致
+- AdaptiveVAD：按帧向量化计算语音频带能量、过零率和频谱平坦度，自适应跟踪噪声底，并带起始确认和拖尾平滑
+"""
+
+import numpy as np
+from config import (
+    SAMPLE_RATE, VAD_BACKEND, VAD_ENERGY_THRESHOLD, VAD_FRAME_MS, VAD_BAND_LOW_HZ, VAD_BAND_HIGH_HZ,
+    VAD_ENERGY_MARGIN_DB, VAD_MIN_ENERGY_DB, VAD_NOISE_ADAPT_RATE, VAD_ZCR_MAX, VAD_FLATNESS_MAX,
+    VAD_TONAL_FLATNESS_MAX, VAD_TONAL_MARGIN_DB, VAD_ONSET_MS, VAD_HANGOVER_MS,
+    ENDPOINT_SILENCE_MS, ENDPOINT_NO_SPEECH_TIMEOUT_MS, ENDPOINT_MAX_UTTERANCE_MS
+)
+
+# 启动阶段使用更快的噪声底跟踪速率，尽快收敛到环境噪声
+INITIAL_ADAPT_MS = 200
+INITIAL_ADAPT_RATE = 0.5
+# 噪声底下降时的跟踪速率相对上升速率的倍数
+NOISE_FALL_FACTOR = 4.0
+
+
+class EnergyVAD:
+    """基于平均幅度阈值的简单VAD"""
+
+    def __init__(self, threshold=VAD_ENERGY_THRESHOLD):
+        """
+        初始化检测器
+
+        Args:
+            threshold (int): 平均幅度阈值
+        """
+        self.threshold = threshold
+
+    def is_speech(self, audio_chunk):
+        """
+        判断音频块是否包含语音
+
+        Args:
+            audio_chunk (bytes): 16位PCM音频数据
+
+        Returns:
+            bool: 包含语音时返回True
+        """
+        audio_array = np.frombuffer(audio_chunk, dtype=np.int16)
+        if len(audio_array) == 0:
+            return False
+        return np.abs(audio_array.astype(np.int32)).mean() >= self.threshold
+
+    def reset(self):
+        """重置状态（无状态，保留接口一致）"""
+
+
+class AdaptiveVAD:
+    """自适应噪声底VAD"""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=VAD_FRAME_MS):
+        """
+        初始化检测器
+
+        Args:
+            sample_rate (int): 采样率
+            frame_ms (int): 分析帧长（毫秒）
+        """
+        self.sample_rate = sample_rate
+        self.frame_len = int(sample_rate * frame_ms / 1000)
+        self.onset_frames = max(1, VAD_ONSET_MS // frame_ms)
+        self.hangover_frames = max(0, VAD_HANGOVER_MS // frame_ms)
+        self.initial_frames = INITIAL_ADAPT_MS // frame_ms
+        self.window = np.hanning(self.frame_len).astype(np.float32)
+        self.window_power = float(np.sum(self.window ** 2))
+        freqs = np.fft.rfftfreq(self.frame_len, 1.0 / sample_rate)
+        self.band = (freqs >= VAD_BAND_LOW_HZ) & (freqs <= VAD_BAND_HIGH_HZ)
+        self.noise_floor = None
+        self.frames_seen = 0
+        self.reset()
+
+    def reset(self, keep_noise_floor=True):
+        """
+        重置检测状态
+
+        Args:
+            keep_noise_floor (bool): 是否保留已学习的噪声底
+        """
+        self.remainder = np.zeros(0, dtype=np.float32)
+        self.in_speech = False
+        self.speech_run = 0
+        self.hangover = 0
+        if not keep_noise_floor:
+            self.noise_floor = None
+            self.frames_seen = 0
+
+    def frame_features(self, samples):
+        """
+        向量化计算每帧的特征，能量和频谱平坦度只统计语音频带，避免低频噪声干扰
+
+        Args:
+            samples (np.ndarray): 归一化到[-1, 1]的float32采样，长度为帧长的整数倍
+
+        Returns:
+            tuple: (频带能量dB, 过零率, 频谱平坦度)，每项都是长度为帧数的数组
+        """
+        frames = samples.reshape(-1, self.frame_len)
+
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        spectrum = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2
+        band = spectrum[:, self.band] + 1e-12
+        # 按Parseval定理换算为与时域均方值同量纲的频带功率
+        band_power = 2.0 * np.sum(band, axis=1) / (self.frame_len * self.window_power)
+        energy_db = 10.0 * np.log10(band_power + 1e-10)
+        flatness = np.exp(np.mean(np.log(band), axis=1)) / np.mean(band, axis=1)
+
+        return energy_db, zcr, flatness
+
+    def process(self, audio_chunk):
+        """
+        处理一个音频块并返回每帧平滑后的判定
+
+        Args:
+            audio_chunk (bytes): 16位PCM音频数据
+
+        Returns:
+            np.ndarray: 每个完整帧的语音判定（bool数组），不足一帧的数据留到下次处理
+        """
+        samples = np.frombuffer(audio_chunk, dtype=np.int16).astype(np.float32) / 32768.0
+        if len(self.remainder):
+            samples = np.concatenate((self.remainder, samples))
+
+        n_frames = len(samples) // self.frame_len
+        self.remainder = samples[n_frames * self.frame_len:]
+        if n_frames == 0:
+            return np.zeros(0, dtype=bool)
+
+        energy_db, zcr, flatness = self.frame_features(samples[:n_frames * self.frame_len])
+        voiced = (zcr < VAD_ZCR_MAX) | (flatness < VAD_FLATNESS_MAX)
+        # 频谱明显呈谐波结构的帧只需略高于噪声底，以便在低信噪比下仍能检出
+        tonal = flatness < VAD_TONAL_FLATNESS_MAX
+
+        decisions = np.zeros(n_frames, dtype=bool)
+        for i in range(n_frames):
+            energy = energy_db[i]
+            if self.noise_floor is None:
+                self.noise_floor = energy
+
+            if energy <= VAD_MIN_ENERGY_DB:
+                raw = False
+            elif tonal[i]:
+                raw = energy > self.noise_floor + VAD_TONAL_MARGIN_DB
+            else:
+                raw = voiced[i] and energy > self.noise_floor + VAD_ENERGY_MARGIN_DB
+
+            # 起始确认与拖尾平滑
+            if raw:
+                self.speech_run += 1
+                if self.in_speech or self.speech_run >= self.onset_frames:
+                    self.in_speech = True
+                    self.hangover = self.hangover_frames
+            else:
+                self.speech_run = 0
+                if self.in_speech:
+                    if self.hangover > 0:
+                        self.hangover -= 1
+                    else:
+                        self.in_speech = False
+
+            # 只在非语音帧上跟踪噪声底，下降比上升更快
+            if not raw:
+                rate = VAD_NOISE_ADAPT_RATE
+                if self.frames_seen < self.initial_frames:
+                    rate = INITIAL_ADAPT_RATE
+                elif energy < self.noise_floor:
+                    rate = min(1.0, VAD_NOISE_ADAPT_RATE * NOISE_FALL_FACTOR)
+                self.noise_floor += rate * (energy - self.noise_floor)
+
+            self.frames_seen += 1
+            decisions[i] = self.in_speech
+
+        return decisions
+
+    def is_speech(self, audio_chunk):
+        """
+        判断音频块是否包含语音
+
+        Args:
+            audio_chunk (bytes): 16位PCM音频数据
+
+        Returns:
+            bool: 块内任一帧处于语音状态时返回True
+        """
+        decisions = self.process(audio_chunk)
+        if len(decisions) == 0:
+            return self.in_speech
+        return bool(decisions.any())
+
+
+class Endpointer:
+    """以毫秒为单位配置的端点检测器"""
+
+    def __init__(self, silence_ms=ENDPOINT_SILENCE_MS, no_speech_timeout_ms=ENDPOINT_NO_SPEECH_TIMEOUT_MS,
+                 max_utterance_ms=ENDPOINT_MAX_UTTERANCE_MS):
+        """
+        初始化端点检测器
+
+        Args:
+            silence_ms (int): 说话后静音多少毫秒判定为说完
+            no_speech_timeout_ms (int): 一直未检测到语音时的超时
+            max_utterance_ms (int): 单次说话的最长时长
+        """
+        self.silence_ms = silence_ms
+        self.no_speech_timeout_ms = no_speech_timeout_ms
+        self.max_utterance_ms = max_utterance_ms
+        self.reset()
+
+    def reset(self):
+        """开始新的一次说话"""
+        self.elapsed_ms = 0.0
+        self.trailing_silence_ms = 0.0
+        self.speech_detected = False
+        self.reason = None
+
+    def update(self, is_speech, duration_ms):
+        """
+        输入一个音频块的检测结果
+
+        Args:
+            is_speech (bool): 该音频块是否包含语音
+            duration_ms (float): 该音频块的时长（毫秒）
+
+        Returns:
+            bool: 到达端点时返回True，原因记录在reason属性中
+        """
+        self.elapsed_ms += duration_ms
+        if is_speech:
+            self.speech_detected = True
+            self.trailing_silence_ms = 0.0
+        else:
+            self.trailing_silence_ms += duration_ms
+
+        if self.speech_detected and self.trailing_silence_ms >= self.silence_ms:
+            self.reason = 'end_of_speech'
+        elif not self.speech_detected and self.elapsed_ms >= self.no_speech_timeout_ms:
+            self.reason = 'no_speech'
+        elif self.elapsed_ms >= self.max_utterance_ms:
+            self.reason = 'max_duration'
+        return self.reason is not None
+
+
+def create_vad(backend=VAD_BACKEND):
+    """
+    根据配置创建VAD实例
+
+    Args:
+        backend (str): 'adaptive'或'energy'
+
+    Returns:
+        VAD实例，提供is_speech(audio_chunk)和reset()方法
+    """
+    if backend == 'adaptive':
+        return AdaptiveVAD()
+    if backend == 'energy':
+        return EnergyVAD()
+    raise ValueError(f"不支持的VAD实现: {backend}")
@@ -0,0 +1,190 @@
+"""
+音频块交接队列模块，负责把采集线程产生的音频块交给Transcribe事件循环
+采集线程通过call_soon_threadsafe投递，事件循环侧以await方式等待，不再轮询
+"""
+
+import threading
+from collections import deque
+from config import TRANSCRIBE_QUEUE_MAXSIZE, TRANSCRIBE_QUEUE_OVERFLOW, TRANSCRIBE_QUEUE_BLOCK_TIMEOUT, TRANSCRIBE_COALESCE_MAX_BYTES
+
+OVERFLOW_POLICIES = ('drop_oldest', 'block', 'coalesce')
+
+
+class AsyncAudioQueue:
+    """有界、事件驱动的跨线程音频队列"""
+
+    def __init__(self, loop, maxsize=TRANSCRIBE_QUEUE_MAXSIZE, overflow=TRANSCRIBE_QUEUE_OVERFLOW):
+        """
+        初始化队列
+
+        Args:
+            loop: 消费者所在的事件循环
+            maxsize (int): 队列最多容纳的音频块数量
+            overflow (str): 队列满时的处理策略：
+                'drop_oldest' 丢弃最旧的音频块；
+                'block' 阻塞采集线程直到有空位（超时后丢弃新块）；
+                'coalesce' 将新块合并到队尾的音频块中
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"不支持的队列溢出策略: {overflow}")
+
+        self.loop = loop
+        self.maxsize = maxsize
+        self.overflow = overflow
+        # 以下状态只在事件循环线程中修改
+        self.items = deque()
+        self.waiter = None
+        self.space_waiter = None
+        self.closed = False
+        # 阻塞策略下队列中的每个音频块都占用一个信号量名额，取出时归还
+        self.slots = threading.BoundedSemaphore(maxsize) if overflow == 'block' else None
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def put_threadsafe(self, chunk):
+        """
+        从采集线程投递一个音频块
+
+        Args:
+            chunk (bytes): 音频数据
+
+        Returns:
+            bool: 是否成功投递
+        """
+        if self.slots is not None and not self.slots.acquire(timeout=TRANSCRIBE_QUEUE_BLOCK_TIMEOUT):
+            # 计数器只由单一采集线程在此处修改
+            self.dropped += 1
+            return False
+
+        try:
+            self.loop.call_soon_threadsafe(self._put, chunk)
+            return True
+        except RuntimeError:
+            # 事件循环已关闭
+            if self.slots is not None:
+                self.slots.release()
+            return False
+
+    def close_threadsafe(self):
+        """从任意线程关闭队列，消费者取完剩余音频块后结束"""
+        try:
+            self.loop.call_soon_threadsafe(self._close)
+        except RuntimeError:
+            pass
+
+    def close(self):
+        """在事件循环线程内关闭队列"""
+        self._close()
+
+    async def put(self, chunk):
+        """
+        在事件循环线程内投递音频块，队列满时挂起等待空位，从而向上游施加背压
+
+        与put_threadsafe不同，该方法不会丢弃或合并音频块
+
+        Args:
+            chunk (bytes): 音频数据
+
+        Returns:
+            bool: 是否成功投递，队列已关闭时返回False
+        """
+        while not self.closed:
+            if self.slots is not None:
+                # 采集线程已投递、尚未入队的音频块也占用名额，只看队列长度会超出上限
+                if self.slots.acquire(blocking=False):
+                    break
+            elif len(self.items) < self.maxsize:
+                break
+            self.space_waiter = self.loop.create_future()
+            try:
+                await self.space_waiter
+            finally:
+                self.space_waiter = None
+
+        if self.closed:
+            return False
+        self._put(chunk)
+        return True
+
+    async def get(self):
+        """
+        等待并取出下一个音频块
+
+        Returns:
+            bytes: 音频数据，队列关闭且已取空时返回None
+        """
+        while not self.items:
+            if self.closed:
+                return None
+            self.waiter = self.loop.create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+
+        chunk = self.items.popleft()
+        if self.slots is not None:
+            self.slots.release()
+        if self.space_waiter is not None and not self.space_waiter.done():
+            self.space_waiter.set_result(None)
+        return chunk
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await self.get()
+        if chunk is None:
+            raise StopAsyncIteration
+        return chunk
+
+    def metrics(self):
+        """
+        获取队列指标
+
+        Returns:
+            dict: 当前深度、最大深度、入队、丢弃和合并的音频块数量
+        """
+        return {
+            'depth': len(self.items),
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+        }
+
+    def _put(self, chunk):
+        """在事件循环线程中执行入队"""
+        if self.closed:
+            if self.slots is not None:
+                self.slots.release()
+            return
+
+        if len(self.items) >= self.maxsize:
+            if self.overflow == 'coalesce' and len(self.items[-1]) + len(chunk) <= TRANSCRIBE_COALESCE_MAX_BYTES:
+                # 音频块可能是只读的memoryview（内存映射的文件输入），拼接结果总是新的bytes
+                self.items[-1] = bytes(self.items[-1]) + chunk
+                self.coalesced += 1
+                self.enqueued += 1
+                return
+            # 合并后过大或策略为丢弃最旧时，丢弃队首音频块
+            self.items.popleft()
+            self.dropped += 1
+
+        self.items.append(chunk)
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, len(self.items))
+        self._wake()
+
+    def _close(self):
+        self.closed = True
+        self._wake()
+        if self.space_waiter is not None and not self.space_waiter.done():
+            self.space_waiter.set_result(None)
+
+    def _wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
@@ -0,0 +1,471 @@
+"""
+Transcribe长连接模块，多次说话共用同一个转录流，不再每次对话都握手
+- 说话的边界由本地端点检测和Transcribe的最终结果共同决定：本地判定说完后补发一段静音，
+  本次说话的结果全部成为最终结果时结束
+- 每个结果按它在流中的时间位置归属到对应的说话
+- 两次说话之间没有音频时定期发送静音，避免服务端因长时间收不到音频而关闭流
+- 接近服务端单个流的时长上限前提前打开替换流，新旧两个流同时接收一段音频后再结束旧流，切换期间不丢音频
+"""
+
+import asyncio
+import time
+from collections import deque
+from config import (
+    SAMPLE_RATE, TRANSCRIBE_MAX_STREAM_SECONDS, TRANSCRIBE_ROLLOVER_MARGIN, TRANSCRIBE_ROLLOVER_FORCE_MARGIN,
+    TRANSCRIBE_ROLLOVER_OVERLAP, TRANSCRIBE_ROLLOVER_MAX_OVERLAP, TRANSCRIBE_KEEPALIVE_INTERVAL,
+    TRANSCRIBE_KEEPALIVE_MS, TRANSCRIBE_SEGMENT_FLUSH_MS, TRANSCRIBE_SEGMENT_FINAL_TIMEOUT,
+    TRANSCRIBE_RECONNECT_BASE_DELAY, TRANSCRIBE_RECONNECT_MAX_DELAY
+)
+from logger_config import logger
+from audio_helpers.stream_encoder import StreamEncoder
+from aws_services.audio_queue import AsyncAudioQueue
+from aws_services.transcribe_client import TranscribeHandler, _get_encoder_executor
+from aws_services.transcript_store import TranscriptStore, EVENT_STABLE_PREFIX
+from telemetry.tracing import tracer, STAGE_UPSTREAM_SEND, MARK_FINAL
+
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+
+# 保留最近几次说话，用于归属迟到的结果
+RECENT_UTTERANCES = 4
+# 归属结果时允许的时间误差（秒）：结果时间只有毫秒精度，各个流的音频时长也是逐块累加的
+ROUTE_TOLERANCE = 0.005
+
+
+def _silence(milliseconds):
+    """生成指定时长的16位静音PCM"""
+    return bytes(int(SAMPLE_RATE * milliseconds / 1000) * 2)
+
+
+class StreamUtterance:
+    """长连接上的一次说话，提供与TranscriptionSession相同的结果属性"""
+
+    def __init__(self, start_offset, stable_callback=None, subscriptions=()):
+        """
+        初始化说话，必须在事件循环线程中创建
+
+        Args:
+            start_offset (float): 本次说话的第一段音频在长连接音频中的位置（秒）
+            stable_callback: 接收部分结果中已稳定前缀的回调函数，参数为(稳定文本, 语言)
+            subscriptions (list): (回调, 事件类型)列表
+        """
+        self.store = TranscriptStore()
+        if stable_callback:
+            self.store.subscribe(lambda update: stable_callback(update.text, update.language), (EVENT_STABLE_PREFIX,))
+        for callback, kinds in subscriptions:
+            self.store.subscribe(callback, kinds)
+        self.start_offset = start_offset
+        self.end_offset = None
+        self.start_time = time.perf_counter()
+        self.results = 0
+        self.changed = asyncio.Event()
+
+    @property
+    def transcript_result(self):
+        """目前为止所有最终片段拼接的文本"""
+        return self.store.text
+
+    @property
+    def identified_language(self):
+        """目前识别到的语言"""
+        return self.store.language
+
+    def subscribe(self, callback, kinds):
+        """订阅本次说话的转录增量事件"""
+        return self.store.subscribe(callback, kinds)
+
+
+class _StreamLeg:
+    """长连接中的一个转录流，切换期间新旧两个流同时存在"""
+
+    def __init__(self, stream, offset, media_encoding):
+        """
+        Args:
+            stream: 已打开的转录流
+            offset (float): 开始接收音频时在长连接音频中的位置（秒），流内的结果时间以此为零点
+            media_encoding (str): 上行编码，每个流有独立的编码器，从头部开始编码
+        """
+        self.stream = stream
+        self.offset = offset
+        self.opened_time = time.perf_counter()
+        self.encoder = StreamEncoder(media_encoding) if media_encoding != 'pcm' else None
+        # 本流负责的时间范围，切换期间两个流转录了同一段音频，每个结果只保留负责方的那份
+        self.owned_from = offset
+        self.owned_until = None
+        # 本流中尚未成为最终结果的结果编号
+        self.open_results = set()
+        self.handler_task = None
+        self.input_ended = False
+
+    @property
+    def age(self):
+        """流已打开的时长（秒）"""
+        return time.perf_counter() - self.opened_time
+
+
+class _LegHandler(TranscribeHandler):
+    """把一个流的结果交给PersistentTranscription归属到对应的说话"""
+
+    def __init__(self, output_stream, owner, leg):
+        super().__init__(output_stream, None)
+        self.owner = owner
+        self.leg = leg
+        self.start_time = leg.opened_time
+
+    def route(self, result):
+        return self.owner._route(self.leg, result)
+
+
+class PersistentTranscription:
+    """常驻的转录流：所有说话的音频经同一个队列按顺序发送，必要时切换到新的流
+
+    除构造外的方法都必须在同一个事件循环中调用，send_audio_chunk可以在任意线程中调用
+    """
+
+    def __init__(self, open_stream, loop, media_encoding, max_stream_seconds=TRANSCRIBE_MAX_STREAM_SECONDS,
+                 rollover_margin=TRANSCRIBE_ROLLOVER_MARGIN, force_margin=TRANSCRIBE_ROLLOVER_FORCE_MARGIN,
+                 overlap=TRANSCRIBE_ROLLOVER_OVERLAP):
+        """
+        初始化长连接，第一个流在start后打开
+
+        Args:
+            open_stream: 打开一个转录流的协程函数
+            loop: 运行转录的事件循环
+            media_encoding (str): 上行编码，必须与打开转录流时的media_encoding一致
+            max_stream_seconds (float): 服务端单个流的最长时长（秒）
+            rollover_margin (float): 距上限不足该秒数时，在两次说话之间切换
+            force_margin (float): 距上限不足该秒数时，即使正在说话也立即切换
+            overlap (float): 新旧两个流同时接收音频的时长（秒）
+        """
+        self.open_stream = open_stream
+        self.loop = loop
+        self.media_encoding = media_encoding
+        self.max_stream_seconds = max_stream_seconds
+        self.rollover_margin = rollover_margin
+        self.force_margin = force_margin
+        self.overlap = overlap
+        self.audio_queue = AsyncAudioQueue(loop)
+        # 正在接收音频的流，切换期间有两个：[旧流, 新流]
+        self.legs = []
+        # 已结束输入、仍在接收结果的流
+        self.draining = []
+        self.utterances = deque(maxlen=RECENT_UTTERANCES)
+        self.current = None
+        # 已发送的音频时长（秒），即长连接音频中的当前位置
+        self.sent_seconds = 0.0
+        self.replacement = None
+        self.overlap_until = None
+        # 每次打开流的尝试结束（成功或失败）时设置，失败原因记在open_error
+        self.ready = asyncio.Event()
+        self.open_error = None
+        self.task = None
+        self.stats = {'streams_opened': 0, 'rollovers': 0, 'reconnects': 0, 'open_failures': 0,
+                      'keepalives': 0, 'late_results': 0}
+
+    def start(self):
+        """启动发送协程并打开第一个流，已启动时直接返回"""
+        if self.task is None:
+            self.task = asyncio.ensure_future(self._run())
+
+    def send_audio_chunk(self, audio_chunk):
+        """
+        从其他线程投递音频块
+
+        Returns:
+            bool: 是否成功投递
+        """
+        return self.audio_queue.put_threadsafe(audio_chunk)
+
+    def _queued_seconds(self):
+        """已入队、尚未发送的音频时长（秒）"""
+        return sum(len(chunk) for chunk in self.audio_queue.items) / BYTES_PER_SECOND
+
+    async def begin_utterance(self, stable_callback=None, subscriptions=()):
+        """
+        开始一次说话，此后投递的音频属于这次说话
+
+        Args:
+            stable_callback: 接收部分结果中已稳定前缀的回调函数
+            subscriptions (list): (回调, 事件类型)列表
+
+        Returns:
+            StreamUtterance: 本次说话
+        """
+        self.start()
+        utterance = StreamUtterance(self.sent_seconds + self._queued_seconds(), stable_callback, subscriptions)
+        self.current = utterance
+        self.utterances.append(utterance)
+        return utterance
+
+    async def end_utterance(self, utterance, timeout=TRANSCRIBE_SEGMENT_FINAL_TIMEOUT):
+        """
+        本地端点检测判定说完：补发静音，等待本次说话的结果全部成为最终结果
+
+        Args:
+            utterance (StreamUtterance): 要结束的说话
+            timeout (float): 等待最终结果的最长时间（秒）
+
+        Returns:
+            tuple: (转录文本, 语言代码)
+        """
+        utterance.end_offset = self.sent_seconds + self._queued_seconds()
+        if self.current is utterance:
+            self.current = None
+        # 服务端根据停顿给出最终结果，补发的静音让它不必等下一段音频
+        await self.audio_queue.put(_silence(TRANSCRIBE_SEGMENT_FLUSH_MS))
+        tracer.add_span(STAGE_UPSTREAM_SEND, utterance.start_time, time.perf_counter())
+
+        deadline = self.loop.time() + timeout
+        while not utterance.results or utterance.store.open_results:
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                if utterance.results:
+                    logger.warning(f"等待最终结果超时，丢弃 {len(utterance.store.open_results)} 个未完成的片段")
+                break
+            utterance.changed.clear()
+            try:
+                await asyncio.wait_for(utterance.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+        transcript = utterance.store.finish()
+        final_time = time.perf_counter()
+        tracer.mark(MARK_FINAL, final_time)
+        logger.info(f"最终转录结果（{len(utterance.store.segments)} 个片段）: {transcript}")
+        return transcript, utterance.identified_language
+
+    async def wait_ready(self):
+        """
+        等待第一个流打开
+
+        Raises:
+            Exception: 打开流失败时抛出最近一次的错误，发送协程会在后台继续重试
+        """
+        self.start()
+        await self.ready.wait()
+        if not self.legs and self.open_error is not None:
+            raise self.open_error
+
+    async def close(self):
+        """结束音频输入，等待各个流的结果接收完毕"""
+        self.audio_queue.close()
+        if self.task is not None:
+            await self.task
+        tasks = [leg.handler_task for leg in self.draining if leg.handler_task is not None]
+        if tasks:
+            await asyncio.wait(tasks, timeout=5)
+
+    def metrics(self):
+        """
+        获取长连接指标
+
+        Returns:
+            dict: 音频队列指标、打开的流数、切换次数、重连次数、打开失败次数、保活次数、被丢弃的迟到结果数、
+                当前流的时长和已发送的音频时长，使用压缩编码时包含当前流的encoder编码指标
+        """
+        metrics = self.audio_queue.metrics()
+        metrics.update(self.stats, sent_seconds=self.sent_seconds,
+                       stream_age=self.legs[-1].age if self.legs else 0.0)
+        if self.legs and self.legs[-1].encoder is not None:
+            metrics['encoder'] = self.legs[-1].encoder.metrics()
+        return metrics
+
+    async def _run(self):
+        """发送协程：按顺序把音频发送到当前的流，空闲时保活，必要时切换到新的流"""
+        keepalive = _silence(TRANSCRIBE_KEEPALIVE_MS)
+        try:
+            if not await self._ensure_leg():
+                return
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(self.audio_queue.get(), TRANSCRIBE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    self.stats['keepalives'] += 1
+                    chunk = keepalive
+                if chunk is None:
+                    break
+                try:
+                    await self._send(chunk)
+                except Exception as e:
+                    logger.error(f"长连接发送音频时出错: {e}")
+        finally:
+            for leg in list(self.legs):
+                await self._end_leg(leg)
+            if self.replacement is not None:
+                self.replacement.cancel()
+                self.replacement = None
+
+    async def _ensure_leg(self):
+        """
+        没有可用的流时打开一个，失败时退避重试，期间到达的音频在队列中等待
+
+        Returns:
+            bool: 是否有可用的流，长连接在重试期间被关闭时返回False
+        """
+        if self.legs:
+            return True
+        if self.stats['streams_opened']:
+            self.stats['reconnects'] += 1
+            logger.warning("转录流已断开，重新打开")
+        delay = TRANSCRIBE_RECONNECT_BASE_DELAY
+        while not self.audio_queue.closed:
+            try:
+                stream = await self.open_stream()
+            except Exception as e:
+                self.stats['open_failures'] += 1
+                self.open_error = e
+                # 唤醒等待的调用方，由它们决定是否继续等待
+                self.ready.set()
+                logger.error(f"打开转录流失败，{delay:.1f}秒后重试: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, TRANSCRIBE_RECONNECT_MAX_DELAY)
+                continue
+            self.open_error = None
+            self.legs.append(self._attach(stream))
+            self.ready.set()
+            return True
+        return False
+
+    def _attach(self, stream):
+        """接管一个已打开的流，从下一块音频开始向它发送"""
+        leg = _StreamLeg(stream, self.sent_seconds, self.media_encoding)
+        handler = _LegHandler(stream.output_stream, self, leg)
+        leg.handler_task = asyncio.ensure_future(self._receive(leg, handler))
+        self.stats['streams_opened'] += 1
+        return leg
+
+    async def _receive(self, leg, handler):
+        """接收一个流的结果，直到服务端结束输出"""
+        try:
+            await handler.handle_events()
+        except Exception as e:
+            logger.error(f"接收转录结果时出错: {e}")
+        if leg in self.legs:
+            # 还在发送音频时输出就结束了，说明流被服务端关闭，下一块音频到达时重新打开
+            logger.warning(f"转录流在 {leg.age:.0f} 秒后被关闭")
+            self.legs.remove(leg)
+
+    async def _send(self, chunk):
+        """把一块音频发送到所有正在接收的流"""
+        if not await self._ensure_leg():
+            return
+        self._check_rollover()
+        for leg in list(self.legs):
+            data = chunk
+            try:
+                if leg.encoder is not None:
+                    # 同一个流的编码按顺序进行，不同会话在线程池中并行
+                    data = await self.loop.run_in_executor(_get_encoder_executor(), leg.encoder.encode, chunk)
+                    if not data:
+                        continue
+                await leg.stream.input_stream.send_audio_event(audio_chunk=data)
+            except Exception as e:
+                logger.error(f"向转录流发送音频时出错: {e}")
+                if leg in self.legs:
+                    self.legs.remove(leg)
+        self.sent_seconds += len(chunk) / BYTES_PER_SECOND
+        await self._advance_rollover()
+
+    def _check_rollover(self):
+        """当前流接近时长上限时开始打开替换流：优先在两次说话之间，太接近上限时立即进行"""
+        if self.replacement is not None or len(self.legs) != 1:
+            return
+        remaining = self.max_stream_seconds - self.legs[0].age
+        if remaining <= self.force_margin or (self.current is None and remaining <= self.rollover_margin):
+            logger.info(f"转录流距时长上限还有 {remaining:.0f} 秒，打开替换流")
+            self.replacement = asyncio.ensure_future(self.open_stream())
+
+    async def _advance_rollover(self):
+        """替换流打开后开始同时发送，同时发送足够长且旧流的结果都已是最终结果后结束旧流"""
+        if self.replacement is not None and self.replacement.done():
+            task, self.replacement = self.replacement, None
+            try:
+                stream = task.result()
+            except Exception as e:
+                logger.warning(f"打开替换流失败，稍后重试: {e}")
+                return
+            if not self.legs:
+                # 旧流在打开替换流期间断开，直接使用新流
+                self.legs.append(self._attach(stream))
+                return
+            old = self.legs[0]
+            new = self._attach(stream)
+            # 两次说话之间没有待发送的语音，不需要重叠；否则切换点取重叠段的中点：
+            # 之前开始的结果由旧流负责，之后开始的由新流负责
+            overlap = 0.0 if self.current is None and not self.audio_queue.items else self.overlap
+            cutover = self.sent_seconds + overlap / 2
+            old.owned_until = cutover
+            new.owned_from = cutover
+            self.legs.append(new)
+            self.overlap_until = self.sent_seconds + overlap
+            self.stats['rollovers'] += 1
+
+        if len(self.legs) == 2 and self.sent_seconds >= self.overlap_until:
+            old = self.legs[0]
+            extended = self.sent_seconds - self.overlap_until
+            if old.open_results and extended < TRANSCRIBE_ROLLOVER_MAX_OVERLAP:
+                # 旧流还有说到一半的片段，继续同时发送直到它成为最终结果
+                return
+            if old.open_results:
+                logger.warning(f"旧转录流仍有 {len(old.open_results)} 个未完成的片段，已达最长重叠时间")
+            self.legs.remove(old)
+            await self._end_leg(old)
+            logger.info(f"已切换到新的转录流（旧流使用了 {old.age:.0f} 秒）")
+
+    async def _end_leg(self, leg):
+        """结束一个流的音频输入，它的结果继续接收到服务端结束输出"""
+        if leg in self.legs:
+            self.legs.remove(leg)
+        if leg.input_ended:
+            return
+        leg.input_ended = True
+        self.draining = [item for item in self.draining if not item.handler_task.done()]
+        self.draining.append(leg)
+        try:
+            if leg.encoder is not None:
+                tail = await self.loop.run_in_executor(_get_encoder_executor(), leg.encoder.close)
+                if tail:
+                    await leg.stream.input_stream.send_audio_event(audio_chunk=tail)
+            await leg.stream.input_stream.end_stream()
+        except Exception as e:
+            logger.warning(f"结束转录流时出错: {e}")
+
+    def _route(self, leg, result):
+        """
+        把一个结果归属到对应的说话
+
+        Args:
+            leg (_StreamLeg): 结果所在的流
+            result: Transcribe返回的结果
+
+        Returns:
+            TranscriptStore: 对应说话的结果存储，结果不归本流负责或所属的说话已结束时返回None
+        """
+        start = leg.offset + result.start_time if result.start_time is not None else None
+        if start is not None and (start < leg.owned_from or
+                                  (leg.owned_until is not None and start >= leg.owned_until)):
+            return None
+
+        if result.is_partial:
+            leg.open_results.add(result.result_id)
+        else:
+            leg.open_results.discard(result.result_id)
+
+        utterance = None
+        if start is None:
+            # 没有时间信息时归属到最近的一次说话
+            utterance = self.utterances[-1] if self.utterances else None
+        else:
+            for candidate in reversed(self.utterances):
+                if candidate.start_offset <= start + ROUTE_TOLERANCE:
+                    utterance = candidate
+                    break
+        if utterance is None or utterance.store.finished:
+            if not result.is_partial:
+                self.stats['late_results'] += 1
+                logger.debug(f"丢弃不属于任何进行中说话的结果: {result.alternatives[0].transcript}")
+            return None
+
+        utterance.results += 1
+        # 结果写入存储之后再唤醒等待最终结果的协程
+        self.loop.call_soon(utterance.changed.set)
+        return utterance.store
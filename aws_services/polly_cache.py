@@ -0,0 +1,296 @@
+"""
+Polly合成结果缓存模块，提供内存LRU和磁盘两级缓存
+缓存键由规范化文本、语音ID、引擎、输出格式和采样率计算得到
+"""
+
+import hashlib
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from config import (
+    POLLY_CACHE_MEMORY_BYTES, POLLY_CACHE_DIR, POLLY_CACHE_DISK_BYTES, POLLY_CACHE_STATS_INTERVAL
+)
+from logger_config import logger
+
+
+def normalize_text(text):
+    """
+    规范化文本，使仅在空白或全半角上不同的文本命中同一缓存项
+
+    Args:
+        text (str): 原始文本
+
+    Returns:
+        str: 规范化后的文本
+    """
+    text = unicodedata.normalize('NFKC', text)
+    return ' '.join(text.split())
+
+
+def make_cache_key(text, voice_id, engine, output_format, sample_rate=None):
+    """
+    计算合成请求的内容寻址键
+
+    Args:
+        text (str): 要合成的文本
+        voice_id (str): 语音ID
+        engine (str): 合成引擎
+        output_format (str): 输出格式
+        sample_rate (str, optional): 采样率，None表示使用Polly默认值
+
+    Returns:
+        str: 十六进制SHA-256摘要
+    """
+    parts = [normalize_text(text), voice_id, engine, output_format, str(sample_rate or 'default')]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class MemoryLRU:
+    """按字节数限制容量的内存LRU缓存"""
+
+    def __init__(self, max_bytes):
+        """
+        初始化内存缓存
+
+        Args:
+            max_bytes (int): 缓存字节上限
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.items = OrderedDict()
+
+    def get(self, key):
+        """获取缓存项，命中时将其移到最近使用位置"""
+        data = self.items.get(key)
+        if data is not None:
+            self.items.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        """
+        写入缓存项
+
+        Returns:
+            int: 因超出容量而被淘汰的缓存项数量
+        """
+        if len(data) > self.max_bytes:
+            return 0
+
+        old = self.items.pop(key, None)
+        if old is not None:
+            self.current_bytes -= len(old)
+
+        self.items[key] = data
+        self.current_bytes += len(data)
+
+        evicted = 0
+        while self.current_bytes > self.max_bytes:
+            _, removed = self.items.popitem(last=False)
+            self.current_bytes -= len(removed)
+            evicted += 1
+        return evicted
+
+
+class DiskStore:
+    """按总大小淘汰的磁盘缓存，以文件修改时间作为最近使用时间
+
+    线程安全：索引由一把锁保护，只在锁内做内存中的记账；文件读写和删除在锁外进行，
+    同一个键的文件操作由按键分片的锁串行化，不同键的磁盘IO可以并行
+    """
+
+    # 按键分片的文件锁数量
+    KEY_LOCKS = 16
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        初始化磁盘缓存
+
+        Args:
+            cache_dir (str): 缓存目录
+            max_bytes (int): 缓存字节上限
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # 启动时扫描已有文件，按修改时间从旧到新排列
+        entries = []
+        for entry in os.scandir(cache_dir):
+            if entry.is_file() and entry.name.endswith('.bin'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        entries.sort()
+
+        self.sizes = OrderedDict((key, size) for _, key, size in entries)
+        self.current_bytes = sum(self.sizes.values())
+        self.lock = threading.Lock()
+        self.key_locks = [threading.Lock() for _ in range(self.KEY_LOCKS)]
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def _key_lock(self, key):
+        return self.key_locks[hash(key) % self.KEY_LOCKS]
+
+    def get(self, key):
+        """读取缓存项，文件不存在时返回None"""
+        with self.lock:
+            if key not in self.sizes:
+                return None
+
+        path = self._path(key)
+        with self._key_lock(key):
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                data = None
+
+        with self.lock:
+            if data is None:
+                self.current_bytes -= self.sizes.pop(key, 0)
+            elif key in self.sizes:
+                self.sizes.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        """
+        写入缓存项（先写临时文件再原子替换）
+
+        Returns:
+            int: 因超出容量而被删除的文件数量
+        """
+        if len(data) > self.max_bytes:
+            return 0
+
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._key_lock(key):
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"写入磁盘缓存失败: {e}")
+                return 0
+
+            with self.lock:
+                self.current_bytes -= self.sizes.pop(key, 0)
+                self.sizes[key] = len(data)
+                self.current_bytes += len(data)
+                evicted = []
+                while self.current_bytes > self.max_bytes:
+                    old_key, size = self.sizes.popitem(last=False)
+                    self.current_bytes -= size
+                    evicted.append(old_key)
+
+        for old_key in evicted:
+            with self._key_lock(old_key):
+                with self.lock:
+                    # 删除前该键可能已被重新写入
+                    if old_key in self.sizes:
+                        continue
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+        return len(evicted)
+
+
+class SynthesisCache:
+    """Polly合成结果的两级缓存"""
+
+    def __init__(self, memory_bytes=POLLY_CACHE_MEMORY_BYTES, cache_dir=POLLY_CACHE_DIR,
+                 disk_bytes=POLLY_CACHE_DISK_BYTES):
+        """
+        初始化两级缓存
+
+        Args:
+            memory_bytes (int): 内存缓存字节上限
+            cache_dir (str): 磁盘缓存目录，为None时仅使用内存缓存
+            disk_bytes (int): 磁盘缓存字节上限
+        """
+        self.memory = MemoryLRU(memory_bytes)
+        self.disk = None
+        if cache_dir:
+            try:
+                self.disk = DiskStore(cache_dir, disk_bytes)
+            except OSError as e:
+                logger.warning(f"无法初始化磁盘缓存，仅使用内存缓存: {e}")
+
+        self.lock = threading.Lock()
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+        }
+        self.lookups = 0
+
+    def get(self, key):
+        """
+        查询缓存，磁盘命中的数据会被提升到内存缓存；读磁盘时不持有锁，不会阻塞其他线程的内存命中
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            bytes: 音频数据，未命中时返回None
+        """
+        with self.lock:
+            self.lookups += 1
+            if self.lookups % POLLY_CACHE_STATS_INTERVAL == 0:
+                self._log_stats()
+            data = self.memory.get(key)
+            if data is not None:
+                self.stats['memory_hits'] += 1
+                logger.debug(f"合成缓存内存命中: {key[:12]}", extra={'log_class': 'polly_cache'})
+                return data
+
+        if self.disk is not None:
+            data = self.disk.get(key)
+
+        with self.lock:
+            if data is not None:
+                self.stats['disk_hits'] += 1
+                self.stats['memory_evictions'] += self.memory.put(key, data)
+                logger.debug(f"合成缓存磁盘命中: {key[:12]}", extra={'log_class': 'polly_cache'})
+            else:
+                self.stats['misses'] += 1
+                logger.debug(f"合成缓存未命中: {key[:12]}", extra={'log_class': 'polly_cache'})
+        return data
+
+    def put(self, key, data):
+        """
+        写入两级缓存，写磁盘时不持有锁
+
+        Args:
+            key (str): 缓存键
+            data (bytes): 音频数据
+        """
+        if not data:
+            return
+        with self.lock:
+            self.stats['memory_evictions'] += self.memory.put(key, data)
+        if self.disk is not None:
+            evicted = self.disk.put(key, data)
+            with self.lock:
+                self.stats['disk_evictions'] += evicted
+
+    def log_stats(self):
+        """输出缓存统计信息"""
+        with self.lock:
+            self._log_stats()
+
+    def _log_stats(self):
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        hit_rate = hits / self.lookups if self.lookups else 0.0
+        logger.info(
+            f"合成缓存统计: 查询 {self.lookups} 次, 命中率 {hit_rate:.1%}, "
+            f"内存命中 {self.stats['memory_hits']}, 磁盘命中 {self.stats['disk_hits']}, "
+            f"未命中 {self.stats['misses']}, 内存淘汰 {self.stats['memory_evictions']}, "
+            f"磁盘淘汰 {self.stats['disk_evictions']}"
+        )
@@ -3,27 +3,149 @@ AWS Polly客户端模块，负责与AWS Polly服务交互
 支持自动识别文本语言，默认使用中文语音
 """
 
-import boto3
+import asyncio
+import contextvars
 import re
-import traceback
+import threading
 import time
-from config import POLLY_REGION, POLLY_VOICE_ID, POLLY_OUTPUT_FORMAT, PREFERRED_LANGUAGE
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    POLLY_REGION, POLLY_VOICE_ID, POLLY_OUTPUT_FORMAT, POLLY_ENGINE, PREFERRED_LANGUAGE, POLLY_CACHE_ENABLED,
+    POLLY_PCM_SAMPLE_RATE, POLLY_STREAM_CHUNK_BYTES, LANGID_LOCAL_ENABLED, LANGID_CONFIDENCE_THRESHOLD,
+    POLLY_COALESCE_ENABLED, POLLY_ASYNC_WORKERS
+)
 from logger_config import logger
+from aws_services.polly_cache import SynthesisCache, make_cache_key
+from aws_services.rate_limiter import get_api_limiter, api_metrics, client_config, is_transient_error
+from aws_services.single_flight import SingleFlight
+from text_helpers.language_id import LanguageDetector
+from telemetry.tracing import tracer, STAGE_LANGUAGE_DETECTION, STAGE_POLLY_API, MARK_FIRST_AUDIO_BYTE
+
+# 中文字符的Unicode范围
+CHINESE_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+# 将Comprehend语言代码映射到Polly支持的格式
+COMPREHEND_LANGUAGE_MAPPING = {
+    'zh': 'zh-CN',
+    'en': 'en-US',
+    'ja': 'ja-JP',
+    'ko': 'ko-KR',
+    'fr': 'fr-FR',
+    'de': 'de-DE',
+    'es': 'es-ES'
+}
+
+
+def log_aws_metrics(polly_client):
+    """
+    输出各AWS API的限流、重试和请求合并指标
+
+    Args:
+        polly_client (PollyClient): Polly客户端
+    """
+    metrics = polly_client.get_metrics()
+    for name, api in metrics['api'].items():
+        logger.info(f"{name} API: 请求 {api['requests']} 次，被限流 {api['throttles']} 次，重试 {api['retries']} 次，"
+                    f"重试用尽 {api['failures']} 次，排队 {api['wait_time']:.2f}秒，当前速率 {api['rate']:.1f}/秒")
+    if 'coalesced' in metrics:
+        logger.info(f"合并的相同合成请求: {metrics['coalesced']} 次")
 
 
 class PollyClient:
-    """AWS Polly客户端类"""
+    """AWS Polly客户端类
+    
+    同步方法供合成线程使用；带_async后缀的方法可在事件循环中await，
+    由一个有界线程池执行，线程数与boto3连接池大小一致，多个并发请求复用连接而不是每次新建线程
+    """
     
-    def __init__(self):
-        """初始化Polly客户端"""
-        self.client = boto3.client('polly', region_name=POLLY_REGION)
-        self.comprehend = boto3.client('comprehend', region_name=POLLY_REGION)
+    def __init__(self, client=None, comprehend=None, executor=None):
+        """
+        初始化Polly客户端，boto3客户端在首次使用时才创建
+        
+        Args:
+            client: Polly客户端，默认使用boto3创建
+            comprehend: Comprehend客户端，默认使用boto3创建
+            executor: 异步接口使用的线程池，默认在首次使用时创建POLLY_ASYNC_WORKERS个线程
+        """
+        self._client = client
+        self._comprehend = comprehend
+        self.client_lock = threading.Lock()
+        self.executor = executor
+        self.owns_executor = executor is None
+        # 进程内共享的API限流器
+        self.polly_limiter = get_api_limiter('polly')
+        self.comprehend_limiter = get_api_limiter('comprehend')
+        # 合并并发的相同合成请求
+        self.single_flight = SingleFlight() if POLLY_COALESCE_ENABLED else None
         # 默认语言设置为中文
         self.default_language = PREFERRED_LANGUAGE
+        # 合成结果缓存
+        self.cache = SynthesisCache() if POLLY_CACHE_ENABLED else None
+        # 本地语言识别器
+        self.language_detector = LanguageDetector() if LANGID_LOCAL_ENABLED else None
+    
+    @property
+    def client(self):
+        """Polly客户端，首次访问时创建"""
+        if self._client is None:
+            with self.client_lock:
+                if self._client is None:
+                    self._client = self._create_client('polly')
+        return self._client
+    
+    @property
+    def comprehend(self):
+        """Comprehend客户端，首次访问时创建"""
+        if self._comprehend is None:
+            with self.client_lock:
+                if self._comprehend is None:
+                    self._comprehend = self._create_client('comprehend')
+        return self._comprehend
+    
+    def _create_client(self, service_name):
+        """创建boto3客户端，同时解析凭证；boto3只在这里导入"""
+        import boto3
+        start_time = time.perf_counter()
+        client = boto3.client(service_name, region_name=POLLY_REGION,
+                              config=client_config(max_pool_connections=POLLY_ASYNC_WORKERS))
+        logger.info(f"{service_name} 客户端已创建，耗时 {time.perf_counter() - start_time:.3f}秒")
+        return client
+    
+    def prewarm(self):
+        """
+        预热：创建客户端、解析凭证，并发起一次轻量请求建立到Polly的TLS连接，之后的合成请求复用该连接
+        
+        Returns:
+            bool: 是否成功建立连接
+        """
+        try:
+            client = self.client
+            self.comprehend
+            client.describe_voices(Engine=POLLY_ENGINE, LanguageCode=self.default_language)
+            return True
+        except Exception as e:
+            logger.warning(f"Polly预热失败: {e}")
+            return False
     
     def detect_language(self, text):
         """
-        使用AWS Comprehend检测文本语言
+        检测文本语言，优先使用本地识别，置信度不足时使用AWS Comprehend
+        
+        Args:
+            text (str): 要检测的文本
+        
+        Returns:
+            str: 语言代码，例如'en-US'、'zh-CN'等，Comprehend暂时不可用时返回默认语言
+
+        Raises:
+            Exception: 参数错误、权限不足等重试也不会成功的错误
+        """
+        with tracer.span(STAGE_LANGUAGE_DETECTION):
+            return self._detect_language(text)
+    
+    async def detect_language_async(self, text):
+        """
+        detect_language的异步版本，在线程池中完成检测
         
         Args:
             text (str): 要检测的文本
@@ -31,19 +153,33 @@ class PollyClient:
         Returns:
             str: 语言代码，例如'en-US'、'zh-CN'等
         """
+        return await self._run_async(self.detect_language, text)
+    
+    def _detect_language(self, text):
+        """依次尝试本地识别和Comprehend"""
         try:
             if not text or len(text.strip()) == 0:
                 return self.default_language
             
+            # 本地识别
+            if self.language_detector is not None:
+                local_start = time.perf_counter()
+                lang, confidence, method = self.language_detector.detect(text)
+                local_delay = (time.perf_counter() - local_start) * 1e6
+                if lang and confidence >= LANGID_CONFIDENCE_THRESHOLD:
+                    logger.info(f"本地识别的语言: {lang} (置信度: {confidence:.2f}, 方法: {method}, 耗时: {local_delay:.0f}微秒)")
+                    return lang
+                logger.info(f"本地识别置信度不足 ({lang}, {confidence:.2f})，使用Comprehend")
+            
             # 记录开始时间
-            start_time = time.time()
+            start_time = time.perf_counter()
             logger.info("开始检测文本语言")
             
             # 调用Comprehend API
-            response = self.comprehend.detect_dominant_language(Text=text)
+            response = self.comprehend_limiter.call(self.comprehend.detect_dominant_language, Text=text)
             
             # 计算API延迟
-            api_delay = time.time() - start_time
+            api_delay = time.perf_counter() - start_time
             logger.info(f"Comprehend API调用延迟: {api_delay:.3f}秒")
             
             # 获取置信度最高的语言
@@ -54,25 +190,17 @@ class PollyClient:
                 score = dominant_language['Score']
                 
                 # 将语言代码映射到Polly支持的格式
-                lang_mapping = {
-                    'zh': 'zh-CN',
-                    'en': 'en-US',
-                    'ja': 'ja-JP',
-                    'ko': 'ko-KR',
-                    'fr': 'fr-FR',
-                    'de': 'de-DE',
-                    'es': 'es-ES'
-                }
-                
-                detected_lang = lang_mapping.get(lang_code, self.default_language)
+                detected_lang = COMPREHEND_LANGUAGE_MAPPING.get(lang_code, self.default_language)
                 logger.info(f"检测到的语言: {detected_lang} (置信度: {score:.2f})")
                 return detected_lang
             else:
                 logger.warning("无法检测到语言，使用默认语言")
                 return self.default_language
         except Exception as e:
-            logger.error(f"检测语言时出错: {e}")
-            traceback.print_exc()
+            if not is_transient_error(e):
+                logger.error(f"检测语言时出错: {e}")
+                raise
+            logger.warning(f"Comprehend暂时不可用，使用默认语言: {e}")
             return self.default_language  # 默认返回中文
     
     def synthesize_speech(self, text, language_code=None):
@@ -84,61 +212,268 @@ class PollyClient:
             language_code (str, optional): 语言代码，例如'en-US'、'zh-CN'等
         
         Returns:
-            bytes: 音频数据
+            bytes: 音频数据，Polly暂时不可用（限流重试用尽、服务端错误或网络故障）时返回None
+
+        Raises:
+            Exception: 参数错误、权限不足等重试也不会成功的错误
         """
         try:
             # 记录开始时间
-            start_time = time.time()
+            start_time = time.perf_counter()
             logger.info("开始合成语音")
             
-            # 如果未提供语言代码，则自动检测
-            if not language_code:
-                language_code = self.detect_language(text)
-                logger.info(f"使用自动检测的语言: {language_code}")
+            voice_id = self._resolve_voice(text, language_code)
             
-            # 确定使用的语音ID
-            voice_id = POLLY_VOICE_ID.get(language_code, POLLY_VOICE_ID.get(self.default_language))
+            # 查询合成缓存
+            cache_key = None
+            if self.cache is not None:
+                cache_key = make_cache_key(text, voice_id, POLLY_ENGINE, POLLY_OUTPUT_FORMAT)
+                audio_data = self.cache.get(cache_key)
+                if audio_data is not None:
+                    total_time = time.perf_counter() - start_time
+                    logger.info(f"命中合成缓存，语音合成总时间: {total_time:.6f}秒")
+                    return audio_data
             
-            # 检查语言和文本是否匹配
-            # 例如，如果检测到英语但使用中文语音，可能需要调整
-            if language_code == 'en-US' and self._contains_chinese(text):
-                logger.warning("检测到英语语言代码，但文本包含中文字符。使用中文语音。")
-                language_code = 'zh-CN'
-                voice_id = POLLY_VOICE_ID.get('zh-CN')
+            if self.single_flight is not None:
+                coalesce_key = cache_key or make_cache_key(text, voice_id, POLLY_ENGINE, POLLY_OUTPUT_FORMAT)
+                audio_data = self.single_flight.do(coalesce_key, self._synthesize_from_api, text, voice_id, cache_key)
+            else:
+                audio_data = self._synthesize_from_api(text, voice_id, cache_key)
+            if audio_data is None:
+                return None
+            tracer.mark(MARK_FIRST_AUDIO_BYTE)
             
-            logger.info(f"使用语音ID: {voice_id} 合成语言: {language_code}")
+            # 计算总处理时间
+            total_time = time.perf_counter() - start_time
+            logger.info(f"语音合成总时间: {total_time:.3f}秒")
+            logger.info(f"合成的音频大小: {len(audio_data)/1024:.2f} KB")
+            return audio_data
+        except Exception as e:
+            logger.error(f"合成语音时出错: {e}")
+            if not is_transient_error(e):
+                raise
+            return None
+    
+    def _synthesize_from_api(self, text, voice_id, cache_key):
+        """
+        调用Polly API合成完整音频，经过限流器，遇到限流错误时退避重试；成功后写入缓存
+        
+        Returns:
+            bytes: 音频数据，没有音频流时返回None
+        """
+        api_start_time = time.perf_counter()
+        response = self.polly_limiter.call(
+            self.client.synthesize_speech,
+            Text=text,
+            OutputFormat=POLLY_OUTPUT_FORMAT,
+            VoiceId=voice_id,
+            Engine=POLLY_ENGINE  # 使用神经引擎获得更好的语音质量
+        )
+        api_end_time = time.perf_counter()
+        tracer.add_span(STAGE_POLLY_API, api_start_time, api_end_time)
+        
+        # 计算API延迟
+        api_delay = api_end_time - api_start_time
+        logger.info(f"Polly API调用延迟: {api_delay:.3f}秒")
+        
+        if 'AudioStream' not in response:
+            logger.error("Polly API未返回音频流")
+            return None
+        audio_data = response['AudioStream'].read()
+        if cache_key is not None:
+            self.cache.put(cache_key, audio_data)
+        return audio_data
+    
+    def synthesize_speech_stream(self, text, language_code=None, output_format='pcm', use_cache=True):
+        """
+        以流式方式合成语音，边接收边产出音频块
+        
+        Args:
+            text (str): 要转换的文本
+            language_code (str, optional): 语言代码，例如'en-US'、'zh-CN'等
+            output_format (str): 'pcm'、'mp3'或'ogg_vorbis'
+            use_cache (bool): 是否读写合成缓存，长文档分段等不会重复的大块音频可以关闭
+        
+        Yields:
+            bytes: 音频块，PCM格式时为16位单声道、采样率为POLLY_PCM_SAMPLE_RATE；Polly暂时不可用时提前结束
+
+        Raises:
+            Exception: 参数错误、权限不足等重试也不会成功的错误
+        """
+        try:
+            start_time = time.perf_counter()
+            logger.info("开始流式合成语音")
             
-            # 调用Polly API
-            api_start_time = time.time()
-            response = self.client.synthesize_speech(
-                Text=text,
-                OutputFormat=POLLY_OUTPUT_FORMAT,
-                VoiceId=voice_id,
-                Engine='neural'  # 使用神经引擎获得更好的语音质量
-            )
-            api_end_time = time.time()
+            voice_id = self._resolve_voice(text, language_code)
             
-            # 计算API延迟
-            api_delay = api_end_time - api_start_time
-            logger.info(f"Polly API调用延迟: {api_delay:.3f}秒")
+            # 查询合成缓存，命中时按块产出
+            cache_key = None
+            if self.cache is not None and use_cache:
+                cache_key = make_cache_key(text, voice_id, POLLY_ENGINE, output_format, POLLY_PCM_SAMPLE_RATE)
+                audio_data = self.cache.get(cache_key)
+                if audio_data is not None:
+                    logger.info(f"命中合成缓存，首块延迟: {time.perf_counter() - start_time:.6f}秒")
+                    tracer.mark(MARK_FIRST_AUDIO_BYTE)
+                    for offset in range(0, len(audio_data), POLLY_STREAM_CHUNK_BYTES):
+                        yield audio_data[offset:offset + POLLY_STREAM_CHUNK_BYTES]
+                    return
             
-            # 返回音频数据
-            if 'AudioStream' in response:
-                audio_data = response['AudioStream'].read()
-                
-                # 计算总处理时间
-                total_time = time.time() - start_time
-                logger.info(f"语音合成总时间: {total_time:.3f}秒")
-                logger.info(f"合成的音频大小: {len(audio_data)/1024:.2f} KB")
-                
-                return audio_data
+            if self.single_flight is not None:
+                coalesce_key = cache_key or make_cache_key(text, voice_id, POLLY_ENGINE, output_format,
+                                                           POLLY_PCM_SAMPLE_RATE)
+                chunks = self.single_flight.stream(coalesce_key, self._stream_from_api, text, voice_id, cache_key,
+                                                   output_format)
             else:
-                logger.error("Polly API未返回音频流")
-                return None
+                chunks = self._stream_from_api(text, voice_id, cache_key, output_format)
+            
+            first_chunk = True
+            for chunk in chunks:
+                if first_chunk:
+                    tracer.mark(MARK_FIRST_AUDIO_BYTE)
+                    logger.info(f"流式合成首块延迟: {time.perf_counter() - start_time:.3f}秒")
+                    first_chunk = False
+                yield chunk
+            
+            logger.info(f"流式语音合成总时间: {time.perf_counter() - start_time:.3f}秒")
         except Exception as e:
-            logger.error(f"合成语音时出错: {e}")
-            traceback.print_exc()
-            return None
+            logger.error(f"流式合成语音时出错: {e}")
+            if not is_transient_error(e):
+                raise
+    
+    def _stream_from_api(self, text, voice_id, cache_key, output_format='pcm'):
+        """
+        调用Polly API流式合成，经过限流器，遇到限流错误时退避重试；读完后写入缓存
+        
+        Yields:
+            bytes: 音频块
+        """
+        api_start_time = time.perf_counter()
+        params = {'SampleRate': str(POLLY_PCM_SAMPLE_RATE)} if output_format == 'pcm' else {}
+        response = self.polly_limiter.call(
+            self.client.synthesize_speech,
+            Text=text,
+            OutputFormat=output_format,
+            VoiceId=voice_id,
+            Engine=POLLY_ENGINE,
+            **params
+        )
+        api_end_time = time.perf_counter()
+        tracer.add_span(STAGE_POLLY_API, api_start_time, api_end_time)
+        logger.info(f"Polly API调用延迟: {api_end_time - api_start_time:.3f}秒")
+        
+        if 'AudioStream' not in response:
+            logger.error("Polly API未返回音频流")
+            return
+        
+        # 逐块读取音频流，同时收集完整数据用于写入缓存
+        chunks = []
+        for chunk in response['AudioStream'].iter_chunks(POLLY_STREAM_CHUNK_BYTES):
+            if cache_key is not None:
+                chunks.append(chunk)
+            yield chunk
+        
+        if cache_key is not None:
+            self.cache.put(cache_key, b''.join(chunks))
+    
+    async def synthesize_speech_async(self, text, language_code=None):
+        """
+        synthesize_speech的异步版本，在线程池中完成合成
+        
+        Args:
+            text (str): 要转换的文本
+            language_code (str, optional): 语言代码
+        
+        Returns:
+            bytes: 音频数据，Polly暂时不可用时返回None
+
+        Raises:
+            Exception: 参数错误、权限不足等重试也不会成功的错误
+        """
+        return await self._run_async(self.synthesize_speech, text, language_code)
+    
+    async def synthesize_speech_stream_async(self, text, language_code=None):
+        """
+        synthesize_speech_stream的异步版本，每个音频块在线程池中读取，等待期间不占用事件循环
+        
+        Args:
+            text (str): 要转换的文本
+            language_code (str, optional): 语言代码
+        
+        Yields:
+            bytes: 16位单声道PCM音频块，采样率为POLLY_PCM_SAMPLE_RATE
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        # 所有读取共用同一个上下文，合成线程中记录的延迟归入调用方的追踪
+        context = contextvars.copy_context()
+        chunks = self.synthesize_speech_stream(text, language_code)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(executor, context.run, next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            # 提前停止读取时关闭生成器，释放Polly音频流
+            await loop.run_in_executor(executor, context.run, chunks.close)
+    
+    async def _run_async(self, func, *args):
+        """在线程池中沿用当前上下文执行同步方法"""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._get_executor(), context.run, func, *args)
+    
+    def _get_executor(self):
+        """获取异步接口使用的线程池，首次使用时创建"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=POLLY_ASYNC_WORKERS, thread_name_prefix='polly-async')
+        return self.executor
+    
+    def shutdown(self):
+        """关闭自己创建的线程池"""
+        if self.owns_executor and self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+    
+    def get_metrics(self):
+        """
+        获取限流、重试和请求合并指标
+        
+        Returns:
+            dict: 各API的限流指标，以及合成请求的合并次数
+        """
+        metrics = {'api': api_metrics()}
+        if self.single_flight is not None:
+            metrics['coalesced'] = self.single_flight.metrics()['coalesced']
+        return metrics
+    
+    def _resolve_voice(self, text, language_code):
+        """
+        确定合成使用的语音ID，如果未提供语言代码，则自动检测
+        
+        Args:
+            text (str): 要转换的文本
+            language_code (str): 语言代码，可以为None
+        
+        Returns:
+            str: 语音ID
+        """
+        # 如果未提供语言代码，则自动检测
+        if not language_code:
+            language_code = self.detect_language(text)
+            logger.info(f"使用自动检测的语言: {language_code}")
+        
+        # 确定使用的语音ID
+        voice_id = POLLY_VOICE_ID.get(language_code, POLLY_VOICE_ID.get(self.default_language))
+        
+        # 检查语言和文本是否匹配
+        # 例如，如果检测到英语但使用中文语音，可能需要调整
+        if language_code == 'en-US' and self._contains_chinese(text):
+            logger.warning("检测到英语语言代码，但文本包含中文字符。使用中文语音。")
+            language_code = 'zh-CN'
+            voice_id = POLLY_VOICE_ID.get('zh-CN')
+        
+        logger.info(f"使用语音ID: {voice_id} 合成语言: {language_code}")
+        return voice_id
     
     def _contains_chinese(self, text):
         """
@@ -150,6 +485,4 @@ class PollyClient:
         Returns:
             bool: 如果包含中文字符则返回True
         """
-        # 中文字符的Unicode范围
-        chinese_pattern = re.compile(r'[\u4e00-\u9fff]')
-        return bool(chinese_pattern.search(text))
+        return bool(CHINESE_PATTERN.search(text))
@@ -0,0 +1,367 @@
+"""
+令牌桶限流模块，供多个线程或协程共享同一个AWS API的请求配额
+每个API有一个进程内共享的限流器，遇到限流错误时按指数退避加随机抖动重试，并自适应降低请求速率
+"""
+
+import asyncio
+import random
+import threading
+import time
+from config import (
+    AWS_API_RATE_LIMITS, AWS_RETRY_MAX_ATTEMPTS, AWS_RETRY_BASE_DELAY, AWS_RETRY_MAX_DELAY,
+    AWS_ADAPTIVE_MIN_RATE_RATIO, AWS_ADAPTIVE_RECOVERY_STEP
+)
+from logger_config import logger
+
+# 表示请求被限流或服务暂时过载、值得退避重试的错误码
+THROTTLING_ERROR_CODES = frozenset({
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottled', 'RequestThrottledException',
+    'TooManyRequestsException', 'RequestLimitExceeded', 'LimitExceededException',
+    'ProvisionedThroughputExceededException', 'SlowDown', 'ServiceUnavailable', 'ServiceUnavailableException',
+})
+
+# botocore中表示连接失败、连接中断或读写超时的异常基类
+TRANSIENT_ERROR_TYPES = frozenset({'ConnectionError', 'HTTPClientError'})
+
+# 凭证无效、权限不足等配置错误的错误码，之后的每个请求都会同样失败
+FATAL_ERROR_CODES = frozenset({
+    'AccessDenied', 'AccessDeniedException', 'UnauthorizedException', 'UnauthorizedOperation',
+    'UnrecognizedClientException', 'InvalidClientTokenId', 'InvalidAccessKeyId', 'InvalidSignatureException',
+    'SignatureDoesNotMatch', 'MissingAuthenticationToken', 'MissingAuthenticationTokenException',
+    'ExpiredToken', 'ExpiredTokenException', 'NotAuthorized',
+})
+
+# botocore中表示缺少凭证、区域或配置文件的异常类
+FATAL_ERROR_TYPES = frozenset({
+    'NoCredentialsError', 'PartialCredentialsError', 'CredentialRetrievalError', 'NoRegionError', 'ProfileNotFound',
+})
+
+
+class TokenBucket:
+    """线程安全的令牌桶
+
+    采用预约方式：取令牌时立即扣除（余额可以为负），返回需要等待的时间，
+    因此并发的调用方按到达顺序排队，不会互相抢占
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        """
+        初始化令牌桶
+
+        Args:
+            rate (float): 每秒补充的令牌数，0或None表示不限速
+            capacity (float, optional): 桶容量，即允许的突发请求数，默认为max(1, rate)
+            clock: 返回单调时间（秒）的函数，测试时可替换
+            sleep: 在当前线程中等待指定秒数的函数，测试时可替换
+        """
+        self.rate = rate or 0.0
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens=1.0):
+        """
+        预约令牌
+
+        Args:
+            tokens (float): 需要的令牌数
+
+        Returns:
+            float: 需要等待的秒数，0表示可以立即执行
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def set_rate(self, rate):
+        """
+        调整补充速率，已累积的令牌按原速率结算
+
+        Args:
+            rate (float): 新的每秒补充令牌数
+        """
+        with self.lock:
+            now = self.clock()
+            if self.rate > 0:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.rate = rate
+
+    def acquire(self, tokens=1.0):
+        """
+        在当前线程中阻塞等待令牌
+
+        Returns:
+            float: 实际等待的秒数
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+    async def acquire_async(self, tokens=1.0):
+        """
+        在事件循环中等待令牌，不阻塞其他协程
+
+        Returns:
+            float: 实际等待的秒数
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+
+def is_throttling_error(error):
+    """
+    判断异常是否为限流错误
+
+    Args:
+        error (Exception): boto3的ClientError或amazon_transcribe的服务异常
+
+    Returns:
+        bool: 是限流或服务暂时不可用时返回True
+    """
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        if response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES:
+            return True
+        if response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 429:
+            return True
+    # amazon_transcribe按错误码定义了异常类
+    return type(error).__name__ in THROTTLING_ERROR_CODES
+
+
+def is_transient_error(error):
+    """
+    判断异常是否为暂时性错误：限流、服务端5xx错误或网络连接失败，稍后重试可能成功
+
+    Args:
+        error (Exception): 调用AWS API时抛出的异常
+
+    Returns:
+        bool: 暂时性错误返回True；参数错误、权限不足和程序错误等重试也不会成功的错误返回False
+    """
+    if is_throttling_error(error) or isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict) and response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0) >= 500:
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_TYPES for cls in type(error).__mro__)
+
+
+def is_fatal_error(error):
+    """
+    判断异常是否为凭证、权限或配置错误，这类错误出现后继续对话也不会成功
+
+    Args:
+        error (Exception): 调用AWS API时抛出的异常
+
+    Returns:
+        bool: 凭证无效、权限不足、缺少区域配置或缺少依赖时返回True
+    """
+    if isinstance(error, ImportError):
+        return True
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        if response.get('Error', {}).get('Code') in FATAL_ERROR_CODES:
+            return True
+        if response.get('ResponseMetadata', {}).get('HTTPStatusCode') in (401, 403):
+            return True
+    return any(cls.__name__ in FATAL_ERROR_TYPES | FATAL_ERROR_CODES for cls in type(error).__mro__)
+
+
+def backoff_delay(attempt, base_delay=AWS_RETRY_BASE_DELAY, max_delay=AWS_RETRY_MAX_DELAY):
+    """
+    计算第attempt次失败后的退避时间（指数退避加完全随机抖动）
+
+    Args:
+        attempt (int): 已失败的次数，从1开始
+
+    Returns:
+        float: 等待的秒数
+    """
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+
+class ApiLimiter:
+    """单个AWS API的共享限流器
+
+    每次请求先从令牌桶取令牌；遇到暂时性错误（限流、服务端5xx、连接失败或超时）时退避后重试，
+    其中限流错误还会把速率减半（不低于配置速率的AWS_ADAPTIVE_MIN_RATE_RATIO）；请求成功时逐步恢复到配置速率。
+    其他错误直接抛出，由调用方处理
+    """
+
+    def __init__(self, name, rate, max_attempts=AWS_RETRY_MAX_ATTEMPTS, clock=time.monotonic, sleep=time.sleep):
+        """
+        初始化限流器
+
+        Args:
+            name (str): API名称，用于日志和指标
+            rate (float): 配置的每秒请求数，0表示不限速（仍会退避重试，但不调整速率）
+            max_attempts (int): 遇到暂时性错误时的最多尝试次数
+            clock: 令牌桶使用的单调时间函数，测试时可替换
+            sleep: 同步调用排队和退避时的等待函数，测试时可替换
+        """
+        self.name = name
+        self.configured_rate = rate or 0.0
+        self.max_attempts = max_attempts
+        self.sleep = sleep
+        self.bucket = TokenBucket(self.configured_rate, clock=clock, sleep=sleep)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'throttles': 0, 'retries': 0, 'failures': 0, 'wait_time': 0.0}
+
+    def call(self, func, *args, **kwargs):
+        """
+        在当前线程中限流调用func，暂时性错误时退避重试
+
+        Returns:
+            func的返回值
+
+        Raises:
+            Exception: 不可重试的错误，或重试次数用尽后的最后一次暂时性错误
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self._record_wait(self.bucket.acquire())
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                self.sleep(delay)
+                continue
+            self._on_success()
+            return result
+
+    async def call_async(self, func, *args, **kwargs):
+        """
+        在事件循环中限流调用协程函数func，暂时性错误时退避重试
+
+        Returns:
+            func返回的协程的结果
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self._record_wait(await self.bucket.acquire_async())
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                delay = self._on_error(e, attempt)
+                await asyncio.sleep(delay)
+                continue
+            self._on_success()
+            return result
+
+    def _record_wait(self, waited):
+        """记录一次请求及其在令牌桶中的等待时间"""
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['wait_time'] += waited
+
+    def _on_error(self, error, attempt):
+        """
+        处理一次失败的请求
+
+        Returns:
+            float: 重试前需要等待的秒数
+
+        Raises:
+            Exception: 不需要重试时重新抛出原异常
+        """
+        if not is_transient_error(error):
+            raise error
+        throttled = is_throttling_error(error)
+        with self.lock:
+            if throttled:
+                self.stats['throttles'] += 1
+            if attempt >= self.max_attempts:
+                self.stats['failures'] += 1
+            else:
+                self.stats['retries'] += 1
+        # 只有限流才说明请求过快，连接失败和服务端错误不调整速率
+        if throttled and self.configured_rate > 0:
+            floor = self.configured_rate * AWS_ADAPTIVE_MIN_RATE_RATIO
+            self.bucket.set_rate(max(floor, self.bucket.rate / 2))
+        reason = "被限流" if throttled else f"暂时失败（{type(error).__name__}）"
+        if attempt >= self.max_attempts:
+            logger.error(f"{self.name} 请求{reason}，已重试 {attempt - 1} 次，放弃")
+            raise error
+        delay = backoff_delay(attempt)
+        logger.warning(f"{self.name} 请求{reason}，{delay:.2f}秒后第 {attempt} 次重试，"
+                       f"当前速率 {self.bucket.rate:.1f}/秒")
+        return delay
+
+    def _on_success(self):
+        """请求成功后逐步恢复速率"""
+        if 0 < self.bucket.rate < self.configured_rate:
+            self.bucket.set_rate(min(self.configured_rate,
+                                     self.bucket.rate + self.configured_rate * AWS_ADAPTIVE_RECOVERY_STEP))
+
+    def metrics(self):
+        """
+        获取限流器指标
+
+        Returns:
+            dict: 请求数、限流次数、重试次数、重试用尽次数、累计排队时间和当前速率
+        """
+        with self.lock:
+            return dict(self.stats, rate=self.bucket.rate)
+
+
+_api_limiters = {}
+_api_limiters_lock = threading.Lock()
+
+
+def get_api_limiter(name):
+    """
+    获取指定API的进程内共享限流器，首次使用时按AWS_API_RATE_LIMITS创建
+
+    Args:
+        name (str): API名称，例如'polly'、'comprehend'、'transcribe'
+
+    Returns:
+        ApiLimiter: 限流器
+    """
+    with _api_limiters_lock:
+        limiter = _api_limiters.get(name)
+        if limiter is None:
+            limiter = _api_limiters[name] = ApiLimiter(name, AWS_API_RATE_LIMITS.get(name, 0))
+        return limiter
+
+
+def api_metrics():
+    """
+    获取所有已使用API的限流指标
+
+    Returns:
+        dict: API名称到指标的映射
+    """
+    with _api_limiters_lock:
+        limiters = list(_api_limiters.values())
+    return {limiter.name: limiter.metrics() for limiter in limiters}
+
+
+def client_config(**kwargs):
+    """
+    创建关闭botocore内置重试的客户端配置，重试统一由ApiLimiter处理，避免两层重试叠加
+
+    Args:
+        **kwargs: 传给botocore.config.Config的其他参数，例如max_pool_connections
+
+    Returns:
+        botocore.config.Config: 客户端配置
+    """
+    from botocore.config import Config
+    return Config(retries={'mode': 'standard', 'max_attempts': 0}, **kwargs)
@@ -0,0 +1,206 @@
+"""
+请求合并模块，相同键的并发调用只执行一次，其余调用方共享结果
+"""
+
+import threading
+
+
+class _Flight:
+    """一次正在进行的调用
+
+    流式调用只为正在读取的跟随方缓存音频块，所有跟随方都读过的块随即释放；
+    释放过音频块后不再接受新的跟随方，同键的新请求会重新发起调用
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.chunks = []
+        # chunks[0]的序号
+        self.base = 0
+        # 跟随方编号 -> 下一个要读取的块序号
+        self.cursors = {}
+        self.next_follower = 0
+        self.result = None
+        self.error = None
+        self.finished = False
+
+    def join(self):
+        """
+        登记一个跟随方
+
+        Returns:
+            int: 跟随方编号，已释放过音频块、无法从头读取时返回None
+        """
+        with self.condition:
+            if self.base > 0:
+                return None
+            follower = self.next_follower
+            self.next_follower += 1
+            self.cursors[follower] = 0
+            return follower
+
+    def has_followers(self):
+        """是否还有跟随方在读取"""
+        with self.condition:
+            return bool(self.cursors)
+
+    def append(self, chunk):
+        """追加一个音频块并唤醒等待的调用方，没有跟随方时直接丢弃"""
+        with self.condition:
+            self.chunks.append(chunk)
+            self._release()
+            self.condition.notify_all()
+
+    def finish(self, result=None, error=None):
+        """标记调用结束"""
+        with self.condition:
+            self.result = result
+            self.error = error
+            self.finished = True
+            self.condition.notify_all()
+
+    def wait(self):
+        """等待调用结束并返回结果"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.finished)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def iter_chunks(self, follower):
+        """
+        按顺序产出已收到和之后收到的音频块，直到调用结束；提前停止读取时注销跟随方
+
+        Args:
+            follower (int): join()返回的跟随方编号
+        """
+        try:
+            while True:
+                with self.condition:
+                    position = self.cursors[follower]
+                    self.condition.wait_for(lambda: position < self.base + len(self.chunks) or self.finished)
+                    pending = self.chunks[position - self.base:]
+                    finished = self.finished
+                    self.cursors[follower] = position + len(pending)
+                    self._release()
+                yield from pending
+                if finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+        finally:
+            with self.condition:
+                self.cursors.pop(follower, None)
+                self._release()
+
+    def _release(self):
+        """释放所有跟随方都已读过的音频块，调用方需持有condition"""
+        end = min(self.cursors.values(), default=self.base + len(self.chunks))
+        if end > self.base:
+            del self.chunks[:end - self.base]
+            self.base = end
+
+
+class SingleFlight:
+    """线程安全的请求合并器"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.stats = {'calls': 0, 'coalesced': 0}
+
+    def _join(self, key):
+        """
+        加入键对应的调用
+
+        Returns:
+            tuple: (_Flight, 跟随方编号)，发起调用的一方编号为None
+        """
+        with self.lock:
+            self.stats['calls'] += 1
+            flight = self.flights.get(key)
+            if flight is not None:
+                follower = flight.join()
+                if follower is not None:
+                    self.stats['coalesced'] += 1
+                    return flight, follower
+            flight = self.flights[key] = _Flight()
+            return flight, None
+
+    def _leave(self, key, flight):
+        """结束调用，之后的同键请求会重新发起"""
+        with self.lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+
+    def do(self, key, func, *args):
+        """
+        调用func，同一键同时只有一个调用在执行，其余调用方等待并共享其结果或异常
+
+        Returns:
+            func的返回值
+        """
+        flight, follower = self._join(key)
+        if follower is not None:
+            return flight.wait()
+        try:
+            result = func(*args)
+        except Exception as e:
+            self._leave(key, flight)
+            flight.finish(error=e)
+            raise
+        self._leave(key, flight)
+        flight.finish(result=result)
+        return result
+
+    def stream(self, key, func, *args):
+        """
+        流式版本：func返回音频块的迭代器，同键的其他调用方边收边读同一份数据
+
+        其他调用方只能在首个音频块被释放之前加入，音频块只为正在读取的调用方缓存，读完即释放；
+        发起方提前停止读取（例如播放被打断）时，如果还有其他调用方在读取，会继续读取直到它们全部结束
+
+        Yields:
+            bytes: 音频块
+        """
+        flight, follower = self._join(key)
+        if follower is not None:
+            yield from flight.iter_chunks(follower)
+            return
+
+        chunks = iter(func(*args))
+        completed = False
+        try:
+            for chunk in chunks:
+                flight.append(chunk)
+                yield chunk
+            completed = True
+            self._leave(key, flight)
+            flight.finish()
+        except Exception as e:
+            completed = True
+            self._leave(key, flight)
+            flight.finish(error=e)
+            raise
+        finally:
+            if not completed:
+                self._leave(key, flight)
+                try:
+                    while flight.has_followers():
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            break
+                        flight.append(chunk)
+                    flight.finish()
+                except Exception as e:
+                    flight.finish(error=e)
+
+    def metrics(self):
+        """
+        获取合并指标
+
+        Returns:
+            dict: 总调用数和被合并的调用数
+        """
+        with self.lock:
+            return dict(self.stats)
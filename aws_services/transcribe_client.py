@@ -4,12 +4,25 @@ AWS Transcribe客户端模块，负责与AWS Transcribe服务交互
 """
 
 import asyncio
-import queue
+import concurrent.futures
+import inspect
 import threading
 import traceback
 import time
-from config import TRANSCRIBE_REGION, LANGUAGE_OPTIONS, PREFERRED_LANGUAGE, IDENTIFY_LANGUAGE
+from config import (
+    TRANSCRIBE_REGION, LANGUAGE_OPTIONS, PREFERRED_LANGUAGE, IDENTIFY_LANGUAGE, TRANSCRIBE_PREOPEN_MAX_AGE,
+    TRANSCRIBE_QUEUE_MAXSIZE, TRANSCRIBE_QUEUE_OVERFLOW, TRANSCRIBE_PREOPEN_STREAM, TRANSCRIBE_MEDIA_ENCODING,
+    TRANSCRIBE_ENCODER_WORKERS, SAMPLE_RATE, TRANSCRIBE_PERSISTENT_STREAM, TRANSCRIBE_SEGMENT_FINAL_TIMEOUT,
+    TRANSCRIBE_READY_TIMEOUT
+)
 from logger_config import logger
+from audio_helpers.stream_encoder import StreamEncoder
+from aws_services.audio_queue import AsyncAudioQueue
+from aws_services.transcript_store import (
+    TranscriptStore, EVENT_KINDS, EVENT_PARTIAL_DELTA, EVENT_STABLE_PREFIX, EVENT_SEGMENT_FINAL
+)
+from aws_services.rate_limiter import get_api_limiter
+from telemetry.tracing import tracer, STAGE_UPSTREAM_SEND, MARK_FIRST_PARTIAL, MARK_FINAL
 
 from amazon_transcribe.client import TranscribeStreamingClient
 from amazon_transcribe.handlers import TranscriptResultStreamHandler
@@ -17,21 +30,19 @@ from amazon_transcribe.model import TranscriptEvent
 
 
 class TranscribeHandler(TranscriptResultStreamHandler):
-    """处理Transcribe转录结果的处理器"""
+    """处理Transcribe转录结果的处理器，把每个结果写入TranscriptStore"""
     
-    def __init__(self, output_stream, callback=None):
+    def __init__(self, output_stream, store):
         """
         初始化处理器
         
         Args:
             output_stream: Transcribe输出流
-            callback: 接收转录结果的回调函数
+            store (TranscriptStore): 本次对话的转录结果存储，由它向订阅者发布增量事件
         """
         super().__init__(output_stream)
-        self.transcript_result = ""
+        self.store = store
         self.identified_language = None
-        self.is_final = False
-        self.callback = callback
         self.start_time = None
         self.first_response_time = None
     
@@ -39,7 +50,7 @@ class TranscribeHandler(TranscriptResultStreamHandler):
         """处理转录事件"""
         # 记录第一次响应的时间
         if self.first_response_time is None:
-            self.first_response_time = time.time()
+            self.first_response_time = time.perf_counter()
             response_delay = self.first_response_time - self.start_time
             logger.info(f"Transcribe首次响应延迟: {response_delay:.3f}秒")
         
@@ -55,192 +66,595 @@ class TranscribeHandler(TranscriptResultStreamHandler):
                     self.identified_language = top_language.language_code
                     logger.info(f"识别到的语言: {self.identified_language}")
             
-            # 获取转录文本
-            for alt in result.alternatives:
-                transcript = alt.transcript
-                
-                # 检查是否是最终结果
-                if not result.is_partial:
-                    self.transcript_result = transcript
-                    self.is_final = True
-                    final_time = time.time()
-                    total_time = final_time - self.start_time
-                    logger.info(f"最终转录结果: {transcript}")
-                    logger.info(f"Transcribe总处理时间: {total_time:.3f}秒")
-                    
-                    # 调用回调函数
-                    if self.callback:
-                        self.callback(transcript, self.identified_language)
-                else:
-                    logger.debug(f"部分转录结果: {transcript}")
+            if not result.alternatives:
+                continue
+            store = self.route(result)
+            if store is None:
+                continue
+            # 备选结果按可信度从高到低排列，只使用第一个
+            alt = result.alternatives[0]
+            transcript = alt.transcript
+            
+            # 检查是否是最终结果
+            if not result.is_partial:
+                total_time = time.perf_counter() - self.start_time
+                logger.info(f"最终结果片段: {transcript}（{total_time:.3f}秒）")
+                store.add_final(result.result_id, transcript, self.identified_language)
+            else:
+                logger.debug(f"部分转录结果: {transcript}", extra={'log_class': 'transcribe_partial'})
+                if transcript:
+                    tracer.mark(MARK_FIRST_PARTIAL)
+                store.update_partial(result.result_id, transcript, alt.items or [], self.identified_language)
+    
+    def route(self, result):
+        """
+        确定一个结果写入哪个TranscriptStore
+        
+        Args:
+            result: Transcribe返回的结果
+        
+        Returns:
+            TranscriptStore: 写入的存储，返回None时丢弃该结果
+        """
+        return self.store
 
 
-class TranscribeClient:
-    """AWS Transcribe客户端类"""
+def log_encoder_metrics(metrics):
+    """输出一次会话的上行编码指标"""
+    logger.info(f"上行编码 {metrics['encoding']}: {metrics['input_bytes'] / 1024:.0f} KB -> "
+                f"{metrics['output_bytes'] / 1024:.0f} KB，压缩比 {metrics['compression_ratio']:.1f}，"
+                f"编码CPU {metrics['cpu_seconds'] * 1000:.1f}ms（音频时长的 {metrics['cpu_ratio'] * 100:.1f}%）")
+
+
+_encoder_executor = None
+_encoder_executor_lock = threading.Lock()
+
+
+def _get_encoder_executor():
+    """获取所有会话共享的上行编码线程池，首次使用时创建"""
+    global _encoder_executor
+    with _encoder_executor_lock:
+        if _encoder_executor is None:
+            _encoder_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=TRANSCRIBE_ENCODER_WORKERS, thread_name_prefix='upstream-encoder')
+        return _encoder_executor
+
+
+class TranscriptionSession:
+    """一次转录会话：音频队列、转录流和转录结果
     
-    def __init__(self):
-        """初始化Transcribe客户端"""
-        self.client = None
+    run协程可以在任意事件循环中执行：单用户模式下运行在TranscribeClient的工作线程中，
+    服务器模式下直接运行在服务器的事件循环中
+    """
+    
+    def __init__(self, loop, stable_callback=None, partial_callback=None, final_callback=None,
+                 maxsize=TRANSCRIBE_QUEUE_MAXSIZE, overflow=TRANSCRIBE_QUEUE_OVERFLOW,
+                 media_encoding=TRANSCRIBE_MEDIA_ENCODING):
+        """
+        初始化会话
+        
+        Args:
+            loop: 运行转录的事件循环
+            stable_callback: 接收部分结果中已稳定前缀的回调函数，参数为(稳定文本, 语言)
+            partial_callback: 接收部分转录结果的回调函数，参数为(文本, 语言)
+            final_callback: 接收每个最终结果片段的回调函数，参数为(文本, 语言)
+            maxsize (int): 音频队列最多缓存的音频块数量
+            overflow (str): 跨线程投递时队列满的处理策略
+            media_encoding (str): 上行编码，必须与打开转录流时的media_encoding一致
+        """
+        self.audio_queue = AsyncAudioQueue(loop, maxsize, overflow)
+        # PCM直接发送；FLAC和Ogg-Opus在共享线程池中编码，不占用事件循环
+        self.encoder = StreamEncoder(media_encoding) if media_encoding != 'pcm' else None
+        # 转录结果和增量事件，回调以订阅者的形式接入
+        self.store = TranscriptStore()
+        if stable_callback:
+            self.store.subscribe(lambda update: stable_callback(update.text, update.language), (EVENT_STABLE_PREFIX,))
+        if partial_callback:
+            self.store.subscribe(lambda update: partial_callback(update.text, update.language), (EVENT_PARTIAL_DELTA,))
+        if final_callback:
+            self.store.subscribe(lambda update: final_callback(update.text, update.language), (EVENT_SEGMENT_FINAL,))
         self.stream = None
         self.handler = None
-        self.audio_queue = None
-        self.stream_thread = None
-        self.stop_thread = False
-        self.transcript_result = ""
-        self.identified_language = None
-        self.start_time = None
+        self.start_time = time.perf_counter()
+    
+    @property
+    def transcript_result(self):
+        """目前为止所有最终片段拼接的文本"""
+        return self.store.text
+    
+    @property
+    def identified_language(self):
+        """目前识别到的语言"""
+        return self.store.language
     
-    async def _mic_stream(self):
+    def subscribe(self, callback, kinds=EVENT_KINDS):
         """
-        从音频队列中获取音频数据
+        订阅本次会话的转录增量事件，回调在运行转录的事件循环线程中调用
         
-        Yields:
-            tuple: (音频数据, 状态)
+        Args:
+            callback: 接收TranscriptUpdate的函数，不应阻塞
+            kinds (tuple): 关心的事件类型，见transcript_store中的EVENT_*
         """
-        loop = asyncio.get_event_loop()
+        return self.store.subscribe(callback, kinds)
+    
+    def send_audio_chunk(self, audio_chunk):
+        """
+        从其他线程投递音频块
         
-        while not self.stop_thread:
-            try:
-                if not self.audio_queue.empty():
-                    audio_chunk = self.audio_queue.get()
-                    if audio_chunk:
-                        yield audio_chunk, None
-                    self.audio_queue.task_done()
-                else:
-                    await asyncio.sleep(0.01)
-            except Exception as e:
-                logger.error(f"从音频队列获取数据时出错: {e}")
-                break
+        Returns:
+            bool: 是否成功投递
+        """
+        return self.audio_queue.put_threadsafe(audio_chunk)
+    
+    async def put(self, audio_chunk):
+        """
+        在事件循环线程内投递音频块，队列满时等待
+        
+        Returns:
+            bool: 是否成功投递
+        """
+        return await self.audio_queue.put(audio_chunk)
+    
+    def close_threadsafe(self):
+        """从其他线程结束音频输入"""
+        self.audio_queue.close_threadsafe()
+    
+    def close(self):
+        """在事件循环线程内结束音频输入"""
+        self.audio_queue.close()
+    
+    def metrics(self):
+        """
+        获取音频队列指标
+        
+        Returns:
+            dict: 队列深度和丢弃音频块数量等指标，使用压缩编码时包含encoder编码指标
+        """
+        metrics = self.audio_queue.metrics()
+        if self.encoder is not None:
+            metrics['encoder'] = self.encoder.metrics()
+        return metrics
+    
+    async def run(self, stream):
+        """
+        在已打开的转录流上发送音频并接收结果，直到音频输入结束且结果接收完毕
+        
+        Args:
+            stream: 转录流
+        
+        Returns:
+            tuple: (转录文本, 语言代码)
+        """
+        self.stream = stream
+        self.handler = TranscribeHandler(stream.output_stream, self.store)
+        self.handler.start_time = self.start_time
+        
+        # 运行转录和处理
+        await asyncio.gather(self._write_chunks(), self.handler.handle_events())
+        
+        # 结果流结束后所有片段都已是最终结果
+        transcript = self.store.finish()
+        final_time = time.perf_counter()
+        tracer.mark(MARK_FINAL, final_time)
+        logger.info(f"最终转录结果（{len(self.store.segments)} 个片段）: {transcript}")
+        logger.info(f"Transcribe总处理时间: {final_time - self.start_time:.3f}秒")
+        return transcript, self.identified_language
     
     async def _write_chunks(self):
-        """将音频块发送到Transcribe流"""
+        """将音频块发送到Transcribe流，队列为空时挂起等待而不是轮询"""
+        first_send_time = None
+        loop = asyncio.get_running_loop()
         try:
-            async for chunk, status in self._mic_stream():
+            async for chunk in self.audio_queue:
+                if first_send_time is None:
+                    first_send_time = time.perf_counter()
+                if self.encoder is not None:
+                    # 同一会话的编码按顺序进行，不同会话在线程池中并行
+                    chunk = await loop.run_in_executor(_get_encoder_executor(), self.encoder.encode, chunk)
+                    if not chunk:
+                        continue
                 await self.stream.input_stream.send_audio_event(audio_chunk=chunk)
             
+            if self.encoder is not None:
+                tail = await loop.run_in_executor(_get_encoder_executor(), self.encoder.close)
+                if tail:
+                    await self.stream.input_stream.send_audio_event(audio_chunk=tail)
+            
             # 结束流
             await self.stream.input_stream.end_stream()
+            if first_send_time is not None:
+                tracer.add_span(STAGE_UPSTREAM_SEND, first_send_time, time.perf_counter())
         except Exception as e:
             logger.error(f"发送音频数据时出错: {e}")
             traceback.print_exc()
+
+
+class TranscribeClient:
+    """AWS Transcribe客户端类
     
-    async def _run_transcription(self):
-        """运行转录流程"""
-        try:
-            # 记录开始时间
-            self.start_time = time.time()
-            logger.info("开始Transcribe转录流程")
-            
-            # 创建客户端
-            self.client = TranscribeStreamingClient(region=TRANSCRIBE_REGION)
-            
-            # 启动转录流
-            # 根据最新的SDK版本调整参数
-            params = {
-                "language_code": PREFERRED_LANGUAGE,  # 默认使用中文
-                "media_sample_rate_hz": 16000,
-                "media_encoding": "pcm",
-            }
-            
-            # 添加可选参数
-            if hasattr(self.client, 'start_stream_transcription') and callable(getattr(self.client, 'start_stream_transcription')):
-                # 检查方法签名以确定支持的参数
-                import inspect
-                sig = inspect.signature(self.client.start_stream_transcription)
-                param_names = [param for param in sig.parameters]
-                
-                # 添加稳定性参数（如果支持）
-                if 'enable_partial_results_stabilization' in param_names:
-                    params["enable_partial_results_stabilization"] = True
-                if 'partial_results_stability' in param_names:
-                    params["partial_results_stability"] = "low"
-                
-                # 添加语言识别参数（如果支持）
-                if IDENTIFY_LANGUAGE:
-                    if 'identify_language' in param_names:
-                        params["identify_language"] = True
-                        if 'language_options' in param_names:
-                            params["language_options"] = LANGUAGE_OPTIONS
-                    elif 'preferred_language' in param_names:
-                        params["preferred_language"] = PREFERRED_LANGUAGE
-                        if 'language_options' in param_names:
-                            params["language_options"] = LANGUAGE_OPTIONS
-                        if 'show_language_identification' in param_names:
-                            params["show_language_identification"] = True
-            
-            logger.debug(f"使用以下参数启动转录: {params}")
+    内部维护一个常驻的转录工作线程：事件循环、TranscribeStreamingClient和
+    转录参数只在首次使用时创建一次，之后每次对话复用。
+    服务器模式下可通过bind_loop绑定到服务器的事件循环，由多个会话共享
+    """
+    
+    def __init__(self, client_factory=TranscribeStreamingClient, media_encoding=TRANSCRIBE_MEDIA_ENCODING,
+                 persistent=TRANSCRIBE_PERSISTENT_STREAM):
+        """
+        初始化Transcribe客户端
+        
+        Args:
+            client_factory: 创建流式转录客户端的工厂，参数为region，基准测试中可替换为本地实现
+            media_encoding (str): 上行编码：'pcm'、'flac'或'ogg-opus'，
+                在此客户端上运行的TranscriptionSession必须使用相同的编码
+            persistent (bool): 多次说话共用一个常驻的转录流，见persistent_stream模块
+        """
+        self.client_factory = client_factory
+        self.media_encoding = media_encoding
+        self.persistent = persistent
+        self.persistent_stream = None
+        self.client = None
+        self.stable_callback = None
+        # 对每次会话都生效的转录事件订阅：(回调, 事件类型)
+        self.subscriptions = []
+        self.session = None
+        self.loop = None
+        self.bound_loop = False
+        self.stream_thread = None
+        self.stream_params = None
+        self.session_future = None
+        self.preopened = None
+        self.preopened_time = None
+    
+    def _resolve_stream_params(self):
+        """
+        根据SDK方法签名确定转录参数，只在工作线程启动时执行一次
+        
+        Returns:
+            dict: start_stream_transcription的参数
+        """
+        # 根据最新的SDK版本调整参数
+        params = {
+            "language_code": PREFERRED_LANGUAGE,  # 默认使用中文
+            "media_sample_rate_hz": SAMPLE_RATE,
+            "media_encoding": self.media_encoding,
+        }
+        
+        # 添加可选参数
+        if hasattr(self.client, 'start_stream_transcription') and callable(getattr(self.client, 'start_stream_transcription')):
+            # 检查方法签名以确定支持的参数
+            sig = inspect.signature(self.client.start_stream_transcription)
+            param_names = [param for param in sig.parameters]
             
-            # 记录API调用开始时间
-            api_start_time = time.time()
-            self.stream = await self.client.start_stream_transcription(**params)
-            api_end_time = time.time()
+            # 添加稳定性参数（如果支持）
+            if 'enable_partial_results_stabilization' in param_names:
+                params["enable_partial_results_stabilization"] = True
+            if 'partial_results_stability' in param_names:
+                params["partial_results_stability"] = "low"
             
-            # 记录API调用延迟
-            api_delay = api_end_time - api_start_time
-            logger.info(f"Transcribe API调用延迟: {api_delay:.3f}秒")
+            # 添加语言识别参数（如果支持）
+            if IDENTIFY_LANGUAGE:
+                if 'identify_language' in param_names:
+                    params["identify_language"] = True
+                    if 'language_options' in param_names:
+                        params["language_options"] = LANGUAGE_OPTIONS
+                elif 'preferred_language' in param_names:
+                    params["preferred_language"] = PREFERRED_LANGUAGE
+                    if 'language_options' in param_names:
+                        params["language_options"] = LANGUAGE_OPTIONS
+                    if 'show_language_identification' in param_names:
+                        params["show_language_identification"] = True
+        
+        logger.debug(f"使用以下参数启动转录: {params}")
+        return params
+    
+    async def _open_stream(self):
+        """打开一个新的转录流并记录握手延迟，经过共享限流器，遇到限流错误时退避重试"""
+        api_start_time = time.perf_counter()
+        stream = await get_api_limiter('transcribe').call_async(
+            self.client.start_stream_transcription, **self.stream_params)
+        api_delay = time.perf_counter() - api_start_time
+        logger.info(f"Transcribe API调用延迟: {api_delay:.3f}秒")
+        return stream
+    
+    async def _take_preopened_stream(self):
+        """
+        取出预先打开的转录流
+        
+        Returns:
+            转录流，没有可用的预开流时返回None
+        """
+        task, opened_time = self.preopened, self.preopened_time
+        self.preopened = None
+        self.preopened_time = None
+        if task is None:
+            return None
+        
+        # 预开流长时间没有音频会被服务端关闭，过期的直接丢弃
+        if time.perf_counter() - opened_time > TRANSCRIBE_PREOPEN_MAX_AGE:
+            logger.info("预开的转录流已过期，重新打开")
+            task.add_done_callback(self._discard_stream)
+            return None
+        
+        try:
+            stream = await task
+            logger.info("使用预开的转录流")
+            return stream
+        except Exception as e:
+            logger.warning(f"预开转录流失败，重新打开: {e}")
+            return None
+    
+    def _discard_stream(self, task):
+        """关闭不再使用的预开流"""
+        if task.cancelled() or task.exception() is not None:
+            return
+        asyncio.ensure_future(task.result().input_stream.end_stream())
+    
+    async def run_session(self, session):
+        """
+        运行一次转录会话，必须在self.loop中执行
+        
+        Args:
+            session (TranscriptionSession): 转录会话
+        
+        Returns:
+            tuple: (转录文本, 语言代码)，出错时为已收到的结果
+        """
+        try:
+            logger.info("开始Transcribe转录流程")
             
-            # 创建处理器
-            self.handler = TranscribeHandler(
-                self.stream.output_stream,
-                callback=self._on_transcription_result
-            )
-            self.handler.start_time = self.start_time
+            # 优先使用预开流，把握手延迟移出关键路径
+            stream = await self._take_preopened_stream()
+            if stream is None:
+                stream = await self._open_stream()
             
-            # 运行转录和处理
-            await asyncio.gather(self._write_chunks(), self.handler.handle_events())
+            return await session.run(stream)
         except Exception as e:
             logger.error(f"运行转录时出错: {e}")
             traceback.print_exc()
-    
-    def _on_transcription_result(self, transcript, language):
-        """转录结果回调"""
-        self.transcript_result = transcript
-        self.identified_language = language
+            return session.transcript_result, session.identified_language
     
     def _transcription_thread(self):
-        """转录线程函数"""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        """转录工作线程函数，事件循环常驻直到shutdown"""
+        asyncio.set_event_loop(self.loop)
         
         try:
-            loop.run_until_complete(self._run_transcription())
+            self.loop.run_forever()
         except Exception as e:
             logger.error(f"转录线程出错: {e}")
             traceback.print_exc()
         finally:
-            loop.close()
+            self.loop.close()
     
-    def start_streaming(self):
-        """开始流式转录"""
-        # 重置状态
-        self.transcript_result = ""
-        self.identified_language = None
-        self.stop_thread = False
-        self.audio_queue = queue.Queue()
+    def _ensure_worker(self):
+        """启动常驻的转录工作线程，并在其中创建客户端、确定转录参数"""
+        if self.bound_loop or (self.stream_thread and self.stream_thread.is_alive()):
+            return
         
-        # 启动转录线程
-        self.stream_thread = threading.Thread(target=self._transcription_thread)
+        self.loop = asyncio.new_event_loop()
+        self.stream_thread = threading.Thread(target=self._transcription_thread, name='transcribe-worker')
         self.stream_thread.daemon = True
         self.stream_thread.start()
         
+        async def setup():
+            self.client = self.client_factory(region=TRANSCRIBE_REGION)
+            self.stream_params = self._resolve_stream_params()
+        
+        try:
+            asyncio.run_coroutine_threadsafe(setup(), self.loop).result()
+        except Exception:
+            self.shutdown()
+            raise
+        logger.info("转录工作线程已启动")
+    
+    def bind_loop(self, loop):
+        """
+        改为在已有的事件循环中运行转录（服务器模式），不再启动独立的工作线程
+        
+        必须在该事件循环的线程中调用
+        
+        Args:
+            loop: 服务器的事件循环
+        """
+        self.loop = loop
+        self.bound_loop = True
+        self.client = self.client_factory(region=TRANSCRIBE_REGION)
+        self.stream_params = self._resolve_stream_params()
+        logger.info("转录客户端已绑定到服务器事件循环")
+    
+    def preopen_stream(self):
+        """
+        预先打开下一次对话使用的转录流，通常在播放回复时调用；长连接模式下流一直打开，无需预开
+        """
+        if self.persistent:
+            return
+        self._ensure_worker()
+        
+        def schedule():
+            if self.preopened is None:
+                self.preopened = asyncio.ensure_future(self._open_stream())
+                self.preopened_time = time.perf_counter()
+        
+        self.loop.call_soon_threadsafe(schedule)
+    
+    def prewarm(self, timeout=TRANSCRIBE_READY_TIMEOUT):
+        """
+        预热：启动工作线程并创建客户端；启用预开流时再预先打开一个转录流，
+        提前完成凭证解析和TLS握手，等待其完成后返回；长连接模式下等待常驻流打开
+        
+        Args:
+            timeout (float): 等待流打开的最长时间（秒）
+        
+        Raises:
+            TimeoutError: 超时仍未打开流，流在后台继续打开
+            Exception: 长连接打开流失败时抛出最近一次的错误，常驻流在后台继续重试
+        """
+        self._ensure_worker()
+        if self.persistent:
+            self._wait_on_loop(self._ensure_persistent().wait_ready(), timeout)
+            return
+        if not TRANSCRIBE_PREOPEN_STREAM:
+            return
+        self.preopen_stream()
+        
+        async def wait_preopened():
+            if self.preopened is not None:
+                await asyncio.wait([self.preopened])
+        
+        self._wait_on_loop(wait_preopened(), timeout)
+    
+    def _wait_on_loop(self, coro, timeout):
+        """
+        在工作线程的事件循环中运行协程并等待其结束
+        
+        Args:
+            coro: 协程
+            timeout (float): 最长等待时间（秒）
+        
+        Raises:
+            TimeoutError: 超时，协程被取消
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"等待转录流打开超过 {timeout} 秒") from None
+    
+    def _ensure_persistent(self):
+        """
+        创建常驻的转录流，必须在启动工作线程之后调用
+        
+        Returns:
+            PersistentTranscription: 长连接
+        """
+        if self.persistent_stream is None:
+            # 延迟导入：persistent_stream依赖本模块中的TranscribeHandler
+            from aws_services.persistent_stream import PersistentTranscription
+            self.persistent_stream = PersistentTranscription(self._open_stream, self.loop, self.media_encoding)
+        return self.persistent_stream
+    
+    def start_streaming(self):
+        """开始流式转录"""
+        self._ensure_worker()
+        
+        if self.persistent:
+            persistent_stream = self._ensure_persistent()
+            self.session = asyncio.run_coroutine_threadsafe(
+                persistent_stream.begin_utterance(self.stable_callback, self.subscriptions), self.loop).result()
+            logger.info("开始录音，使用常驻转录流")
+            return
+        
+        self.session = TranscriptionSession(self.loop, stable_callback=self.stable_callback,
+                                            media_encoding=self.media_encoding)
+        for callback, kinds in self.subscriptions:
+            self.session.subscribe(callback, kinds)
+        
+        # 在常驻事件循环中启动本次转录
+        self.session_future = asyncio.run_coroutine_threadsafe(self.run_session(self.session), self.loop)
+        
         logger.info("开始录音和转录")
     
+    def subscribe(self, callback, kinds=EVENT_KINDS):
+        """
+        订阅之后每次会话的转录增量事件，回调在转录工作线程中调用
+        
+        Args:
+            callback: 接收TranscriptUpdate的函数，不应阻塞
+            kinds (tuple): 关心的事件类型，见transcript_store中的EVENT_*
+        """
+        self.subscriptions.append((callback, kinds))
+    
     def send_audio_chunk(self, audio_chunk):
         """发送音频块到Transcribe服务"""
-        if not self.stream_thread or not self.stream_thread.is_alive() or not self.audio_queue:
+        if self.persistent:
+            return self.session is not None and self.persistent_stream.send_audio_chunk(audio_chunk)
+        if not self.session_future or self.session_future.done() or not self.session:
             return False
         
-        # 将音频块放入队列
-        self.audio_queue.put(audio_chunk)
-        return True
+        # 将音频块投递到事件循环中的队列
+        return self.session.send_audio_chunk(audio_chunk)
+    
+    def get_queue_metrics(self):
+        """
+        获取音频队列指标
+        
+        Returns:
+            dict: 队列深度和丢弃音频块数量等指标，未开始转录时返回空字典
+        """
+        if self.persistent_stream is not None:
+            return self.persistent_stream.metrics()
+        if not self.session:
+            return {}
+        return self.session.metrics()
     
     def stop_streaming(self):
         """停止流式转录"""
         logger.info("停止转录")
-        self.stop_thread = True
+        if not self.session:
+            return "", None
+        if self.persistent:
+            return self._end_utterance()
+        self.session.close_threadsafe()
         
-        # 等待转录线程结束
+        # 等待本次转录结束
+        if self.session_future and not self.session_future.done():
+            try:
+                self.session_future.result(timeout=5)
+            except concurrent.futures.TimeoutError:
+                logger.warning("等待转录结束超时")
+                self.session_future.cancel()
+        
+        metrics = self.get_queue_metrics()
+        logger.info(f"音频队列指标: 最大深度 {metrics['max_depth']}, 入队 {metrics['enqueued']}, "
+                    f"丢弃 {metrics['dropped']}, 合并 {metrics['coalesced']}")
+        if 'encoder' in metrics:
+            log_encoder_metrics(metrics['encoder'])
+        
+        return self.session.transcript_result, self.session.identified_language
+    
+    def _end_utterance(self):
+        """
+        长连接模式下结束本次说话，流保持打开
+        
+        Returns:
+            tuple: (转录文本, 语言代码)，超时时为已收到的结果
+        """
+        utterance = self.session
+        future = asyncio.run_coroutine_threadsafe(self.persistent_stream.end_utterance(utterance), self.loop)
+        try:
+            result = future.result(timeout=TRANSCRIBE_SEGMENT_FINAL_TIMEOUT + 3)
+        except concurrent.futures.TimeoutError:
+            logger.warning("等待转录结束超时")
+            future.cancel()
+            result = utterance.transcript_result, utterance.identified_language
+        
+        metrics = self.get_queue_metrics()
+        logger.info(f"音频队列指标: 最大深度 {metrics['max_depth']}, 入队 {metrics['enqueued']}, "
+                    f"丢弃 {metrics['dropped']}, 合并 {metrics['coalesced']}")
+        logger.info(f"常驻转录流: 已打开 {metrics['streams_opened']} 个流, 切换 {metrics['rollovers']} 次, "
+                    f"重连 {metrics['reconnects']} 次, 当前流已使用 {metrics['stream_age']:.0f} 秒")
+        if 'encoder' in metrics:
+            log_encoder_metrics(metrics['encoder'])
+        return result
+    
+    def shutdown(self):
+        """停止常驻的转录工作线程"""
         if self.stream_thread and self.stream_thread.is_alive():
+            if self.persistent_stream is not None:
+                try:
+                    asyncio.run_coroutine_threadsafe(self.persistent_stream.close(), self.loop).result(timeout=10)
+                except Exception as e:
+                    logger.warning(f"关闭常驻转录流时出错: {e}")
+                self.persistent_stream = None
+            
+            def stop():
+                # 取消尚未使用的预开流，避免事件循环停止时任务仍处于挂起状态
+                if self.preopened is not None:
+                    self.preopened.cancel()
+                    self.preopened = None
+                # 在下一轮迭代停止，让被取消的任务先完成
+                self.loop.call_soon(self.loop.stop)
+            
+            self.loop.call_soon_threadsafe(stop)
             self.stream_thread.join(timeout=5)
-        
-        return self.transcript_result, self.identified_language
+        self.stream_thread = None
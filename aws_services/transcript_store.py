@@ -0,0 +1,225 @@
+"""
+增量转录结果存储模块
+一次对话中Transcribe可能返回多个最终结果片段（每段一个result_id），本模块负责：
+- 以O(1)追加最终片段，整句文本只在需要时拼接一次
+- 按result_id跟踪部分结果及其已稳定的前缀，稳定词条只扫描新增的部分
+- 向订阅者发布带类型的增量事件：部分结果变化、稳定前缀增长、片段最终、整句最终
+"""
+
+from logger_config import logger
+
+EVENT_PARTIAL_DELTA = 'partial_delta'  # 部分结果变化，delta为新的尾部，replaced为被替换掉的旧尾部字符数
+EVENT_STABLE_PREFIX = 'stable_prefix'  # 部分结果的稳定前缀增长，delta为新稳定的文本
+EVENT_SEGMENT_FINAL = 'segment_final'  # 一个片段得到最终结果
+EVENT_UTTERANCE_FINAL = 'utterance_final'  # 整次对话的转录结束，text为全部片段拼接的文本
+
+EVENT_KINDS = (EVENT_PARTIAL_DELTA, EVENT_STABLE_PREFIX, EVENT_SEGMENT_FINAL, EVENT_UTTERANCE_FINAL)
+
+
+class TranscriptUpdate:
+    """一条转录增量事件"""
+
+    __slots__ = ('kind', 'result_id', 'text', 'delta', 'replaced', 'language', 'segment_index')
+
+    def __init__(self, kind, result_id, text, delta, language, replaced=0, segment_index=None):
+        """
+        Args:
+            kind (str): 事件类型，EVENT_*之一
+            result_id (str): Transcribe结果编号，整句最终事件为None
+            text (str): 事件对应的完整文本：部分结果、稳定前缀、片段文本或整句文本
+            delta (str): 相对上一次同类事件新增的文本
+            language (str): 语言代码
+            replaced (int): 部分结果中被改写的旧尾部字符数，界面可先删除再追加delta
+            segment_index (int, optional): 最终片段在本次对话中的序号
+        """
+        self.kind = kind
+        self.result_id = result_id
+        self.text = text
+        self.delta = delta
+        self.replaced = replaced
+        self.language = language
+        self.segment_index = segment_index
+
+    def __repr__(self):
+        return f"TranscriptUpdate({self.kind}, {self.result_id}, {self.text!r}, delta={self.delta!r})"
+
+
+def _is_cjk(char):
+    """检查字符是否为中日韩字符"""
+    return ord(char) >= 0x2E80
+
+
+def _separator(left, right):
+    """拼接两段文本时使用的分隔符：中日韩字符之间不加空格"""
+    if not left or not right or (_is_cjk(left[-1]) and _is_cjk(right[0])):
+        return ""
+    return " "
+
+
+def append_item(text, item):
+    """
+    把一个词条追加到文本末尾
+
+    Args:
+        text (str): 已有文本
+        item: Transcribe返回的词条
+
+    Returns:
+        str: 追加后的文本
+    """
+    content = item.content
+    # 标点直接附在前一个词后；中日韩字符之间不加空格
+    if text and item.item_type != 'punctuation' and not (_is_cjk(text[-1]) and _is_cjk(content[0])):
+        text += " "
+    return text + content
+
+
+def join_stable_items(items):
+    """
+    拼接部分结果中从开头起连续稳定的词条
+
+    Args:
+        items (list): Transcribe返回的词条列表
+
+    Returns:
+        str: 稳定前缀文本
+    """
+    text = ""
+    for item in items:
+        if not item.stable or not item.content:
+            break
+        text = append_item(text, item)
+    return text
+
+
+class _OpenResult:
+    """尚未得到最终结果的片段"""
+
+    __slots__ = ('partial', 'stable', 'stable_count')
+
+    def __init__(self):
+        self.partial = ""
+        self.stable = ""
+        # 已计入stable的词条数量，稳定的词条不会再变化，下次从这里继续扫描
+        self.stable_count = 0
+
+
+class TranscriptStore:
+    """一次对话的转录结果，在事件循环线程中更新，订阅者在同一线程中同步收到事件"""
+
+    def __init__(self):
+        self.segments = []
+        self.open_results = {}
+        self.language = None
+        self.subscribers = []
+        self.finished = False
+        self._text = ""
+        self._joined_count = 0
+
+    def subscribe(self, callback, kinds=EVENT_KINDS):
+        """
+        订阅转录事件
+
+        Args:
+            callback: 接收TranscriptUpdate的函数，不应阻塞
+            kinds (tuple): 关心的事件类型
+
+        Returns:
+            订阅句柄，可传给unsubscribe
+        """
+        subscription = (callback, frozenset(kinds))
+        self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """取消订阅"""
+        if subscription in self.subscribers:
+            self.subscribers.remove(subscription)
+
+    def update_partial(self, result_id, transcript, items, language):
+        """
+        记录一个部分结果
+
+        Args:
+            result_id (str): 结果编号
+            transcript (str): 部分结果文本
+            items (list): 词条列表，用于计算稳定前缀
+            language (str): 当前识别到的语言
+        """
+        self.language = language or self.language
+        state = self.open_results.get(result_id)
+        if state is None:
+            state = self.open_results[result_id] = _OpenResult()
+
+        if transcript != state.partial:
+            previous = state.partial
+            if transcript.startswith(previous):
+                common = len(previous)
+            else:
+                common = 0
+                limit = min(len(previous), len(transcript))
+                while common < limit and previous[common] == transcript[common]:
+                    common += 1
+            state.partial = transcript
+            self._publish(TranscriptUpdate(EVENT_PARTIAL_DELTA, result_id, transcript, transcript[common:],
+                                           self.language, replaced=len(previous) - common))
+
+        previous_stable = state.stable
+        for item in items[state.stable_count:]:
+            if not item.stable or not item.content:
+                break
+            state.stable = append_item(state.stable, item)
+            state.stable_count += 1
+        if state.stable != previous_stable:
+            self._publish(TranscriptUpdate(EVENT_STABLE_PREFIX, result_id, state.stable,
+                                           state.stable[len(previous_stable):], self.language))
+
+    def add_final(self, result_id, transcript, language):
+        """
+        记录一个片段的最终结果
+
+        Args:
+            result_id (str): 结果编号
+            transcript (str): 最终文本
+            language (str): 当前识别到的语言
+        """
+        self.language = language or self.language
+        self.open_results.pop(result_id, None)
+        if not transcript:
+            return
+        self.segments.append(transcript)
+        self._publish(TranscriptUpdate(EVENT_SEGMENT_FINAL, result_id, transcript, transcript, self.language,
+                                       segment_index=len(self.segments) - 1))
+
+    def finish(self):
+        """
+        结束本次对话，未得到最终结果的片段被丢弃
+
+        Returns:
+            str: 全部最终片段拼接的文本
+        """
+        if self.finished:
+            return self.text
+        self.finished = True
+        self.open_results.clear()
+        text = self.text
+        self._publish(TranscriptUpdate(EVENT_UTTERANCE_FINAL, None, text, text, self.language,
+                                       segment_index=len(self.segments) - 1 if self.segments else None))
+        return text
+
+    @property
+    def text(self):
+        """全部最终片段拼接的文本，只拼接上次读取之后新增的片段"""
+        for segment in self.segments[self._joined_count:]:
+            self._text += _separator(self._text, segment) + segment
+        self._joined_count = len(self.segments)
+        return self._text
+
+    def _publish(self, update):
+        """把事件同步分发给订阅者，单个订阅者出错不影响其他订阅者"""
+        for callback, kinds in self.subscribers:
+            if update.kind in kinds:
+                try:
+                    callback(update)
+                except Exception as e:
+                    logger.error(f"处理转录事件 {update.kind} 时出错: {e}")
@@ -0,0 +1,274 @@
+"""
+批处理程序，离线转录目录中的WAV/FLAC文件并重新合成语音
+- 文件以快于实时的速度流式发送到Transcribe，多个文件并发处理，并发数有上限
+- 转录流的打开和Polly请求经过进程内共享的限流器（见AWS_API_RATE_LIMITS），遇到限流时退避重试
+- 每个文件输出转录文本和合成的WAV，完成后记入清单，重新运行时跳过已完成且未修改的文件
+
+运行方式:
+    python batch_processor.py <输入目录> <输出目录> [--concurrency 4] [--speed 4] [--no-synthesis] [--force]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import traceback
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    SAMPLE_RATE, POLLY_PCM_SAMPLE_RATE, BATCH_CONCURRENCY, BATCH_STREAM_SPEED, BATCH_CHUNK_MS,
+    BATCH_TRANSCRIBE_TIMEOUT, BATCH_MANIFEST_NAME
+)
+from logger_config import logger
+from audio_helpers.pcm_convert import to_pcm16_mono
+from aws_services.polly_client import PollyClient, log_aws_metrics
+from aws_services.transcribe_client import TranscribeClient, TranscriptionSession
+from text_helpers.segmenter import split_sentences
+
+AUDIO_EXTENSIONS = ('.wav', '.flac')
+
+
+def find_audio_files(input_dir):
+    """
+    递归查找目录中的音频文件
+
+    Returns:
+        list: 相对于输入目录的路径，按名称排序
+    """
+    files = []
+    for root, _, names in os.walk(input_dir):
+        for name in names:
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                files.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return sorted(files)
+
+
+def load_audio(path):
+    """
+    读取音频文件并转换为16位单声道PCM
+
+    Returns:
+        bytes: 采样率为SAMPLE_RATE的PCM
+    """
+    import soundfile as sf
+    samples, sample_rate = sf.read(path, dtype='float32', always_2d=True)
+    return to_pcm16_mono(samples, sample_rate)
+
+
+class Manifest:
+    """记录已完成文件的清单，每个文件一行JSON，只追加写入"""
+
+    def __init__(self, path):
+        """
+        初始化清单并读取已有记录
+
+        Args:
+            path (str): 清单文件路径
+        """
+        self.path = path
+        self.entries = {}
+        # 上次运行中断时最后一行可能不完整，追加前先换行，避免新记录接在残缺的行后面
+        self.needs_newline = False
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    self.needs_newline = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.entries[entry['file']] = entry
+
+    def is_done(self, relpath, stat):
+        """检查文件是否已成功处理且之后未被修改"""
+        entry = self.entries.get(relpath)
+        return (entry is not None and entry.get('status') == 'ok'
+                and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime)
+
+    def record(self, entry):
+        """追加一条记录"""
+        self.entries[entry['file']] = entry
+        with open(self.path, 'a', encoding='utf-8') as f:
+            if self.needs_newline:
+                f.write("\n")
+                self.needs_newline = False
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class BatchProcessor:
+    """目录批处理器"""
+
+    def __init__(self, input_dir, output_dir, concurrency=BATCH_CONCURRENCY, speed=BATCH_STREAM_SPEED,
+                 synthesize=True, transcribe_client=None, polly_client=None):
+        """
+        初始化批处理器
+
+        Args:
+            input_dir (str): 输入目录
+            output_dir (str): 输出目录
+            concurrency (int): 同时处理的文件数
+            speed (float): 发送音频的速度（实时的倍数），0表示不限速
+            synthesize (bool): 是否用Polly重新合成转录结果
+            transcribe_client: Transcribe客户端，默认新建
+            polly_client: Polly客户端，默认新建
+        """
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.concurrency = concurrency
+        self.speed = speed
+        self.synthesize = synthesize
+        self.transcribe_client = transcribe_client or TranscribeClient()
+        if polly_client is None and synthesize:
+            polly_client = PollyClient()
+        self.polly_client = polly_client
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch-io')
+        self.manifest = None
+        self.stats = {'ok': 0, 'failed': 0, 'skipped': 0, 'audio_seconds': 0.0}
+
+    async def run(self):
+        """
+        处理输入目录中所有未完成的文件
+
+        Returns:
+            dict: 成功、失败、跳过的文件数和处理的音频总时长
+        """
+        loop = asyncio.get_running_loop()
+        self.transcribe_client.bind_loop(loop)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.manifest = Manifest(os.path.join(self.output_dir, BATCH_MANIFEST_NAME))
+
+        pending = []
+        for relpath in find_audio_files(self.input_dir):
+            if self.manifest.is_done(relpath, os.stat(os.path.join(self.input_dir, relpath))):
+                self.stats['skipped'] += 1
+            else:
+                pending.append(relpath)
+        logger.info(f"共 {len(pending) + self.stats['skipped']} 个文件，跳过已完成的 {self.stats['skipped']} 个")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def limited(relpath):
+            async with semaphore:
+                await self._process_file(relpath)
+
+        try:
+            await asyncio.gather(*(limited(relpath) for relpath in pending))
+        finally:
+            self.executor.shutdown(wait=False)
+        return self.stats
+
+    async def _process_file(self, relpath):
+        """处理单个文件并写入清单"""
+        loop = asyncio.get_running_loop()
+        path = os.path.join(self.input_dir, relpath)
+        stat = os.stat(path)
+        start = time.perf_counter()
+        entry = {'file': relpath, 'size': stat.st_size, 'mtime': stat.st_mtime}
+        try:
+            pcm = await loop.run_in_executor(self.executor, load_audio, path)
+            audio_seconds = len(pcm) / 2 / SAMPLE_RATE
+            transcript, language = await self._transcribe(pcm)
+
+            base = os.path.join(self.output_dir, os.path.splitext(relpath)[0])
+            os.makedirs(os.path.dirname(base), exist_ok=True)
+            await loop.run_in_executor(self.executor, _write_atomic, f"{base}.txt", transcript.encode('utf-8'))
+            if self.synthesize and transcript:
+                await loop.run_in_executor(self.executor, self._synthesize_to_wav, transcript, language,
+                                           f"{base}.tts.wav")
+
+            entry.update(status='ok', language=language, audio_seconds=round(audio_seconds, 3),
+                         elapsed=round(time.perf_counter() - start, 3), transcript=transcript)
+            self.stats['ok'] += 1
+            self.stats['audio_seconds'] += audio_seconds
+            logger.info(f"[{self.stats['ok'] + self.stats['failed']}] {relpath}: 音频 {audio_seconds:.1f}秒, "
+                        f"用时 {entry['elapsed']:.1f}秒, 语言 {language}")
+        except Exception as e:
+            entry.update(status='failed', error=str(e), elapsed=round(time.perf_counter() - start, 3))
+            self.stats['failed'] += 1
+            logger.error(f"处理文件 {relpath} 时出错: {e}")
+            traceback.print_exc()
+        self.manifest.record(entry)
+
+    async def _transcribe(self, pcm):
+        """
+        按设定速度把PCM发送到Transcribe，收集所有最终结果片段
+
+        Returns:
+            tuple: (完整转录文本, 语言代码)
+        """
+        session = TranscriptionSession(asyncio.get_running_loop(),
+                                       media_encoding=self.transcribe_client.media_encoding)
+        task = asyncio.ensure_future(self.transcribe_client.run_session(session))
+
+        chunk_bytes = int(SAMPLE_RATE * BATCH_CHUNK_MS / 1000) * 2
+        start = time.perf_counter()
+        for index, offset in enumerate(range(0, len(pcm), chunk_bytes)):
+            if self.speed > 0:
+                delay = start + index * BATCH_CHUNK_MS / 1000 / self.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if not await session.put(pcm[offset:offset + chunk_bytes]) or task.done():
+                break
+        session.close()
+
+        # 会话把所有最终片段按顺序拼接，中日韩文字之间不加空格
+        return await asyncio.wait_for(task, BATCH_TRANSCRIBE_TIMEOUT)
+
+    def _synthesize_to_wav(self, transcript, language, path):
+        """在线程中分句合成转录文本并写入WAV，先写临时文件再替换"""
+        tmp_path = f"{path}.tmp"
+        with wave.open(tmp_path, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(POLLY_PCM_SAMPLE_RATE)
+            for segment in split_sentences(transcript, language):
+                written = 0
+                for chunk in self.polly_client.synthesize_speech_stream(segment, language):
+                    wav.writeframes(chunk)
+                    written += len(chunk)
+                if not written:
+                    raise RuntimeError(f"合成失败: {segment[:30]}")
+        os.replace(tmp_path, path)
+
+
+def _write_atomic(path, data):
+    """先写临时文件再替换，避免中断时留下不完整的输出"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量转录并重新合成目录中的音频文件")
+    parser.add_argument('input_dir', help="包含WAV/FLAC文件的输入目录")
+    parser.add_argument('output_dir', help="输出目录")
+    parser.add_argument('--concurrency', type=int, default=BATCH_CONCURRENCY, help="同时处理的文件数")
+    parser.add_argument('--speed', type=float, default=BATCH_STREAM_SPEED, help="发送音频的速度（实时的倍数），0表示不限速")
+    parser.add_argument('--no-synthesis', action='store_true', help="只转录，不重新合成语音")
+    parser.add_argument('--force', action='store_true', help="忽略清单，重新处理所有文件")
+    args = parser.parse_args()
+
+    if args.force:
+        manifest_path = os.path.join(args.output_dir, BATCH_MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+    processor = BatchProcessor(args.input_dir, args.output_dir, args.concurrency, args.speed,
+                               synthesize=not args.no_synthesis)
+    wall_start = time.perf_counter()
+    stats = asyncio.run(processor.run())
+    wall = time.perf_counter() - wall_start
+
+    processed = stats['ok'] + stats['failed']
+    logger.info(f"完成 {stats['ok']} 个，失败 {stats['failed']} 个，跳过 {stats['skipped']} 个，用时 {wall:.1f}秒")
+    if processed and wall > 0:
+        logger.info(f"吞吐: {processed / wall * 60:.1f} 文件/分钟，"
+                    f"{stats['audio_seconds'] / wall:.2f} 音频小时/墙钟小时")
+    if processor.polly_client is not None:
+        log_aws_metrics(processor.polly_client)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+对话轮次基准测试
+用本地替身驱动VoiceProcessor完成多轮对话，扬声器替身按实时速率播放回复，比较两种对话模式：
+- half_duplex：每轮录音结束后才合成播放，播放完才开始下一轮录音
+- continuous：录音不停，用户说完下一句时上一条回复若仍在播放则被打断
+
+用户每句话之间停顿--gap秒（半双工模式下从回复播放结束算起），停顿短于回复时长时连续模式会触发打断。
+输出每分钟轮数、打断次数，以及轮次切换延迟（说完 → 回复发声）和打断反应时间（开口 → 停止回复）的p50/p95/p99
+
+运行方式:
+    python -m benchmarks.duplex_benchmark [--turns 8] [--gap 1.5] [--modes half_duplex,continuous] [--action duck]
+"""
+
+import argparse
+import logging
+import threading
+import time
+from aws_services.polly_client import PollyClient
+from aws_services.transcribe_client import TranscribeClient
+from benchmarks.e2e_benchmark import DEFAULT_TEXTS
+from audio_helpers.audio_sinks import NullAudioSink
+from benchmarks.fakes import WavFileSource, FakeTranscribeStreamingClient, FakePollyClient, FakeComprehendClient
+from benchmarks.signals import utterance
+from benchmarks.stats import format_percentiles
+from config import BARGE_IN_ACTION
+from logger_config import logger
+from voice_processor import VoiceProcessor, CONVERSATION_MODES, BARGE_IN_ACTIONS
+
+
+def build_turns(args):
+    """
+    生成每轮用户说话的音频，语音前有--gap秒的停顿
+
+    Returns:
+        list: (PCM, 语音开始, 语音结束, 文本)
+    """
+    turns = []
+    for i in range(args.turns):
+        text = DEFAULT_TEXTS[i % len(DEFAULT_TEXTS)]
+        pcm, start, end = utterance(lead=args.gap, speech=1.0 + 0.1 * len(text.split()), tail=0.1,
+                                    snr_db=20.0, seed=i)
+        turns.append((pcm, start, end, text))
+    return turns
+
+
+def build_processor(mode, args):
+    """创建使用本地替身的VoiceProcessor"""
+    source = WavFileSource()
+    sink = NullAudioSink(realtime=True)
+    fake_transcribe = FakeTranscribeStreamingClient(args.handshake, args.first_partial, args.partial_interval,
+                                                    args.final_delay)
+    polly = PollyClient(client=FakePollyClient(args.polly_latency),
+                        comprehend=FakeComprehendClient(args.comprehend_latency))
+    polly.cache = None
+    processor = VoiceProcessor(mic_input=source, audio_output=sink,
+                               transcribe_client=TranscribeClient(client_factory=fake_transcribe),
+                               polly_client=polly, conversation_mode=mode, barge_in_action=args.action)
+    return processor, source, fake_transcribe
+
+
+def run_half_duplex(args, turns):
+    """逐轮调用process_turn，每轮重新开始录音"""
+    processor, source, fake_transcribe = build_processor('half_duplex', args)
+    processor.running = True
+    try:
+        for pcm, speech_start, speech_end, text in turns:
+            source.load(pcm, speech_start, speech_end)
+            fake_transcribe.script.append(text)
+            processor.process_turn()
+        return processor.conversation_metrics()
+    finally:
+        processor.transcribe_client.shutdown()
+        processor.synthesis_pipeline.shutdown()
+
+
+def run_continuous(args, turns):
+    """把各轮音频拼接成一条连续的输入，在后台线程中运行连续模式直到所有回复结束"""
+    processor, source, fake_transcribe = build_processor('continuous', args)
+    pcm = b''.join(turn[0] for turn in turns)
+    source.load(pcm, turns[0][1], turns[0][2])
+    fake_transcribe.script.extend(turn[3] for turn in turns)
+
+    processor.running = True
+    thread = threading.Thread(target=processor.run_continuous, name='duplex-benchmark')
+    thread.start()
+    # 音频读完后输入源返回静音，最后一句之后最多再等--tail秒让最后一条回复播放完
+    deadline = time.perf_counter() + len(pcm) / 2 / source.sample_rate + args.tail
+    try:
+        while time.perf_counter() < deadline:
+            response = processor.response
+            if (len(fake_transcribe.records) >= len(turns) and response is not None
+                    and processor.conversation_stats['turns'] >= len(turns) and response.done.is_set()):
+                break
+            time.sleep(0.05)
+        return processor.conversation_metrics()
+    finally:
+        processor.running = False
+        thread.join()
+        processor.transcribe_client.shutdown()
+        processor.synthesis_pipeline.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="半双工与连续对话模式的轮次切换延迟和每分钟轮数")
+    parser.add_argument('--turns', type=int, default=8, help="对话轮数")
+    parser.add_argument('--gap', type=float, default=1.5, help="用户每句话之前的停顿（秒）")
+    parser.add_argument('--tail', type=float, default=6.0, help="连续模式下最后一句之后最多等待回复结束的时长（秒）")
+    parser.add_argument('--modes', default=','.join(CONVERSATION_MODES),
+                        help=f"要运行的模式，逗号分隔: {', '.join(CONVERSATION_MODES)}")
+    parser.add_argument('--action', default=BARGE_IN_ACTION, choices=BARGE_IN_ACTIONS, help="打断方式")
+    parser.add_argument('--handshake', type=float, default=0.15, help="Transcribe打开流的延迟（秒）")
+    parser.add_argument('--first-partial', type=float, default=0.3, help="首个部分结果的延迟（秒）")
+    parser.add_argument('--partial-interval', type=float, default=0.2, help="部分结果的间隔（秒）")
+    parser.add_argument('--final-delay', type=float, default=0.25, help="输入结束到最终结果的延迟（秒）")
+    parser.add_argument('--polly-latency', type=float, default=0.12, help="Polly首字节延迟（秒）")
+    parser.add_argument('--comprehend-latency', type=float, default=0.08, help="Comprehend调用延迟（秒）")
+    parser.add_argument('--verbose', action='store_true', help="输出VoiceProcessor的日志")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+
+    turns = build_turns(args)
+    results = {}
+    for mode in args.modes.split(','):
+        if mode not in CONVERSATION_MODES:
+            parser.error(f"未知模式: {mode}")
+        runner = run_continuous if mode == 'continuous' else run_half_duplex
+        results[mode] = runner(args, turns)
+
+    print(f"\n{'模式':<14}{'轮数':>6}{'打断':>6}{'时长(秒)':>10}{'每分钟轮数':>12}")
+    for mode, metrics in results.items():
+        print(f"{mode:<14}{metrics['turns']:>6}{metrics['barge_ins']:>6}{metrics['elapsed_seconds']:>10.1f}"
+              f"{metrics['turns_per_minute']:>12.1f}")
+
+    print(f"\n{'指标':<24}{'样本':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for mode, metrics in results.items():
+        print(format_percentiles(f"{mode} 轮次切换延迟", metrics['turn_taking'], width=24))
+        if metrics['barge_in_reactions']:
+            print(format_percentiles(f"{mode} 打断反应时间", metrics['barge_in_reactions'], width=24))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+端到端延迟基准测试
+用本地替身（WAV/合成音频输入、本地Transcribe流、Polly/Comprehend桩、空音频输出）驱动完整的VoiceProcessor，
+不需要麦克风、扬声器和AWS账号，输出以下指标的p50/p95/p99：
+- 首个部分结果延迟：语音开始 → 第一个部分转录结果
+- 说话结束到最终结果：语音结束 → 最终转录结果
+- 最终结果到首个音频：最终转录结果 → 第一个音频块送到输出
+
+运行方式:
+    python -m benchmarks.e2e_benchmark [--turns 10] [--script script.json] [--cache] [--no-speculation]
+                                       [--persistent [--max-stream-seconds 20]]
+
+script.json为列表，每项形如 {"audio": "turn1.wav", "text": "对应的转录文本"}，
+audio可省略（使用合成的类语音信号），可选 "speech_start"/"speech_end"（秒）标注语音起止位置
+"""
+
+import argparse
+import json
+import logging
+import os
+from aws_services.polly_client import PollyClient
+from aws_services.transcribe_client import TranscribeClient
+from audio_helpers.audio_sinks import NullAudioSink
+from benchmarks.fakes import WavFileSource, FakeTranscribeStreamingClient, FakePollyClient, FakeComprehendClient
+from benchmarks.signals import utterance
+from benchmarks.stats import format_percentiles
+from config import TRANSCRIBE_MEDIA_ENCODING
+from logger_config import logger
+from voice_processor import VoiceProcessor
+
+DEFAULT_TEXTS = [
+    "Turn on the lights in the living room. Then play some music.",
+    "What is the weather like tomorrow? I need to know before the trip.",
+    "请帮我查一下明天的天气。我下午要出门。",
+    "Set a timer for ten minutes.",
+    "Remind me to call my mother this evening. She wanted to talk about the weekend.",
+]
+
+
+def load_script(path, turns):
+    """
+    读取脚本，未提供时使用合成音频和默认文本
+
+    Returns:
+        list: (音频路径或PCM, 语音开始, 语音结束, 文本)
+    """
+    if path:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+        base_dir = os.path.dirname(os.path.abspath(path))
+    else:
+        entries = [{'text': DEFAULT_TEXTS[i % len(DEFAULT_TEXTS)]} for i in range(turns)]
+        base_dir = None
+
+    script = []
+    for i, entry in enumerate(entries[:turns]):
+        if entry.get('audio'):
+            audio = os.path.join(base_dir, entry['audio'])
+            script.append((audio, entry.get('speech_start'), entry.get('speech_end'), entry['text']))
+        else:
+            pcm, start, end = utterance(lead=0.5, speech=1.5 + 0.1 * len(entry['text'].split()), tail=3.0,
+                                        snr_db=20.0, seed=i)
+            script.append((pcm, start, end, entry['text']))
+    return script
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端延迟基准测试（本地替身）")
+    parser.add_argument('--turns', type=int, default=10, help="对话轮数")
+    parser.add_argument('--script', help="脚本JSON文件路径")
+    parser.add_argument('--speed', type=float, default=1.0, help="音频输入速度倍数，0表示不按实时节奏")
+    parser.add_argument('--handshake', type=float, default=0.15, help="Transcribe打开流的延迟（秒）")
+    parser.add_argument('--first-partial', type=float, default=0.3, help="首个部分结果的延迟（秒）")
+    parser.add_argument('--partial-interval', type=float, default=0.2, help="部分结果的间隔（秒）")
+    parser.add_argument('--final-delay', type=float, default=0.25, help="输入结束到最终结果的延迟（秒）")
+    parser.add_argument('--polly-latency', type=float, default=0.12, help="Polly首字节延迟（秒）")
+    parser.add_argument('--comprehend-latency', type=float, default=0.08, help="Comprehend调用延迟（秒）")
+    parser.add_argument('--cache', action='store_true', help="启用Polly合成缓存（默认关闭，避免重复文本命中缓存）")
+    parser.add_argument('--no-speculation', action='store_true', help="关闭根据部分结果的推测合成")
+    parser.add_argument('--encoding', default=TRANSCRIBE_MEDIA_ENCODING, choices=('pcm', 'flac', 'ogg-opus'),
+                        help="向Transcribe发送音频的编码")
+    parser.add_argument('--persistent', action='store_true', help="所有轮次共用一个常驻转录流")
+    parser.add_argument('--max-stream-seconds', type=float,
+                        help="常驻转录流的时长上限（秒），设得较小可在测试中触发流切换")
+    parser.add_argument('--verbose', action='store_true', help="输出VoiceProcessor的日志")
+    args = parser.parse_args()
+    if args.persistent and args.encoding != 'pcm':
+        # 本地替身只能在PCM上行中识别静音，据此在一个流上划分多次说话
+        parser.error("--persistent 只支持pcm编码")
+
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+
+    source = WavFileSource(speed=args.speed)
+    sink = NullAudioSink()
+    # 常驻转录流上静音达到0.3秒时给出本段的最终结果
+    fake_transcribe = FakeTranscribeStreamingClient(args.handshake, args.first_partial, args.partial_interval,
+                                                    args.final_delay,
+                                                    segment_silence=0.3 if args.persistent else None)
+    polly = PollyClient(client=FakePollyClient(args.polly_latency),
+                        comprehend=FakeComprehendClient(args.comprehend_latency))
+    if not args.cache:
+        polly.cache = None
+
+    processor = VoiceProcessor(mic_input=source, audio_output=sink,
+                               transcribe_client=TranscribeClient(client_factory=fake_transcribe,
+                                                                  media_encoding=args.encoding,
+                                                                  persistent=args.persistent),
+                               polly_client=polly)
+    if args.no_speculation:
+        processor.transcribe_client.stable_callback = None
+    if args.persistent and args.max_stream_seconds:
+        processor.transcribe_client.prewarm()
+        persistent_stream = processor.transcribe_client.persistent_stream
+        # 按上限等比例缩小切换余量，优先在两轮之间切换
+        persistent_stream.max_stream_seconds = args.max_stream_seconds
+        persistent_stream.rollover_margin = args.max_stream_seconds / 2
+        persistent_stream.force_margin = args.max_stream_seconds / 10
+    processor.running = True
+
+    first_partial, eos_to_final, final_to_audio = [], [], []
+    script = load_script(args.script, args.turns)
+    try:
+        for index, (audio, speech_start, speech_end, text) in enumerate(script):
+            if isinstance(audio, str):
+                source.load_wav(audio, speech_start, speech_end)
+            else:
+                source.load(audio, speech_start, speech_end)
+            fake_transcribe.script.append(text)
+            sink.reset()
+
+            records_before = len(fake_transcribe.records)
+            transcript, _ = processor.process_turn()
+            if len(fake_transcribe.records) == records_before or not transcript:
+                print(f"第 {index + 1} 轮未得到转录结果")
+                continue
+            record = fake_transcribe.records[-1]
+
+            if record['first_partial'] and source.speech_start_time:
+                first_partial.append(record['first_partial'] - source.speech_start_time)
+            if source.speech_end_time:
+                eos_to_final.append(record['final'] - source.speech_end_time)
+            if sink.first_audio_time:
+                final_to_audio.append(sink.first_audio_time - record['final'])
+            print(f"第 {index + 1}/{len(script)} 轮完成: {transcript}")
+    finally:
+        metrics = processor.transcribe_client.get_queue_metrics()
+        processor.transcribe_client.shutdown()
+        processor.synthesis_pipeline.shutdown()
+
+    print(f"\n{'指标':<16}{'样本':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for name, values in (('首个部分结果延迟', first_partial), ('说话结束到最终结果', eos_to_final),
+                         ('最终结果到首个音频', final_to_audio)):
+        print(format_percentiles(name, values))
+    if args.persistent:
+        print(f"\n常驻转录流: 切换 {metrics['rollovers']} 次, 重连 {metrics['reconnects']} 次, "
+              f"保活 {metrics['keepalives']} 次, 丢弃迟到结果 {metrics['late_results']} 个")
+    print(f"\n打开转录流 {fake_transcribe.streams_opened} 个, Polly调用 {polly.client.calls} 次, "
+          f"Comprehend调用 {polly.comprehend.calls} 次, 上行音频 {fake_transcribe.bytes_received / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+上行编码基准测试
+按采集块大小把一段16位单声道PCM逐块送入各编码器，统计：
+- 上行码率（kbit/s）和相对PCM的压缩比
+- 编码CPU时间占音频时长的比例，以及单块编码耗时的p50/p95/p99
+- 编码缓冲延迟：编码器攒够一个分块或一页才输出数据，输入到输出之间最多滞后的音频时长
+- 往返解码：用libsndfile解码编码结果，FLAC必须与输入逐样本一致，Opus检查时长和信噪比；任一编码失败时以非零状态退出
+
+运行方式:
+    python -m benchmarks.encoding_benchmark [--wav speech.wav] [--seconds 30]
+"""
+
+import argparse
+import io
+import sys
+import time
+import numpy as np
+from audio_helpers.pcm_convert import to_pcm16_mono
+from audio_helpers.stream_encoder import StreamEncoder, MEDIA_ENCODINGS
+from benchmarks.signals import utterance
+from benchmarks.stats import format_percentiles
+from config import SAMPLE_RATE, CHUNK_SIZE
+
+# Opus往返解码的最低信噪比（dB）
+MIN_OPUS_SNR_DB = 10.0
+
+
+def load_pcm(args):
+    """读取WAV并转换为SAMPLE_RATE单声道PCM，未指定时使用合成的类语音信号"""
+    if args.wav:
+        import soundfile as sf
+        samples, sample_rate = sf.read(args.wav, dtype='float32')
+        return to_pcm16_mono(samples, sample_rate)
+    pcm = b''
+    seed = 0
+    while len(pcm) < args.seconds * SAMPLE_RATE * 2:
+        segment, _, _ = utterance(lead=0.5, speech=3.0, tail=1.0, snr_db=args.snr, seed=seed)
+        pcm += segment
+        seed += 1
+    return pcm[:int(args.seconds * SAMPLE_RATE) * 2]
+
+
+def run_encoding(media_encoding, pcm, chunk_bytes):
+    """
+    逐块编码一段PCM
+
+    Returns:
+        dict: 编码指标、单块编码耗时、最大缓冲延迟（秒）和完整的编码流
+    """
+    encoder = StreamEncoder(media_encoding)
+    encoded = []
+    chunk_times = []
+    pending_audio = 0.0
+    max_buffered = 0.0
+    for offset in range(0, len(pcm), chunk_bytes):
+        chunk = pcm[offset:offset + chunk_bytes]
+        start = time.perf_counter()
+        data = encoder.encode(chunk)
+        chunk_times.append(time.perf_counter() - start)
+        pending_audio += len(chunk) / 2 / SAMPLE_RATE
+        if data:
+            encoded.append(data)
+            max_buffered = max(max_buffered, pending_audio)
+            pending_audio = 0.0
+    encoded.append(encoder.close())
+    return dict(encoder.metrics(), chunk_times=chunk_times, max_buffered=max_buffered,
+                encoded=encoder.finalize(b''.join(encoded)))
+
+
+def check_round_trip(media_encoding, pcm, encoded):
+    """
+    用libsndfile解码编码结果并与输入比较
+
+    Args:
+        media_encoding (str): 编码方式
+        pcm (bytes): 输入的16位单声道PCM
+        encoded (bytes): StreamEncoder.finalize得到的完整文件
+
+    Returns:
+        tuple: (是否通过, 说明)
+    """
+    import soundfile as sf
+    try:
+        decoded, sample_rate = sf.read(io.BytesIO(encoded), dtype='int16')
+    except Exception as e:
+        return False, f"解码失败: {e}"
+    expected = np.frombuffer(pcm, dtype='<i2')
+    if sample_rate != SAMPLE_RATE or len(decoded) != len(expected):
+        return False, f"解码得到 {len(decoded)} 帧/{sample_rate}Hz，应为 {len(expected)} 帧/{SAMPLE_RATE}Hz"
+    if media_encoding == 'flac':
+        if not np.array_equal(decoded, expected):
+            return False, "无损编码的解码结果与输入不一致"
+        return True, "逐样本一致"
+    error = decoded.astype(np.float64) - expected
+    snr = 10.0 * np.log10(np.sum(expected.astype(np.float64) ** 2) / max(np.sum(error ** 2), 1e-12))
+    return snr >= MIN_OPUS_SNR_DB, f"信噪比 {snr:.1f} dB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上行编码码率、压缩比与CPU耗时")
+    parser.add_argument('--wav', help="语音WAV文件，任意采样率和声道数")
+    parser.add_argument('--seconds', type=float, default=30.0, help="未指定WAV时合成的音频时长（秒）")
+    parser.add_argument('--snr', type=float, default=30.0, help="合成音频的信噪比（dB）")
+    parser.add_argument('--chunk', type=int, default=CHUNK_SIZE, help="每块的采样帧数")
+    args = parser.parse_args()
+
+    pcm = load_pcm(args)
+    seconds = len(pcm) / 2 / SAMPLE_RATE
+    pcm_kbps = SAMPLE_RATE * 16 / 1000
+    print(f"音频 {seconds:.1f}秒，每块 {args.chunk} 帧（{args.chunk / SAMPLE_RATE * 1000:.0f}ms）\n")
+    print(f"{'编码':<10}{'码率(kbit/s)':>14}{'压缩比':>8}{'CPU/实时':>10}{'缓冲延迟(ms)':>14}")
+    print(f"{'pcm':<10}{pcm_kbps:>14.1f}{1.0:>8.2f}{0.0:>9.2f}%{args.chunk / SAMPLE_RATE * 1000:>14.0f}")
+
+    chunk_times = {}
+    round_trips = {}
+    for media_encoding in MEDIA_ENCODINGS:
+        result = run_encoding(media_encoding, pcm, args.chunk * 2)
+        kbps = result['output_bytes'] * 8 / seconds / 1000
+        print(f"{media_encoding:<10}{kbps:>14.1f}{result['compression_ratio']:>8.2f}"
+              f"{result['cpu_ratio'] * 100:>9.2f}%{result['max_buffered'] * 1000:>14.0f}")
+        chunk_times[media_encoding] = result['chunk_times']
+        round_trips[media_encoding] = check_round_trip(media_encoding, pcm, result['encoded'])
+
+    print(f"\n{'单块编码耗时':<16}{'样本':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for media_encoding, times in chunk_times.items():
+        print(format_percentiles(media_encoding, times))
+
+    print("\n往返解码:")
+    for media_encoding, (ok, detail) in round_trips.items():
+        print(f"  {media_encoding}: {'通过' if ok else '失败'}，{detail}")
+    if not all(ok for ok, _ in round_trips.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
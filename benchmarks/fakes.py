@@ -0,0 +1,397 @@
+"""
+本地替身实现，用于在没有麦克风、扬声器和AWS的环境中运行VoiceProcessor
+- WavFileSource：从WAV文件或内存PCM读取音频，接口与MicrophoneInput一致
+- FakeTranscribeStreamingClient：按可配置的延迟输出部分和最终转录结果
+- FakePollyClient / FakeComprehendClient：可配置延迟和音频大小的boto3客户端桩
+"""
+
+import asyncio
+import time
+import wave
+from collections import deque
+import numpy as np
+from config import SAMPLE_RATE, CHUNK_SIZE
+
+from amazon_transcribe.model import Alternative, Item, Result, Transcript, TranscriptEvent
+
+
+def estimate_speech_bounds(pcm, sample_rate=SAMPLE_RATE, threshold_db=-40.0, frame_ms=20):
+    """
+    粗略估计PCM中语音的起止时间
+
+    Returns:
+        tuple: (开始秒数, 结束秒数)，没有超过阈值的帧时返回(None, None)
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+    frame_len = int(sample_rate * frame_ms / 1000)
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return None, None
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+    energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    active = np.flatnonzero(energy_db > threshold_db)
+    if len(active) == 0:
+        return None, None
+    return active[0] * frame_ms / 1000, (active[-1] + 1) * frame_ms / 1000
+
+
+class WavFileSource:
+    """从WAV文件或内存PCM按块读取音频的输入源"""
+
+    def __init__(self, chunk_frames=CHUNK_SIZE, sample_rate=SAMPLE_RATE, speed=1.0):
+        """
+        初始化输入源
+
+        Args:
+            chunk_frames (int): 每块的采样帧数
+            sample_rate (int): 采样率
+            speed (float): 播放速度倍数，1.0为实时，0表示不等待
+        """
+        self.chunk_bytes = chunk_frames * 2
+        self.sample_rate = sample_rate
+        self.speed = speed
+        self.pcm = b''
+        self.speech_start = None
+        self.speech_end = None
+        self.is_recording = False
+        self._reset_timing()
+
+    def load(self, pcm, speech_start=None, speech_end=None):
+        """
+        载入下一次说话的音频
+
+        Args:
+            pcm (bytes): 16位单声道PCM
+            speech_start (float, optional): 语音开始时间（秒），未提供时根据能量估计
+            speech_end (float, optional): 语音结束时间（秒）
+        """
+        if speech_start is None or speech_end is None:
+            speech_start, speech_end = estimate_speech_bounds(pcm, self.sample_rate)
+        self.pcm = pcm
+        self.speech_start = speech_start
+        self.speech_end = speech_end
+
+    def load_wav(self, path, speech_start=None, speech_end=None):
+        """载入WAV文件，要求为16位单声道且采样率与配置一致"""
+        with wave.open(path, 'rb') as wav:
+            if wav.getsampwidth() != 2 or wav.getnchannels() != 1 or wav.getframerate() != self.sample_rate:
+                raise ValueError(f"{path} 必须是16位单声道、{self.sample_rate}Hz的WAV文件")
+            self.load(wav.readframes(wav.getnframes()), speech_start, speech_end)
+
+    def start_recording(self):
+        """开始读取"""
+        self._reset_timing()
+        self.is_recording = True
+        self.start_time = time.perf_counter()
+
+    def stop_recording(self):
+        """停止读取"""
+        self.is_recording = False
+
+    def read_chunk(self):
+        """按设定速度返回下一个音频块，数据读完后返回静音"""
+        if not self.is_recording:
+            return None
+
+        offset = self.chunks_read * self.chunk_bytes
+        if self.speed > 0:
+            due = self.start_time + offset / 2 / self.sample_rate / self.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        chunk = self.pcm[offset:offset + self.chunk_bytes]
+        if len(chunk) < self.chunk_bytes:
+            chunk += bytes(self.chunk_bytes - len(chunk))
+
+        # 记录语音起止位置所在音频块被交付的时间
+        chunk_end = (offset + self.chunk_bytes) / 2 / self.sample_rate
+        now = time.perf_counter()
+        if self.speech_start is not None and self.speech_start_time is None and chunk_end > self.speech_start:
+            self.speech_start_time = now
+        if self.speech_end is not None and self.speech_end_time is None and chunk_end >= self.speech_end:
+            self.speech_end_time = now
+
+        self.chunks_read += 1
+        return chunk
+
+    def read_view(self):
+        """与MicrophoneInput接口一致，返回下一个音频块的视图"""
+        chunk = self.read_chunk()
+        return memoryview(chunk) if chunk is not None else None
+
+    def mark_sent(self):
+        """与MicrophoneInput接口一致"""
+
+    def get_capture_metrics(self):
+        """与MicrophoneInput接口一致的采集指标"""
+        return {
+            'chunks_read': self.chunks_read,
+            'input_overflows': 0,
+            'overrun_events': 0,
+            'overrun_frames': 0,
+            'send_latency_avg': 0.0,
+            'send_latency_max': 0.0,
+        }
+
+    def _reset_timing(self):
+        self.chunks_read = 0
+        self.start_time = None
+        self.speech_start_time = None
+        self.speech_end_time = None
+
+
+class _FakeInputStream:
+    """本地转录流的输入端"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    async def send_audio_event(self, audio_chunk):
+        self.stream.client.bytes_received += len(audio_chunk)
+        await self.stream.on_audio(audio_chunk)
+
+    async def end_stream(self):
+        await self.stream.on_end()
+
+
+class _FakeOutputStream:
+    """本地转录流的输出端，异步迭代转录事件"""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self.queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+
+class _FakeSegment:
+    """本地转录流中的一次说话，对应脚本中的一条文本"""
+
+    def __init__(self, text, result_id, start_time):
+        self.text = text
+        self.result_id = result_id
+        self.start_time = start_time
+        self.end_time = None
+        self.ended = False
+        self.record = {'text': text, 'first_partial': None, 'final': None}
+        # 中日韩文本逐字输出，其他语言逐词输出
+        self.separator = '' if text and ord(text[0]) >= 0x2E80 else ' '
+        self.words = list(text) if not self.separator else text.split()
+
+
+class FakeTranscribeStream:
+    """按脚本输出转录结果的本地转录流
+
+    默认一个流只对应一次说话；客户端设置了segment_silence且上行为PCM时，一个流上可以有多次说话：
+    全零的音频块视为静音，静音累计达到segment_silence秒时结束当前说话，下一段非静音音频开始新的说话
+    """
+
+    def __init__(self, client, media_encoding='pcm'):
+        self.client = client
+        self.input_stream = _FakeInputStream(self)
+        self.output_stream = _FakeOutputStream()
+        self.segmented = client.segment_silence is not None and media_encoding == 'pcm'
+        self.segment = None
+        self.segment_count = 0
+        self.partial_task = None
+        self.finals = []
+        # 收到的音频时长（秒），结果的start_time/end_time以此为准
+        self.audio_seconds = 0.0
+        self.silence_seconds = 0.0
+        self.ended = False
+
+    async def on_audio(self, audio_chunk):
+        position = self.audio_seconds
+        self.audio_seconds += len(audio_chunk) / (SAMPLE_RATE * 2)
+        if self.segmented:
+            if not bytes(audio_chunk).strip(b'\0'):
+                self.silence_seconds += len(audio_chunk) / (SAMPLE_RATE * 2)
+                if self.segment is not None and self.silence_seconds >= self.client.segment_silence:
+                    self._finish_segment()
+                return
+            self.silence_seconds = 0.0
+        if self.segment is None and (self.segmented or not self.segment_count):
+            # 收到第一段音频时才从脚本中取出对应文本，预先打开的流也能对应到正确的一轮；
+            # 切换流时新旧两个流收到同一段语音，转录出相同的文本
+            speaking = [segment for segment in self.client.segments if not segment.ended] if self.segmented else None
+            if speaking:
+                self._start_segment(speaking[0].text, position, record=speaking[0].record)
+            else:
+                self._start_segment(self.client.next_text(), position)
+            self.partial_task = asyncio.ensure_future(self._emit_partials(self.segment))
+
+    def _start_segment(self, text, position, record=None):
+        self.segment = _FakeSegment(text, f"{id(self)}-{self.segment_count}", position)
+        self.segment_count += 1
+        if record is not None:
+            # 同一段语音在两个流上共用一条记录，最终结果时间取较晚的一个
+            self.segment.record = record
+        else:
+            self.client.records.append(self.segment.record)
+        if self.segmented:
+            self.client.segments = [segment for segment in self.client.segments if not segment.ended]
+            self.client.segments.append(self.segment)
+
+    def _finish_segment(self):
+        segment, self.segment = self.segment, None
+        segment.ended = True
+        segment.end_time = self.audio_seconds
+        if self.partial_task is not None:
+            self.partial_task.cancel()
+            self.partial_task = None
+        self.finals.append(asyncio.ensure_future(self._emit_final(segment)))
+
+    async def on_end(self):
+        self.ended = True
+        if self.segment is None and not self.segment_count:
+            self._start_segment('', self.audio_seconds)
+        if self.segment is not None:
+            self._finish_segment()
+        asyncio.ensure_future(self._close_output(list(self.finals)))
+
+    async def _close_output(self, finals):
+        # 所有最终结果发出后再结束输出
+        await asyncio.wait(finals)
+        await self.output_stream.queue.put(None)
+
+    async def _emit_partials(self, segment):
+        await asyncio.sleep(self.client.first_partial_delay)
+        revealed = 1
+        while not segment.ended and revealed < len(segment.words):
+            await self._put(segment, segment.words[:revealed], is_partial=True)
+            if segment.record['first_partial'] is None:
+                segment.record['first_partial'] = time.perf_counter()
+            revealed += 1
+            await asyncio.sleep(self.client.partial_interval)
+
+    async def _emit_final(self, segment):
+        await asyncio.sleep(self.client.final_delay)
+        if segment.text:
+            await self._put(segment, segment.words, is_partial=False)
+        segment.record['final'] = time.perf_counter()
+
+    async def _put(self, segment, words, is_partial):
+        # 部分结果中最后两个词尚未稳定
+        stable_count = len(words) - 2 if is_partial else len(words)
+        items = [Item(item_type='pronunciation', content=word, stable=i < stable_count) for i, word in enumerate(words)]
+        transcript = segment.separator.join(words)
+        end_time = segment.end_time if segment.end_time is not None else self.audio_seconds
+        result = Result(result_id=segment.result_id, start_time=segment.start_time, end_time=end_time,
+                        is_partial=is_partial,
+                        alternatives=[Alternative(transcript=transcript, items=items, entities=None)])
+        await self.output_stream.queue.put(TranscriptEvent(transcript=Transcript(results=[result])))
+
+
+class FakeTranscribeStreamingClient:
+    """替代TranscribeStreamingClient的本地实现，按顺序为每个流分配脚本中的文本"""
+
+    def __init__(self, handshake_delay=0.15, first_partial_delay=0.3, partial_interval=0.2, final_delay=0.25,
+                 default_text='', segment_silence=None):
+        """
+        初始化本地转录客户端
+
+        Args:
+            handshake_delay (float): 打开流的延迟（秒）
+            first_partial_delay (float): 收到音频到第一个部分结果的延迟（秒）
+            partial_interval (float): 部分结果的间隔（秒）
+            final_delay (float): 输入结束到最终结果的延迟（秒）
+            default_text (str): 脚本为空时使用的文本，多会话负载测试中所有流共用
+            segment_silence (float, optional): 设置后一个PCM流上可以有多次说话，静音达到该秒数时给出最终结果，
+                用于模拟常驻转录流
+        """
+        self.handshake_delay = handshake_delay
+        self.first_partial_delay = first_partial_delay
+        self.partial_interval = partial_interval
+        self.final_delay = final_delay
+        self.default_text = default_text
+        self.segment_silence = segment_silence
+        self.script = deque()
+        # 每个收到音频的流一条记录：文本、首个部分结果时间、最终结果时间
+        self.records = []
+        # 常驻转录流模拟中各个流正在进行的说话
+        self.segments = []
+        self.streams_opened = 0
+        # 所有流收到的上行音频字节数（编码后）
+        self.bytes_received = 0
+
+    def __call__(self, region=None):
+        """作为TranscribeClient的client_factory使用"""
+        return self
+
+    async def start_stream_transcription(self, *, language_code, media_sample_rate_hz, media_encoding,
+                                         enable_partial_results_stabilization=None, partial_results_stability=None,
+                                         identify_language=None, language_options=None, **kwargs):
+        await asyncio.sleep(self.handshake_delay)
+        self.streams_opened += 1
+        return FakeTranscribeStream(self, media_encoding)
+
+    def next_text(self):
+        """取出脚本中的下一条文本，脚本为空时返回默认文本"""
+        return self.script.popleft() if self.script else self.default_text
+
+
+class FakeAudioStream:
+    """模拟botocore StreamingBody"""
+
+    def __init__(self, payload, bytes_per_second=None):
+        self.payload = payload
+        self.bytes_per_second = bytes_per_second
+
+    def read(self):
+        return b''.join(self.iter_chunks())
+
+    def iter_chunks(self, chunk_size=4096):
+        for offset in range(0, len(self.payload), chunk_size):
+            chunk = self.payload[offset:offset + chunk_size]
+            if self.bytes_per_second:
+                time.sleep(len(chunk) / self.bytes_per_second)
+            yield chunk
+
+
+class FakePollyClient:
+    """boto3 Polly客户端桩"""
+
+    def __init__(self, latency=0.12, bytes_per_char=640, bytes_per_second=None):
+        """
+        初始化桩
+
+        Args:
+            latency (float): 返回响应头前的延迟（秒）
+            bytes_per_char (int): 每个字符对应的音频字节数
+            bytes_per_second (int, optional): 音频流的传输速率，None表示不限速
+        """
+        self.latency = latency
+        self.bytes_per_char = bytes_per_char
+        self.bytes_per_second = bytes_per_second
+        self.calls = 0
+
+    def synthesize_speech(self, Text, OutputFormat, VoiceId, Engine=None, SampleRate=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        payload = bytes(max(2, len(Text) * self.bytes_per_char) // 2 * 2)
+        return {'AudioStream': FakeAudioStream(payload, self.bytes_per_second), 'ContentType': 'audio/pcm'}
+
+    def describe_voices(self, **kwargs):
+        time.sleep(self.latency)
+        return {'Voices': []}
+
+
+class FakeComprehendClient:
+    """boto3 Comprehend客户端桩"""
+
+    def __init__(self, latency=0.08, language_code='en'):
+        self.latency = latency
+        self.language_code = language_code
+        self.calls = 0
+
+    def detect_dominant_language(self, Text):
+        self.calls += 1
+        time.sleep(self.latency)
+        return {'Languages': [{'LanguageCode': self.language_code, 'Score': 0.99}]}
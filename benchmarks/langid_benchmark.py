@@ -0,0 +1,105 @@
+"""
+本地语言识别基准测试
+输出各语言的识别准确率、需要回退到Comprehend的比例以及单次识别耗时；
+加上--comprehend参数时同时调用AWS Comprehend，比较两者结果（经相同的语言代码映射）是否一致
+
+运行方式:
+    python -m benchmarks.langid_benchmark [--comprehend]
+"""
+
+import argparse
+import time
+from config import LANGID_CONFIDENCE_THRESHOLD, POLLY_REGION
+from text_helpers.language_id import LanguageDetector
+
+# 与训练语料不重叠的测试句子
+SAMPLES = {
+    'zh-CN': ['请帮我查一下明天的天气', '这个价格有点贵', '我们下午三点开会', '谢谢你的帮助', '打开客厅的灯'],
+    'ja-JP': ['明日の天気を教えてください', 'この値段は少し高いです', 'ありがとうございます', '会議は三時からです', '電気をつけて'],
+    'ko-KR': ['내일 날씨를 알려 주세요', '이 가격은 조금 비싸요', '감사합니다', '회의는 세 시에 시작합니다', '불을 켜 주세요'],
+    'en-US': ['Please check tomorrow\'s weather for me', 'This price is a bit too high', 'The meeting starts at three',
+              'Thanks for your help', 'Turn on the lights in the living room', 'Yes', 'Sounds good to me'],
+    'fr-FR': ['Peux-tu vérifier la météo de demain', 'Ce prix est un peu trop élevé', 'La réunion commence à trois heures',
+              'Merci pour ton aide', 'Allume la lumière du salon', 'Oui', 'Ça me va très bien'],
+    'de-DE': ['Kannst du das Wetter für morgen prüfen', 'Dieser Preis ist etwas zu hoch', 'Das Treffen beginnt um drei',
+              'Danke für deine Hilfe', 'Mach das Licht im Wohnzimmer an', 'Ja', 'Das klingt gut für mich'],
+    'es-ES': ['¿Puedes mirar el tiempo de mañana?', 'Este precio es un poco alto', 'La reunión empieza a las tres',
+              'Gracias por tu ayuda', 'Enciende la luz del salón', 'Sí', 'Me parece muy bien'],
+}
+
+BENCH_ITERATIONS = 2000
+
+
+def comprehend_detect(client, text):
+    """调用Comprehend并按PollyClient的映射转换语言代码"""
+    from aws_services.polly_client import COMPREHEND_LANGUAGE_MAPPING
+    start = time.perf_counter()
+    response = client.detect_dominant_language(Text=text)
+    elapsed = time.perf_counter() - start
+    languages = response.get('Languages', [])
+    if not languages:
+        return None, elapsed
+    code = max(languages, key=lambda x: x['Score'])['LanguageCode']
+    return COMPREHEND_LANGUAGE_MAPPING.get(code), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地语言识别基准测试")
+    parser.add_argument('--comprehend', action='store_true', help="同时调用AWS Comprehend进行对比")
+    args = parser.parse_args()
+
+    comprehend = None
+    if args.comprehend:
+        import boto3
+        comprehend = boto3.client('comprehend', region_name=POLLY_REGION)
+
+    detector = LanguageDetector()
+    header = f"{'语言':<8}{'样本':>6}{'本地准确率':>12}{'需回退':>8}{'未回退部分准确率':>18}"
+    if comprehend:
+        header += f"{'Comprehend准确率':>18}{'一致率':>8}"
+    print(header)
+
+    total = correct = fallbacks = accepted_correct = 0
+    comprehend_latencies = []
+    for expected, texts in SAMPLES.items():
+        lang_correct = lang_fallback = lang_accepted_correct = comprehend_correct = agree = 0
+        for text in texts:
+            lang, confidence, _ = detector.detect(text)
+            lang_correct += lang == expected
+            if confidence < LANGID_CONFIDENCE_THRESHOLD:
+                lang_fallback += 1
+            else:
+                lang_accepted_correct += lang == expected
+            if comprehend:
+                remote, elapsed = comprehend_detect(comprehend, text)
+                comprehend_latencies.append(elapsed)
+                comprehend_correct += remote == expected
+                agree += remote == lang
+        accepted = len(texts) - lang_fallback
+        precision = f"{lang_accepted_correct / accepted:.0%}" if accepted else '-'
+        row = f"{expected:<8}{len(texts):>6}{lang_correct / len(texts):>12.0%}{lang_fallback:>8}{precision:>18}"
+        if comprehend:
+            row += f"{comprehend_correct / len(texts):>18.0%}{agree / len(texts):>8.0%}"
+        print(row)
+        total += len(texts)
+        correct += lang_correct
+        fallbacks += lang_fallback
+        accepted_correct += lang_accepted_correct
+
+    print(f"\n总体本地准确率: {correct / total:.1%}，低于置信度阈值 {LANGID_CONFIDENCE_THRESHOLD} 需回退: {fallbacks}/{total}，"
+          f"未回退部分准确率: {accepted_correct / max(total - fallbacks, 1):.1%}")
+
+    # 单次识别耗时
+    texts = [text for group in SAMPLES.values() for text in group]
+    start = time.perf_counter()
+    for i in range(BENCH_ITERATIONS):
+        detector.detect(texts[i % len(texts)])
+    per_call = (time.perf_counter() - start) / BENCH_ITERATIONS
+    print(f"本地识别平均耗时: {per_call * 1e6:.1f}微秒/次")
+    if comprehend_latencies:
+        comprehend_latencies.sort()
+        print(f"Comprehend调用耗时中位数: {comprehend_latencies[len(comprehend_latencies) // 2] * 1000:.1f}毫秒/次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+多会话服务器负载测试
+启动大量模拟会话，按实时节奏发送合成的语音音频，统计会话接受/拒绝情况和各项延迟的p50/p95/p99：
+- 说话结束到最终结果：客户端发出语音结束位置所在音频块 → 收到FINAL
+- 最终结果到首个音频：收到FINAL → 收到第一个AUDIO_OUT
+- 说话结束到首个音频：用户感知的回复延迟
+
+默认在后台线程中启动使用本地替身（Transcribe流、Polly/Comprehend桩）的服务器，
+也可以用--connect压测已经运行的服务器
+
+运行方式:
+    python -m benchmarks.load_generator [--sessions 200] [--turns 2] [--ramp 5] [--connect 127.0.0.1:8765]
+"""
+
+import argparse
+import asyncio
+import logging
+import threading
+import time
+from config import CHUNK_SIZE, SAMPLE_RATE, TRANSCRIBE_MEDIA_ENCODING
+from benchmarks.signals import utterance, iter_chunks
+from benchmarks.stats import format_percentiles
+from logger_config import logger
+from server.protocol import (
+    FRAME_AUDIO, FRAME_END_OF_UTTERANCE, FRAME_READY, FRAME_FINAL, FRAME_AUDIO_OUT, FRAME_TURN_END,
+    FRAME_BUSY, FRAME_ERROR, encode_frame, encode_json, decode_json, read_frame
+)
+
+UTTERANCE_TEXT = "Turn on the lights in the living room. Then play some music."
+# 预先生成的音频数量，各会话轮流使用
+UTTERANCE_VARIANTS = 8
+
+
+def start_local_server(args):
+    """
+    在后台线程中启动使用本地替身的服务器
+
+    Returns:
+        tuple: (VoiceServer, 事件循环, 端口)
+    """
+    from aws_services.polly_client import PollyClient
+    from aws_services.transcribe_client import TranscribeClient
+    from benchmarks.fakes import FakeTranscribeStreamingClient, FakePollyClient, FakeComprehendClient
+    from server.voice_server import VoiceServer
+
+    polly = PollyClient(client=FakePollyClient(args.polly_latency), comprehend=FakeComprehendClient())
+    if not args.cache:
+        polly.cache = None
+    server = VoiceServer('127.0.0.1', 0, args.max_sessions,
+                         transcribe_client=TranscribeClient(FakeTranscribeStreamingClient(default_text=UTTERANCE_TEXT),
+                                                            media_encoding=args.encoding),
+                         polly_client=polly)
+
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name='voice-server', daemon=True).start()
+    ready.wait()
+    return server, loop, server.port
+
+
+class SessionResult:
+    """一个模拟会话的结果"""
+
+    def __init__(self):
+        self.status = 'pending'
+        self.turns = 0
+        self.eos_to_final = []
+        self.final_to_audio = []
+        self.eos_to_audio = []
+        self.error = None
+
+
+async def run_session(host, port, audio, speed, turns, start_delay):
+    """
+    运行一个模拟会话
+
+    Args:
+        host (str): 服务器地址
+        port (int): 服务器端口
+        audio (tuple): (PCM, 语音开始, 语音结束)
+        speed (float): 发送速度倍数
+        turns (int): 对话轮数
+        start_delay (float): 开始前等待的时间（秒），用于逐步增加负载
+
+    Returns:
+        SessionResult: 会话结果
+    """
+    result = SessionResult()
+    await asyncio.sleep(start_delay)
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError as e:
+        result.status, result.error = 'failed', str(e)
+        return result
+
+    try:
+        frame_type, _ = await read_frame(reader)
+        if frame_type == FRAME_BUSY:
+            result.status = 'rejected'
+            return result
+        if frame_type != FRAME_READY:
+            result.status, result.error = 'failed', f"意外的帧类型: {frame_type}"
+            return result
+
+        pcm, _, speech_end = audio
+        chunk_seconds = CHUNK_SIZE / SAMPLE_RATE
+        for turn in range(1, turns + 1):
+            final_received = asyncio.Event()
+            timing = {'speech_end': None}
+
+            async def send_audio(turn):
+                start = time.perf_counter()
+                for index, chunk in enumerate(iter_chunks(pcm, CHUNK_SIZE)):
+                    if final_received.is_set():
+                        break
+                    if speed > 0:
+                        delay = start + index * chunk_seconds / speed - time.perf_counter()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                    writer.write(encode_frame(FRAME_AUDIO, chunk))
+                    await writer.drain()
+                    if timing['speech_end'] is None and (index + 1) * chunk_seconds >= speech_end:
+                        timing['speech_end'] = time.perf_counter()
+                # 每轮音频都以END_OF_UTTERANCE结束，服务器据此丢弃它判定说话结束后收到的音频
+                writer.write(encode_json(FRAME_END_OF_UTTERANCE, {'turn': turn}))
+                await writer.drain()
+
+            sender = asyncio.ensure_future(send_audio(turn))
+            final_time = first_audio_time = None
+            while True:
+                frame_type, payload = await read_frame(reader)
+                if frame_type is None or frame_type == FRAME_ERROR:
+                    raise ConnectionError("服务器关闭了连接")
+                if frame_type in (FRAME_FINAL, FRAME_TURN_END):
+                    # 与服务器不在同一轮时，后续的延迟统计都没有意义
+                    received = decode_json(payload).get('turn')
+                    if received != turn:
+                        raise ValueError(f"第 {turn} 轮收到了第 {received} 轮的帧: {frame_type:#x}")
+                if frame_type == FRAME_FINAL:
+                    final_time = time.perf_counter()
+                    final_received.set()
+                elif frame_type == FRAME_AUDIO_OUT and first_audio_time is None:
+                    first_audio_time = time.perf_counter()
+                elif frame_type == FRAME_TURN_END:
+                    break
+            final_received.set()
+            await sender
+
+            if final_time and timing['speech_end']:
+                result.eos_to_final.append(final_time - timing['speech_end'])
+            if final_time and first_audio_time:
+                result.final_to_audio.append(first_audio_time - final_time)
+            if first_audio_time and timing['speech_end']:
+                result.eos_to_audio.append(first_audio_time - timing['speech_end'])
+            result.turns += 1
+        result.status = 'ok'
+    except (ConnectionError, ValueError, OSError) as e:
+        result.status, result.error = 'failed', str(e)
+    finally:
+        writer.close()
+    return result
+
+
+async def run_load(host, port, args):
+    """并发运行所有模拟会话"""
+    variants = [utterance(lead=0.5, speech=2.0, tail=2.0, snr_db=20.0, seed=i) for i in range(UTTERANCE_VARIANTS)]
+    tasks = [
+        run_session(host, port, variants[i % len(variants)], args.speed, args.turns,
+                    args.ramp * i / max(args.sessions, 1))
+        for i in range(args.sessions)
+    ]
+    return await asyncio.gather(*tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多会话服务器负载测试")
+    parser.add_argument('--sessions', type=int, default=200, help="模拟会话数")
+    parser.add_argument('--turns', type=int, default=2, help="每个会话的对话轮数")
+    parser.add_argument('--ramp', type=float, default=5.0, help="在多少秒内逐步启动所有会话")
+    parser.add_argument('--speed', type=float, default=1.0, help="音频发送速度倍数，0表示不按实时节奏")
+    parser.add_argument('--connect', help="压测已运行的服务器，格式为host:port")
+    parser.add_argument('--max-sessions', type=int, default=None, help="本地服务器的会话上限，默认不低于模拟会话数")
+    parser.add_argument('--polly-latency', type=float, default=0.12, help="本地Polly桩的首字节延迟（秒）")
+    parser.add_argument('--cache', action='store_true', help="本地服务器启用Polly合成缓存")
+    parser.add_argument('--encoding', default=TRANSCRIBE_MEDIA_ENCODING, choices=('pcm', 'flac', 'ogg-opus'),
+                        help="本地服务器向Transcribe发送音频的编码")
+    parser.add_argument('--verbose', action='store_true', help="输出服务器日志")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+
+    server = server_loop = None
+    if args.connect:
+        host, port = args.connect.rsplit(':', 1)
+        port = int(port)
+    else:
+        if args.max_sessions is None:
+            args.max_sessions = args.sessions
+        server, server_loop, port = start_local_server(args)
+        host = '127.0.0.1'
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    results = asyncio.run(run_load(host, port, args))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    statuses = {}
+    for result in results:
+        statuses[result.status] = statuses.get(result.status, 0) + 1
+    turns = sum(result.turns for result in results)
+    print(f"会话: 共 {len(results)}, 完成 {statuses.get('ok', 0)}, 被拒绝 {statuses.get('rejected', 0)}, "
+          f"失败 {statuses.get('failed', 0)}")
+    errors = {result.error for result in results if result.error}
+    for error in list(errors)[:5]:
+        print(f"  失败原因: {error}")
+    print(f"完成对话 {turns} 轮，耗时 {wall:.1f}秒，吞吐 {turns / wall:.1f} 轮/秒，进程CPU {cpu:.1f}秒")
+
+    print(f"\n{'指标':<16}{'样本':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for name, attr in (('说话结束到最终结果', 'eos_to_final'), ('最终结果到首个音频', 'final_to_audio'),
+                       ('说话结束到首个音频', 'eos_to_audio')):
+        print(format_percentiles(name, [v for result in results for v in getattr(result, attr)]))
+
+    if server is not None:
+        # 先关闭服务器再读取指标，关闭期间会话中出现的错误也计入
+        asyncio.run_coroutine_threadsafe(server.close(), server_loop).result()
+        metrics = asyncio.run_coroutine_threadsafe(_server_metrics(server), server_loop).result()
+        print(f"\n服务器: 最大同时会话 {metrics['max_active']}, 接受 {metrics['accepted']}, "
+              f"拒绝 {metrics['rejected']}, 出错 {metrics['errors']}")
+        if metrics['upstream_encoded_bytes']:
+            print(f"上行编码: {metrics['upstream_pcm_bytes'] / 1024:.0f} KB -> "
+                  f"{metrics['upstream_encoded_bytes'] / 1024:.0f} KB，"
+                  f"压缩比 {metrics['upstream_pcm_bytes'] / metrics['upstream_encoded_bytes']:.1f}，"
+                  f"编码CPU {metrics['encode_cpu_seconds']:.2f}秒")
+
+
+async def _server_metrics(server):
+    """在服务器事件循环中读取指标"""
+    return server.metrics()
+
+
+if __name__ == "__main__":
+    main()
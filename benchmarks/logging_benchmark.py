@@ -0,0 +1,142 @@
+"""
+日志对事件循环延迟的影响基准测试
+在一个事件循环中模拟多个转录会话高频产生部分结果并写DEBUG日志（与TranscribeHandler相同的写法），
+同时用一个定时协程测量事件循环的调度延迟（实际唤醒时间 - 预定唤醒时间），对比以下模式的p50/p95/p99：
+- off：不写日志
+- sync：文件和控制台处理器直接挂在记录器上，在事件循环线程中同步写入（旧的配置）
+- queue：日志放入队列，由后台线程写入（当前配置，不限流）
+- queue+limit：在queue的基础上按LOG_RATE_LIMITS限流
+
+控制台输出写到空设备，文件写到临时目录；--stall-ms可模拟磁盘偶发卡顿
+
+运行方式:
+    python -m benchmarks.logging_benchmark [--sessions 50] [--interval 0.05] [--duration 3] [--stall-ms 20]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from benchmarks.stats import format_percentiles
+from config import LOG_RATE_LIMITS
+from logger_config import LazyFileHandler, create_output_handlers, create_queue_handler
+
+MODES = ('off', 'sync', 'queue', 'queue+limit')
+
+
+class StallingFileHandler(LazyFileHandler):
+    """每写入若干条日志卡顿一次的文件处理器，模拟磁盘I/O抖动"""
+
+    def __init__(self, filename, stall, every):
+        super().__init__(filename)
+        self.stall = stall
+        self.every = every
+        self.count = 0
+
+    def emit(self, record):
+        super().emit(record)
+        self.count += 1
+        if self.stall and self.count % self.every == 0:
+            time.sleep(self.stall)
+
+
+def build_logger(mode, directory, args):
+    """
+    按模式创建独立的记录器
+
+    Returns:
+        tuple: (记录器, 需要在结束时停止的QueueListener或None)
+    """
+    bench_logger = logging.getLogger(f'logging_benchmark.{mode}')
+    bench_logger.propagate = False
+    bench_logger.handlers.clear()
+    bench_logger.setLevel(logging.DEBUG)
+    if mode == 'off':
+        bench_logger.disabled = True
+        return bench_logger, None
+
+    handlers = create_output_handlers(os.path.join(directory, f'{mode}.log'), open(os.devnull, 'w'))
+    stalling = StallingFileHandler(handlers[0].baseFilename, args.stall_ms / 1000, args.stall_every)
+    stalling.setLevel(handlers[0].level)
+    stalling.setFormatter(handlers[0].formatter)
+    handlers[0] = stalling
+
+    if mode == 'sync':
+        for handler in handlers:
+            bench_logger.addHandler(handler)
+        return bench_logger, None
+    rate_limits = LOG_RATE_LIMITS if mode == 'queue+limit' else {}
+    queue_handler, listener = create_queue_handler(handlers, rate_limits=rate_limits)
+    bench_logger.addHandler(queue_handler)
+    return bench_logger, listener
+
+
+async def session(bench_logger, index, args, stop):
+    """模拟一个转录会话：按固定间隔收到部分结果并写日志"""
+    words = []
+    while not stop.is_set():
+        await asyncio.sleep(args.interval)
+        words.append(f"word{len(words) % 50}")
+        transcript = " ".join(words[-20:])
+        bench_logger.debug(f"部分转录结果: {transcript}", extra={'log_class': 'transcribe_partial'})
+        if len(words) % 25 == 0:
+            bench_logger.info(f"会话 {index} 最终转录结果: {transcript}")
+
+
+async def measure_lag(args, stop):
+    """每隔tick秒唤醒一次，记录唤醒延迟"""
+    loop = asyncio.get_running_loop()
+    lags = []
+    deadline = loop.time() + args.duration
+    while loop.time() < deadline:
+        expected = loop.time() + args.tick
+        await asyncio.sleep(args.tick)
+        lags.append(max(0.0, loop.time() - expected))
+    stop.set()
+    return lags
+
+
+async def run_mode(mode, directory, args):
+    """运行一种模式，返回事件循环延迟样本和写日志的条数"""
+    bench_logger, listener = build_logger(mode, directory, args)
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(session(bench_logger, i, args, stop)) for i in range(args.sessions)]
+    lags = await measure_lag(args, stop)
+    await asyncio.gather(*tasks)
+    if listener is not None:
+        listener.stop()
+    path = os.path.join(directory, f'{mode}.log')
+    lines = 0
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            lines = sum(1 for _ in f)
+    return lags, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志对事件循环延迟的影响")
+    parser.add_argument('--sessions', type=int, default=50, help="并发模拟会话数")
+    parser.add_argument('--interval', type=float, default=0.05, help="每个会话部分结果的间隔（秒）")
+    parser.add_argument('--duration', type=float, default=3.0, help="每种模式的运行时长（秒）")
+    parser.add_argument('--tick', type=float, default=0.005, help="测量事件循环延迟的间隔（秒）")
+    parser.add_argument('--stall-ms', type=float, default=0.0, help="模拟磁盘卡顿的时长（毫秒），0表示不卡顿")
+    parser.add_argument('--stall-every', type=int, default=200, help="每写入多少条日志卡顿一次")
+    parser.add_argument('--modes', default=','.join(MODES), help=f"要运行的模式，逗号分隔: {', '.join(MODES)}")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in args.modes.split(','):
+            if mode not in MODES:
+                parser.error(f"未知模式: {mode}")
+            results[mode] = asyncio.run(run_mode(mode, directory, args))
+
+    print(f"{'事件循环延迟':<16}{'样本':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'最大(ms)':>10}{'日志行数':>10}")
+    for mode, (lags, lines) in results.items():
+        print(f"{format_percentiles(mode, lags)}{max(lags, default=0.0) * 1000:>10.1f}{lines:>10}")
+
+
+if __name__ == "__main__":
+    main()
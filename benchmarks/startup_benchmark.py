@@ -0,0 +1,121 @@
+"""
+启动时间基准测试
+每次试验在全新的Python进程中构造VoiceProcessor，统计以下耗时的p50/p95：
+- 导入：import voice_processor
+- 构造：VoiceProcessor()返回
+- 就绪：后台预热完成（SDK已导入、客户端已创建、转录流已预开）
+- 首轮额外开销：模拟用户准备若干秒后开始第一轮对话时，仍需同步完成的初始化工作
+- 进程总耗时：父进程启动子进程到子进程就绪
+
+默认使用本地替身（无需声卡和AWS账号，SDK导入的开销是真实的），--aws使用真实的AWS客户端
+
+运行方式:
+    python -m benchmarks.startup_benchmark [--trials 5] [--think 1.0] [--no-prewarm] [--aws]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from benchmarks.stats import format_percentiles
+
+# 子进程在最后一行输出JSON结果
+RESULT_PREFIX = 'STARTUP_RESULT '
+
+
+def run_child(args):
+    """在子进程中测量各阶段耗时并输出结果"""
+    start = time.perf_counter()
+    import logging
+    import voice_processor
+    from logger_config import logger
+    logger.setLevel(logging.WARNING)
+    imported = time.perf_counter()
+
+    kwargs = {}
+    if not args.aws:
+        from aws_services.polly_client import PollyClient
+        from audio_helpers.audio_sinks import NullAudioSink
+        from benchmarks.fakes import (
+            WavFileSource, FakeTranscribeStreamingClient, FakePollyClient, FakeComprehendClient
+        )
+
+        def transcribe_factory():
+            from aws_services.transcribe_client import TranscribeClient
+            return TranscribeClient(client_factory=FakeTranscribeStreamingClient(handshake_delay=args.handshake))
+
+        kwargs = dict(mic_input=WavFileSource(), audio_output=NullAudioSink(), transcribe_factory=transcribe_factory,
+                      polly_client=PollyClient(client=FakePollyClient(args.handshake),
+                                               comprehend=FakeComprehendClient()))
+    processor = voice_processor.VoiceProcessor(**kwargs)
+    constructed = time.perf_counter()
+
+    ready = None
+    if not args.no_prewarm:
+        processor.prewarm().join()
+        ready = time.perf_counter()
+
+    # 模拟用户准备说话的时间，之后第一轮对话需要的客户端和转录流
+    remaining = args.think - (time.perf_counter() - constructed)
+    if remaining > 0:
+        time.sleep(remaining)
+    first_use_start = time.perf_counter()
+    processor.transcribe_client.prewarm()
+    processor.polly_client.client
+    first_use = time.perf_counter() - first_use_start
+    if ready is None:
+        # 不预热时，就绪时间按构造完成后立即进行同样的初始化计算
+        ready = constructed + first_use
+
+    result = {
+        'import': imported - start,
+        'construct': constructed - imported,
+        'ready': ready - start,
+        'first_use': first_use,
+        # 以挂钟时间换算，包含解释器自身的启动时间
+        'process': time.time() - (time.perf_counter() - ready) - args.spawn_time,
+    }
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+    processor.transcribe_client.shutdown()
+
+
+def run_trial(args):
+    """启动一个子进程完成一次试验"""
+    command = [sys.executable, '-m', 'benchmarks.startup_benchmark', '--child', '--think', str(args.think),
+               '--handshake', str(args.handshake), '--spawn-time', repr(time.time())]
+    if args.no_prewarm:
+        command.append('--no-prewarm')
+    if args.aws:
+        command.append('--aws')
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    for line in output.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"子进程没有输出结果: {output[-500:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动时间基准测试")
+    parser.add_argument('--trials', type=int, default=5, help="试验次数")
+    parser.add_argument('--think', type=float, default=1.0, help="模拟用户准备说话的时间（秒）")
+    parser.add_argument('--handshake', type=float, default=0.15, help="本地替身的连接建立延迟（秒）")
+    parser.add_argument('--no-prewarm', action='store_true', help="不预热，所有初始化都在第一轮对话时进行")
+    parser.add_argument('--aws', action='store_true', help="使用真实的AWS客户端（需要凭证和网络）")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--spawn-time', type=float, default=0.0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    results = [run_trial(args) for _ in range(args.trials)]
+    print(f"{'指标':<16}{'样本':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    for name, key in (('导入', 'import'), ('构造', 'construct'), ('就绪', 'ready'),
+                      ('首轮额外开销', 'first_use'), ('进程总耗时', 'process')):
+        print(format_percentiles(name, [result[key] for result in results]))
+
+
+if __name__ == "__main__":
+    main()
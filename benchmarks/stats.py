@@ -0,0 +1,33 @@
+"""
+基准测试共用的统计函数
+"""
+
+
+def percentile(values, q):
+    """线性插值计算百分位数"""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def format_percentiles(name, values, scale=1000.0, width=16):
+    """
+    格式化一行p50/p95/p99
+
+    Args:
+        name (str): 指标名称
+        values (list): 样本（秒）
+        scale (float): 输出单位换算，默认换算为毫秒
+        width (int): 名称列宽
+
+    Returns:
+        str: 格式化后的一行
+    """
+    row = f"{name:<{width}}{len(values):>6}"
+    for q in (50, 95, 99):
+        row += f"{percentile(values, q) * scale:>10.1f}"
+    return row
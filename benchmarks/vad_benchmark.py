@@ -0,0 +1,81 @@
+"""
+VAD与端点检测基准测试
+在合成的语音/噪声信号上比较各VAD实现的说话结束检测延迟和每秒音频的CPU耗时
+
+运行方式:
+    python -m benchmarks.vad_benchmark
+"""
+
+import time
+from config import SAMPLE_RATE, CHUNK_SIZE
+from audio_helpers.vad import AdaptiveVAD, EnergyVAD, Endpointer
+from benchmarks.signals import utterance, iter_chunks
+
+# 早期实现：50个静音块（约3.2秒）判定说话结束
+LEGACY_SILENCE_MS = 50 * CHUNK_SIZE / SAMPLE_RATE * 1000
+
+SCENARIOS = [
+    ('white', 20.0),
+    ('white', 10.0),
+    ('white', 5.0),
+    ('pink', 20.0),
+    ('pink', 10.0),
+    ('pink', 5.0),
+]
+
+
+def run_case(vad, endpointer, pcm, speech_start, speech_end):
+    """
+    运行一个测试片段
+
+    Returns:
+        dict: 检测结果，包括说话结束检测延迟、误触发和CPU耗时
+    """
+    chunk_ms = CHUNK_SIZE / SAMPLE_RATE * 1000
+    elapsed = 0.0
+    onset_time = None
+    end_time = None
+    cpu = 0.0
+
+    for chunk in iter_chunks(pcm, CHUNK_SIZE):
+        t0 = time.process_time()
+        is_speech = vad.is_speech(chunk)
+        cpu += time.process_time() - t0
+
+        elapsed += chunk_ms / 1000
+        if is_speech and onset_time is None:
+            onset_time = elapsed
+        if endpointer.update(is_speech, chunk_ms):
+            end_time = elapsed
+            break
+
+    audio_seconds = len(pcm) / 2 / SAMPLE_RATE
+    return {
+        'reason': endpointer.reason,
+        'false_start': onset_time is not None and onset_time < speech_start,
+        'eos_delay_ms': (end_time - speech_end) * 1000 if end_time and endpointer.reason == 'end_of_speech' else None,
+        'cpu_ms_per_s': cpu * 1000 / min(audio_seconds, elapsed or audio_seconds),
+    }
+
+
+def main():
+    detectors = [
+        ('energy (legacy 3.2s)', lambda: EnergyVAD(), LEGACY_SILENCE_MS),
+        ('energy', lambda: EnergyVAD(), None),
+        ('adaptive', lambda: AdaptiveVAD(), None),
+    ]
+
+    print(f"{'检测器':<22}{'噪声':<8}{'SNR':>6}{'端点原因':>16}{'误触发':>8}{'结束延迟(ms)':>14}{'CPU(ms/s)':>12}")
+    for name, factory, silence_ms in detectors:
+        for noise_kind, snr_db in SCENARIOS:
+            pcm, speech_start, speech_end = utterance(lead=1.0, speech=2.0, tail=4.0, snr_db=snr_db,
+                                                      noise_kind=noise_kind, seed=int(snr_db))
+            endpointer = Endpointer(silence_ms=silence_ms) if silence_ms else Endpointer()
+            result = run_case(factory(), endpointer, pcm, speech_start, speech_end)
+            delay = f"{result['eos_delay_ms']:.0f}" if result['eos_delay_ms'] is not None else '-'
+            print(f"{name:<22}{noise_kind:<8}{snr_db:>6.0f}{result['reason'] or '-':>16}"
+                  f"{'是' if result['false_start'] else '否':>8}{delay:>14}{result['cpu_ms_per_s']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
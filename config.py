@@ -2,6 +2,8 @@
 配置文件，包含项目的各种设置
 """
 
+import os
+
 # 音频配置
 SAMPLE_RATE = 16000  # 采样率 (Hz)
 CHANNELS = 1  # 单声道
@@ -26,3 +28,179 @@ POLLY_VOICE_ID = {
     'es-ES': 'Lucia'
 }  # 各语言的默认语音
 POLLY_OUTPUT_FORMAT = 'mp3'  # 输出格式
+POLLY_ENGINE = 'neural'  # 合成引擎
+
+# Polly合成缓存配置
+POLLY_CACHE_ENABLED = True  # 是否启用合成缓存
+POLLY_CACHE_MEMORY_BYTES = 32 * 1024 * 1024  # 内存LRU缓存字节上限
+POLLY_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'polly')  # 磁盘缓存目录
+POLLY_CACHE_DISK_BYTES = 512 * 1024 * 1024  # 磁盘缓存字节上限
+POLLY_CACHE_STATS_INTERVAL = 50  # 每查询多少次输出一次缓存统计
+
+# Polly流式播放配置
+POLLY_STREAMING_PLAYBACK = True  # 是否以PCM流式合成并边收边播
+POLLY_PCM_SAMPLE_RATE = 16000  # PCM输出采样率 (Hz)，Polly支持8000和16000
+POLLY_STREAM_CHUNK_BYTES = 4096  # 每次从音频流读取的字节数
+
+# 音频输出配置
+AUDIO_OUTPUT_DEVICE = None  # 输出设备编号或名称，None表示系统默认设备
+AUDIO_OUTPUT_BLOCK_MS = 20  # 输出回调每次填充的音频时长（毫秒）
+AUDIO_OUTPUT_LATENCY = 'low'  # 输出流延迟设置，'low'、'high'或秒数
+AUDIO_OUTPUT_MAX_LOOKAHEAD = 0.5  # 流式播放时最多提前排队的音频时长（秒），超出时写入方等待
+
+# 分句流水线配置
+PIPELINE_ENABLED = True  # 是否按句子分段并行合成、顺序播放
+PIPELINE_MAX_WORKERS = 3  # 并行合成的最大线程数
+SEGMENT_MIN_CHARS = 6  # 分段的最小字符数，过短的片段会与后一段合并
+SEGMENT_MAX_CHARS = 120  # 超过该长度的句子会在从句边界处继续切分
+
+# Transcribe音频队列配置
+TRANSCRIBE_QUEUE_MAXSIZE = 64  # 队列最多缓存的音频块数量（约4秒音频）
+TRANSCRIBE_QUEUE_OVERFLOW = 'drop_oldest'  # 队列满时的策略：'drop_oldest'、'block'或'coalesce'
+TRANSCRIBE_QUEUE_BLOCK_TIMEOUT = 0.5  # 'block'策略下采集线程最长等待时间（秒）
+TRANSCRIBE_COALESCE_MAX_BYTES = 32 * 1024  # 'coalesce'策略下合并后单个音频块的最大字节数
+
+# Transcribe常驻工作线程配置
+TRANSCRIBE_PREOPEN_STREAM = True  # 播放回复时是否预先打开下一次对话的转录流
+TRANSCRIBE_PREOPEN_MAX_AGE = 10.0  # 预开流的最长保留时间（秒），超时后服务端可能因无音频而关闭
+
+# Transcribe上行编码配置
+TRANSCRIBE_MEDIA_ENCODING = 'pcm'  # 上行音频编码：'pcm'（约256kbit/s）、'flac'（无损）或'ogg-opus'（有损，约30kbit/s）
+TRANSCRIBE_ENCODER_WORKERS = 4  # 所有会话共享的编码线程数
+TRANSCRIBE_FLAC_COMPRESSION_LEVEL = 0.0  # FLAC压缩级别（0到1），0使用最小的分块（约72ms），编码延迟最低
+TRANSCRIBE_OPUS_PAGE_LATENCY_MS = 20.0  # Ogg页的最长缓冲时长（毫秒），越小上行越及时，封装开销越大
+
+# Transcribe长连接配置
+TRANSCRIBE_PERSISTENT_STREAM = False  # 是否让多次说话共用一个常驻转录流，省去每次对话的握手
+TRANSCRIBE_MAX_STREAM_SECONDS = 4 * 60 * 60  # 服务端单个转录流的最长时长（秒），Transcribe流式转录的上限为4小时
+TRANSCRIBE_ROLLOVER_MARGIN = 300.0  # 距上限不足该秒数时，在两次说话之间打开替换流
+TRANSCRIBE_ROLLOVER_FORCE_MARGIN = 30.0  # 距上限不足该秒数时，即使正在说话也立即打开替换流
+TRANSCRIBE_ROLLOVER_OVERLAP = 1.0  # 切换时新旧两个流同时接收音频的时长（秒）
+TRANSCRIBE_ROLLOVER_MAX_OVERLAP = 15.0  # 旧流还有未成为最终结果的片段时，最多延长同时接收的时长（秒）
+TRANSCRIBE_KEEPALIVE_INTERVAL = 5.0  # 超过该秒数没有音频时发送一段静音，服务端约15秒收不到音频会关闭流
+TRANSCRIBE_KEEPALIVE_MS = 100  # 每次保活发送的静音时长（毫秒）
+TRANSCRIBE_SEGMENT_FLUSH_MS = 500  # 本地判定说完后补发的静音时长（毫秒），促使服务端尽快给出最终结果
+TRANSCRIBE_SEGMENT_FINAL_TIMEOUT = 2.0  # 补发静音后等待最终结果的最长时间（秒）
+TRANSCRIBE_RECONNECT_BASE_DELAY = 0.5  # 打开转录流失败后首次重试前的等待时间（秒），之后每次加倍
+TRANSCRIBE_RECONNECT_MAX_DELAY = 10.0  # 重试打开转录流的最长等待时间（秒）
+TRANSCRIBE_READY_TIMEOUT = 10.0  # 预热时等待转录流打开的最长时间（秒）
+
+# 麦克风采集配置
+MIC_CAPTURE_MODE = 'callback'  # 采集模式：'blocking'（阻塞读取）或'callback'（回调写入环形缓冲区）
+MIC_RING_BUFFER_SECONDS = 2.0  # 环形缓冲区可容纳的音频时长（秒）
+MIC_READ_TIMEOUT = 1.0  # 回调模式下等待音频块的最长时间（秒）
+MIC_DEVICE = None  # 输入设备编号，None表示系统默认设备
+MIC_DEVICE_RATE = None  # 设备采集采样率 (Hz)，None表示设备支持SAMPLE_RATE时直接使用，否则使用设备默认采样率
+MIC_DEVICE_CHANNELS = None  # 设备采集声道数，None表示设备支持单声道时直接使用，否则使用设备的全部输入声道
+CAPTURE_FILTER_TAPS = 63  # 降采样前抗混叠低通滤波器的阶数
+CAPTURE_FILTER_CUTOFF = 0.9  # 抗混叠滤波器截止频率占目标采样率奈奎斯特频率的比例
+
+# 音频输入输出后端配置
+AUDIO_SOURCE = 'pyaudio'  # 音频输入：'pyaudio'（麦克风）、'file'（内存映射读取WAV/原始PCM）、'socket'（TCP/UNIX套接字PCM流）或'null'（静音）
+AUDIO_SOURCE_PATH = None  # 'file'输入的文件路径，WAV按文件头解析，其他文件视为SAMPLE_RATE的16位单声道原始PCM
+AUDIO_SOURCE_SPEED = 1.0  # 'file'和'null'输入的读取速度倍数，1.0为实时，大于1加速，0表示不等待
+AUDIO_SOURCE_LOOP = False  # 'file'输入读完后是否从头循环，否则读完后结束程序
+AUDIO_SOURCE_ADDRESS = None  # 'socket'输入的地址：'tcp://主机:端口'或'unix:///路径'，数据为SAMPLE_RATE的16位单声道PCM
+AUDIO_SOURCE_LISTEN = False  # 'socket'输入是否监听等待对端连接，False时主动连接
+AUDIO_SINK = 'sounddevice'  # 音频输出：'sounddevice'（扬声器）、'socket'（TCP/UNIX套接字PCM流）或'null'（丢弃）
+AUDIO_SINK_ADDRESS = None  # 'socket'输出的地址，格式同AUDIO_SOURCE_ADDRESS，数据为POLLY_PCM_SAMPLE_RATE的16位单声道PCM
+AUDIO_SINK_LISTEN = False  # 'socket'输出是否监听等待对端连接，False时主动连接
+AUDIO_SINK_REALTIME = True  # 'socket'和'null'输出是否按音频时长等待，保持与扬声器相同的轮次节奏和打断行为
+AUDIO_SOCKET_TIMEOUT = 5.0  # 套接字连接和写入的超时时间（秒）
+
+# 语音活动检测（VAD）配置
+VAD_BACKEND = 'adaptive'  # VAD实现：'adaptive'（自适应噪声底+频谱特征）或'energy'（平均幅度阈值）
+VAD_ENERGY_THRESHOLD = 500  # 'energy'模式下的平均幅度阈值
+VAD_FRAME_MS = 20  # 分析帧长（毫秒）
+VAD_BAND_LOW_HZ = 150  # 计算能量和频谱平坦度的语音频带下限 (Hz)
+VAD_BAND_HIGH_HZ = 4000  # 语音频带上限 (Hz)
+VAD_ENERGY_MARGIN_DB = 9.0  # 帧能量高于噪声底多少分贝才可能是语音
+VAD_MIN_ENERGY_DB = -55.0  # 语音帧的最低绝对能量（dBFS）
+VAD_NOISE_ADAPT_RATE = 0.05  # 噪声底在非语音帧上的跟踪速率
+VAD_ZCR_MAX = 0.35  # 浊音帧的最大过零率
+VAD_FLATNESS_MAX = 0.45  # 语音帧的最大频谱平坦度（越接近1越像白噪声）
+VAD_TONAL_FLATNESS_MAX = 0.3  # 低于该平坦度的帧视为明显的谐波结构
+VAD_TONAL_MARGIN_DB = 3.0  # 谐波结构明显的帧只需高于噪声底的分贝数
+VAD_ONSET_MS = 60  # 连续多少毫秒的语音帧才判定为开始说话
+VAD_HANGOVER_MS = 200  # 语音帧结束后保持语音状态的时长（毫秒）
+
+# 端点检测配置
+ENDPOINT_SILENCE_MS = 600  # 说话后静音多少毫秒判定为说完
+ENDPOINT_NO_SPEECH_TIMEOUT_MS = 5000  # 一直未检测到语音时的超时（毫秒）
+ENDPOINT_MAX_UTTERANCE_MS = 30000  # 单次说话的最长时长（毫秒）
+
+# 语音门控配置
+GATE_ENABLED = True  # 是否只在检测到语音后才向Transcribe发送音频
+GATE_PREROLL_MS = 300  # 语音开始前保留并补发的音频时长（毫秒）
+GATE_PAUSE_MS = 1500  # 说话过程中静音超过该时长时暂停发送（毫秒）
+
+# 推测合成配置
+SPECULATIVE_SYNTHESIS = True  # 是否根据稳定的部分转录结果提前合成完整的句子
+SPECULATIVE_MAX_SEGMENTS = 4  # 同时保留的推测合成片段上限
+
+# 对话模式配置
+CONVERSATION_MODE = 'half_duplex'  # 'half_duplex'：录音和回复交替进行，每轮后按Enter继续；'continuous'：录音不停，回复在后台播放，说完自动进入下一轮
+BARGE_IN_ENABLED = True  # 连续模式下用户在回复期间开口时是否打断回复
+BARGE_IN_ACTION = 'cancel'  # 打断方式：'cancel'停止播放并丢弃剩余回复，'duck'压低音量继续播放
+BARGE_IN_REACTION_MS = 150  # 回复期间连续检测到语音多少毫秒后打断，越小反应越快，越大越不易被咳嗽等短促声音误触发
+BARGE_IN_DUCK_GAIN = 0.25  # 'duck'方式下回复的音量倍数
+
+# 本地语言识别配置
+LANGID_LOCAL_ENABLED = True  # 是否优先使用本地语言识别
+LANGID_CONFIDENCE_THRESHOLD = 0.85  # 本地识别置信度低于该值时回退到AWS Comprehend
+LANGID_EVIDENCE_CAP = 12  # 计算置信度时最多计入的三元组数量，防止长文本过度自信
+
+# 日志配置
+LOG_QUEUE_MAXSIZE = 10000  # 日志队列容量，由后台线程写入文件和控制台，队列满时丢弃新日志而不阻塞调用方
+LOG_RATE_LIMITS = {'transcribe_partial': 5.0, 'polly_cache': 20.0}  # 按消息类别限制每秒写入的日志条数，超出的被丢弃并计数
+
+# 启动配置
+PREWARM_ENABLED = True  # 启动后是否在后台预热：初始化音频设备、创建AWS客户端并建立连接
+
+# 延迟追踪配置
+TRACE_ENABLED = True  # 是否记录每次对话各阶段的延迟
+TRACE_JSONL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'traces.jsonl')  # 每次对话追加一行JSON，None表示不写入
+TRACE_PROMETHEUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'metrics.prom')  # Prometheus文本文件，None表示不写入
+TRACE_PROMETHEUS_PORT = 0  # 通过HTTP提供/metrics的端口，0表示不启动
+TRACE_HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # 直方图分桶上界（秒）
+TRACE_EXPORT_QUEUE_MAXSIZE = 10000  # 等待后台线程导出的对话记录上限，超出时丢弃
+TRACE_PROMETHEUS_INTERVAL = 1.0  # Prometheus文本文件最多每隔多少秒重写一次
+
+# 服务器模式配置
+SERVER_HOST = '127.0.0.1'  # 监听地址
+SERVER_PORT = 8765  # 监听端口
+SERVER_MAX_SESSIONS = 200  # 同时服务的会话上限，超出时回复BUSY并断开连接
+SERVER_SESSION_QUEUE_MAXSIZE = 32  # 每个会话上行音频队列的容量（音频块），满时暂停读取该连接，经TCP流量控制向客户端施加背压
+SERVER_POLLY_POOL_SIZE = 32  # 所有会话共享的Polly合成线程数，同时也是boto3连接池大小
+SERVER_RESPONSE_WORKERS = 64  # 同时进行回复合成与下发的会话数上限
+SERVER_IDLE_TIMEOUT = 60.0  # 会话在该时长内没有收到任何数据时断开（秒）
+SERVER_TRANSCRIBE_TIMEOUT = 10.0  # 音频输入结束后等待最终转录结果的最长时间（秒）
+SERVER_MAX_FRAME_BYTES = 256 * 1024  # 单帧负载的最大字节数
+
+# 批处理模式配置
+BATCH_CONCURRENCY = 4  # 同时处理的文件数
+BATCH_STREAM_SPEED = 4.0  # 向Transcribe发送音频的速度（实时的倍数），0表示不限速
+BATCH_CHUNK_MS = 100  # 每次发送的音频时长（毫秒）
+BATCH_TRANSCRIBE_TIMEOUT = 30.0  # 音频发送完毕后等待最终转录结果的最长时间（秒）
+BATCH_MANIFEST_NAME = 'manifest.jsonl'  # 输出目录中记录已完成文件的清单，用于断点续跑
+
+# AWS API限流与重试配置
+AWS_API_RATE_LIMITS = {
+    'polly': 8.0,  # SynthesizeSpeech
+    'comprehend': 20.0,  # DetectDominantLanguage
+    'transcribe': 25.0,  # StartStreamTranscription
+}  # 进程内共享：每个API每秒最多发起的请求数，0表示不限速
+AWS_RETRY_MAX_ATTEMPTS = 5  # 遇到限流、服务端错误或连接失败等暂时性错误时的最多尝试次数（含首次）
+AWS_RETRY_BASE_DELAY = 0.1  # 指数退避的基础等待时间（秒），实际等待在0到退避上限之间随机
+AWS_RETRY_MAX_DELAY = 5.0  # 单次退避的最长等待时间（秒）
+AWS_ADAPTIVE_MIN_RATE_RATIO = 0.1  # 限流后请求速率最低降到配置速率的比例，每次限流速率减半
+AWS_ADAPTIVE_RECOVERY_STEP = 0.05  # 每次请求成功后恢复配置速率的比例
+POLLY_COALESCE_ENABLED = True  # 是否合并并发的相同合成请求，只调用一次Polly
+
+# 长文档合成配置
+DOCUMENT_MAX_CHARS = 2800  # 每次请求的最大字符数，Polly单次请求上限为3000个计费字符
+DOCUMENT_MAX_WORKERS = 8  # 并行合成的分段数，同时也是内存中最多保留的已合成分段数
+DOCUMENT_LANGID_SAMPLE_CHARS = 1000  # 检测文档语言时使用开头的多少个字符
+
+# Polly/Comprehend异步接口配置
+POLLY_ASYNC_WORKERS = 16  # 异步接口使用的线程池大小，同时也是默认boto3客户端的连接池大小
@@ -1,43 +1,186 @@
 """
 日志配置模块，提供统一的日志设置
+导入本模块不会创建目录或文件，日志目录和日志文件在第一条日志写入时才创建
+
+调用方只把日志记录放入队列，由后台线程格式化并写入文件和控制台，
+事件循环和音频回调中的日志不会因磁盘或终端I/O而阻塞。
+高频日志可以通过extra={'log_class': 类别}归类，按LOG_RATE_LIMITS限制每秒写入的条数：
+
+    logger.debug(f"部分转录结果: {transcript}", extra={'log_class': 'transcribe_partial'})
 """
 
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
 from datetime import datetime
+from config import LOG_QUEUE_MAXSIZE, LOG_RATE_LIMITS
 
-# 创建logs目录（如果不存在）
+# 日志目录
 logs_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
-if not os.path.exists(logs_dir):
-    os.makedirs(logs_dir)
 
 # 创建日志文件名，包含日期
 log_file = os.path.join(logs_dir, f'voice_processor_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
 
-# 配置根日志记录器
-def setup_logger():
-    """设置并返回配置好的日志记录器"""
-    # 创建日志记录器
-    logger = logging.getLogger('voice_processor')
-    logger.setLevel(logging.DEBUG)
-    
+
+class LazyFileHandler(logging.FileHandler):
+    """第一次写入时才创建目录和日志文件的文件处理器"""
+
+    def __init__(self, filename):
+        super().__init__(filename, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class RateLimitFilter(logging.Filter):
+    """按消息类别限制每秒通过的日志条数，未归类的日志不受限制"""
+
+    def __init__(self, rates):
+        """
+        初始化过滤器
+
+        Args:
+            rates (dict): 消息类别 -> 每秒最多通过的条数，0表示不限制
+        """
+        super().__init__()
+        self.rates = dict(rates)
+        # 消息类别 -> [可用配额, 上次补充时间]
+        self.buckets = {}
+        self.dropped = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        log_class = getattr(record, 'log_class', None)
+        rate = self.rates.get(log_class)
+        if not rate:
+            return True
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.setdefault(log_class, [rate, now])
+            bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                self.dropped[log_class] = self.dropped.get(log_class, 0) + 1
+                return False
+            bucket[0] -= 1
+            dropped = self.dropped.pop(log_class, 0)
+        if dropped:
+            # 在下一条通过的同类日志中注明期间省略的条数
+            record.msg = f"{record.msg}（此前省略同类日志 {dropped} 条）"
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """把日志记录放入有界队列的处理器，队列满时丢弃而不阻塞调用方"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        """
+        只在调用方线程中完成必须立即进行的工作：合并消息参数、展开异常堆栈
+        时间格式化和输出交给后台线程中的处理器
+        """
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def get_log_metrics():
+    """
+    获取日志指标
+
+    Returns:
+        dict: 队列深度、因队列满丢弃的条数、各类别被限流丢弃的条数
+    """
+    handler = getattr(logger, 'queue_handler', None)
+    if handler is None:
+        return {}
+    rate_filter = handler.filters[0]
+    with rate_filter.lock:
+        rate_limited = dict(rate_filter.dropped)
+    return {'queue_depth': handler.queue.qsize(), 'queue_dropped': handler.dropped, 'rate_limited': rate_limited}
+
+
+def create_output_handlers(filename, stream=None):
+    """
+    创建写入日志文件（DEBUG及以上）和控制台（INFO及以上）的处理器
+
+    Args:
+        filename (str): 日志文件路径，第一次写入时才创建
+        stream: 控制台输出流，默认为sys.stderr
+
+    Returns:
+        list: [文件处理器, 控制台处理器]
+    """
     # 创建文件处理器
-    file_handler = logging.FileHandler(log_file)
+    file_handler = LazyFileHandler(filename)
     file_handler.setLevel(logging.DEBUG)
-    
+
     # 创建控制台处理器
-    console_handler = logging.StreamHandler()
+    console_handler = logging.StreamHandler(stream)
     console_handler.setLevel(logging.INFO)
-    
+
     # 创建格式化器
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
-    
-    # 添加处理器到日志记录器
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
+    return [file_handler, console_handler]
+
+
+def create_queue_handler(handlers, maxsize=LOG_QUEUE_MAXSIZE, rate_limits=LOG_RATE_LIMITS):
+    """
+    创建队列处理器和后台写入线程
+
+    Args:
+        handlers (list): 在后台线程中实际输出日志的处理器
+        maxsize (int): 队列容量
+        rate_limits (dict): 消息类别 -> 每秒最多写入的条数
+
+    Returns:
+        tuple: (NonBlockingQueueHandler, 已启动的QueueListener)
+    """
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize))
+    queue_handler.addFilter(RateLimitFilter(rate_limits))
+    listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return queue_handler, listener
+
+
+# 配置根日志记录器
+def setup_logger():
+    """设置并返回配置好的日志记录器，重复调用时直接返回已配置的记录器，不会重复添加处理器"""
+    # 创建日志记录器
+    logger = logging.getLogger('voice_processor')
+    if getattr(logger, 'queue_handler', None) is not None:
+        return logger
+    logger.setLevel(logging.DEBUG)
+
+    # 记录器只挂队列处理器，文件和控制台处理器由后台线程调用
+    queue_handler, listener = create_queue_handler(create_output_handlers(log_file))
+    # 进程退出时写完队列中剩余的日志
+    atexit.register(listener.stop)
+
+    logger.addHandler(queue_handler)
+    logger.queue_handler = queue_handler
+    logger.queue_listener = listener
+
     return logger
 
 # 获取日志记录器实例
@@ -0,0 +1 @@
+# 语音处理流水线模块
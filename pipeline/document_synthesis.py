@@ -0,0 +1,186 @@
+"""
+长文档合成模块，把超出Polly单次请求字符上限的文档合成为一个音频文件
+- 在句子边界处把文档切分为不超过DOCUMENT_MAX_CHARS的分段
+- 多个分段并行合成，按原顺序逐段写入输出文件，内存中最多保留DOCUMENT_MAX_WORKERS个分段
+- PCM分段直接拼接到WAV或原始PCM文件；MP3帧和Ogg逻辑流本身可以首尾相接，按字节拼接即可
+
+运行方式:
+    python -m pipeline.document_synthesis <文本文件> <输出文件(.wav/.pcm/.mp3/.ogg)> [--language en-US] [--workers 8]
+"""
+
+import argparse
+import contextvars
+import os
+import time
+import wave
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    POLLY_PCM_SAMPLE_RATE, DOCUMENT_MAX_CHARS, DOCUMENT_MAX_WORKERS, DOCUMENT_LANGID_SAMPLE_CHARS
+)
+from logger_config import logger
+from text_helpers.segmenter import split_sentences
+
+# 输出文件扩展名 -> (Polly输出格式, 是否写WAV头)
+OUTPUT_FORMATS = {
+    '.wav': ('pcm', True),
+    '.pcm': ('pcm', False),
+    '.raw': ('pcm', False),
+    '.mp3': ('mp3', False),
+    '.ogg': ('ogg_vorbis', False),
+}
+
+
+def split_document(text, language_code=None, max_chars=DOCUMENT_MAX_CHARS):
+    """
+    在句子边界处把文档切分为不超过max_chars的分段，相邻的短句尽量合并到同一分段
+
+    Args:
+        text (str): 文档文本
+        language_code (str, optional): 语言代码，决定使用全角还是半角标点切分
+        max_chars (int): 每个分段的最大字符数
+
+    Returns:
+        list: 按原顺序排列的分段
+    """
+    # 最小长度与最大长度相同时，split_sentences会把句子贪心地合并到上限以内
+    return split_sentences(text, language_code, min_chars=max_chars, max_chars=max_chars)
+
+
+class DocumentSynthesizer:
+    """长文档合成器"""
+
+    def __init__(self, polly_client, max_workers=DOCUMENT_MAX_WORKERS, max_chars=DOCUMENT_MAX_CHARS):
+        """
+        初始化合成器
+
+        Args:
+            polly_client: PollyClient实例，限流、重试和请求合并沿用其配置
+            max_workers (int): 并行合成的分段数
+            max_chars (int): 每个分段的最大字符数
+        """
+        self.polly_client = polly_client
+        self.max_workers = max_workers
+        self.max_chars = max_chars
+
+    def synthesize_to_file(self, text, output_path, language_code=None):
+        """
+        合成文档并写入文件，先写临时文件，全部分段成功后再替换
+
+        Args:
+            text (str): 文档文本
+            output_path (str): 输出文件路径，格式由扩展名决定
+            language_code (str, optional): 语言代码，未提供时根据文档开头检测一次
+
+        Returns:
+            dict: 分段数、字符数、输出字节数、音频时长（PCM格式）和耗时
+
+        Raises:
+            ValueError: 不支持的输出格式或文档为空
+            RuntimeError: 某个分段合成失败
+        """
+        extension = os.path.splitext(output_path)[1].lower()
+        if extension not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {extension}，可选: {', '.join(OUTPUT_FORMATS)}")
+        output_format, wav_header = OUTPUT_FORMATS[extension]
+
+        start_time = time.perf_counter()
+        if not language_code:
+            language_code = self.polly_client.detect_language(text[:DOCUMENT_LANGID_SAMPLE_CHARS])
+        segments = split_document(text, language_code, self.max_chars)
+        if not segments:
+            raise ValueError("文档为空")
+        logger.info(f"文档共 {len(text)} 个字符，切分为 {len(segments)} 段，语言 {language_code}")
+
+        tmp_path = f"{output_path}.tmp"
+        try:
+            if wav_header:
+                with wave.open(tmp_path, 'wb') as wav:
+                    wav.setnchannels(1)
+                    wav.setsampwidth(2)
+                    wav.setframerate(POLLY_PCM_SAMPLE_RATE)
+                    written = self._write_segments(segments, language_code, output_format, wav.writeframesraw)
+            else:
+                with open(tmp_path, 'wb') as f:
+                    written = self._write_segments(segments, language_code, output_format, f.write)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        elapsed = time.perf_counter() - start_time
+        result = {'segments': len(segments), 'chars': len(text), 'bytes': written, 'elapsed': elapsed,
+                  'audio_seconds': written / 2 / POLLY_PCM_SAMPLE_RATE if output_format == 'pcm' else None}
+        logger.info(f"文档合成完成: {output_path}，{written / 1024:.0f} KB，用时 {elapsed:.1f}秒")
+        return result
+
+    def _write_segments(self, segments, language_code, output_format, write):
+        """
+        并行合成各分段并按顺序写出，最多同时保留max_workers个未写出的分段
+
+        Returns:
+            int: 写出的音频字节数
+        """
+        written = 0
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='document-synth') as executor:
+            pending = deque()
+            next_index = 0
+
+            def fill_window():
+                nonlocal next_index
+                while next_index < len(segments) and len(pending) < self.max_workers:
+                    pending.append(executor.submit(context.copy().run, self._synthesize_segment,
+                                                   segments[next_index], language_code, output_format))
+                    next_index += 1
+
+            fill_window()
+            index = 0
+            try:
+                while pending:
+                    chunks = pending.popleft().result()
+                    fill_window()
+                    if not chunks:
+                        raise RuntimeError(f"第 {index + 1} 段合成失败: {segments[index][:30]}")
+                    for chunk in chunks:
+                        write(chunk)
+                        written += len(chunk)
+                    index += 1
+                    logger.info(f"已写出 {index}/{len(segments)} 段")
+            finally:
+                for future in pending:
+                    future.cancel()
+        return written
+
+    def _synthesize_segment(self, segment, language_code, output_format):
+        """在工作线程中合成一个分段，分段不会重复，不写入合成缓存"""
+        return list(self.polly_client.synthesize_speech_stream(
+            segment, language_code, output_format=output_format, use_cache=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把长文档合成为一个音频文件")
+    parser.add_argument('input', help="UTF-8文本文件")
+    parser.add_argument('output', help=f"输出文件，格式由扩展名决定: {', '.join(OUTPUT_FORMATS)}")
+    parser.add_argument('--language', help="语言代码，例如en-US，默认根据文档开头检测")
+    parser.add_argument('--workers', type=int, default=DOCUMENT_MAX_WORKERS, help="并行合成的分段数")
+    args = parser.parse_args()
+
+    from aws_services.polly_client import PollyClient, log_aws_metrics
+    polly_client = PollyClient()
+    with open(args.input, encoding='utf-8') as f:
+        text = f.read()
+
+    result = DocumentSynthesizer(polly_client, args.workers).synthesize_to_file(text, args.output, args.language)
+    summary = f"{result['segments']} 段，{result['chars']} 个字符，用时 {result['elapsed']:.1f}秒"
+    if result['audio_seconds']:
+        summary += f"，音频 {result['audio_seconds']:.0f}秒（{result['audio_seconds'] / result['elapsed']:.0f}倍实时）"
+    logger.info(summary)
+    log_aws_metrics(polly_client)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+分句合成流水线模块，将长文本切分为句子后并行合成、按顺序播放
+第一句以流式方式边合成边播放，其余句子在后台线程池中预先合成
+还可以根据稳定的部分转录结果提前推测合成，最终结果到达后只重做发生变化的句子
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config import PIPELINE_MAX_WORKERS, POLLY_PCM_SAMPLE_RATE, SPECULATIVE_MAX_SEGMENTS, PREFERRED_LANGUAGE
+from logger_config import logger
+from aws_services.rate_limiter import is_fatal_error
+from text_helpers.segmenter import split_sentences
+
+
+class SynthesisPipeline:
+    """分句并行合成、顺序播放的流水线"""
+
+    def __init__(self, polly_client, audio_output, max_workers=PIPELINE_MAX_WORKERS, executor=None):
+        """
+        初始化流水线
+
+        Args:
+            polly_client: PollyClient实例
+            audio_output: AudioOutput实例
+            max_workers (int): 并行合成的最大线程数，同时也是预合成的最大片段数
+            executor (ThreadPoolExecutor, optional): 共享的合成线程池，服务器模式下多个会话共用，
+                未提供时新建一个
+        """
+        self.polly_client = polly_client
+        self.audio_output = audio_output
+        self.max_workers = max_workers
+        self.owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='polly-synth')
+        # 推测合成任务：(片段, 语言) -> [任务, 提交时间, 完成时间]
+        self.speculations = {}
+        self.speculation_lock = threading.Lock()
+
+    def speak(self, text, language_code=None, cancelled=None):
+        """
+        合成并播放文本，某一段合成出错时记录并跳过该段，继续播放其余各段
+
+        Args:
+            text (str): 要播放的文本
+            language_code (str, optional): 语言代码，未提供时对整段文本检测一次
+            cancelled (threading.Event, optional): 被设置后不再播放后续片段，用于用户插话时放弃回复
+
+        Returns:
+            bool: 是否播放了音频
+
+        Raises:
+            Exception: 凭证、权限或配置错误，后续的回复也不会成功
+        """
+        start_time = time.perf_counter()
+
+        def stopped():
+            return cancelled is not None and cancelled.is_set()
+
+        if not language_code:
+            try:
+                language_code = self.polly_client.detect_language(text)
+            except Exception as e:
+                if is_fatal_error(e):
+                    raise
+                logger.error(f"检测语言时出错，使用默认语言 {PREFERRED_LANGUAGE}: {e}")
+                language_code = PREFERRED_LANGUAGE
+
+        segments = split_sentences(text, language_code)
+        if not segments:
+            self.discard_speculations()
+            return False
+        logger.info(f"文本被切分为 {len(segments)} 段")
+
+        # 与最终结果一致的推测合成直接复用，其余的丢弃
+        speculated = self._claim_speculations(segments, language_code, start_time)
+
+        # 后台预合成第2..N段，最多同时保留max_workers个未播放的片段
+        pending = deque()
+        next_index = 1
+
+        def fill_window():
+            nonlocal next_index
+            while next_index < len(segments) and len(pending) < self.max_workers:
+                future = speculated.get(next_index)
+                if future is None:
+                    future = self._submit(segments[next_index], language_code)
+                pending.append(future)
+                next_index += 1
+
+        try:
+            fill_window()
+
+            if 0 in speculated:
+                # 第一段已推测合成，等待结果后直接播放
+                audio_data = self._segment_audio(speculated[0], 0)
+                logger.info(f"流水线首段首块延迟: {time.perf_counter() - start_time:.3f}秒（推测合成）")
+                played = bool(audio_data) and not stopped() and self.audio_output.play_stream(
+                    [audio_data], POLLY_PCM_SAMPLE_RATE
+                )
+            else:
+                # 第一段直接流式播放，播放器会吞掉迭代中的异常，合成错误通过errors带回
+                errors = []
+                played = self.audio_output.play_stream(
+                    self._timed_stream(segments[0], language_code, start_time, stopped, errors),
+                    POLLY_PCM_SAMPLE_RATE
+                )
+                if errors:
+                    self._skip_failed_segment(errors[0], 0)
+
+            # 其余各段严格按顺序播放
+            index = 1
+            while pending and not stopped():
+                future = pending.popleft()
+                fill_window()
+                audio_data = self._segment_audio(future, index)
+                if stopped():
+                    break
+                if audio_data:
+                    played = self.audio_output.play_stream([audio_data], POLLY_PCM_SAMPLE_RATE) or played
+                elif audio_data is not None:
+                    # 合成出错时_segment_audio已记录原因并返回None
+                    logger.error(f"第 {index + 1} 段合成失败，已跳过")
+                index += 1
+        finally:
+            # 被打断或出现致命错误时，尚未播放的片段不再需要
+            for future in pending:
+                future.cancel()
+
+        if stopped():
+            # 取消前刚排队的片段不会被调用方的stop()清掉，这里再停一次
+            self.audio_output.stop()
+            logger.info(f"回复被打断，{len(segments)} 段中已播放 {index} 段")
+            return played
+
+        logger.info(f"流水线播放总时间: {time.perf_counter() - start_time:.3f}秒")
+        return played
+
+    def speculate(self, stable_text, language_code):
+        """
+        根据部分转录结果中已稳定的前缀，提前合成其中完整的句子
+
+        可以在任意线程中调用，只提交后台任务，不会阻塞
+
+        Args:
+            stable_text (str): 已稳定的转录前缀
+            language_code (str): 语言代码
+        """
+        segments = split_sentences(stable_text, language_code)
+        # 最后一段可能是未说完的句子，或会在最终结果中与后文合并，不做推测
+        for segment in segments[:-1]:
+            key = (segment, language_code)
+            with self.speculation_lock:
+                if key in self.speculations or len(self.speculations) >= SPECULATIVE_MAX_SEGMENTS:
+                    continue
+                future = self._submit(segment, language_code)
+                entry = [future, time.perf_counter(), None]
+                future.add_done_callback(lambda _, entry=entry: entry.__setitem__(2, time.perf_counter()))
+                self.speculations[key] = entry
+            logger.debug(f"推测合成: {segment}")
+
+    def discard_speculations(self):
+        """丢弃所有未被使用的推测合成结果"""
+        with self.speculation_lock:
+            discarded = len(self.speculations)
+            for entry in self.speculations.values():
+                entry[0].cancel()
+            self.speculations.clear()
+        if discarded:
+            logger.info(f"丢弃 {discarded} 段与最终结果不一致的推测合成")
+
+    def _claim_speculations(self, segments, language_code, start_time):
+        """
+        取出与最终分段一致的推测合成任务
+
+        Returns:
+            dict: 分段序号到合成任务的映射
+        """
+        claimed = {}
+        saved = 0.0
+        with self.speculation_lock:
+            for index, segment in enumerate(segments):
+                entry = self.speculations.pop((segment, language_code), None)
+                if entry is None:
+                    continue
+                future, submit_time, done_time = entry
+                claimed[index] = future
+                # 最终结果到达前已完成的合成时间，即从关键路径上省下的时间
+                saved += max(0.0, min(start_time, done_time or start_time) - submit_time)
+        self.discard_speculations()
+
+        if claimed:
+            logger.info(f"推测合成命中 {len(claimed)}/{len(segments)} 段，"
+                        f"首段{'命中' if 0 in claimed else '未命中'}，节省合成时间约 {saved:.3f}秒")
+        return claimed
+
+    def _submit(self, segment, language_code):
+        """提交合成任务，并把当前上下文（如服务器会话的延迟追踪）带到工作线程中"""
+        context = contextvars.copy_context()
+        return self.executor.submit(context.run, self._synthesize, segment, language_code)
+    
+    def _synthesize(self, segment, language_code):
+        """在工作线程中合成一个片段的完整PCM数据"""
+        return b''.join(self.polly_client.synthesize_speech_stream(segment, language_code))
+
+    def _segment_audio(self, future, index):
+        """
+        取出一个片段的合成结果
+
+        Returns:
+            bytes: PCM数据，合成出错时记录原因并返回None
+
+        Raises:
+            Exception: 凭证、权限或配置错误
+        """
+        try:
+            return future.result()
+        except Exception as e:
+            self._skip_failed_segment(e, index)
+            return None
+
+    def _skip_failed_segment(self, error, index):
+        """记录合成出错的片段，凭证、权限或配置错误继续向上抛出"""
+        if is_fatal_error(error):
+            raise error
+        logger.error(f"第 {index + 1} 段合成出错，已跳过: {error}")
+
+    def _timed_stream(self, segment, language_code, start_time, stopped, errors):
+        """流式合成第一段，并记录首个音频块的感知延迟，stopped()为真时提前结束；合成出错时把异常放入errors"""
+        first_chunk = True
+        try:
+            for chunk in self.polly_client.synthesize_speech_stream(segment, language_code):
+                if stopped():
+                    return
+                if first_chunk:
+                    logger.info(f"流水线首段首块延迟: {time.perf_counter() - start_time:.3f}秒")
+                    first_chunk = False
+                yield chunk
+        except Exception as e:
+            errors.append(e)
+
+    def shutdown(self):
+        """关闭合成线程池，共享的线程池由其创建者关闭"""
+        if self.owns_executor:
+            self.executor.shutdown(wait=False)
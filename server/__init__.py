@@ -0,0 +1 @@
+# 多会话服务器模式
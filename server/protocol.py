@@ -0,0 +1,84 @@
+"""
+服务器模式的帧协议
+每帧由1字节类型、4字节大端长度和负载组成；音频负载为16位单声道PCM，其余负载为UTF-8编码的JSON
+
+一次对话的帧顺序：
+    服务器 → READY（连接建立后发送一次）
+    客户端 → AUDIO ... END_OF_UTTERANCE
+    服务器 → PARTIAL ... FINAL → AUDIO_OUT ... → TURN_END
+对话轮次从1开始编号，服务器发送的PARTIAL、FINAL和TURN_END都带有轮次，客户端据此确认双方处于同一轮。
+每轮上行音频都以一个END_OF_UTTERANCE结束：客户端说完时发送，或在收到本轮的FINAL或TURN_END后停止发送音频并补发。
+服务器自行判定说话结束时，本轮END_OF_UTTERANCE之前到达的音频都被丢弃，不会被当作下一轮的开始；
+服务器在合成回复期间不读取上行数据
+"""
+
+import json
+import struct
+from config import SERVER_MAX_FRAME_BYTES
+
+HEADER = struct.Struct('!BI')
+
+# 客户端 → 服务器
+FRAME_AUDIO = 0x01  # 上行音频，采样率为SAMPLE_RATE
+FRAME_END_OF_UTTERANCE = 0x02  # 本轮上行音频结束：{"turn"}（可选），服务器同时也会自行做端点检测
+
+# 服务器 → 客户端
+FRAME_READY = 0x10  # 会话已建立：{"session_id", "sample_rate", "output_sample_rate"}
+FRAME_PARTIAL = 0x11  # 部分转录结果：{"turn", "text", "language", "delta", "replaced"}，界面可删除末尾replaced个字符后追加delta
+FRAME_FINAL = 0x12  # 最终转录结果：{"turn", "text", "language"}
+FRAME_AUDIO_OUT = 0x13  # 回复音频，采样率为POLLY_PCM_SAMPLE_RATE
+FRAME_TURN_END = 0x14  # 本次对话结束：{"turn", "played"}
+FRAME_BUSY = 0x15  # 会话数已达上限：{"reason"}，随后断开连接
+FRAME_ERROR = 0x16  # 协议或处理错误：{"reason"}，随后断开连接
+
+
+def encode_frame(frame_type, payload=b''):
+    """
+    编码一帧
+
+    Args:
+        frame_type (int): 帧类型
+        payload (bytes): 负载
+
+    Returns:
+        bytes: 编码后的帧
+    """
+    return HEADER.pack(frame_type, len(payload)) + payload
+
+
+def encode_json(frame_type, message):
+    """编码负载为JSON的帧"""
+    return encode_frame(frame_type, json.dumps(message, ensure_ascii=False).encode('utf-8'))
+
+
+def decode_json(payload):
+    """解码JSON负载，空负载返回空字典"""
+    return json.loads(payload.decode('utf-8')) if payload else {}
+
+
+async def read_frame(reader, max_bytes=SERVER_MAX_FRAME_BYTES):
+    """
+    从流中读取一帧
+
+    Args:
+        reader (asyncio.StreamReader): 输入流
+        max_bytes (int): 负载的最大字节数
+
+    Returns:
+        tuple: (帧类型, 负载)，对端关闭连接时返回(None, None)
+
+    Raises:
+        ValueError: 负载超过上限
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except EOFError:
+        return None, None
+    frame_type, length = HEADER.unpack(header)
+    if length > max_bytes:
+        raise ValueError(f"帧负载过大: {length} 字节")
+    try:
+        payload = await reader.readexactly(length) if length else b''
+    except EOFError:
+        return None, None
+    return frame_type, payload
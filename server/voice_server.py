@@ -0,0 +1,462 @@
+"""
+多会话服务器模式
+一个asyncio进程通过TCP同时服务多个语音会话（帧格式见server.protocol）：
+- 每个会话有独立的VAD、端点检测、语音门控和推测合成状态
+- 所有会话共享一个绑定在服务器事件循环上的Transcribe客户端、一个PollyClient和Polly合成线程池
+- 上行音频经有界队列交给转录流，队列满时暂停读取该连接；回复音频写回时等待发送缓冲区排空
+
+运行方式:
+    python -m server.voice_server [--host 127.0.0.1] [--port 8765] [--max-sessions 200]
+"""
+
+import argparse
+import asyncio
+import contextvars
+import itertools
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    SAMPLE_RATE, POLLY_REGION, POLLY_PCM_SAMPLE_RATE, SPECULATIVE_SYNTHESIS, TRACE_PROMETHEUS_PORT,
+    SERVER_HOST, SERVER_PORT, SERVER_MAX_SESSIONS, SERVER_SESSION_QUEUE_MAXSIZE, SERVER_POLLY_POOL_SIZE,
+    SERVER_RESPONSE_WORKERS, SERVER_IDLE_TIMEOUT, SERVER_TRANSCRIBE_TIMEOUT
+)
+from logger_config import logger, get_log_metrics
+from audio_helpers.vad import create_vad, Endpointer
+from audio_helpers.speech_gate import SpeechGate
+from aws_services.transcribe_client import TranscribeClient, TranscriptionSession
+from aws_services.transcript_store import EVENT_PARTIAL_DELTA
+from aws_services.polly_client import PollyClient, log_aws_metrics
+from aws_services.rate_limiter import client_config
+from pipeline.synthesis_pipeline import SynthesisPipeline
+from server.protocol import (
+    FRAME_AUDIO, FRAME_END_OF_UTTERANCE, FRAME_READY, FRAME_PARTIAL, FRAME_FINAL, FRAME_AUDIO_OUT,
+    FRAME_TURN_END, FRAME_BUSY, FRAME_ERROR, encode_frame, encode_json, decode_json, read_frame
+)
+from telemetry.tracing import (
+    tracer, STAGE_CAPTURE, MARK_SPEECH_START, MARK_SPEECH_END, MARK_PLAYBACK_START, MARK_PLAYBACK_END
+)
+
+
+class SocketAudioSink:
+    """把回复音频以AUDIO_OUT帧写回客户端，接口与AudioOutput一致，在合成线程中调用"""
+
+    def __init__(self, session, loop):
+        """
+        初始化输出
+
+        Args:
+            session (VoiceSession): 所属会话
+            loop: 服务器事件循环
+        """
+        self.session = session
+        self.loop = loop
+
+    def play_stream(self, chunks, sample_rate=16000):
+        """
+        逐块发送PCM音频，每块都等待发送缓冲区排空，客户端读取慢时合成线程随之变慢
+
+        Returns:
+            bool: 是否发送了音频
+        """
+        played = False
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if not played:
+                    tracer.mark(MARK_PLAYBACK_START)
+                asyncio.run_coroutine_threadsafe(self.session.send(FRAME_AUDIO_OUT, chunk), self.loop).result()
+                played = True
+        except (ConnectionError, RuntimeError) as e:
+            self.loop.call_soon_threadsafe(self.session.server.count_error)
+            logger.warning(f"会话 {self.session.session_id} 发送回复音频失败: {e}")
+        if played:
+            tracer.mark(MARK_PLAYBACK_END)
+        return played
+
+    def play_audio(self, audio_data, sample_rate=24000):
+        """发送完整的音频数据"""
+        return self.play_stream([audio_data], sample_rate)
+
+    def wait(self, timeout=None):
+        """与AudioOutput接口一致，数据在play_stream返回前已经发出"""
+        return True
+
+    def stop(self):
+        """与AudioOutput接口一致，已发出的音频无法撤回，后续片段由会话的cancelled事件停止"""
+
+    def close_stream(self):
+        """与AudioOutput接口一致"""
+
+
+class VoiceSession:
+    """一个客户端连接对应的语音会话"""
+
+    def __init__(self, server, reader, writer, session_id):
+        """
+        初始化会话
+
+        Args:
+            server (VoiceServer): 所属服务器
+            reader (asyncio.StreamReader): 连接的输入流
+            writer (asyncio.StreamWriter): 连接的输出流
+            session_id (str): 会话标识
+        """
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.session_id = session_id
+        self.loop = asyncio.get_running_loop()
+        self.vad = create_vad()
+        self.endpointer = Endpointer()
+        self.speech_gate = SpeechGate()
+        self.pipeline = SynthesisPipeline(server.polly_client, SocketAudioSink(self, self.loop),
+                                          executor=server.synthesis_executor)
+        # 被设置后回复线程不再合成和发送后续片段
+        self.cancelled = threading.Event()
+        self.task = None
+        self.turns = 0
+        # 当前对话的轮次，从1开始
+        self.turn = 0
+
+    def cancel(self):
+        """停止正在进行的回复并取消会话的处理任务"""
+        self.cancelled.set()
+        if self.task is not None:
+            self.task.cancel()
+
+    async def send(self, frame_type, payload=b''):
+        """发送一帧并等待发送缓冲区排空"""
+        self.writer.write(encode_frame(frame_type, payload))
+        await self.writer.drain()
+
+    async def send_json(self, frame_type, message):
+        """发送一个JSON帧并等待发送缓冲区排空"""
+        self.writer.write(encode_json(frame_type, message))
+        await self.writer.drain()
+
+    async def run(self):
+        """处理该连接上的所有对话，直到客户端断开"""
+        await self.send_json(FRAME_READY, {
+            'session_id': self.session_id,
+            'sample_rate': SAMPLE_RATE,
+            'output_sample_rate': POLLY_PCM_SAMPLE_RATE,
+        })
+        while await self._run_turn():
+            pass
+
+    async def _run_turn(self):
+        """
+        处理一轮对话
+
+        Returns:
+            bool: 连接是否仍然可用
+        """
+        self.turn = self.turns + 1
+        trace = tracer.start_utterance(scoped=True, session_id=self.session_id)
+        try:
+            transcript, language, connected, client_ended = await self._capture_utterance()
+            if not connected:
+                self.pipeline.discard_speculations()
+                return False
+
+            played = False
+            if transcript:
+                await self.send_json(FRAME_FINAL, {'turn': self.turn, 'text': transcript, 'language': language})
+                played = await self._respond(transcript, language if language else 'en-US')
+            else:
+                self.pipeline.discard_speculations()
+            await self.send_json(FRAME_TURN_END, {'turn': self.turn, 'played': played})
+            self.turns += 1
+            self.server.stats['turns'] += 1
+            if client_ended:
+                return True
+            # 服务器先判定了说话结束，客户端随后发送的本轮音频不属于下一轮
+            return await self._discard_until_end_of_utterance()
+        finally:
+            tracer.finish_utterance(trace)
+
+    async def _read_client_frame(self):
+        """
+        读取一个客户端帧，校验帧类型和END_OF_UTTERANCE的轮次
+
+        Returns:
+            tuple: (帧类型, 负载)，连接断开或空闲超时时返回(None, None)
+
+        Raises:
+            ValueError: 不支持的帧类型、音频长度不是采样的整数倍或轮次与当前对话不一致
+        """
+        try:
+            frame_type, payload = await asyncio.wait_for(read_frame(self.reader), SERVER_IDLE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.info(f"会话 {self.session_id} 空闲超时")
+            return None, None
+        if frame_type == FRAME_END_OF_UTTERANCE:
+            turn = decode_json(payload).get('turn', self.turn)
+            if turn != self.turn:
+                raise ValueError(f"END_OF_UTTERANCE的轮次 {turn} 与当前轮次 {self.turn} 不一致")
+        elif frame_type == FRAME_AUDIO:
+            if len(payload) % 2:
+                raise ValueError("音频帧长度必须是16位采样的整数倍")
+        elif frame_type is not None:
+            raise ValueError(f"不支持的帧类型: {frame_type:#x}")
+        return frame_type, payload
+
+    async def _discard_until_end_of_utterance(self):
+        """
+        丢弃本轮剩余的上行音频，直到收到客户端的END_OF_UTTERANCE
+
+        Returns:
+            bool: 连接是否仍然可用
+        """
+        discarded = 0
+        while True:
+            frame_type, payload = await self._read_client_frame()
+            if frame_type is None:
+                return False
+            if frame_type == FRAME_END_OF_UTTERANCE:
+                if discarded:
+                    logger.debug(f"会话 {self.session_id} 丢弃第 {self.turn} 轮说话结束后的 {discarded} 字节音频")
+                return True
+            discarded += len(payload)
+
+    async def _capture_utterance(self):
+        """
+        接收上行音频并流式转录，直到端点检测判定说话结束或客户端发送END_OF_UTTERANCE
+
+        Returns:
+            tuple: (转录文本, 语言代码, 连接是否仍然可用, 是否由客户端的END_OF_UTTERANCE结束)
+        """
+        self.vad.reset()
+        self.endpointer.reset()
+        self.speech_gate.reset()
+        transcription = None
+        task = None
+        connected = True
+        client_ended = False
+        capture_start = time.perf_counter()
+
+        while True:
+            frame_type, payload = await self._read_client_frame()
+            if frame_type is None:
+                connected = False
+                break
+            if frame_type == FRAME_END_OF_UTTERANCE:
+                client_ended = True
+                break
+
+            is_speech = self.vad.is_speech(payload)
+            for upstream_chunk in self.speech_gate.process(payload, is_speech):
+                if transcription is None:
+                    tracer.mark(MARK_SPEECH_START)
+                    transcription = TranscriptionSession(
+                        self.loop,
+                        stable_callback=self._on_stable_prefix if SPECULATIVE_SYNTHESIS else None,
+                        maxsize=SERVER_SESSION_QUEUE_MAXSIZE,
+                        media_encoding=self.server.transcribe_client.media_encoding
+                    )
+                    transcription.subscribe(self._on_partial, (EVENT_PARTIAL_DELTA,))
+                    task = self.loop.create_task(self.server.transcribe_client.run_session(transcription))
+                # 上行队列满时在此等待，期间不再读取该连接
+                await transcription.put(upstream_chunk)
+
+            chunk_ms = len(payload) / 2 / SAMPLE_RATE * 1000
+            if self.endpointer.update(is_speech, chunk_ms):
+                if self.endpointer.speech_detected:
+                    tracer.mark(MARK_SPEECH_END, time.perf_counter() - self.endpointer.trailing_silence_ms / 1000)
+                break
+
+        tracer.add_span(STAGE_CAPTURE, capture_start, time.perf_counter())
+        if transcription is None:
+            return "", None, connected, client_ended
+
+        transcription.close()
+        try:
+            transcript, language = await asyncio.wait_for(task, SERVER_TRANSCRIBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"会话 {self.session_id} 等待转录结束超时")
+            transcript, language = transcription.transcript_result, transcription.identified_language
+        if transcription.encoder is not None:
+            stats = self.server.stats
+            stats['upstream_pcm_bytes'] += transcription.encoder.input_bytes
+            stats['upstream_encoded_bytes'] += transcription.encoder.output_bytes
+            stats['encode_cpu_seconds'] += transcription.encoder.cpu_time
+        return transcript, language, connected, client_ended
+
+    async def _respond(self, transcript, language):
+        """
+        在回复线程池中合成并发送回复，沿用当前上下文以便记录延迟追踪
+
+        Returns:
+            bool: 是否发送了音频
+        """
+        context = contextvars.copy_context()
+        return await self.loop.run_in_executor(
+            self.server.response_executor, context.run, self.pipeline.speak, transcript, language, self.cancelled
+        )
+
+    def _on_partial(self, update):
+        """转发部分转录结果及其增量，不等待发送缓冲区排空"""
+        if not self.writer.is_closing():
+            self.writer.write(encode_json(FRAME_PARTIAL, {
+                'turn': self.turn, 'text': update.text, 'language': update.language,
+                'delta': update.delta, 'replaced': update.replaced,
+            }))
+
+    def _on_stable_prefix(self, stable_text, language):
+        """根据稳定前缀提前合成完整的句子"""
+        self.pipeline.speculate(stable_text, language if language else 'en-US')
+
+
+class VoiceServer:
+    """多会话语音服务器"""
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, max_sessions=SERVER_MAX_SESSIONS,
+                 transcribe_client=None, polly_client=None, polly_pool_size=SERVER_POLLY_POOL_SIZE,
+                 response_workers=SERVER_RESPONSE_WORKERS):
+        """
+        初始化服务器
+
+        Args:
+            host (str): 监听地址
+            port (int): 监听端口，0表示由系统分配
+            max_sessions (int): 同时服务的会话上限
+            transcribe_client: 共享的Transcribe客户端，默认新建
+            polly_client: 共享的Polly客户端，默认新建并按合成线程数设置连接池大小
+            polly_pool_size (int): Polly合成线程数
+            response_workers (int): 同时进行回复合成与下发的会话数上限
+        """
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.transcribe_client = transcribe_client or TranscribeClient()
+        self.synthesis_executor = ThreadPoolExecutor(max_workers=polly_pool_size, thread_name_prefix='polly-synth')
+        if polly_client is None:
+            import boto3
+            polly_client = PollyClient(client=boto3.client(
+                'polly', region_name=POLLY_REGION, config=client_config(max_pool_connections=polly_pool_size)
+            ), executor=self.synthesis_executor)
+        self.polly_client = polly_client
+        self.response_executor = ThreadPoolExecutor(max_workers=response_workers,
+                                                    thread_name_prefix='session-response')
+        self.sessions = {}
+        self.session_ids = itertools.count(1)
+        self.server = None
+        self.stats = {'accepted': 0, 'rejected': 0, 'errors': 0, 'turns': 0, 'max_active': 0,
+                      'upstream_pcm_bytes': 0, 'upstream_encoded_bytes': 0, 'encode_cpu_seconds': 0.0}
+
+    async def start(self):
+        """绑定事件循环并开始监听"""
+        self.transcribe_client.bind_loop(asyncio.get_running_loop())
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"语音服务器已启动: {self.host}:{self.port}，会话上限 {self.max_sessions}")
+
+    async def serve_forever(self):
+        """启动并持续服务"""
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        """停止监听，取消并等待所有进行中的会话，再释放线程池"""
+        if self.server is not None:
+            self.server.close()
+        sessions = list(self.sessions.values())
+        for session in sessions:
+            session.cancel()
+        if sessions:
+            await asyncio.gather(*(session.task for session in sessions), return_exceptions=True)
+        if self.server is not None:
+            await self.server.wait_closed()
+        # 被取消的回复仍可能在回复线程中向合成线程池提交任务，等它们结束后再关闭合成线程池
+        await asyncio.get_running_loop().run_in_executor(None, self.response_executor.shutdown)
+        self.synthesis_executor.shutdown(wait=False, cancel_futures=True)
+
+    def count_error(self):
+        """记录一次服务器端错误，必须在事件循环线程中调用"""
+        self.stats['errors'] += 1
+
+    async def _handle_connection(self, reader, writer):
+        """处理一个新连接"""
+        if len(self.sessions) >= self.max_sessions:
+            self.stats['rejected'] += 1
+            writer.write(encode_json(FRAME_BUSY, {'reason': f"会话数已达上限 {self.max_sessions}"}))
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+            writer.close()
+            return
+
+        session = VoiceSession(self, reader, writer, f"s{next(self.session_ids)}")
+        session.task = asyncio.current_task()
+        self.sessions[session.session_id] = session
+        self.stats['accepted'] += 1
+        self.stats['max_active'] = max(self.stats['max_active'], len(self.sessions))
+        logger.debug(f"会话 {session.session_id} 已建立，当前会话数 {len(self.sessions)}")
+
+        try:
+            await session.run()
+        except ConnectionError as e:
+            logger.debug(f"会话 {session.session_id} 连接断开: {e}")
+        except ValueError as e:
+            self.count_error()
+            logger.warning(f"会话 {session.session_id} 协议错误: {e}")
+            writer.write(encode_json(FRAME_ERROR, {'reason': str(e)}))
+        except asyncio.CancelledError:
+            logger.debug(f"会话 {session.session_id} 已被取消")
+        except Exception as e:
+            self.count_error()
+            logger.error(f"会话 {session.session_id} 处理出错: {e}")
+            traceback.print_exc()
+        finally:
+            session.cancelled.set()
+            del self.sessions[session.session_id]
+            session.pipeline.shutdown()
+            writer.close()
+            logger.debug(f"会话 {session.session_id} 已结束，共 {session.turns} 轮对话")
+
+    def metrics(self):
+        """
+        获取服务器指标
+
+        Returns:
+            dict: 当前会话数，累计的接受、拒绝、出错会话数和对话轮数，压缩编码前后的上行字节数和编码CPU时间，
+                AWS API限流和请求合并指标，以及日志队列指标
+        """
+        return dict(self.stats, active=len(self.sessions), aws=self.polly_client.get_metrics(),
+                    logging=get_log_metrics())
+
+
+async def run_server(args):
+    """按命令行参数运行服务器"""
+    server = VoiceServer(args.host, args.port, args.max_sessions)
+    if TRACE_PROMETHEUS_PORT:
+        tracer.serve_prometheus(TRACE_PROMETHEUS_PORT)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+        tracer.log_summary()
+        tracer.shutdown()
+        log_aws_metrics(server.polly_client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多会话语音服务器")
+    parser.add_argument('--host', default=SERVER_HOST, help="监听地址")
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help="监听端口")
+    parser.add_argument('--max-sessions', type=int, default=SERVER_MAX_SESSIONS, help="同时服务的会话上限")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_server(args))
+    except KeyboardInterrupt:
+        logger.info("服务器已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# 延迟追踪与指标模块
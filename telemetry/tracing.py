@@ -0,0 +1,565 @@
+"""
+逐次对话延迟追踪模块
+每次对话（从开始录音到回复播放结束）对应一个UtteranceTrace，各阶段使用单调时钟记录耗时或时间点；
+对话结束时将各阶段延迟计入进程内直方图，并导出为JSONL记录和Prometheus文本格式；
+导出由后台线程完成，结束对话的线程（包括服务器的事件循环）不做文件I/O
+"""
+
+import atexit
+import contextvars
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from config import (
+    TRACE_ENABLED, TRACE_JSONL_PATH, TRACE_PROMETHEUS_PATH, TRACE_HISTOGRAM_BUCKETS, TRACE_EXPORT_QUEUE_MAXSIZE,
+    TRACE_PROMETHEUS_INTERVAL
+)
+from logger_config import logger
+
+# 耗时阶段：记录开始和结束时间，同一阶段可出现多次（如每个分段一次Polly调用）
+STAGE_CAPTURE = 'capture'
+STAGE_UPSTREAM_SEND = 'upstream_send'
+STAGE_LANGUAGE_DETECTION = 'language_detection'
+STAGE_POLLY_API = 'polly_api'
+STAGE_PLAYBACK = 'playback'
+STAGE_TURN_TAKING = 'turn_taking'
+STAGE_BARGE_IN_REACTION = 'barge_in_reaction'
+
+# 时间点：只保留第一次出现（playback_end保留最后一次）
+MARK_SPEECH_START = 'speech_start'
+MARK_SPEECH_END = 'speech_end'
+MARK_FIRST_PARTIAL = 'first_partial'
+MARK_FINAL = 'final'
+MARK_FIRST_AUDIO_BYTE = 'first_audio_byte'
+MARK_PLAYBACK_START = 'playback_start'
+MARK_PLAYBACK_END = 'playback_end'
+MARK_BARGE_IN_SPEECH = 'barge_in_speech'
+MARK_BARGE_IN = 'barge_in'
+
+# 时间点的延迟以另一个时间点为基准计算
+MARK_REFERENCES = {
+    MARK_FIRST_PARTIAL: MARK_SPEECH_START,
+    MARK_FINAL: MARK_SPEECH_END,
+    MARK_FIRST_AUDIO_BYTE: MARK_FINAL,
+    MARK_PLAYBACK_START: MARK_FINAL,
+}
+
+# 由两个时间点构成的阶段
+DERIVED_SPANS = {
+    STAGE_PLAYBACK: (MARK_PLAYBACK_START, MARK_PLAYBACK_END),
+    # 轮次切换延迟：用户说完 → 回复开始发声
+    STAGE_TURN_TAKING: (MARK_SPEECH_END, MARK_PLAYBACK_START),
+    # 打断反应时间：回复期间用户开始说话 → 停止或压低回复
+    STAGE_BARGE_IN_REACTION: (MARK_BARGE_IN_SPEECH, MARK_BARGE_IN),
+}
+
+PROMETHEUS_METRIC = 'voice_stage_latency_seconds'
+
+
+class Histogram:
+    """固定分桶的直方图"""
+
+    def __init__(self, buckets):
+        """
+        初始化直方图
+
+        Args:
+            buckets (tuple): 各桶的上界（秒），按升序排列
+        """
+        self.buckets = tuple(sorted(buckets))
+        # 最后一个计数对应+Inf桶
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """记录一个观测值"""
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        根据分桶计数估计分位数，在桶内线性插值
+
+        Args:
+            q (float): 0到1之间的分位
+
+        Returns:
+            float: 估计值，没有观测值时返回None
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    # 落在+Inf桶时无法插值，返回最后一个有限上界
+                    return lower
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class HistogramRegistry:
+    """进程内按阶段名称索引的直方图集合，线程安全"""
+
+    def __init__(self, buckets=TRACE_HISTOGRAM_BUCKETS):
+        """
+        初始化直方图集合
+
+        Args:
+            buckets (tuple): 新建直方图使用的分桶上界（秒）
+        """
+        self.buckets = buckets
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, value):
+        """将一个观测值计入指定阶段的直方图"""
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def summary(self, quantiles=(0.5, 0.95, 0.99)):
+        """
+        获取各阶段的观测次数和分位数
+
+        Returns:
+            dict: 阶段 -> {'count': 次数, 'p50': 秒, ...}
+        """
+        with self.lock:
+            result = {}
+            for stage, histogram in sorted(self.histograms.items()):
+                entry = {'count': histogram.count}
+                for q in quantiles:
+                    entry[f"p{int(q * 100)}"] = histogram.quantile(q)
+                result[stage] = entry
+            return result
+
+    def to_prometheus(self):
+        """
+        导出为Prometheus文本格式
+
+        Returns:
+            str: 所有阶段的直方图，桶计数为累计值
+        """
+        lines = [
+            f"# HELP {PROMETHEUS_METRIC} Latency of each voice processing stage per utterance",
+            f"# TYPE {PROMETHEUS_METRIC} histogram",
+        ]
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f'{PROMETHEUS_METRIC}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{PROMETHEUS_METRIC}_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{PROMETHEUS_METRIC}_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+class UtteranceTrace:
+    """一次对话的追踪记录，所有时间均为time.perf_counter()的单调时钟值"""
+
+    def __init__(self, utterance_id, session_id=None):
+        """
+        初始化追踪记录
+
+        Args:
+            utterance_id (int): 对话序号
+            session_id (str, optional): 服务器模式下所属会话的标识
+        """
+        self.utterance_id = utterance_id
+        self.session_id = session_id
+        self.start = time.perf_counter()
+        self.start_wall = time.time()
+        self.spans = []
+        self.marks = {}
+        self.lock = threading.Lock()
+
+    def mark(self, name, timestamp=None):
+        """
+        记录一个时间点，同名时间点只保留第一次（playback_end保留最后一次）
+
+        Args:
+            name (str): 时间点名称
+            timestamp (float, optional): perf_counter时间，默认为当前时间
+        """
+        timestamp = time.perf_counter() if timestamp is None else timestamp
+        with self.lock:
+            if name == MARK_PLAYBACK_END or name not in self.marks:
+                self.marks[name] = timestamp
+
+    def add_span(self, stage, start, end):
+        """记录一个已结束的耗时阶段"""
+        with self.lock:
+            self.spans.append((stage, start, end))
+
+    def latencies(self):
+        """
+        计算各阶段的延迟
+
+        Returns:
+            dict: 阶段 -> 延迟列表（秒）
+        """
+        with self.lock:
+            spans = list(self.spans)
+            marks = dict(self.marks)
+
+        result = {}
+        for stage, start, end in spans:
+            result.setdefault(stage, []).append(end - start)
+        for stage, (begin, end) in DERIVED_SPANS.items():
+            if begin in marks and end in marks:
+                result.setdefault(stage, []).append(marks[end] - marks[begin])
+        for name, reference in MARK_REFERENCES.items():
+            if name in marks and reference in marks:
+                # 推测合成可能在最终结果之前就拿到音频，此时等待时间记为0
+                result[name] = [max(0.0, marks[name] - marks[reference])]
+        return result
+
+    def to_dict(self):
+        """
+        转换为可写入JSONL的字典，时间均为相对于对话开始的毫秒数
+
+        Returns:
+            dict: 追踪记录
+        """
+        with self.lock:
+            spans = list(self.spans)
+            marks = dict(self.marks)
+        return {
+            'utterance_id': self.utterance_id,
+            'session_id': self.session_id,
+            'start_time': self.start_wall,
+            'spans': [
+                {'stage': stage, 'start_ms': round((start - self.start) * 1000, 3),
+                 'duration_ms': round((end - start) * 1000, 3)}
+                for stage, start, end in spans
+            ],
+            'marks': {name: round((t - self.start) * 1000, 3) for name, t in marks.items()},
+            'latencies_ms': {stage: [round(v * 1000, 3) for v in values]
+                             for stage, values in self.latencies().items()},
+        }
+
+
+class TraceExporter:
+    """在后台线程中导出结束的对话：每批记录追加到JSONL文件，Prometheus文件按间隔整体重写一次"""
+
+    def __init__(self, jsonl_path, prometheus_path, write_prometheus, interval=TRACE_PROMETHEUS_INTERVAL,
+                 maxsize=TRACE_EXPORT_QUEUE_MAXSIZE):
+        """
+        初始化导出器，后台线程在第一次提交时启动
+
+        Args:
+            jsonl_path (str): 每次对话追加一行JSON的文件路径，None表示不写入
+            prometheus_path (str): Prometheus文本文件路径，None表示不写入
+            write_prometheus: 把直方图写入指定路径的函数
+            interval (float): 两次重写Prometheus文件之间的最短间隔（秒）
+            maxsize (int): 队列容量
+        """
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.write_prometheus = write_prometheus
+        self.interval = interval
+        self.queue = queue.Queue(maxsize)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+    def submit(self, trace):
+        """
+        提交一次结束的对话，不阻塞调用方，队列满时丢弃
+
+        Args:
+            trace (UtteranceTrace): 追踪记录
+        """
+        self._ensure_thread()
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=None):
+        """
+        等待已提交的对话全部写出，并立即重写Prometheus文件
+
+        Args:
+            timeout (float, optional): 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            bool: 是否在超时前写完；导出线程已退出或队列在超时前一直是满的时返回False
+        """
+        if self.thread is None:
+            return True
+        if not self.thread.is_alive():
+            return False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            # 队列满时排队也受超时约束，导出线程卡在磁盘IO上时不会让退出流程一直挂起
+            self.queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def _ensure_thread(self):
+        """启动后台导出线程，已启动时直接返回"""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name='trace-export', daemon=True)
+            self.thread.start()
+        # 进程退出时写完队列中剩余的记录，磁盘卡住时最多等待5秒
+        atexit.register(self.flush, 5.0)
+
+    def _run(self):
+        """后台线程：批量取出队列中的记录写入JSONL，到达间隔或收到flush请求时重写Prometheus文件"""
+        prometheus_dirty = False
+        last_prometheus = 0.0
+        while True:
+            timeout = None
+            if prometheus_dirty:
+                timeout = max(0.0, last_prometheus + self.interval - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            traces, waiters = [], []
+            while item is not None:
+                (waiters if isinstance(item, threading.Event) else traces).append(item)
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            try:
+                if traces and self.jsonl_path:
+                    os.makedirs(os.path.dirname(self.jsonl_path), exist_ok=True)
+                    with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                        f.writelines(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n" for trace in traces)
+                if traces and self.prometheus_path:
+                    prometheus_dirty = True
+                if prometheus_dirty and (waiters or time.monotonic() - last_prometheus >= self.interval):
+                    prometheus_dirty = False
+                    last_prometheus = time.monotonic()
+                    self.write_prometheus(self.prometheus_path)
+            except OSError as e:
+                logger.warning(f"导出延迟追踪数据失败: {e}")
+            except Exception as e:
+                # 单条异常的记录不能让导出线程退出，否则之后的记录和flush都会无人处理
+                logger.error(f"导出延迟追踪数据时出错: {e}")
+            for waiter in waiters:
+                waiter.set()
+
+
+class Tracer:
+    """对话追踪器，维护当前对话的追踪记录和全局直方图
+
+    单用户模式下当前对话保存在全局属性中，各线程共享；
+    服务器模式下每个会话的对话保存在contextvars中，互不干扰
+    """
+
+    def __init__(self, enabled=TRACE_ENABLED, jsonl_path=TRACE_JSONL_PATH, prometheus_path=TRACE_PROMETHEUS_PATH,
+                 buckets=TRACE_HISTOGRAM_BUCKETS):
+        """
+        初始化追踪器
+
+        Args:
+            enabled (bool): 为False时所有记录操作都直接返回
+            jsonl_path (str): 每次对话追加一行JSON的文件路径，None表示不写入
+            prometheus_path (str): 对话结束后覆盖写入的Prometheus文本文件路径，最多每TRACE_PROMETHEUS_INTERVAL秒一次，
+                None表示不写入
+            buckets (tuple): 直方图分桶上界（秒）
+        """
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.registry = HistogramRegistry(buckets)
+        self.exporter = None
+        if jsonl_path or prometheus_path:
+            self.exporter = TraceExporter(jsonl_path, prometheus_path, self.write_prometheus)
+        self.current = None
+        self.context_trace = contextvars.ContextVar('utterance_trace', default=None)
+        self.utterance_ids = itertools.count(1)
+        self.http_server = None
+
+    def start_utterance(self, scoped=False, session_id=None):
+        """
+        开始追踪新的一次对话
+
+        Args:
+            scoped (bool): 为True时只在当前上下文（asyncio任务及用copy_context传递的线程）中生效，
+                供服务器模式下并发的会话使用
+            session_id (str, optional): 所属会话的标识，写入JSONL记录
+
+        Returns:
+            UtteranceTrace: 追踪记录，未启用时返回None
+        """
+        if not self.enabled:
+            return None
+        trace = UtteranceTrace(next(self.utterance_ids), session_id)
+        if scoped:
+            self.context_trace.set(trace)
+        else:
+            self.current = trace
+        return trace
+
+    def attach(self, trace):
+        """
+        在当前上下文中继续记录一个已开始的对话，供接手该对话后续阶段的线程使用
+
+        Args:
+            trace (UtteranceTrace): start_utterance返回的追踪记录
+        """
+        self.context_trace.set(trace)
+
+    def active(self):
+        """获取当前上下文中的对话追踪记录"""
+        return self.context_trace.get() or self.current
+
+    def mark(self, name, timestamp=None):
+        """在当前对话中记录一个时间点"""
+        trace = self.active()
+        if trace is not None:
+            trace.mark(name, timestamp)
+
+    def add_span(self, stage, start, end):
+        """在当前对话中记录一个已结束的耗时阶段"""
+        trace = self.active()
+        if trace is not None:
+            trace.add_span(stage, start, end)
+
+    @contextmanager
+    def span(self, stage):
+        """以上下文管理器的方式记录一个耗时阶段"""
+        trace = self.active()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if trace is not None:
+                trace.add_span(stage, start, time.perf_counter())
+
+    def finish_utterance(self, trace=None):
+        """
+        结束对话：计入直方图，交给后台线程导出
+
+        Args:
+            trace (UtteranceTrace, optional): 要结束的追踪记录，默认为全局的当前对话
+        """
+        if trace is None:
+            trace, self.current = self.current, None
+        elif self.context_trace.get() is trace:
+            self.context_trace.set(None)
+        if trace is None:
+            return
+
+        latencies = trace.latencies()
+        for stage, values in latencies.items():
+            for value in values:
+                self.registry.observe(stage, value)
+
+        logger.debug("本次对话各阶段延迟: " + ", ".join(
+            f"{stage} {sum(values) * 1000:.0f}ms" for stage, values in sorted(latencies.items())
+        ))
+
+        if self.exporter is not None:
+            self.exporter.submit(trace)
+
+    def flush(self, timeout=None):
+        """
+        等待已结束的对话全部导出
+
+        Args:
+            timeout (float, optional): 最长等待时间（秒）
+
+        Returns:
+            bool: 是否在超时前导出完毕
+        """
+        return self.exporter.flush(timeout) if self.exporter is not None else True
+
+    def write_prometheus(self, path):
+        """将直方图以Prometheus文本格式写入文件，先写临时文件再替换，避免被读取到一半"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.registry.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def serve_prometheus(self, port, host='127.0.0.1'):
+        """
+        在后台线程中启动HTTP服务，通过/metrics提供Prometheus文本格式的指标
+
+        Args:
+            port (int): 监听端口
+            host (str): 监听地址
+        """
+        if self.http_server is not None:
+            return
+        registry = self.registry
+
+        # 只有启用HTTP导出时才需要http.server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            logger.warning(f"无法启动指标HTTP服务 {host}:{port}: {e}")
+            return
+        thread = threading.Thread(target=self.http_server.serve_forever, name='metrics-http', daemon=True)
+        thread.start()
+        logger.info(f"指标HTTP服务已启动: http://{host}:{port}/metrics")
+
+    def log_summary(self):
+        """输出各阶段延迟的分位数汇总"""
+        summary = self.registry.summary()
+        if not summary:
+            return
+        logger.info("各阶段延迟汇总 (p50/p95/p99):")
+        for stage, entry in summary.items():
+            logger.info(f"  {stage}: {entry['p50'] * 1000:.0f} / {entry['p95'] * 1000:.0f} / "
+                        f"{entry['p99'] * 1000:.0f} ms (共 {entry['count']} 次)")
+
+    def shutdown(self):
+        """导出剩余的对话并停止指标HTTP服务"""
+        self.flush(5.0)
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
+
+
+# 全局追踪器实例
+tracer = Tracer()
@@ -0,0 +1,70 @@
+"""
+音频交接队列的测试：阻塞策略下混用put和put_threadsafe时的名额计数
+"""
+
+import asyncio
+import threading
+from aws_services.audio_queue import AsyncAudioQueue
+
+
+def test_mixed_producers_never_exceed_maxsize_under_block_policy():
+    async def run():
+        queue = AsyncAudioQueue(asyncio.get_running_loop(), maxsize=4, overflow='block')
+
+        async def consume_later():
+            await asyncio.sleep(0.05)
+            return await queue.get()
+        consumer = asyncio.ensure_future(consume_later())
+
+        # 采集线程占满所有名额，事件循环还没来得及把这些音频块入队
+        producer = threading.Thread(target=lambda: [queue.put_threadsafe(bytes([i])) for i in range(4)])
+        producer.start()
+        producer.join()
+        assert not queue.items
+        # 队列虽然是空的，但名额已满，put要等消费者取走一块后才能入队
+        assert await queue.put(b'x')
+        assert consumer.done()
+
+        chunks = [consumer.result()]
+        while queue.items:
+            chunks.append(await queue.get())
+        assert chunks == [b'\x00', b'\x01', b'\x02', b'\x03', b'x']
+        assert queue.dropped == 0
+        # 所有名额都已归还且没有多还，多余的归还会使BoundedSemaphore抛出异常
+        for _ in range(4):
+            assert queue.slots.acquire(blocking=False)
+        assert not queue.slots.acquire(blocking=False)
+
+    asyncio.run(run())
+
+
+def test_put_returns_false_when_closed_while_waiting():
+    async def run():
+        queue = AsyncAudioQueue(asyncio.get_running_loop(), maxsize=1, overflow='block')
+        assert await queue.put(b'a')
+        put = asyncio.ensure_future(queue.put(b'b'))
+        await asyncio.sleep(0.01)
+        queue.close()
+        assert await asyncio.wait_for(put, 1.0) is False
+        assert await queue.get() == b'a'
+        assert await queue.get() is None
+
+    asyncio.run(run())
+
+
+def test_threadsafe_producer_blocks_until_consumer_frees_a_slot():
+    async def run():
+        queue = AsyncAudioQueue(asyncio.get_running_loop(), maxsize=2, overflow='block')
+        assert await queue.put(b'a')
+        assert await queue.put(b'b')
+        results = []
+        producer = threading.Thread(target=lambda: results.append(queue.put_threadsafe(b'c')))
+        producer.start()
+        await asyncio.sleep(0.05)
+        assert not results
+        assert await queue.get() == b'a'
+        await asyncio.get_running_loop().run_in_executor(None, producer.join)
+        assert results == [True]
+        assert [await queue.get(), await queue.get()] == [b'b', b'c']
+
+    asyncio.run(run())
@@ -0,0 +1,165 @@
+"""
+无声卡音频输入的测试：WAV文件头解析、内存映射文件的循环与结束、套接字输入的缓冲区复用
+"""
+
+import socket
+import struct
+import threading
+import numpy as np
+import pytest
+from config import SAMPLE_RATE
+from audio_helpers.audio_sources import (
+    parse_wav_header, MappedFileSource, SocketAudioSource, WAV_FORMAT_PCM, WAV_FORMAT_EXTENSIBLE
+)
+
+
+def chunk(chunk_id, body, size=None):
+    """构造一个RIFF块，长度为奇数时补一个填充字节"""
+    size = len(body) if size is None else size
+    return chunk_id + struct.pack('<I', size) + body + (b'\0' if len(body) & 1 else b'')
+
+
+def fmt_chunk(format_tag=WAV_FORMAT_PCM, channels=1, rate=SAMPLE_RATE, bits=16):
+    block_align = channels * bits // 8
+    body = struct.pack('<HHIIHH', format_tag, channels, rate, rate * block_align, block_align, bits)
+    if format_tag == WAV_FORMAT_EXTENSIBLE:
+        # cbSize、有效位数、声道掩码和子格式GUID（KSDATAFORMAT_SUBTYPE_PCM）
+        body += struct.pack('<HHI', 22, bits, 0x4) + bytes.fromhex('0100000000001000800000aa00389b71')
+    return chunk(b'fmt ', body)
+
+
+def wav(*chunks):
+    body = b'WAVE' + b''.join(chunks)
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
+def test_parse_skips_odd_sized_chunks():
+    data = wav(chunk(b'LIST', b'abc'), fmt_chunk(), chunk(b'junk', b'x'), chunk(b'data', b'\x01\x00' * 4))
+    rate, channels, offset, size = parse_wav_header(data)
+    assert (rate, channels, size) == (SAMPLE_RATE, 1, 8)
+    assert data[offset:offset + size] == b'\x01\x00' * 4
+
+
+def test_parse_accepts_wave_format_extensible():
+    data = wav(fmt_chunk(WAV_FORMAT_EXTENSIBLE, channels=2, rate=48000), chunk(b'data', b'\0' * 16))
+    assert parse_wav_header(data)[:2] == (48000, 2)
+    assert parse_wav_header(data)[3] == 16
+
+
+@pytest.mark.parametrize('declared', [0, 0xFFFFFFFF, 1000])
+def test_parse_unfilled_data_size_reads_to_end_of_file(declared):
+    data = wav(fmt_chunk(), chunk(b'data', b'\0' * 12, size=declared))
+    _, _, offset, size = parse_wav_header(data)
+    assert offset + size == len(data) and size == 12
+
+
+@pytest.mark.parametrize('data, message', [
+    (b'RIFF\0\0\0\0AVI ', '不是WAV'),
+    (wav(chunk(b'data', b'\0' * 4)), '缺少fmt'),
+    (wav(fmt_chunk()), '缺少data'),
+    (wav(fmt_chunk(bits=8), chunk(b'data', b'\0' * 4)), '16位'),
+    (wav(fmt_chunk(format_tag=3, bits=32), chunk(b'data', b'\0' * 4)), '16位'),
+])
+def test_parse_rejects_unsupported_files(data, message):
+    with pytest.raises(ValueError, match=message):
+        parse_wav_header(data)
+
+
+def pcm_ramp(frames):
+    return np.arange(frames, dtype=np.int16).tobytes()
+
+
+def read_all(source, limit=100):
+    chunks = []
+    while len(chunks) < limit:
+        view = source.read_view()
+        if view is None:
+            break
+        chunks.append(bytes(view))
+    return chunks
+
+
+def test_mapped_file_reads_to_exhaustion(tmp_path):
+    path = tmp_path / 'input.wav'
+    pcm = pcm_ramp(10)
+    path.write_bytes(wav(fmt_chunk(), chunk(b'data', pcm)))
+    source = MappedFileSource(str(path), speed=0, loop=False, chunk_frames=4)
+    source.start_recording()
+    try:
+        assert read_all(source) == [pcm[0:8], pcm[8:16], pcm[16:20]]
+        assert source.exhausted
+        assert source.read_view() is None
+        assert source.get_capture_metrics()['chunks_read'] == 3
+    finally:
+        source.close()
+
+
+def test_mapped_file_read_chunk_returns_owned_bytes(tmp_path):
+    path = tmp_path / 'input.pcm'
+    pcm = pcm_ramp(6)
+    path.write_bytes(pcm)
+    source = MappedFileSource(str(path), speed=0, loop=False, chunk_frames=4)
+    source.start_recording()
+    try:
+        first = source.read_chunk()
+    finally:
+        source.close()
+    # 关闭映射后数据仍然可用
+    assert type(first) is bytes and first == pcm[0:8]
+
+
+def test_mapped_file_loops_raw_pcm(tmp_path):
+    path = tmp_path / 'input.pcm'
+    pcm = pcm_ramp(6)
+    # 末尾不足一个采样的字节被丢弃
+    path.write_bytes(pcm + b'\x07')
+    source = MappedFileSource(str(path), speed=0, loop=True, chunk_frames=4)
+    source.start_recording()
+    try:
+        assert read_all(source, limit=5) == [pcm[0:8], pcm[8:12], pcm[0:8], pcm[8:12], pcm[0:8]]
+        assert source.loops == 2
+        assert not source.exhausted
+    finally:
+        source.close()
+
+
+def test_mapped_file_requires_recording_and_path(tmp_path):
+    with pytest.raises(ValueError):
+        MappedFileSource(None)
+    path = tmp_path / 'input.pcm'
+    path.write_bytes(pcm_ramp(4))
+    source = MappedFileSource(str(path), speed=0, chunk_frames=4)
+    assert source.read_view() is None
+    source.close()
+
+
+def test_socket_source_reuses_its_receive_buffer(tmp_path):
+    address = tmp_path / 'audio.sock'
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(address))
+    server.listen(1)
+
+    def send():
+        conn, _ = server.accept()
+        with conn:
+            conn.sendall(b'\x01' * 8 + b'\x02' * 8 + b'\x03' * 3)
+
+    sender = threading.Thread(target=send)
+    sender.start()
+    source = SocketAudioSource(f"unix://{address}", listen=False, chunk_frames=4, read_timeout=1.0)
+    try:
+        source.start_recording()
+        first = source.read_view()
+        kept = bytes(first)
+        second = source.read_view()
+        # 两次读取返回同一块缓冲区，第一块的视图已被第二块覆盖
+        assert first.obj is second.obj
+        assert bytes(first) == b'\x02' * 8
+        assert kept == b'\x01' * 8
+        # 对端断开时交付完整采样的剩余数据，之后输入结束
+        assert source.read_chunk() == b'\x03' * 2
+        assert source.exhausted
+    finally:
+        sender.join(1.0)
+        source.close()
+        server.close()
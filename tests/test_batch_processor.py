@@ -0,0 +1,65 @@
+"""
+批处理清单的测试：中断后重新运行时只跳过成功且未被修改的文件
+"""
+
+import json
+import os
+from batch_processor import Manifest
+
+
+def write_audio(path, data, mtime):
+    path.write_bytes(data)
+    # 固定修改时间，不依赖文件系统时钟的精度
+    os.utime(path, (mtime, mtime))
+    return os.stat(path)
+
+
+def entry_for(relpath, stat, status='ok'):
+    return {'file': relpath, 'size': stat.st_size, 'mtime': stat.st_mtime, 'status': status}
+
+
+def test_resume_skips_only_unchanged_successes(tmp_path):
+    manifest_path = str(tmp_path / 'manifest.jsonl')
+    done = write_audio(tmp_path / 'a.wav', b'a' * 100, 1_000_000)
+    failed = write_audio(tmp_path / 'b.wav', b'b' * 100, 1_000_000)
+    manifest = Manifest(manifest_path)
+    manifest.record(entry_for('a.wav', done))
+    manifest.record(entry_for('b.wav', failed, status='failed'))
+
+    resumed = Manifest(manifest_path)
+    assert resumed.is_done('a.wav', done)
+    assert not resumed.is_done('b.wav', failed)
+    assert not resumed.is_done('c.wav', done)
+
+    # 修改时间或大小变化都视为新文件
+    touched = write_audio(tmp_path / 'a.wav', b'a' * 100, 1_000_001)
+    assert not resumed.is_done('a.wav', touched)
+    resized = write_audio(tmp_path / 'a.wav', b'a' * 101, 1_000_000)
+    assert not resumed.is_done('a.wav', resized)
+
+
+def test_later_records_override_earlier_ones(tmp_path):
+    manifest_path = str(tmp_path / 'manifest.jsonl')
+    stat = write_audio(tmp_path / 'a.wav', b'a' * 10, 1_000_000)
+    manifest = Manifest(manifest_path)
+    manifest.record(entry_for('a.wav', stat, status='failed'))
+    manifest.record(entry_for('a.wav', stat))
+    assert Manifest(manifest_path).is_done('a.wav', stat)
+
+    manifest.record(entry_for('a.wav', stat, status='failed'))
+    assert not Manifest(manifest_path).is_done('a.wav', stat)
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    manifest_path = tmp_path / 'manifest.jsonl'
+    stat = write_audio(tmp_path / 'a.wav', b'a' * 10, 1_000_000)
+    partial = json.dumps(entry_for('b.wav', stat))[:20]
+    manifest_path.write_text(json.dumps(entry_for('a.wav', stat)) + "\n" + partial, encoding='utf-8')
+
+    manifest = Manifest(str(manifest_path))
+    assert manifest.is_done('a.wav', stat)
+    assert 'b.wav' not in manifest.entries
+
+    # 续跑时的新记录不能接在残缺的行后面
+    manifest.record(entry_for('b.wav', stat))
+    assert Manifest(str(manifest_path)).is_done('b.wav', stat)
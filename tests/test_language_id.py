@@ -0,0 +1,64 @@
+"""
+本地语言识别的测试：文字系统快速判断、空文本和低置信度时回退到Comprehend
+"""
+
+from benchmarks.fakes import FakeComprehendClient
+from config import LANGID_CONFIDENCE_THRESHOLD
+from aws_services.polly_client import PollyClient
+from text_helpers.language_id import LanguageDetector
+
+detector = LanguageDetector()
+
+
+def test_script_fast_path():
+    assert detector.detect('你好世界') == ('zh-CN', 1.0, 'script')
+    assert detector.detect('こんにちは世界') == ('ja-JP', 1.0, 'script')
+    assert detector.detect('안녕하세요') == ('ko-KR', 1.0, 'script')
+    # 混有汉字时与PollyClient一致，使用中文语音
+    assert detector.detect('Hello 你好') == ('zh-CN', 1.0, 'script')
+
+
+def test_script_fast_path_respects_supported_languages():
+    latin_only = LanguageDetector(languages=['en-US', 'fr-FR'])
+    assert latin_only.detect('你好')[0] is None
+
+
+def test_empty_and_non_letter_text():
+    for text in ('', '   ', '12345', '3.14 + 42 = ?'):
+        assert detector.detect(text) == (None, 0.0, 'empty')
+
+
+def test_latin_languages():
+    lang, confidence, method = detector.detect('The weather is nice today and we are going to the park')
+    assert (lang, method) == ('en-US', 'ngram')
+    assert confidence >= LANGID_CONFIDENCE_THRESHOLD
+    lang, confidence, _ = detector.detect('Bonjour, je voudrais réserver une table pour ce soir')
+    assert lang == 'fr-FR' and confidence >= LANGID_CONFIDENCE_THRESHOLD
+
+
+def test_short_latin_text_has_low_confidence():
+    _, confidence, method = detector.detect('ok')
+    assert method == 'ngram'
+    assert confidence < LANGID_CONFIDENCE_THRESHOLD
+
+
+def create_client(language_code):
+    comprehend = FakeComprehendClient(latency=0, language_code=language_code)
+    client = PollyClient(client=object(), comprehend=comprehend)
+    client.cache = None
+    client.single_flight = None
+    client.language_detector = detector
+    return client, comprehend
+
+
+def test_low_confidence_falls_back_to_comprehend():
+    client, comprehend = create_client('fr')
+    assert client._detect_language('ok') == 'fr-FR'
+    assert comprehend.calls == 1
+
+
+def test_confident_local_result_skips_comprehend():
+    client, comprehend = create_client('fr')
+    assert client._detect_language('Hello 你好') == 'zh-CN'
+    assert client._detect_language('The weather is nice today and we are going to the park') == 'en-US'
+    assert comprehend.calls == 0
@@ -0,0 +1,73 @@
+"""
+日志配置的测试：重复初始化不重复添加处理器，高频日志按类别限流并注明省略的条数
+"""
+
+import io
+import logging
+import logger_config
+from logger_config import RateLimitFilter, create_queue_handler, setup_logger
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_record(msg, log_class=None):
+    fields = {'msg': msg, 'levelno': logging.INFO, 'levelname': 'INFO'}
+    if log_class is not None:
+        fields['log_class'] = log_class
+    return logging.makeLogRecord(fields)
+
+
+def test_setup_logger_is_idempotent():
+    first = setup_logger()
+    handlers = list(first.handlers)
+    second = setup_logger()
+    assert second is first
+    assert second.handlers == handlers
+    assert sum(isinstance(h, logger_config.NonBlockingQueueHandler) for h in second.handlers) == 1
+
+
+def test_rate_limited_class_drops_and_reports(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(logger_config.time, 'monotonic', clock)
+    rate_filter = RateLimitFilter({'partial': 2.0, 'unlimited': 0})
+
+    results = [rate_filter.filter(make_record(f'partial {i}', 'partial')) for i in range(5)]
+    assert results == [True, True, False, False, False]
+    assert rate_filter.dropped == {'partial': 3}
+
+    # 未归类和不限流的类别不受影响
+    assert all(rate_filter.filter(make_record('other')) for _ in range(10))
+    assert all(rate_filter.filter(make_record('other', 'unlimited')) for _ in range(10))
+
+    # 配额补充后，下一条通过的日志注明省略的条数
+    clock.now += 0.5
+    record = make_record('partial 5', 'partial')
+    assert rate_filter.filter(record)
+    assert record.msg == 'partial 5（此前省略同类日志 3 条）'
+    assert rate_filter.dropped == {}
+    assert not rate_filter.filter(make_record('partial 6', 'partial'))
+
+
+def test_queue_handler_applies_rate_limits():
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(logging.Formatter('%(message)s'))
+    queue_handler, listener = create_queue_handler([output], maxsize=100, rate_limits={'burst': 1.0})
+    test_logger = logging.getLogger('voice_processor.test_rate_limit')
+    test_logger.propagate = False
+    test_logger.addHandler(queue_handler)
+    try:
+        for i in range(5):
+            test_logger.info(f"burst {i}", extra={'log_class': 'burst'})
+        test_logger.info("plain")
+    finally:
+        test_logger.removeHandler(queue_handler)
+        listener.stop()
+    assert stream.getvalue().splitlines() == ['burst 0', 'plain']
+    assert queue_handler.filters[0].dropped == {'burst': 4}
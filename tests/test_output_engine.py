@@ -0,0 +1,134 @@
+"""
+常驻输出引擎的测试：不打开声卡，直接调用回调使用的_fill驱动播放队列
+"""
+
+import threading
+import time
+import numpy as np
+from audio_helpers.output_engine import OutputEngine
+
+RATE = 1000
+
+
+def create_engine(max_lookahead=1.0):
+    """创建不打开输出流的引擎，设备采样率固定为RATE"""
+    engine = OutputEngine(sample_rate=RATE, max_lookahead=max_lookahead)
+    engine.device_rate = RATE
+    # 输出流已"打开"，open_stream不会导入sounddevice
+    engine.stream = object()
+    return engine
+
+
+def fill(engine, size):
+    outdata = bytearray(size)
+    # 播放时间设在过去，通知线程不需要等待
+    engine._fill(outdata, time.perf_counter() - 1.0)
+    return bytes(outdata)
+
+
+def start_notifier(engine):
+    engine.notifier = threading.Thread(target=engine._notify_loop, daemon=True)
+    engine.notifier.start()
+
+
+def test_handles_play_in_order():
+    engine = create_engine()
+    first = engine.open_stream(RATE)
+    first.write(b'aaaa', block=False)
+    second = engine.play(b'bbbb', RATE)
+
+    # 第一段还没写完，即使后面的句柄有数据也输出静音等待
+    assert fill(engine, 8) == b'aaaa\0\0\0\0'
+    first.write(b'cc', block=False)
+    first.finish()
+    assert fill(engine, 8) == b'ccbbbb\0\0'
+    assert first.completed and second.completed
+    assert not engine.handles and engine.queued_bytes == 0
+
+
+def test_head_handle_is_not_blocked_by_data_queued_behind_it():
+    # 额度为8字节
+    engine = create_engine(max_lookahead=0.004)
+    head = engine.open_stream(RATE)
+    engine.play(b'x' * 16, RATE)
+
+    writer = threading.Thread(target=head.write, args=(b'aaaa',), daemon=True)
+    writer.start()
+    writer.join(1.0)
+    assert not writer.is_alive()
+    head.finish()
+    assert fill(engine, 24) == b'aaaa' + b'x' * 16 + b'\0' * 4
+
+
+def test_blocking_write_waits_for_data_ahead_of_it():
+    engine = create_engine(max_lookahead=0.004)
+    engine.play(b'x' * 16, RATE)
+    tail = engine.open_stream(RATE)
+    results = []
+    writer = threading.Thread(target=lambda: results.append(tail.write(b'bbbb')), daemon=True)
+    writer.start()
+    writer.join(0.1)
+    assert writer.is_alive()
+
+    # 回调消费到前面只剩不足额度的数据后，写入才继续
+    fill(engine, 12)
+    writer.join(1.0)
+    assert results == [True]
+    tail.finish()
+    assert fill(engine, 8) == b'xxxxbbbb'
+
+
+def test_cancel_mid_buffer_releases_queued_bytes_and_writers():
+    engine = create_engine(max_lookahead=0.004)
+    handle = engine.open_stream(RATE)
+    handle.write(b'a' * 16, block=False)
+    assert fill(engine, 4) == b'aaaa'
+    assert engine.queued_bytes == 12
+
+    results = []
+    writer = threading.Thread(target=lambda: results.append(handle.write(b'bbbb')), daemon=True)
+    writer.start()
+    writer.join(0.1)
+    assert writer.is_alive()
+
+    handle.cancel()
+    writer.join(1.0)
+    assert results == [False]
+    assert engine.queued_bytes == 0 and not engine.handles
+    assert handle.write(b'cccc') is False
+    assert fill(engine, 4) == b'\0' * 4
+
+
+def test_on_complete_fires_once():
+    engine = create_engine()
+    calls = []
+    played = engine.play(b'aaaa', RATE, on_complete=calls.append)
+    cancelled = engine.open_stream(RATE, on_complete=calls.append)
+    cancelled.write(b'bbbb', block=False)
+    empty = engine.open_stream(RATE, on_complete=calls.append)
+    start_notifier(engine)
+
+    fill(engine, 4)
+    cancelled.cancel()
+    cancelled.cancel()
+    empty.finish()
+    empty.cancel()
+    played.cancel()
+    for handle in (played, cancelled, empty):
+        assert handle.wait(1.0)
+    notifier = engine.notifier
+    engine.close()
+    notifier.join(1.0)
+    assert not notifier.is_alive()
+    assert sorted(map(id, calls)) == sorted(map(id, [played, cancelled, empty]))
+    assert played.start_time is not None and not played.cancelled
+    assert cancelled.cancelled
+
+
+def test_gain_applies_to_filled_samples_only():
+    engine = create_engine()
+    engine.set_gain(0.5)
+    samples = np.array([1000, -1000, 2000], dtype=np.int16)
+    engine.play(samples.tobytes(), RATE)
+    out = np.frombuffer(fill(engine, 10), dtype=np.int16)
+    assert out.tolist() == [500, -500, 1000, 0, 0]
@@ -0,0 +1,225 @@
+"""
+Transcribe长连接的测试：打开失败后的重试、流切换、结果归属、迟到结果和保活
+"""
+
+import asyncio
+import numpy as np
+import pytest
+from amazon_transcribe.model import Alternative, Result
+from aws_services import persistent_stream
+from aws_services.persistent_stream import PersistentTranscription, StreamUtterance, _StreamLeg, BYTES_PER_SECOND
+from benchmarks.fakes import FakeTranscribeStreamingClient
+
+TEXTS = ['Turn on the lights.', 'What time is it?', 'Play some music.', 'Set an alarm for seven.']
+
+
+def fake_client(**kwargs):
+    """返回各个延迟都很短的本地转录客户端"""
+    options = dict(handshake_delay=0.01, first_partial_delay=0.01, partial_interval=0.01, final_delay=0.02,
+                   segment_silence=0.2)
+    options.update(kwargs)
+    return FakeTranscribeStreamingClient(**options)
+
+
+def open_stream_for(client):
+    """返回打开本地转录流的协程函数"""
+    def open_stream():
+        return client.start_stream_transcription(language_code='zh-CN', media_sample_rate_hz=16000,
+                                                 media_encoding='pcm')
+    return open_stream
+
+
+def flaky(open_stream, failures):
+    """返回前failures次打开失败的协程函数"""
+    attempts = []
+
+    async def open_with_failures():
+        attempts.append(None)
+        if len(attempts) <= failures:
+            raise ConnectionError("网络不可用")
+        return await open_stream()
+    return open_with_failures, attempts
+
+
+@pytest.fixture(autouse=True)
+def fast_reconnect(monkeypatch):
+    monkeypatch.setattr(persistent_stream, 'TRANSCRIBE_RECONNECT_BASE_DELAY', 0.01)
+    monkeypatch.setattr(persistent_stream, 'TRANSCRIBE_RECONNECT_MAX_DELAY', 0.02)
+
+
+def test_wait_ready_raises_open_error_and_keeps_retrying():
+    async def run():
+        client = fake_client()
+        open_stream, attempts = flaky(open_stream_for(client), failures=3)
+        stream = PersistentTranscription(open_stream, asyncio.get_running_loop(), 'pcm')
+        with pytest.raises(ConnectionError):
+            await stream.wait_ready()
+        # 发送协程在后台继续重试，直到打开成功
+        while not stream.legs:
+            await asyncio.sleep(0.01)
+        await stream.wait_ready()
+        assert stream.open_error is None
+        assert stream.stats['open_failures'] == 3
+        assert len(attempts) == 4
+        await stream.close()
+
+    asyncio.run(run())
+
+
+def test_close_stops_retrying_when_open_keeps_failing():
+    async def run():
+        client = fake_client()
+        open_stream, attempts = flaky(open_stream_for(client), failures=10 ** 6)
+        stream = PersistentTranscription(open_stream, asyncio.get_running_loop(), 'pcm')
+        stream.start()
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(stream.close(), 1.0)
+        assert stream.task.done()
+        assert client.streams_opened == 0
+        assert attempts
+
+    asyncio.run(run())
+
+
+def test_prewarm_times_out_instead_of_blocking():
+    from aws_services.transcribe_client import TranscribeClient
+
+    client = fake_client(handshake_delay=0.5)
+    transcribe_client = TranscribeClient(client_factory=client, media_encoding='pcm', persistent=True)
+    try:
+        with pytest.raises(TimeoutError):
+            transcribe_client.prewarm(timeout=0.05)
+    finally:
+        transcribe_client.shutdown()
+
+
+def speech(seconds):
+    """生成指定时长的非静音PCM"""
+    return np.full(int(BYTES_PER_SECOND * seconds) // 2, 1000, dtype=np.int16).tobytes()
+
+
+async def say(stream, seconds, chunk_seconds=0.05):
+    """开始一次说话，按接近实时的节奏发送语音后结束，返回转录文本"""
+    utterance = await stream.begin_utterance()
+    for _ in range(round(seconds / chunk_seconds)):
+        await stream.audio_queue.put(speech(chunk_seconds))
+        await asyncio.sleep(chunk_seconds / 2)
+    transcript, _ = await stream.end_utterance(utterance, timeout=2.0)
+    return transcript
+
+
+def result(result_id, start_time, text='hello', is_partial=False):
+    end_time = start_time + 0.5 if start_time is not None else None
+    return Result(result_id=result_id, start_time=start_time, end_time=end_time, is_partial=is_partial,
+                  alternatives=[Alternative(transcript=text, items=[], entities=None)])
+
+
+def test_rollover_between_utterances_keeps_every_turn_once():
+    async def run():
+        client = fake_client()
+        client.script.extend(TEXTS)
+        stream = PersistentTranscription(open_stream_for(client), asyncio.get_running_loop(), 'pcm',
+                                         max_stream_seconds=0.6, rollover_margin=0.5, force_margin=0.05)
+        await stream.wait_ready()
+        transcripts = [await say(stream, 0.2) for _ in TEXTS]
+        await stream.close()
+        assert transcripts == TEXTS
+        assert stream.stats['rollovers'] >= 1
+        assert stream.stats['streams_opened'] == stream.stats['rollovers'] + 1
+        assert stream.stats['reconnects'] == 0
+        assert stream.stats['late_results'] == 0
+
+    asyncio.run(run())
+
+
+def test_forced_rollover_during_speech_does_not_duplicate_results():
+    async def run():
+        client = fake_client()
+        client.script.extend(TEXTS[:2])
+        stream = PersistentTranscription(open_stream_for(client), asyncio.get_running_loop(), 'pcm',
+                                         max_stream_seconds=0.4, rollover_margin=0.0, force_margin=0.3,
+                                         overlap=0.2)
+        await stream.wait_ready()
+        transcripts = [await say(stream, 0.5) for _ in range(2)]
+        await stream.close()
+        # 重叠期间两个流都转录了同一段语音，每次说话仍只有一个片段
+        assert transcripts == TEXTS[:2]
+        assert stream.stats['rollovers'] >= 1
+        assert all(len(utterance.store.segments) == 1 for utterance in stream.utterances)
+
+    asyncio.run(run())
+
+
+def test_route_applies_overlap_ownership():
+    async def run():
+        stream = PersistentTranscription(None, asyncio.get_running_loop(), 'pcm')
+        utterance = StreamUtterance(5.0)
+        stream.utterances.append(utterance)
+        old = _StreamLeg(None, 0.0, 'pcm')
+        new = _StreamLeg(None, 8.0, 'pcm')
+        old.owned_until = new.owned_from = 10.0
+
+        # 切换点之前开始的结果由旧流负责
+        assert stream._route(old, result('a', 9.5)) is utterance.store
+        assert stream._route(new, result('b', 1.5)) is None
+        # 切换点之后开始的结果由新流负责
+        assert stream._route(old, result('c', 10.5)) is None
+        assert stream._route(new, result('d', 2.5)) is utterance.store
+        assert utterance.results == 2
+
+    asyncio.run(run())
+
+
+def test_route_tracks_open_results_and_picks_latest_utterance():
+    async def run():
+        stream = PersistentTranscription(None, asyncio.get_running_loop(), 'pcm')
+        first, second = StreamUtterance(0.0), StreamUtterance(3.0)
+        stream.utterances.extend([first, second])
+        leg = _StreamLeg(None, 0.0, 'pcm')
+
+        assert stream._route(leg, result('a', 1.0, is_partial=True)) is first.store
+        assert leg.open_results == {'a'}
+        assert stream._route(leg, result('a', 1.0)) is first.store
+        assert not leg.open_results
+        assert stream._route(leg, result('b', 3.5)) is second.store
+        # 累加误差使结果略早于说话开始时仍归属到这次说话
+        assert stream._route(leg, result('b', 3.0 - 1e-9)) is second.store
+        # 没有时间信息时归属到最近的一次说话
+        assert stream._route(leg, result('c', None)) is second.store
+
+    asyncio.run(run())
+
+
+def test_route_drops_late_results_for_finished_utterances():
+    async def run():
+        stream = PersistentTranscription(None, asyncio.get_running_loop(), 'pcm')
+        utterance = StreamUtterance(0.0)
+        stream.utterances.append(utterance)
+        utterance.store.finish()
+        leg = _StreamLeg(None, 0.0, 'pcm')
+
+        assert stream._route(leg, result('a', 1.0, is_partial=True)) is None
+        assert stream._route(leg, result('a', 1.0)) is None
+        # 只有迟到的最终结果计入丢弃数
+        assert stream.stats['late_results'] == 1
+        assert utterance.results == 0
+
+    asyncio.run(run())
+
+
+def test_keepalive_sends_silence_while_idle(monkeypatch):
+    monkeypatch.setattr(persistent_stream, 'TRANSCRIBE_KEEPALIVE_INTERVAL', 0.02)
+
+    async def run():
+        client = fake_client()
+        stream = PersistentTranscription(open_stream_for(client), asyncio.get_running_loop(), 'pcm')
+        await stream.wait_ready()
+        await asyncio.sleep(0.2)
+        await stream.close()
+        keepalive_bytes = len(persistent_stream._silence(persistent_stream.TRANSCRIBE_KEEPALIVE_MS))
+        assert stream.stats['keepalives'] >= 3
+        assert client.bytes_received == stream.stats['keepalives'] * keepalive_bytes
+        # 保活静音不产生说话
+        assert not any(record['text'] for record in client.records)
+
+    asyncio.run(run())
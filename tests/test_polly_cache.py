@@ -0,0 +1,157 @@
+"""
+Polly合成缓存的测试：两级LRU淘汰、磁盘容量上限和缓存键的稳定性
+"""
+
+import os
+import threading
+from aws_services.polly_cache import MemoryLRU, DiskStore, SynthesisCache, make_cache_key
+
+
+def test_cache_key_is_stable():
+    # 缓存键写在磁盘文件名里，计算方式改变会让已有的磁盘缓存全部失效
+    assert make_cache_key('你好，世界', 'Zhiyu', 'neural', 'pcm', '16000') == \
+        'e0b1c59fc41d83b6a98aa53ff22bbdb032b739fb57521f0a1a995f5135f3e070'
+
+
+def test_cache_key_normalizes_text_only():
+    key = make_cache_key('Hello  world', 'Joanna', 'neural', 'pcm', '16000')
+    assert make_cache_key(' Ｈｅｌｌｏ\tworld\n', 'Joanna', 'neural', 'pcm', '16000') == key
+    assert make_cache_key('Hello world', 'Matthew', 'neural', 'pcm', '16000') != key
+    assert make_cache_key('Hello world', 'Joanna', 'standard', 'pcm', '16000') != key
+    assert make_cache_key('Hello world', 'Joanna', 'neural', 'mp3', '16000') != key
+    assert make_cache_key('Hello world', 'Joanna', 'neural', 'pcm', '8000') != key
+    assert make_cache_key('Hello world', 'Joanna', 'neural', 'pcm') != key
+
+
+def test_memory_lru_evicts_least_recently_used():
+    lru = MemoryLRU(max_bytes=30)
+    assert lru.put('a', b'a' * 10) == 0
+    assert lru.put('b', b'b' * 10) == 0
+    assert lru.put('c', b'c' * 10) == 0
+    assert lru.get('a') == b'a' * 10
+    assert lru.put('d', b'd' * 10) == 1
+    assert lru.get('b') is None
+    assert list(lru.items) == ['c', 'a', 'd']
+    assert lru.current_bytes == 30
+
+    # 替换已有项按新大小计数，超过上限的项不缓存
+    assert lru.put('c', b'c' * 20) == 1
+    assert list(lru.items) == ['d', 'c'] and lru.current_bytes == 30
+    assert lru.put('e', b'e' * 31) == 0
+    assert lru.get('e') is None
+
+
+def test_disk_store_enforces_size_cap(tmp_path):
+    store = DiskStore(str(tmp_path), max_bytes=30)
+    for key in 'abc':
+        assert store.put(key, key.encode() * 10) == 0
+    assert store.get('a') == b'a' * 10
+    assert store.put('d', b'd' * 10) == 1
+    assert store.get('b') is None
+    assert sorted(os.listdir(tmp_path)) == ['a.bin', 'c.bin', 'd.bin']
+    assert store.current_bytes == 30
+    assert store.put('e', b'e' * 31) == 0
+    assert not os.path.exists(tmp_path / 'e.bin')
+
+
+def test_disk_store_rescans_in_recency_order(tmp_path):
+    for age, key in enumerate('cba'):
+        path = tmp_path / f"{key}.bin"
+        path.write_bytes(key.encode() * 10)
+        os.utime(path, (1000 - age, 1000 - age))
+    (tmp_path / 'stale.bin.123.tmp').write_bytes(b'x')
+
+    store = DiskStore(str(tmp_path), max_bytes=30)
+    assert list(store.sizes) == ['a', 'b', 'c']
+    assert store.current_bytes == 30
+    assert store.put('d', b'd' * 10) == 1
+    assert not os.path.exists(tmp_path / 'a.bin')
+
+
+def test_disk_store_forgets_files_removed_behind_its_back(tmp_path):
+    store = DiskStore(str(tmp_path), max_bytes=100)
+    store.put('a', b'a' * 10)
+    os.remove(tmp_path / 'a.bin')
+    assert store.get('a') is None
+    assert store.current_bytes == 0 and 'a' not in store.sizes
+
+
+def test_two_tier_cache_falls_back_to_disk_and_promotes(tmp_path):
+    cache = SynthesisCache(memory_bytes=20, cache_dir=str(tmp_path), disk_bytes=100)
+    for key in 'abc':
+        cache.put(key, key.encode() * 10)
+    # 内存只容得下两项，最早写入的a只在磁盘上
+    assert list(cache.memory.items) == ['b', 'c']
+    assert cache.stats['memory_evictions'] == 1
+
+    assert cache.get('a') == b'a' * 10
+    assert cache.stats['disk_hits'] == 1
+    # 磁盘命中提升到内存，挤出最近最少使用的b
+    assert list(cache.memory.items) == ['c', 'a']
+    assert cache.stats['memory_evictions'] == 2
+
+    assert cache.get('a') == b'a' * 10
+    assert cache.get('b') == b'b' * 10
+    assert cache.get('missing') is None
+    assert cache.stats['memory_hits'] == 1
+    assert cache.stats['disk_hits'] == 2
+    assert cache.stats['misses'] == 1
+
+
+def test_two_tier_cache_survives_restart(tmp_path):
+    SynthesisCache(memory_bytes=100, cache_dir=str(tmp_path), disk_bytes=100).put('a', b'audio')
+    cache = SynthesisCache(memory_bytes=100, cache_dir=str(tmp_path), disk_bytes=100)
+    assert cache.get('a') == b'audio'
+    assert cache.stats['disk_hits'] == 1
+
+
+def test_memory_only_cache_ignores_empty_audio():
+    cache = SynthesisCache(memory_bytes=100, cache_dir=None)
+    cache.put('a', b'')
+    assert cache.get('a') is None
+    assert cache.disk is None
+
+
+def test_memory_hits_do_not_wait_for_disk_io(tmp_path):
+    cache = SynthesisCache(memory_bytes=100, cache_dir=str(tmp_path), disk_bytes=100)
+    cache.put('hot', b'hot')
+    cache.disk.put('cold', b'cold')
+    entered, release = threading.Event(), threading.Event()
+    disk_get = cache.disk.get
+
+    def slow_get(key):
+        entered.set()
+        release.wait(5.0)
+        return disk_get(key)
+    cache.disk.get = slow_get
+
+    reader = threading.Thread(target=cache.get, args=('cold',))
+    reader.start()
+    assert entered.wait(5.0)
+    # 另一个线程卡在磁盘读取上时，内存命中照常返回
+    assert cache.get('hot') == b'hot'
+    release.set()
+    reader.join(5.0)
+    assert cache.stats['disk_hits'] == 1 and cache.stats['memory_hits'] == 1
+
+
+def test_concurrent_puts_keep_disk_index_consistent(tmp_path):
+    cache = SynthesisCache(memory_bytes=50, cache_dir=str(tmp_path), disk_bytes=200)
+
+    def work(worker):
+        for i in range(200):
+            key = f"k{(worker * 7 + i) % 30}"
+            cache.put(key, key.encode() * (1 + i % 5))
+            cache.get(f"k{i % 30}")
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10.0)
+
+    disk = cache.disk
+    files = {name[:-4]: os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path) if name.endswith('.bin')}
+    assert files == dict(disk.sizes)
+    assert disk.current_bytes == sum(files.values()) <= 200
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
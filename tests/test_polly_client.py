@@ -0,0 +1,82 @@
+"""
+Polly客户端的错误处理：暂时性错误降级，其他错误抛给调用方
+"""
+
+import pytest
+from config import AWS_RETRY_MAX_ATTEMPTS
+from aws_services import rate_limiter
+from aws_services.polly_client import PollyClient
+from aws_services.rate_limiter import is_transient_error
+
+
+class ServiceError(Exception):
+    """模拟botocore的ClientError"""
+
+    def __init__(self, code, status):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}
+
+
+class HTTPClientError(Exception):
+    """与botocore同名的连接错误基类"""
+
+
+class ReadTimeoutError(HTTPClientError):
+    pass
+
+
+class FailingClient:
+    """每次调用都抛出指定异常的Polly/Comprehend客户端"""
+
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def synthesize_speech(self, **kwargs):
+        self.calls += 1
+        raise self.error
+
+    def detect_dominant_language(self, **kwargs):
+        self.calls += 1
+        raise self.error
+
+
+def create_client(error):
+    failing = FailingClient(error)
+    client = PollyClient(client=failing, comprehend=failing)
+    client.cache = None
+    client.single_flight = None
+    client.language_detector = None
+    return client, failing
+
+
+def test_transient_error_classification():
+    assert is_transient_error(ServiceError('ThrottlingException', 400))
+    assert is_transient_error(ServiceError('InternalFailure', 500))
+    assert is_transient_error(ConnectionResetError())
+    assert is_transient_error(ReadTimeoutError())
+    assert not is_transient_error(ServiceError('ValidationException', 400))
+    assert not is_transient_error(ServiceError('AccessDeniedException', 403))
+    assert not is_transient_error(TypeError('bad argument'))
+
+
+def test_transient_failures_degrade(monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'backoff_delay', lambda attempt: 0.0)
+    client, failing = create_client(ServiceError('InternalFailure', 500))
+    assert client.synthesize_speech('hello', 'en-US') is None
+    assert list(client.synthesize_speech_stream('hello', 'en-US')) == []
+    assert client.detect_language('hello') == client.default_language
+    # 限流器先重试暂时性错误，用尽后才降级
+    assert failing.calls == 3 * AWS_RETRY_MAX_ATTEMPTS
+
+
+def test_permanent_failures_are_raised():
+    error = ServiceError('ValidationException', 400)
+    client, failing = create_client(error)
+    with pytest.raises(ServiceError) as raised:
+        client.synthesize_speech('hello', 'en-US')
+    assert raised.value is error
+    with pytest.raises(ServiceError):
+        list(client.synthesize_speech_stream('hello', 'en-US'))
+    with pytest.raises(ServiceError):
+        client.detect_language('hello')
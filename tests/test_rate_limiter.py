@@ -0,0 +1,194 @@
+"""
+令牌桶和API限流器的测试，使用注入的时钟，不依赖真实时间
+"""
+
+import asyncio
+import pytest
+from config import AWS_ADAPTIVE_MIN_RATE_RATIO, AWS_ADAPTIVE_RECOVERY_STEP
+from aws_services import rate_limiter
+from aws_services.rate_limiter import TokenBucket, ApiLimiter
+
+
+class FakeClock:
+    """手动推进的时钟，sleep只推进时间并记录等待的秒数"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ServiceError(Exception):
+    def __init__(self, status):
+        super().__init__(f'HTTP {status}')
+        self.response = {'Error': {'Code': 'ServiceFailure'}, 'ResponseMetadata': {'HTTPStatusCode': status}}
+
+
+class Throttled(Exception):
+    def __init__(self):
+        super().__init__('rate exceeded')
+        self.response = {'Error': {'Code': 'ThrottlingException'}}
+
+
+def failing(errors, result='ok'):
+    """依次抛出errors中的异常，之后返回result"""
+    errors = list(errors)
+
+    def call():
+        if errors:
+            raise errors.pop(0)
+        return result
+    return call
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(autouse=True)
+def fixed_backoff(monkeypatch):
+    # 退避时间带随机抖动，固定下来以便断言
+    monkeypatch.setattr(rate_limiter, 'backoff_delay', lambda attempt: 0.1 * attempt)
+
+
+def test_bucket_reservations_queue_in_arrival_order(clock):
+    bucket = TokenBucket(2.0, clock=clock.monotonic, sleep=clock.sleep)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    # 余额变为负数，后到的调用方排在更后面
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+    clock.now = 1.0
+    assert bucket.reserve() == pytest.approx(0.5)
+
+
+def test_bucket_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(2.0, capacity=3, clock=clock.monotonic, sleep=clock.sleep)
+    for _ in range(3):
+        assert bucket.reserve() == 0.0
+    clock.now = 100.0
+    for _ in range(3):
+        assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5)
+
+
+def test_bucket_acquire_sleeps_for_the_reserved_delay(clock):
+    bucket = TokenBucket(4.0, capacity=1, clock=clock.monotonic, sleep=clock.sleep)
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == pytest.approx(0.25)
+    assert bucket.acquire() == pytest.approx(0.25)
+    assert clock.sleeps == pytest.approx([0.25, 0.25])
+    assert clock.now == pytest.approx(0.5)
+
+
+def test_set_rate_settles_tokens_at_the_old_rate(clock):
+    bucket = TokenBucket(2.0, clock=clock.monotonic, sleep=clock.sleep)
+    bucket.reserve()
+    bucket.reserve()
+    clock.now = 0.5
+    bucket.set_rate(1.0)
+    # 前0.5秒按2/秒补充了1个令牌，之后按1/秒补充
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_zero_rate_is_unlimited(clock):
+    bucket = TokenBucket(0, clock=clock.monotonic, sleep=clock.sleep)
+    assert all(bucket.reserve() == 0.0 for _ in range(1000))
+
+
+def test_throttling_halves_rate_and_retries(clock):
+    limiter = ApiLimiter('test', 10.0, clock=clock.monotonic, sleep=clock.sleep)
+    assert limiter.call(failing([Throttled(), Throttled()])) == 'ok'
+
+    recovered = 2.5 + 10.0 * AWS_ADAPTIVE_RECOVERY_STEP
+    assert limiter.bucket.rate == pytest.approx(recovered)
+    assert clock.sleeps == pytest.approx([0.1, 0.2])
+    metrics = limiter.metrics()
+    assert (metrics['requests'], metrics['throttles'], metrics['retries'], metrics['failures']) == (3, 2, 2, 0)
+
+
+def test_rate_never_drops_below_floor_and_gives_up(clock):
+    limiter = ApiLimiter('test', 10.0, max_attempts=6, clock=clock.monotonic, sleep=clock.sleep)
+    error = Throttled()
+    with pytest.raises(Throttled) as raised:
+        limiter.call(failing([error] * 6))
+    assert raised.value is error
+    assert limiter.bucket.rate == pytest.approx(10.0 * AWS_ADAPTIVE_MIN_RATE_RATIO)
+    metrics = limiter.metrics()
+    assert (metrics['requests'], metrics['throttles'], metrics['retries'], metrics['failures']) == (6, 6, 5, 1)
+
+
+def test_rate_recovers_gradually_after_throttling(clock):
+    limiter = ApiLimiter('test', 10.0, clock=clock.monotonic, sleep=clock.sleep)
+    limiter.call(failing([Throttled()]))
+    rates = [limiter.bucket.rate]
+    while limiter.bucket.rate < 10.0:
+        limiter.call(failing([]))
+        rates.append(limiter.bucket.rate)
+        assert len(rates) < 100
+
+    step = 10.0 * AWS_ADAPTIVE_RECOVERY_STEP
+    assert rates[0] == pytest.approx(5.0 + step)
+    assert all(b - a == pytest.approx(step) for a, b in zip(rates, rates[1:-1]))
+    assert rates[-1] == 10.0
+    limiter.call(failing([]))
+    assert limiter.bucket.rate == 10.0
+
+
+def test_other_errors_are_raised_without_retry(clock):
+    limiter = ApiLimiter('test', 10.0, clock=clock.monotonic, sleep=clock.sleep)
+    with pytest.raises(ValueError):
+        limiter.call(failing([ValueError('bad request')]))
+    assert limiter.bucket.rate == 10.0
+    assert clock.sleeps == []
+    assert limiter.metrics()['throttles'] == 0
+
+
+def test_limiter_spaces_requests_by_reservation(clock):
+    limiter = ApiLimiter('test', 4.0, clock=clock.monotonic, sleep=clock.sleep)
+    for _ in range(6):
+        limiter.call(failing([]))
+    # 初始容量4次突发，之后每次等待1/4秒
+    assert clock.sleeps == pytest.approx([0.25, 0.25])
+    assert limiter.metrics()['wait_time'] == pytest.approx(0.5)
+
+
+@pytest.mark.parametrize('error', [ConnectionResetError('reset by peer'), ServiceError(503)])
+def test_transient_errors_are_retried_without_slowing_down(clock, error):
+    limiter = ApiLimiter('test', 10.0, clock=clock.monotonic, sleep=clock.sleep)
+    assert limiter.call(failing([error])) == 'ok'
+    # 连接失败和服务端错误退避重试，但不是请求过快，不降低速率
+    assert limiter.bucket.rate == 10.0
+    assert clock.sleeps == pytest.approx([0.1])
+    metrics = limiter.metrics()
+    assert (metrics['requests'], metrics['throttles'], metrics['retries'], metrics['failures']) == (2, 0, 1, 0)
+
+
+def test_client_errors_are_not_retried(clock):
+    limiter = ApiLimiter('test', 10.0, clock=clock.monotonic, sleep=clock.sleep)
+    error = ServiceError(400)
+    with pytest.raises(ServiceError):
+        limiter.call(failing([error]))
+    assert limiter.metrics()['requests'] == 1
+
+
+def test_async_calls_retry_transient_errors(monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'backoff_delay', lambda attempt: 0.0)
+    limiter = ApiLimiter('test', 0)
+    errors = [ConnectionResetError('reset'), ServiceError(503)]
+
+    async def call():
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    assert asyncio.run(limiter.call_async(call)) == 'ok'
+    assert limiter.metrics()['retries'] == 2
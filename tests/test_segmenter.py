@@ -0,0 +1,55 @@
+"""
+文本分段的测试：中日文与拉丁字母语言的切分、短片段合并和过长句子的切分
+"""
+
+from text_helpers.segmenter import split_sentences, _merge_short
+
+
+def test_cjk_splits_after_full_width_punctuation():
+    assert split_sentences('今天天气很好。我们去公园散步吧！你觉得怎么样？', 'zh-CN') == [
+        '今天天气很好。', '我们去公园散步吧！', '你觉得怎么样？'
+    ]
+    # 拉丁字母语言要求标点后有空白，中文文本不会被切开
+    assert split_sentences('今天天气很好。我们去公园散步吧！', 'en-US') == ['今天天气很好。我们去公园散步吧！']
+
+
+def test_latin_splits_only_before_whitespace():
+    # 小数点不切分，缩写切出的短片段与后一段合并
+    assert split_sentences('Pi is 3.14 today. Mr. Smith went home! Really?', 'en-US') == [
+        'Pi is 3.14 today.', 'Mr. Smith went home!', 'Really?'
+    ]
+
+
+def test_empty_text():
+    assert split_sentences('', 'en-US') == []
+    assert split_sentences('  \n', 'zh-CN') == []
+
+
+def test_short_pieces_are_merged():
+    # 中文片段之间不加空格，拉丁字母片段之间加一个空格
+    assert split_sentences('好。对。我们出发吧。', 'zh-CN') == ['好。对。我们出发吧。']
+    assert split_sentences('Yes. No. Maybe later today.', 'en-US') == ['Yes. No.', 'Maybe later today.']
+    # 末尾的短片段并入前一段
+    assert split_sentences('This is long enough. Ok.', 'en-US') == ['This is long enough. Ok.']
+
+
+def test_merge_respects_max_chars():
+    assert _merge_short(['This is long enough.', 'Ok.'], 6, 22) == ['This is long enough.', 'Ok.']
+    assert _merge_short(['ab', 'cd', 'efghij'], 6, 5) == ['ab cd', 'efghij']
+
+
+def test_long_sentence_splits_at_clauses():
+    text = 'First clause here, second clause here, third clause here.'
+    assert split_sentences(text, 'en-US', max_chars=30) == [
+        'First clause here,', 'second clause here,', 'third clause here.'
+    ]
+
+
+def test_long_sentence_without_clauses_is_hard_split():
+    words = ' '.join(['word'] * 12)
+    pieces = split_sentences(words, 'en-US', max_chars=20)
+    assert all(len(piece) <= 20 for piece in pieces)
+    assert ' '.join(pieces) == words
+
+    # 没有空白时按固定长度切分
+    assert split_sentences('好' * 50, 'zh-CN', max_chars=20) == ['好' * 20, '好' * 20, '好' * 10]
@@ -0,0 +1,122 @@
+"""
+请求合并的测试：流式调用只为正在读取的跟随方缓存音频块
+"""
+
+import threading
+import time
+from aws_services.single_flight import SingleFlight
+
+
+def gated(chunks, gate, produced=None):
+    """等gate被设置后依次产出chunks，produced记录实际产出的块"""
+    def produce():
+        gate.wait(1.0)
+        for chunk in chunks:
+            if produced is not None:
+                produced.append(chunk)
+            yield chunk
+    return produce
+
+
+def wait_until(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_leader_without_followers_buffers_nothing():
+    flights = SingleFlight()
+    stream = flights.stream('k', lambda: iter([b'a', b'b', b'c']))
+    assert next(stream) == b'a'
+    flight = flights.flights['k']
+    assert flight.chunks == []
+
+    # 首块已释放，同键的新请求重新发起调用而不是合并
+    late = flights.stream('k', lambda: iter([b'x']))
+    assert list(late) == [b'x']
+    assert list(stream) == [b'b', b'c']
+    assert flight.chunks == []
+    assert flights.metrics() == {'calls': 2, 'coalesced': 0}
+
+
+def test_follower_reads_everything_and_chunks_are_freed():
+    flights = SingleFlight()
+    gate = threading.Event()
+    leader = flights.stream('k', gated([b'a', b'b', b'c'], gate))
+    leader_chunks = []
+    leader_thread = threading.Thread(target=lambda: leader_chunks.extend(leader))
+    leader_thread.start()
+    wait_until(lambda: 'k' in flights.flights)
+    flight = flights.flights['k']
+
+    follower = flights.stream('k', lambda: iter([b'unused']))
+    follower_chunks = []
+    follower_thread = threading.Thread(target=lambda: follower_chunks.extend(follower))
+    follower_thread.start()
+    wait_until(lambda: flight.cursors)
+
+    gate.set()
+    leader_thread.join(1.0)
+    follower_thread.join(1.0)
+    assert leader_chunks == follower_chunks == [b'a', b'b', b'c']
+    assert flight.chunks == [] and flight.cursors == {}
+    assert flights.metrics() == {'calls': 2, 'coalesced': 1}
+
+
+def test_lagging_follower_holds_only_unread_chunks():
+    flights = SingleFlight()
+    gate = threading.Event()
+    leader = flights.stream('k', gated([b'a', b'b', b'c'], gate))
+    leader_thread = threading.Thread(target=lambda: list(leader))
+    leader_thread.start()
+    wait_until(lambda: 'k' in flights.flights)
+    flight = flights.flights['k']
+    follower = flight.join()
+
+    gate.set()
+    leader_thread.join(1.0)
+    # 跟随方还没开始读，三块都保留着
+    assert flight.chunks == [b'a', b'b', b'c']
+    chunks = flight.iter_chunks(follower)
+    assert next(chunks) == b'a'
+    assert flight.chunks == []
+    assert list(chunks) == [b'b', b'c']
+    assert flight.cursors == {}
+
+
+def test_abandoned_leader_keeps_reading_only_while_followers_remain():
+    flights = SingleFlight()
+    gate = threading.Event()
+    produced = []
+    leader = flights.stream('k', gated([b'a', b'b', b'c', b'd'], gate, produced))
+    leader_first = []
+
+    def lead():
+        leader_first.append(next(leader))
+        leader.close()
+
+    leader_thread = threading.Thread(target=lead)
+    leader_thread.start()
+    wait_until(lambda: 'k' in flights.flights)
+    flight = flights.flights['k']
+    follower = flight.join()
+
+    gate.set()
+    leader_thread.join(1.0)
+    chunks = flight.iter_chunks(follower)
+    assert leader_first == [b'a']
+    assert list(chunks) == [b'a', b'b', b'c', b'd']
+    assert produced == [b'a', b'b', b'c', b'd']
+
+
+def test_abandoned_leader_without_followers_stops_reading():
+    flights = SingleFlight()
+    produced = []
+    gate = threading.Event()
+    gate.set()
+    leader = flights.stream('k', gated([b'a', b'b', b'c'], gate, produced))
+    assert next(leader) == b'a'
+    leader.close()
+    assert produced == [b'a']
+    assert 'k' not in flights.flights
@@ -0,0 +1,21 @@
+"""SpeechGate在输入为复用缓冲区视图时的预卷行为"""
+
+from audio_helpers.speech_gate import SpeechGate
+
+
+def test_preroll_copies_reused_views():
+    gate = SpeechGate(enabled=True, preroll_ms=100, pause_ms=500, sample_rate=16000)
+    buffer = bytearray(320)
+    view = memoryview(buffer)
+
+    for value in (1, 2, 3):
+        buffer[:] = bytes([value]) * len(buffer)
+        assert gate.process(view, is_speech=False) == []
+
+    buffer[:] = bytes([9]) * len(buffer)
+    chunks = gate.process(view, is_speech=True)
+
+    # 预卷数据是各自读取时的内容，而不是缓冲区当前的内容
+    assert [bytes(c[:1]) for c in chunks[:-1]] == [b'\x01', b'\x02', b'\x03']
+    assert chunks[-1] is view
+    assert gate.stats()['sent_bytes'] == 4 * len(buffer)
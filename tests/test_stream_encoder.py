@@ -0,0 +1,70 @@
+"""
+上行流式编码的测试：往返解码和soundfile内部接口不可用时的回退
+"""
+
+import io
+import numpy as np
+import pytest
+import soundfile as sf
+from audio_helpers import stream_encoder
+from audio_helpers.stream_encoder import StreamEncoder
+from benchmarks.encoding_benchmark import check_round_trip
+from benchmarks.signals import utterance
+
+
+def encode(media_encoding, pcm, chunk_bytes=2048):
+    """逐块编码，返回编码器和拼接后的编码流"""
+    encoder = StreamEncoder(media_encoding)
+    encoded = b''.join(encoder.encode(pcm[offset:offset + chunk_bytes])
+                       for offset in range(0, len(pcm), chunk_bytes))
+    return encoder, encoded + encoder.close()
+
+
+@pytest.fixture(scope='module')
+def pcm():
+    return utterance(lead=0.5, speech=2.0, tail=0.5, snr_db=30.0)[0]
+
+
+@pytest.mark.parametrize('media_encoding', ['flac', 'ogg-opus'])
+def test_round_trip_decodes_finalized_stream(media_encoding, pcm):
+    encoder, encoded = encode(media_encoding, pcm)
+    ok, detail = check_round_trip(media_encoding, pcm, encoder.finalize(encoded))
+    assert ok, detail
+
+
+def test_flac_stream_is_lossless_after_finalize(pcm):
+    encoder, encoded = encode('flac', pcm)
+    decoded, sample_rate = sf.read(io.BytesIO(encoder.finalize(encoded)), dtype='int16')
+    assert sample_rate == encoder.sample_rate
+    assert np.array_equal(decoded, np.frombuffer(pcm, dtype='<i2'))
+    # 发送的流只在头部与完整文件不同，音频分块原样保留
+    assert len(encoder.finalize(encoded)) == len(encoded)
+
+
+def test_finalize_requires_closed_encoder(pcm):
+    encoder = StreamEncoder('flac')
+    encoder.encode(pcm[:2048])
+    with pytest.raises(ValueError):
+        encoder.finalize(b'')
+
+
+def test_opus_falls_back_when_page_latency_cannot_be_set(monkeypatch, pcm):
+    warnings = []
+    monkeypatch.setattr(stream_encoder, '_set_ogg_page_latency', lambda sf, sound_file, milliseconds: False)
+    monkeypatch.setattr(stream_encoder.logger, 'warning', warnings.append)
+    encoder, encoded = encode('ogg-opus', pcm)
+    ok, detail = check_round_trip('ogg-opus', pcm, encoder.finalize(encoded))
+    assert ok, detail
+    assert warnings
+
+
+def test_set_ogg_page_latency_requires_soundfile_internals():
+    class WithoutInternals:
+        """没有_ffi和_snd的soundfile模块"""
+    sound_file = sf.SoundFile(io.BytesIO(), 'w', 16000, 1, 'OPUS', format='OGG')
+    try:
+        assert not stream_encoder._set_ogg_page_latency(WithoutInternals, sound_file, 20.0)
+        assert not stream_encoder._set_ogg_page_latency(sf, object(), 20.0)
+        assert stream_encoder._set_ogg_page_latency(sf, sound_file, 20.0)
+    finally:
+        sound_file.close()
@@ -0,0 +1,187 @@
+"""
+分句合成流水线的测试：乱序完成的片段按顺序播放、预合成窗口、中途打断和推测合成的复用
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import SPECULATIVE_MAX_SEGMENTS
+from audio_helpers.audio_sinks import AudioSink
+from pipeline.synthesis_pipeline import SynthesisPipeline
+
+SEGMENTS = ['Segment zero.', 'Segment one.', 'Segment two.', 'Segment three.', 'Segment four.', 'Segment five.']
+
+
+class GatedPolly:
+    """合成指定片段前等待对应事件的PollyClient桩，记录开始和完成的顺序"""
+
+    def __init__(self, gated=()):
+        self.gates = {text: threading.Event() for text in gated}
+        self.lock = threading.Lock()
+        self.started = []
+        self.finished = []
+
+    def detect_language(self, text):
+        return 'en-US'
+
+    def synthesize_speech_stream(self, text, language_code):
+        with self.lock:
+            self.started.append(text)
+        gate = self.gates.get(text)
+        if gate is not None:
+            assert gate.wait(5.0)
+        with self.lock:
+            self.finished.append(text)
+        yield text.encode('utf-8')
+
+    def wait_started(self, count, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while len(self.started) < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return len(self.started) >= count
+
+
+class RecordingSink(AudioSink):
+    """记录每段输出的音频，可以在输出指定片段时回调"""
+
+    def __init__(self, on_write=None):
+        super().__init__()
+        self.chunks = []
+        self.on_write = on_write
+
+    def _write(self, chunk):
+        self.chunks.append(bytes(chunk).decode('utf-8'))
+        if self.on_write is not None:
+            self.on_write(self.chunks[-1])
+
+
+def run_in_thread(target):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(target()), daemon=True)
+    thread.start()
+    return thread, results
+
+
+def test_segments_play_in_order_when_completed_out_of_order():
+    polly = GatedPolly(gated=SEGMENTS[1:4])
+    sink = RecordingSink()
+    pipeline = SynthesisPipeline(polly, sink, max_workers=3)
+    try:
+        thread, results = run_in_thread(lambda: pipeline.speak(' '.join(SEGMENTS[:4])))
+        assert polly.wait_started(4)
+        # 后面的片段先完成
+        for text in reversed(SEGMENTS[1:4]):
+            polly.gates[text].set()
+            time.sleep(0.02)
+        thread.join(5.0)
+    finally:
+        pipeline.shutdown()
+    assert results == [True]
+    assert polly.finished == [SEGMENTS[0], SEGMENTS[3], SEGMENTS[2], SEGMENTS[1]]
+    assert sink.chunks == SEGMENTS[:4]
+
+
+def test_pending_window_is_bounded_by_max_workers():
+    polly = GatedPolly(gated=SEGMENTS[:1])
+    sink = RecordingSink()
+    # 线程池足够大，预合成的片段数只受窗口限制
+    executor = ThreadPoolExecutor(max_workers=8)
+    pipeline = SynthesisPipeline(polly, sink, max_workers=2, executor=executor)
+    try:
+        thread, results = run_in_thread(lambda: pipeline.speak(' '.join(SEGMENTS)))
+        assert polly.wait_started(3)
+        time.sleep(0.05)
+        assert sorted(polly.started) == sorted(SEGMENTS[:3])
+        polly.gates[SEGMENTS[0]].set()
+        thread.join(5.0)
+    finally:
+        executor.shutdown()
+    assert results == [True]
+    assert sink.chunks == SEGMENTS
+
+
+def test_cancel_mid_response_stops_remaining_segments():
+    cancelled = threading.Event()
+    polly = GatedPolly(gated=SEGMENTS[2:3])
+    sink = RecordingSink(on_write=lambda text: text == SEGMENTS[1] and cancelled.set())
+    # 单线程池：第三段阻塞时后面的片段还在排队，打断后应被取消
+    executor = ThreadPoolExecutor(max_workers=1)
+    pipeline = SynthesisPipeline(polly, sink, max_workers=3, executor=executor)
+    try:
+        assert pipeline.speak(' '.join(SEGMENTS[:5]), cancelled=cancelled)
+    finally:
+        polly.gates[SEGMENTS[2]].set()
+        executor.shutdown(wait=True)
+    assert sink.chunks == SEGMENTS[:2]
+    assert sink.stops == 1
+    assert SEGMENTS[3] not in polly.started and SEGMENTS[4] not in polly.started
+
+
+def speculate_and_wait(pipeline, text, language_code='en-US'):
+    """提交推测合成并等待完成"""
+    pipeline.speculate(text, language_code)
+    for future, _, _ in list(pipeline.speculations.values()):
+        future.result(5.0)
+
+
+def test_matching_speculations_are_reused():
+    polly = GatedPolly()
+    sink = RecordingSink()
+    pipeline = SynthesisPipeline(polly, sink, max_workers=3)
+    try:
+        # 最后一段可能还没说完，不做推测
+        speculate_and_wait(pipeline, 'Segment zero. Segment one. Segment tw')
+        assert sorted(polly.started) == sorted(SEGMENTS[:2])
+        assert pipeline.speak(' '.join(SEGMENTS[:3]), 'en-US')
+    finally:
+        pipeline.shutdown()
+    assert sink.chunks == SEGMENTS[:3]
+    assert sorted(polly.started) == sorted(SEGMENTS[:3])
+    assert not pipeline.speculations
+
+
+def test_diverging_speculations_are_discarded():
+    polly = GatedPolly()
+    sink = RecordingSink()
+    pipeline = SynthesisPipeline(polly, sink, max_workers=3)
+    try:
+        speculate_and_wait(pipeline, 'Segment zero. Segment won. Segment tw')
+        assert pipeline.speak(' '.join(SEGMENTS[:3]), 'en-US')
+    finally:
+        pipeline.shutdown()
+    assert sink.chunks == SEGMENTS[:3]
+    # 第一段复用，与最终结果不一致的第二段被丢弃并重新合成
+    assert polly.started.count(SEGMENTS[0]) == 1
+    assert polly.started.count(SEGMENTS[1]) == 1
+    assert 'Segment won.' in polly.started
+    assert not pipeline.speculations
+
+
+def test_speculations_in_another_language_are_not_reused():
+    polly = GatedPolly()
+    sink = RecordingSink()
+    pipeline = SynthesisPipeline(polly, sink, max_workers=3)
+    try:
+        speculate_and_wait(pipeline, 'Segment zero. Segment one. Segment tw')
+        assert pipeline.speak(' '.join(SEGMENTS[:2]), 'fr-FR')
+    finally:
+        pipeline.shutdown()
+    assert sink.chunks == SEGMENTS[:2]
+    assert polly.started.count(SEGMENTS[0]) == 2
+    assert polly.started.count(SEGMENTS[1]) == 2
+    assert not pipeline.speculations
+
+
+def test_speculations_are_capped_and_deduplicated():
+    polly = GatedPolly()
+    pipeline = SynthesisPipeline(polly, RecordingSink(), max_workers=3)
+    sentences = [f'Sentence number {i}.' for i in range(SPECULATIVE_MAX_SEGMENTS + 3)]
+    try:
+        speculate_and_wait(pipeline, ' '.join(sentences))
+        speculate_and_wait(pipeline, ' '.join(sentences))
+        assert len(pipeline.speculations) == SPECULATIVE_MAX_SEGMENTS
+        assert sorted(polly.started) == sorted(sentences[:SPECULATIVE_MAX_SEGMENTS])
+        pipeline.discard_speculations()
+        assert not pipeline.speculations
+    finally:
+        pipeline.shutdown()
@@ -0,0 +1,89 @@
+"""
+延迟追踪的测试：导出在后台线程中进行，Prometheus文件按间隔批量重写
+"""
+
+import json
+import os
+import threading
+from telemetry.tracing import Tracer, STAGE_CAPTURE
+
+
+def finish(tracer, count):
+    """记录并结束count次对话"""
+    for _ in range(count):
+        trace = tracer.start_utterance(scoped=True, session_id='s1')
+        tracer.add_span(STAGE_CAPTURE, trace.start, trace.start + 0.1)
+        tracer.finish_utterance(trace)
+
+
+def test_finish_utterance_does_not_write_on_the_calling_thread(tmp_path):
+    tracer = Tracer(jsonl_path=str(tmp_path / 'traces.jsonl'), prometheus_path=str(tmp_path / 'metrics.prom'))
+    writers = []
+    original = tracer.write_prometheus
+
+    def record_thread(path):
+        writers.append(threading.current_thread().name)
+        original(path)
+    tracer.exporter.write_prometheus = record_thread
+
+    finish(tracer, 3)
+    assert tracer.flush(5.0)
+    assert writers and threading.current_thread().name not in writers
+    with open(tmp_path / 'traces.jsonl', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [record['session_id'] for record in records] == ['s1'] * 3
+    assert 'voice_stage_latency_seconds_count{stage="capture"} 3' in (tmp_path / 'metrics.prom').read_text()
+
+
+def test_prometheus_rewrites_are_batched(tmp_path):
+    tracer = Tracer(jsonl_path=None, prometheus_path=str(tmp_path / 'metrics.prom'))
+    tracer.exporter.interval = 60.0
+    writes = []
+    tracer.exporter.write_prometheus = writes.append
+
+    finish(tracer, 50)
+    assert tracer.flush(5.0)
+    # 间隔内的多次对话只在flush时重写一次
+    assert len(writes) <= 2
+    assert not os.path.exists(tmp_path / 'traces.jsonl')
+
+
+def test_disabled_paths_do_not_start_exporter():
+    tracer = Tracer(jsonl_path=None, prometheus_path=None)
+    finish(tracer, 1)
+    assert tracer.exporter is None
+    assert tracer.flush()
+    assert tracer.registry.summary()[STAGE_CAPTURE]['count'] == 1
+
+
+def test_flush_is_bounded_when_the_writer_is_stuck(tmp_path):
+    tracer = Tracer(jsonl_path=None, prometheus_path=str(tmp_path / 'metrics.prom'))
+    exporter = tracer.exporter
+    exporter.queue.maxsize = 2
+    release = threading.Event()
+    exporter.write_prometheus = lambda path: release.wait(5.0)
+
+    # 导出线程卡在写文件上，之后的记录把队列填满
+    finish(tracer, 1)
+    assert not exporter.flush(0.1)
+    finish(tracer, 3)
+    assert exporter.queue.full()
+    assert not exporter.flush(0.1)
+    release.set()
+    assert exporter.flush(5.0)
+
+
+def test_bad_trace_does_not_kill_the_exporter(tmp_path):
+    tracer = Tracer(jsonl_path=str(tmp_path / 'traces.jsonl'), prometheus_path=None)
+    exporter = tracer.exporter
+
+    class BadTrace:
+        def to_dict(self):
+            raise TypeError('not serializable')
+
+    exporter.submit(BadTrace())
+    assert exporter.flush(5.0)
+    finish(tracer, 1)
+    assert exporter.flush(5.0)
+    assert exporter.thread.is_alive()
+    assert len((tmp_path / 'traces.jsonl').read_text().splitlines()) == 1
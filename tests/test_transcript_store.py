@@ -0,0 +1,107 @@
+"""
+增量转录结果存储的测试：事件顺序、增量内容和多片段拼接
+"""
+
+from collections import namedtuple
+from aws_services.transcript_store import (
+    TranscriptStore, EVENT_PARTIAL_DELTA, EVENT_STABLE_PREFIX, EVENT_SEGMENT_FINAL, EVENT_UTTERANCE_FINAL
+)
+
+Item = namedtuple('Item', 'content item_type stable')
+
+
+def words(*pairs):
+    """由(内容, 是否稳定)构造词条，内容为标点符号时词条类型为punctuation"""
+    return [Item(content, 'punctuation' if content in '，。,.?' else 'pronunciation', stable)
+            for content, stable in pairs]
+
+
+def record(store, kinds=None):
+    events = []
+    if kinds is None:
+        store.subscribe(events.append)
+    else:
+        store.subscribe(events.append, kinds)
+    return events
+
+
+def test_event_order_and_deltas():
+    store = TranscriptStore()
+    events = record(store)
+
+    store.update_partial('r1', 'hello', words(('hello', False)), 'en-US')
+    store.update_partial('r1', 'hello word', words(('hello', True), ('word', False)), 'en-US')
+    store.update_partial('r1', 'hello world', words(('hello', True), ('world', True)), 'en-US')
+    # 文本和稳定前缀都没变时不发布事件
+    store.update_partial('r1', 'hello world', words(('hello', True), ('world', True)), 'en-US')
+    store.add_final('r1', 'hello world.', 'en-US')
+    assert store.finish() == 'hello world.'
+
+    assert [(e.kind, e.text, e.delta, e.replaced) for e in events] == [
+        (EVENT_PARTIAL_DELTA, 'hello', 'hello', 0),
+        (EVENT_PARTIAL_DELTA, 'hello word', ' word', 0),
+        (EVENT_STABLE_PREFIX, 'hello', 'hello', 0),
+        # 尾部被改写：删除旧尾部的1个字符后追加新的尾部
+        (EVENT_PARTIAL_DELTA, 'hello world', 'ld', 1),
+        (EVENT_STABLE_PREFIX, 'hello world', ' world', 0),
+        (EVENT_SEGMENT_FINAL, 'hello world.', 'hello world.', 0),
+        (EVENT_UTTERANCE_FINAL, 'hello world.', 'hello world.', 0),
+    ]
+    assert [e.result_id for e in events[-2:]] == ['r1', None]
+    assert events[-2].segment_index == 0 and events[-1].segment_index == 0
+    assert not store.open_results
+
+
+def test_stable_prefix_stops_at_first_unstable_item():
+    store = TranscriptStore()
+    events = record(store, kinds=(EVENT_STABLE_PREFIX,))
+    store.update_partial('r1', 'a b c', words(('a', True), ('b', False), ('c', True)), 'en-US')
+    store.update_partial('r1', 'a b c', words(('a', True), ('b', True), ('c', True), (',', True)), 'en-US')
+    assert [(e.text, e.delta) for e in events] == [('a', 'a'), ('a b c,', ' b c,')]
+
+
+def test_multi_segment_cjk_join():
+    store = TranscriptStore()
+    events = record(store, kinds=(EVENT_SEGMENT_FINAL, EVENT_UTTERANCE_FINAL))
+    store.update_partial('r1', '你好', words(('你好', True)), 'zh-CN')
+    store.add_final('r1', '你好。', 'zh-CN')
+    store.add_final('r2', '今天天气不错', 'zh-CN')
+    # 读取一次后再追加，拼接从上次的位置继续
+    assert store.text == '你好。今天天气不错'
+    store.add_final('r3', 'OK', 'zh-CN')
+    store.add_final('r4', '谢谢', 'zh-CN')
+    store.add_final('r5', '', 'zh-CN')
+
+    assert store.finish() == '你好。今天天气不错 OK 谢谢'
+    assert [(e.kind, e.segment_index) for e in events] == [
+        (EVENT_SEGMENT_FINAL, 0), (EVENT_SEGMENT_FINAL, 1), (EVENT_SEGMENT_FINAL, 2), (EVENT_SEGMENT_FINAL, 3),
+        (EVENT_UTTERANCE_FINAL, 3),
+    ]
+    assert events[-1].language == 'zh-CN'
+
+
+def test_finish_is_idempotent_and_drops_open_results():
+    store = TranscriptStore()
+    events = record(store)
+    store.update_partial('r1', 'pending', [], 'en-US')
+    assert store.finish() == ''
+    assert store.finish() == ''
+    assert [e.kind for e in events] == [EVENT_PARTIAL_DELTA, EVENT_UTTERANCE_FINAL]
+    assert events[-1].segment_index is None
+    assert not store.open_results
+
+
+def test_failing_subscriber_does_not_block_others():
+    store = TranscriptStore()
+
+    def broken(update):
+        raise RuntimeError('boom')
+
+    store.subscribe(broken)
+    events = record(store)
+    store.add_final('r1', 'hi', 'en-US')
+    assert [e.kind for e in events] == [EVENT_SEGMENT_FINAL]
+
+    store.unsubscribe(store.subscribers[0])
+    store.finish()
+    assert [e.kind for e in events] == [EVENT_SEGMENT_FINAL, EVENT_UTTERANCE_FINAL]
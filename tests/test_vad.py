@@ -0,0 +1,89 @@
+"""
+AdaptiveVAD与Endpointer的测试，使用benchmarks.signals合成的语音和噪声
+"""
+
+import numpy as np
+import pytest
+from config import SAMPLE_RATE, CHUNK_SIZE, VAD_HANGOVER_MS, ENDPOINT_SILENCE_MS
+from audio_helpers.vad import AdaptiveVAD, Endpointer
+from benchmarks.signals import noise, utterance, iter_chunks
+
+CHUNK_MS = CHUNK_SIZE / SAMPLE_RATE * 1000
+
+
+def run(pcm, endpointer=None):
+    """
+    逐块送入VAD和端点检测器
+
+    Returns:
+        tuple: (首次判定为语音的时间, 到达端点的时间, 端点原因)，时间单位为毫秒，未发生时为None
+    """
+    vad = AdaptiveVAD()
+    endpointer = endpointer or Endpointer()
+    elapsed = 0.0
+    onset = None
+    for chunk in iter_chunks(pcm, CHUNK_SIZE):
+        is_speech = vad.is_speech(chunk)
+        elapsed += CHUNK_MS
+        if is_speech and onset is None:
+            onset = elapsed
+        if endpointer.update(is_speech, CHUNK_MS):
+            return onset, elapsed, endpointer.reason
+    return onset, None, None
+
+
+@pytest.mark.parametrize('noise_kind', ['white', 'pink'])
+@pytest.mark.parametrize('snr_db', [20.0, 10.0, 5.0])
+def test_end_of_speech_delay_is_bounded(noise_kind, snr_db):
+    pcm, speech_start, speech_end = utterance(lead=1.0, speech=2.0, tail=4.0, snr_db=snr_db,
+                                              noise_kind=noise_kind, seed=int(snr_db))
+    onset, end, reason = run(pcm)
+
+    assert reason == 'end_of_speech'
+    # 不在语音开始前触发，开始后很快检出
+    assert speech_start * 1000 <= onset <= speech_start * 1000 + 300
+    # 结束延迟由静音判定时长、VAD拖尾和块粒度决定
+    delay = end - speech_end * 1000
+    assert ENDPOINT_SILENCE_MS <= delay <= ENDPOINT_SILENCE_MS + VAD_HANGOVER_MS + 2 * CHUNK_MS
+
+
+@pytest.mark.parametrize('noise_kind', ['white', 'pink'])
+@pytest.mark.parametrize('level_db', [-60.0, -45.0, -30.0])
+def test_noise_never_triggers(noise_kind, level_db):
+    samples = noise(6.0, level_db, noise_kind, np.random.default_rng(3))
+    pcm = np.clip(samples * 32767.0, -32768, 32767).astype(np.int16).tobytes()
+    onset, end, reason = run(pcm)
+    assert onset is None
+    assert reason == 'no_speech'
+    assert end == pytest.approx(5000, abs=CHUNK_MS)
+
+
+def test_partial_frames_carry_over_between_chunks():
+    pcm, _, _ = utterance(lead=0.5, speech=1.0, tail=0.5, seed=2)
+    whole = AdaptiveVAD().process(pcm)
+    vad = AdaptiveVAD()
+    # 块长不是帧长的整数倍，不足一帧的数据留到下一块
+    pieces = [vad.process(pcm[offset:offset + 1000]) for offset in range(0, len(pcm), 1000)]
+    assert np.array_equal(np.concatenate(pieces), whole)
+
+
+def test_endpointer_reasons():
+    endpointer = Endpointer(silence_ms=300, no_speech_timeout_ms=1000, max_utterance_ms=2000)
+    assert not endpointer.update(False, 900)
+    assert endpointer.update(False, 100)
+    assert endpointer.reason == 'no_speech'
+
+    endpointer.reset()
+    assert not endpointer.update(True, 100)
+    assert not endpointer.update(False, 200)
+    # 语音打断静音计时
+    assert not endpointer.update(True, 100)
+    assert not endpointer.update(False, 200)
+    assert endpointer.update(False, 100)
+    assert endpointer.reason == 'end_of_speech'
+
+    endpointer.reset()
+    for _ in range(19):
+        assert not endpointer.update(True, 100)
+    assert endpointer.update(True, 100)
+    assert endpointer.reason == 'max_duration'
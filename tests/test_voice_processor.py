@@ -0,0 +1,125 @@
+"""
+半双工对话中合成出错的处理：单段或单轮的合成错误只跳过该段，凭证和权限错误才结束会话
+"""
+
+from collections import deque
+import pytest
+from audio_helpers.audio_sinks import AudioSink
+from audio_helpers.audio_sources import NullAudioSource
+from aws_services.polly_client import PollyClient
+from benchmarks.fakes import FakeAudioStream, FakeComprehendClient
+from voice_processor import VoiceProcessor
+
+
+class ServiceError(Exception):
+    """模拟botocore的ClientError"""
+
+    def __init__(self, code, status):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}
+
+
+class ScriptedPolly:
+    """文本包含errors中的关键字时抛出对应异常的Polly客户端桩"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.texts = []
+
+    def synthesize_speech(self, Text, **kwargs):
+        self.texts.append(Text)
+        for keyword, error in self.errors.items():
+            if keyword in Text:
+                raise error
+        return {'AudioStream': FakeAudioStream(Text.encode('utf-8').ljust(64, b'\0')[:64])}
+
+
+class RecordingSink(AudioSink):
+    """记录每段输出的音频"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def _write(self, chunk):
+        self.chunks.append(bytes(chunk))
+
+
+class StubTranscribe:
+    stable_callback = None
+
+    def preopen_stream(self):
+        pass
+
+
+def create_processor(errors, transcripts):
+    polly = PollyClient(client=ScriptedPolly(errors), comprehend=FakeComprehendClient(latency=0))
+    polly.cache = None
+    polly.single_flight = None
+    sink = RecordingSink()
+    processor = VoiceProcessor(mic_input=NullAudioSource(speed=0), audio_output=sink,
+                               transcribe_client=StubTranscribe(), polly_client=polly)
+    processor.running = True
+    turns = deque(transcripts)
+    processor._capture_utterance = lambda continuous=False: turns.popleft()
+    return processor, sink
+
+
+def played_texts(sink):
+    return [chunk.rstrip(b'\0').decode('utf-8') for chunk in sink.chunks]
+
+
+def test_invalid_segment_is_skipped_and_next_turn_runs():
+    processor, sink = create_processor(
+        {'broken': ServiceError('ValidationException', 400)},
+        [("First part. A broken sentence. Last part.", 'en-US'), ("Next turn.", 'en-US')],
+    )
+    try:
+        processor.process_turn()
+        processor.process_turn()
+    finally:
+        processor.synthesis_pipeline.shutdown()
+    assert processor.running
+    assert played_texts(sink) == ['First part.', 'Last part.', 'Next turn.']
+    assert processor.conversation_stats['turns'] == 2
+
+
+def test_invalid_first_segment_is_skipped():
+    processor, sink = create_processor(
+        {'broken': ServiceError('ValidationException', 400)},
+        [("A broken opening. Then the rest.", 'en-US')],
+    )
+    try:
+        processor.process_turn()
+    finally:
+        processor.synthesis_pipeline.shutdown()
+    assert played_texts(sink) == ['Then the rest.']
+
+
+def test_permission_error_ends_the_session():
+    processor, sink = create_processor(
+        {'Hello': ServiceError('AccessDeniedException', 403)},
+        [("Hello there. Second sentence.", 'en-US')],
+    )
+    try:
+        with pytest.raises(ServiceError):
+            processor.process_turn()
+    finally:
+        processor.synthesis_pipeline.shutdown()
+    assert sink.chunks == []
+
+
+def test_language_detection_failure_falls_back_to_default_language():
+    processor, sink = create_processor({}, [("Hello there.", None)])
+    processor.polly_client.language_detector = None
+    processor.polly_client._comprehend = ScriptedPolly({})
+
+    def reject(**kwargs):
+        raise ServiceError('TextSizeLimitExceededException', 400)
+
+    processor.polly_client._comprehend.detect_dominant_language = reject
+    try:
+        assert processor.synthesis_pipeline.speak("Hello there.") is True
+    finally:
+        processor.synthesis_pipeline.shutdown()
+    assert played_texts(sink) == ['Hello there.']
@@ -0,0 +1,102 @@
+"""
+多会话服务器的测试：对话轮次的边界和关闭服务器时的会话清理
+"""
+
+import asyncio
+from config import CHUNK_SIZE
+from aws_services.polly_client import PollyClient
+from aws_services.transcribe_client import TranscribeClient
+from benchmarks.fakes import FakeTranscribeStreamingClient, FakePollyClient, FakeComprehendClient
+from benchmarks.signals import utterance, iter_chunks
+from server.protocol import (
+    FRAME_AUDIO, FRAME_END_OF_UTTERANCE, FRAME_READY, FRAME_FINAL, FRAME_TURN_END, FRAME_ERROR,
+    encode_frame, encode_json, decode_json, read_frame
+)
+from server.voice_server import VoiceServer
+
+
+def create_server():
+    """创建使用本地替身、监听随机端口的服务器"""
+    polly = PollyClient(client=FakePollyClient(0.01), comprehend=FakeComprehendClient(0.0))
+    polly.cache = None
+    transcribe = TranscribeClient(FakeTranscribeStreamingClient(0.0, 0.01, 0.01, 0.01, default_text="Hello there."),
+                                  media_encoding='pcm')
+    return VoiceServer('127.0.0.1', 0, 4, transcribe_client=transcribe, polly_client=polly)
+
+
+def test_close_cancels_active_sessions_before_releasing_executors():
+    async def run():
+        server = create_server()
+        await server.start()
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+        frame_type, _ = await read_frame(reader)
+        assert frame_type == FRAME_READY
+        assert len(server.sessions) == 1
+
+        await asyncio.wait_for(server.close(), 5)
+        assert not server.sessions
+        assert server.stats['errors'] == 0
+        # 会话被取消后连接随之关闭
+        assert await read_frame(reader) == (None, None)
+        writer.close()
+
+    asyncio.run(run())
+
+
+async def connect(server):
+    """连接服务器并读取READY帧"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+    frame_type, _ = await read_frame(reader)
+    assert frame_type == FRAME_READY
+    return reader, writer
+
+
+async def read_turn(reader):
+    """读取一轮对话中服务器发送的帧，直到TURN_END，返回FINAL和TURN_END的负载"""
+    messages = {}
+    while True:
+        frame_type, payload = await asyncio.wait_for(read_frame(reader), 5)
+        assert frame_type not in (None, FRAME_ERROR)
+        if frame_type in (FRAME_FINAL, FRAME_TURN_END):
+            messages[frame_type] = decode_json(payload)
+        if frame_type == FRAME_TURN_END:
+            return messages
+
+
+def test_audio_after_server_endpoint_is_not_taken_as_next_turn():
+    async def run():
+        server = create_server()
+        await server.start()
+        reader, writer = await connect(server)
+        pcm, _, _ = utterance(lead=0.3, speech=1.0, tail=2.0, snr_db=20.0)
+        for turn in (1, 2):
+            # 一次发出整段音频，服务器在尾部静音中途判定说话结束，剩余的音频仍在连接中
+            for chunk in iter_chunks(pcm, CHUNK_SIZE):
+                writer.write(encode_frame(FRAME_AUDIO, chunk))
+            messages = await read_turn(reader)
+            assert messages[FRAME_FINAL]['turn'] == turn
+            assert messages[FRAME_FINAL]['text'] == 'Hello there.'
+            assert messages[FRAME_TURN_END]['turn'] == turn
+            writer.write(encode_json(FRAME_END_OF_UTTERANCE, {'turn': turn}))
+        writer.close()
+        await server.close()
+        assert server.stats['turns'] == 2
+        assert server.stats['errors'] == 0
+
+    asyncio.run(run())
+
+
+def test_end_of_utterance_for_another_turn_is_a_protocol_error():
+    async def run():
+        server = create_server()
+        await server.start()
+        reader, writer = await connect(server)
+        writer.write(encode_json(FRAME_END_OF_UTTERANCE, {'turn': 2}))
+        frame_type, payload = await asyncio.wait_for(read_frame(reader), 5)
+        assert frame_type == FRAME_ERROR
+        assert '轮次' in decode_json(payload)['reason']
+        writer.close()
+        await server.close()
+        assert server.stats['errors'] == 1
+
+    asyncio.run(run())
@@ -0,0 +1 @@
+# 文本处理辅助模块
@@ -0,0 +1,177 @@
+"""
+本地语言识别模块，避免每次合成前都调用AWS Comprehend
+分两层识别：
+- 文字系统快速判断：韩文字母→韩语，假名→日语，汉字→中文
+- 拉丁字母语言使用字符三元组模型，在英语、法语、德语和西班牙语之间判断
+"""
+
+import math
+import re
+from collections import Counter
+from config import LANGUAGE_OPTIONS, LANGID_EVIDENCE_CAP
+
+HANGUL_PATTERN = re.compile(r'[\u1100-\u11ff\u3130-\u318f\uac00-\ud7af]')
+KANA_PATTERN = re.compile(r'[\u3040-\u30ff\u31f0-\u31ff\uff66-\uff9f]')
+HAN_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+LATIN_PATTERN = re.compile(r'[a-z\u00e0-\u00f6\u00f8-\u00ff\u0153\u00df]')
+NON_LETTER_PATTERN = re.compile(r"[^a-z\u00e0-\u00f6\u00f8-\u00ff\u0153\u00df']+")
+
+# 各拉丁字母语言的训练语料，只用于构建三元组频率表
+SEED_TEXTS = {
+    'en-US': (
+        "the quick brown fox jumps over the lazy dog. hello, how are you today? i would like to book a table "
+        "for two people this evening. thank you very much for your help, that is exactly what i was looking "
+        "for. could you please tell me where the nearest station is? we are going to the office tomorrow "
+        "morning and will be back in the afternoon. the weather is nice and warm, so they decided to walk "
+        "home through the park. what time does the meeting start? please let me know if there is anything "
+        "else you need. it was the best of times, it was the worst of times. this is an important message "
+        "about your account. my name is john and i live in a small town with my family. have a great day "
+        "and see you soon. there were many people waiting outside the shop when it opened. which one of these "
+        "would you recommend? i think that we should try again later because the system is not working right "
+        "now. they have been working on this project for several months and it should be finished by the end "
+        "of the year. your order has been shipped and will arrive within three business days."
+    ),
+    'fr-FR': (
+        "bonjour, comment allez-vous aujourd'hui? je voudrais réserver une table pour deux personnes ce soir. "
+        "merci beaucoup pour votre aide, c'est exactement ce que je cherchais. pourriez-vous me dire où se "
+        "trouve la gare la plus proche? nous allons au bureau demain matin et nous serons de retour dans "
+        "l'après-midi. il fait beau et chaud, alors ils ont décidé de rentrer à pied par le parc. à quelle "
+        "heure commence la réunion? n'hésitez pas à me dire si vous avez besoin d'autre chose. c'est un message "
+        "important concernant votre compte. je m'appelle pierre et j'habite dans une petite ville avec ma "
+        "famille. bonne journée et à bientôt. il y avait beaucoup de gens qui attendaient devant le magasin "
+        "quand il a ouvert. lequel de ces produits me conseillez-vous? je pense que nous devrions réessayer "
+        "plus tard parce que le système ne fonctionne pas en ce moment. ils travaillent sur ce projet depuis "
+        "plusieurs mois et il devrait être terminé avant la fin de l'année. votre commande a été expédiée et "
+        "arrivera dans les trois jours ouvrables. les enfants jouent dans le jardin pendant que leurs parents "
+        "préparent le dîner."
+    ),
+    'de-DE': (
+        "guten tag, wie geht es ihnen heute? ich möchte einen tisch für zwei personen heute abend reservieren. "
+        "vielen dank für ihre hilfe, das ist genau das, was ich gesucht habe. können sie mir bitte sagen, wo "
+        "der nächste bahnhof ist? wir fahren morgen früh ins büro und sind am nachmittag wieder zurück. das "
+        "wetter ist schön und warm, deshalb haben sie beschlossen, durch den park nach hause zu gehen. um "
+        "wie viel uhr beginnt die besprechung? lassen sie mich wissen, wenn sie noch etwas brauchen. dies ist "
+        "eine wichtige nachricht zu ihrem konto. ich heiße thomas und wohne mit meiner familie in einer "
+        "kleinen stadt. einen schönen tag noch und bis bald. viele leute warteten vor dem geschäft, als es "
+        "öffnete. welches von diesen würden sie mir empfehlen? ich denke, wir sollten es später noch einmal "
+        "versuchen, weil das system gerade nicht funktioniert. sie arbeiten seit mehreren monaten an diesem "
+        "projekt und es sollte bis ende des jahres fertig sein. ihre bestellung wurde versandt und wird "
+        "innerhalb von drei werktagen ankommen. die kinder spielen im garten, während die eltern das "
+        "abendessen vorbereiten."
+    ),
+    'es-ES': (
+        "hola, ¿cómo estás hoy? me gustaría reservar una mesa para dos personas esta noche. muchas gracias "
+        "por tu ayuda, es exactamente lo que estaba buscando. ¿podría decirme dónde está la estación más "
+        "cercana? vamos a la oficina mañana por la mañana y volveremos por la tarde. hace buen tiempo y calor, "
+        "así que decidieron volver a casa caminando por el parque. ¿a qué hora empieza la reunión? por favor, "
+        "avísame si necesitas algo más. este es un mensaje importante sobre tu cuenta. me llamo juan y vivo "
+        "en un pueblo pequeño con mi familia. que tengas un buen día y hasta pronto. había mucha gente "
+        "esperando fuera de la tienda cuando abrió. ¿cuál de estos me recomiendas? creo que deberíamos "
+        "intentarlo más tarde porque el sistema no funciona en este momento. llevan varios meses trabajando "
+        "en este proyecto y debería estar terminado antes de que acabe el año. tu pedido ha sido enviado y "
+        "llegará en un plazo de tres días hábiles. los niños juegan en el jardín mientras sus padres preparan "
+        "la cena."
+    ),
+}
+
+# 各语言特有的字母和标点，每出现一次为该语言加分（对数概率）
+DISTINCTIVE_CHARS = {
+    'fr-FR': 'èêëçàâîïôûùœ',
+    'de-DE': 'äöüß',
+    'es-ES': 'ñáíóú¿¡',
+}
+DISTINCTIVE_BONUS = 3.0
+
+# 平滑系数
+SMOOTHING = 0.5
+
+
+def _trigrams(text):
+    """提取带词边界的字符三元组"""
+    words = NON_LETTER_PATTERN.sub(' ', text.lower()).split()
+    grams = []
+    for word in words:
+        padded = f" {word} "
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class LanguageDetector:
+    """基于文字系统和字符三元组的本地语言识别器"""
+
+    def __init__(self, languages=LANGUAGE_OPTIONS):
+        """
+        初始化识别器并构建三元组模型
+
+        Args:
+            languages (list): 支持的语言代码
+        """
+        self.languages = languages
+        self.latin_languages = [lang for lang in languages if lang in SEED_TEXTS]
+
+        counts = {lang: Counter(_trigrams(SEED_TEXTS[lang])) for lang in self.latin_languages}
+        vocabulary = set()
+        for counter in counts.values():
+            vocabulary.update(counter)
+        vocab_size = len(vocabulary) + 1
+
+        # 预先计算对数概率，未见过的三元组使用各语言的默认值
+        self.log_probs = {}
+        self.unseen_log_prob = {}
+        for lang, counter in counts.items():
+            total = sum(counter.values()) + SMOOTHING * vocab_size
+            self.log_probs[lang] = {gram: math.log((c + SMOOTHING) / total) for gram, c in counter.items()}
+            self.unseen_log_prob[lang] = math.log(SMOOTHING / total)
+
+    def detect(self, text):
+        """
+        识别文本语言
+
+        Args:
+            text (str): 要识别的文本
+
+        Returns:
+            tuple: (语言代码, 置信度, 使用的方法)，无法识别时语言代码为None
+        """
+        if not text or not text.strip():
+            return None, 0.0, 'empty'
+
+        # 文字系统快速判断：日文通常混有汉字，只要出现假名即判为日语；
+        # 与PollyClient的处理一致，含有汉字的文本使用中文语音
+        if HANGUL_PATTERN.search(text) and 'ko-KR' in self.languages:
+            return 'ko-KR', 1.0, 'script'
+        if KANA_PATTERN.search(text) and 'ja-JP' in self.languages:
+            return 'ja-JP', 1.0, 'script'
+        if HAN_PATTERN.search(text) and 'zh-CN' in self.languages:
+            return 'zh-CN', 1.0, 'script'
+
+        lowered = text.lower()
+        latin = len(LATIN_PATTERN.findall(lowered))
+        if latin == 0:
+            return None, 0.0, 'empty'
+
+        # 混有其他文字系统（如西里尔字母）时按拉丁字母占比降低置信度
+        letters = sum(1 for char in lowered if char.isalpha())
+        return self._detect_latin(lowered, latin / letters)
+
+    def _detect_latin(self, text, script_share):
+        """使用三元组模型在拉丁字母语言之间判断"""
+        grams = _trigrams(text)
+        if not grams or not self.latin_languages:
+            return None, 0.0, 'ngram'
+
+        scores = {}
+        for lang in self.latin_languages:
+            table = self.log_probs[lang]
+            unseen = self.unseen_log_prob[lang]
+            total = sum(table.get(gram, unseen) for gram in grams)
+            total += DISTINCTIVE_BONUS * sum(text.count(char) for char in DISTINCTIVE_CHARS.get(lang, ''))
+            scores[lang] = total / len(grams)
+
+        # 以平均对数概率乘以证据量（有上限）计算后验，避免短文本被判为高置信度
+        evidence = min(len(grams), LANGID_EVIDENCE_CAP)
+        best = max(scores.values())
+        weights = {lang: math.exp((score - best) * evidence) for lang, score in scores.items()}
+        total = sum(weights.values())
+        lang = max(weights, key=weights.get)
+        return lang, weights[lang] / total * script_share, 'ngram'
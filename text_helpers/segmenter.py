@@ -0,0 +1,96 @@
+"""
+文本分段模块，在句子和从句边界处切分文本
+中文和日文使用全角标点切分，其他语言使用半角标点加空白切分
+"""
+
+import re
+from config import SEGMENT_MIN_CHARS, SEGMENT_MAX_CHARS
+
+# 全角标点后无需空白即可切分
+CJK_SENTENCE_PATTERN = re.compile(r'(?<=[。！？!?…])')
+CJK_CLAUSE_PATTERN = re.compile(r'(?<=[，、；：,;])')
+
+# 半角标点后必须跟空白，避免切开小数和缩写中的句点
+LATIN_SENTENCE_PATTERN = re.compile(r'(?<=[.!?。！？])\s+')
+LATIN_CLAUSE_PATTERN = re.compile(r'(?<=[,;:])\s+')
+
+CJK_LANGUAGES = ('zh', 'ja')
+
+
+def split_sentences(text, language_code=None, min_chars=SEGMENT_MIN_CHARS, max_chars=SEGMENT_MAX_CHARS):
+    """
+    将文本切分为适合逐段合成的片段
+
+    Args:
+        text (str): 要切分的文本
+        language_code (str, optional): 语言代码，例如'zh-CN'、'en-US'
+        min_chars (int): 片段最小字符数，过短的片段会与后一段合并
+        max_chars (int): 超过该长度的句子会在从句边界处继续切分
+
+    Returns:
+        list: 按原顺序排列的文本片段
+    """
+    if not text or not text.strip():
+        return []
+
+    if language_code and language_code.split('-')[0] in CJK_LANGUAGES:
+        sentence_pattern, clause_pattern = CJK_SENTENCE_PATTERN, CJK_CLAUSE_PATTERN
+    else:
+        sentence_pattern, clause_pattern = LATIN_SENTENCE_PATTERN, LATIN_CLAUSE_PATTERN
+
+    pieces = []
+    for sentence in sentence_pattern.split(text.strip()):
+        if len(sentence) > max_chars:
+            pieces.extend(_split_long(sentence, clause_pattern, max_chars))
+        else:
+            pieces.append(sentence)
+
+    return _merge_short([p.strip() for p in pieces if p.strip()], min_chars, max_chars)
+
+
+def _split_long(sentence, clause_pattern, max_chars):
+    """在从句边界处切分过长的句子，仍然过长的部分按空白或固定长度硬切"""
+    result = []
+    for clause in clause_pattern.split(sentence):
+        while len(clause) > max_chars:
+            cut = clause.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            result.append(clause[:cut])
+            clause = clause[cut:]
+        result.append(clause)
+    return result
+
+
+def _merge_short(pieces, min_chars, max_chars):
+    """将过短的片段与后一段合并，合并结果不超过max_chars"""
+    merged = []
+    buffer = ''
+    for piece in pieces:
+        if buffer:
+            joiner = '' if _ends_with_cjk(buffer) else ' '
+            candidate = buffer + joiner + piece
+            if len(candidate) <= max_chars:
+                buffer = candidate
+            else:
+                merged.append(buffer)
+                buffer = piece
+        else:
+            buffer = piece
+
+        if len(buffer) >= min_chars:
+            merged.append(buffer)
+            buffer = ''
+
+    if buffer:
+        if merged and len(merged[-1]) + len(buffer) + 1 <= max_chars:
+            joiner = '' if _ends_with_cjk(merged[-1]) else ' '
+            merged[-1] = merged[-1] + joiner + buffer
+        else:
+            merged.append(buffer)
+    return merged
+
+
+def _ends_with_cjk(text):
+    """检查文本是否以中日韩字符或全角标点结尾"""
+    return bool(text) and ord(text[-1]) >= 0x2E80
@@ -1,28 +1,171 @@
 """
-主程序，协调麦克风输入、Transcribe转录和Polly语音合成
+主程序，协调音频输入、Transcribe转录和Polly语音合成
+音频输入输出由AUDIO_SOURCE/AUDIO_SINK选择，可以是声卡、录音文件、网络音频流或空设备
 """
 
+import contextvars
 import time
 import signal
 import sys
-import numpy as np
-from audio_helpers.mic_input import MicrophoneInput
-from audio_helpers.audio_output import AudioOutput
-from aws_services.transcribe_client import TranscribeClient
-from aws_services.polly_client import PollyClient
+import threading
+from audio_helpers.audio_backends import create_audio_source, create_audio_sink
+from audio_helpers.vad import create_vad, Endpointer
+from audio_helpers.speech_gate import SpeechGate
+from aws_services.polly_client import PollyClient, log_aws_metrics
+from aws_services.rate_limiter import is_fatal_error
 from logger_config import logger
+from config import (
+    SAMPLE_RATE, POLLY_STREAMING_PLAYBACK, POLLY_PCM_SAMPLE_RATE, PIPELINE_ENABLED, TRANSCRIBE_PREOPEN_STREAM,
+    SPECULATIVE_SYNTHESIS, TRACE_PROMETHEUS_PORT, PREWARM_ENABLED, CONVERSATION_MODE, BARGE_IN_ENABLED,
+    BARGE_IN_ACTION, BARGE_IN_REACTION_MS, BARGE_IN_DUCK_GAIN
+)
+from pipeline.synthesis_pipeline import SynthesisPipeline
+from telemetry.tracing import (
+    tracer, STAGE_CAPTURE, STAGE_TURN_TAKING, STAGE_BARGE_IN_REACTION, MARK_SPEECH_START, MARK_SPEECH_END,
+    MARK_BARGE_IN_SPEECH, MARK_BARGE_IN
+)
+
+CONVERSATION_MODES = ('half_duplex', 'continuous')
+BARGE_IN_ACTIONS = ('cancel', 'duck')
+
+
+class ResponsePlayback:
+    """连续模式下在后台线程中合成并播放的一次回复"""
+
+    def __init__(self, trace):
+        """
+        Args:
+            trace (UtteranceTrace): 这一轮对话的追踪记录，未启用追踪时为None
+        """
+        self.trace = trace
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.thread = None
+        self.interrupted = False
+        self.ducked = False
+        # 回复期间连续检测到语音的时长（毫秒）和这段语音开始的时间
+        self.speech_ms = 0.0
+        self.speech_start = None
 
 
 class VoiceProcessor:
     """语音处理器类，协调整个流程"""
     
-    def __init__(self):
-        """初始化语音处理器"""
-        self.mic_input = MicrophoneInput()
-        self.audio_output = AudioOutput()
-        self.transcribe_client = TranscribeClient()
-        self.polly_client = PollyClient()
+    def __init__(self, mic_input=None, audio_output=None, transcribe_client=None, polly_client=None,
+                 transcribe_factory=None, conversation_mode=CONVERSATION_MODE, barge_in_action=BARGE_IN_ACTION):
+        """
+        初始化语音处理器
+        
+        Args:
+            mic_input: 音频输入，默认按AUDIO_SOURCE创建（麦克风、文件、套接字或静音）
+            audio_output: 音频输出，默认按AUDIO_SINK创建（扬声器、套接字或丢弃）
+            transcribe_client: Transcribe客户端，默认新建
+            polly_client: Polly客户端，默认新建
+            transcribe_factory: 未提供transcribe_client时，首次使用时调用以创建客户端，默认为TranscribeClient
+            conversation_mode (str): 'half_duplex'或'continuous'
+            barge_in_action (str): 连续模式下用户插话时'cancel'停止回复或'duck'压低回复
+        
+        Raises:
+            ValueError: 不支持的对话模式、打断方式或音频后端
+        """
+        if conversation_mode not in CONVERSATION_MODES:
+            raise ValueError(f"不支持的对话模式: {conversation_mode}，可选: {', '.join(CONVERSATION_MODES)}")
+        if barge_in_action not in BARGE_IN_ACTIONS:
+            raise ValueError(f"不支持的打断方式: {barge_in_action}，可选: {', '.join(BARGE_IN_ACTIONS)}")
+        # 声卡后端依赖PortAudio，只在选中时导入，无声卡的环境可以使用文件、套接字或空设备
+        if mic_input is None:
+            mic_input = create_audio_source()
+        if audio_output is None:
+            audio_output = create_audio_sink()
+        self.mic_input = mic_input
+        self.audio_output = audio_output
+        # Transcribe SDK（amazon_transcribe/awscrt）导入较慢，首次使用时才导入并创建客户端
+        self._transcribe_client = transcribe_client
+        self.transcribe_factory = transcribe_factory
+        self.transcribe_lock = threading.Lock()
+        if transcribe_client is not None:
+            self._configure_transcribe(transcribe_client)
+        # boto3客户端由PollyClient在首次使用时创建
+        self.polly_client = polly_client or PollyClient()
+        self.synthesis_pipeline = SynthesisPipeline(self.polly_client, self.audio_output)
+        self.vad = create_vad()
+        self.endpointer = Endpointer()
+        self.speech_gate = SpeechGate()
         self.running = False
+        self.prewarm_thread = None
+        self.conversation_mode = conversation_mode
+        self.barge_in_action = barge_in_action
+        # 连续模式下正在后台播放的回复
+        self.response = None
+        self.response_lock = threading.Lock()
+        # 对话轮次统计，每分钟轮数从第一轮开始计时
+        self.conversation_start = None
+        self.conversation_stats = {'turns': 0, 'barge_ins': 0}
+        self.turn_taking = []
+        self.barge_in_reactions = []
+        self.stats_lock = threading.Lock()
+    
+    @property
+    def transcribe_client(self):
+        """Transcribe客户端，首次访问时创建"""
+        if self._transcribe_client is None:
+            with self.transcribe_lock:
+                if self._transcribe_client is None:
+                    factory = self.transcribe_factory
+                    if factory is None:
+                        from aws_services.transcribe_client import TranscribeClient as factory
+                    client = factory()
+                    self._configure_transcribe(client)
+                    self._transcribe_client = client
+        return self._transcribe_client
+    
+    def _configure_transcribe(self, client):
+        """设置Transcribe客户端的回调"""
+        # 根据稳定的部分转录结果提前合成
+        if PIPELINE_ENABLED and SPECULATIVE_SYNTHESIS:
+            client.stable_callback = self._on_stable_prefix
+    
+    def prewarm(self):
+        """
+        在后台线程中并行预热各子系统：初始化音频设备、导入SDK、创建AWS客户端并建立连接
+        
+        用户准备说话期间完成这些工作，第一轮对话不再承担冷启动开销；
+        预热未完成时各子系统仍会在首次使用时按需初始化
+        
+        Returns:
+            threading.Thread: 预热线程，join后表示预热结束
+        """
+        if self.prewarm_thread is not None:
+            return self.prewarm_thread
+        
+        tasks = [('Transcribe', lambda: self.transcribe_client.prewarm()),
+                 ('Polly', self.polly_client.prewarm)]
+        for name, component in (('麦克风', self.mic_input), ('扬声器', self.audio_output)):
+            prewarm = getattr(component, 'prewarm', None)
+            if prewarm is not None:
+                tasks.append((name, prewarm))
+        
+        def run_task(name, task):
+            task_start = time.perf_counter()
+            try:
+                task()
+                logger.info(f"{name} 预热完成，耗时 {time.perf_counter() - task_start:.3f}秒")
+            except Exception as e:
+                logger.warning(f"{name} 预热失败: {e}")
+        
+        def run():
+            start_time = time.perf_counter()
+            threads = [threading.Thread(target=run_task, args=task, name=f'prewarm-{index}', daemon=True)
+                       for index, task in enumerate(tasks)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            logger.info(f"预热结束，总耗时 {time.perf_counter() - start_time:.3f}秒")
+        
+        self.prewarm_thread = threading.Thread(target=run, name='prewarm', daemon=True)
+        self.prewarm_thread.start()
+        return self.prewarm_thread
     
     def start(self):
         """启动语音处理"""
@@ -34,93 +177,403 @@ class VoiceProcessor:
         logger.info("=== AWS语音处理POC ===")
         logger.info("按Ctrl+C停止程序")
         
-        while self.running:
-            try:
-                # 开始录音和转录
-                logger.info("\n准备好了吗？开始说话...")
-                self.mic_input.start_recording()
-                self.transcribe_client.start_streaming()
-                
-                # 处理音频块
-                silence_counter = 0
-                max_silence = 50  # 约5秒的静音
-                while silence_counter < max_silence and self.running:
-                    audio_chunk = self.mic_input.read_chunk()
-                    
-                    if audio_chunk:
-                        # 检查是否为静音
-                        if self._is_silence(audio_chunk):
-                            silence_counter += 1
-                        else:
-                            silence_counter = 0
-                        
-                        # 发送到Transcribe
-                        self.transcribe_client.send_audio_chunk(audio_chunk)
-                    
-                    time.sleep(0.01)
-                
-                # 停止录音和转录
-                self.mic_input.stop_recording()
-                transcript, language = self.transcribe_client.stop_streaming()
-                
-                # 如果有转录结果，则使用Polly合成语音
-                if transcript and self.running:
-                    logger.info(f"\n转录结果 ({language if language else 'en-US'}): {transcript}")
+        if TRACE_PROMETHEUS_PORT:
+            tracer.serve_prometheus(TRACE_PROMETHEUS_PORT)
+        
+        if PREWARM_ENABLED:
+            self.prewarm()
+        
+        if self.conversation_mode == 'continuous':
+            self.run_continuous()
+        else:
+            while self.running:
+                try:
+                    self.process_turn()
+                    if self._input_exhausted():
+                        break
                     
-                    # 合成语音
-                    logger.info("正在合成语音...")
-                    start_time = time.time()
-                    audio_data = self.polly_client.synthesize_speech(transcript, language if language else 'en-US')
+                    if self.running and getattr(self.mic_input, 'interactive', True):
+                        # 询问是否继续，文件和网络输入直接进入下一轮
+                        logger.info("\n按Enter继续，或按Ctrl+C退出")
+                        input()
                     
-                    if audio_data:
-                        # 播放合成的语音
-                        logger.info("播放合成的语音...")
-                        self.audio_output.play_audio(audio_data)
-                        
-                        # 计算端到端延迟
-                        end_time = time.time()
-                        total_time = end_time - start_time
-                        logger.info(f"端到端处理时间（从转录结束到语音播放）: {total_time:.3f}秒")
-                    else:
-                        logger.error("语音合成失败")
-                else:
-                    logger.warning("未检测到语音或转录失败")
+                except Exception as e:
+                    logger.error(f"处理过程中出错: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    self.running = False
+        
+        tracer.log_summary()
+        self.log_conversation_metrics()
+        log_aws_metrics(self.polly_client)
+    
+    def run_continuous(self):
+        """
+        连续对话：录音始终不停，回复在后台线程中合成播放，
+        回复期间用户开口即停止或压低回复，说完后自动进入下一轮，不需要按键确认
+        """
+        logger.info("连续对话模式：直接说话即可，回复播放期间开口可以打断")
+        self.mic_input.start_recording()
+        try:
+            while self.running:
+                try:
+                    self.process_continuous_turn()
+                    if self._input_exhausted():
+                        # 等最后一条回复播放完再结束
+                        response = self.response
+                        if response is not None:
+                            response.done.wait()
+                        break
+                except Exception as e:
+                    logger.error(f"处理过程中出错: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    self.running = False
+        finally:
+            response = self.response
+            if response is not None:
+                self._cancel_response(response)
+                response.thread.join(timeout=5)
+            self.mic_input.stop_recording()
+    
+    def _input_exhausted(self):
+        """文件读完或网络音频流结束时返回True，麦克风输入始终为False"""
+        return getattr(self.mic_input, 'exhausted', False)
+    
+    def process_turn(self):
+        """
+        处理一轮对话：录音并转录，然后合成并播放转录结果
+        
+        Returns:
+            tuple: (转录文本, 语言代码)
+        """
+        trace = tracer.start_utterance()
+        if self.conversation_start is None:
+            self.conversation_start = time.perf_counter()
+        try:
+            # 开始录音和转录
+            logger.info("\n准备好了吗？开始说话...")
+            transcript, language = self._capture_utterance()
+            
+            # 播放回复期间预先打开下一次对话的转录流
+            if TRANSCRIBE_PREOPEN_STREAM and self.running:
+                self.transcribe_client.preopen_stream()
+            
+            # 如果有转录结果，则使用Polly合成语音
+            if transcript and self.running:
+                logger.info(f"\n转录结果 ({language if language else 'en-US'}): {transcript}")
+                with self.stats_lock:
+                    self.conversation_stats['turns'] += 1
+                self._respond(transcript, language if language else 'en-US')
+                self._record_turn(trace)
+            else:
+                self.synthesis_pipeline.discard_speculations()
+                logger.warning("未检测到语音或转录失败")
+            
+            return transcript, language
+        finally:
+            tracer.finish_utterance()
+    
+    def process_continuous_turn(self):
+        """
+        连续模式下处理一轮对话：聆听到用户说完，把回复交给后台线程后立即返回，开始聆听下一轮
+        
+        Returns:
+            tuple: (转录文本, 语言代码)
+        """
+        trace = tracer.start_utterance()
+        if self.conversation_start is None:
+            self.conversation_start = time.perf_counter()
+        logger.info("\n正在聆听...")
+        transcript, language = self._capture_utterance(continuous=True)
+        
+        if TRANSCRIBE_PREOPEN_STREAM and self.running:
+            self.transcribe_client.preopen_stream()
+        
+        if transcript and self.running:
+            logger.info(f"\n转录结果 ({language if language else 'en-US'}): {transcript}")
+            self._start_response(transcript, language if language else 'en-US', trace)
+        else:
+            self.synthesis_pipeline.discard_speculations()
+            if self.running:
+                logger.warning("未检测到语音或转录失败")
+            tracer.finish_utterance()
+        return transcript, language
+    
+    def _capture_utterance(self, continuous=False):
+        """
+        录音并流式转录，直到端点检测判定说话结束
+        
+        Args:
+            continuous (bool): 连续模式下录音在各轮之间不停止，期间检测用户是否打断正在播放的回复
+        
+        Returns:
+            tuple: (转录文本, 语言代码)
+        """
+        if not continuous:
+            self.mic_input.start_recording()
+            # 连续模式下音频不中断，保留VAD对噪声底的估计
+            self.vad.reset()
+        capture_start = time.perf_counter()
+        
+        # 转录流在语音门控首次打开时才启动
+        self.endpointer.reset()
+        self.speech_gate.reset()
+        streaming = False
+        while self.running:
+            # 零拷贝读取，视图在下一次读取前有效，VAD和端点检测直接使用
+            audio_chunk = self.mic_input.read_view()
+            
+            if audio_chunk:
+                # 检查是否包含语音
+                is_speech = self.vad.is_speech(audio_chunk)
+                chunk_ms = len(audio_chunk) / 2 / SAMPLE_RATE * 1000
+                if continuous:
+                    self._check_barge_in(is_speech, chunk_ms)
                 
-                if self.running:
-                    # 询问是否继续
-                    logger.info("\n按Enter继续，或按Ctrl+C退出")
-                    input()
+                # 经语音门控后发送到Transcribe
+                for upstream_chunk in self.speech_gate.process(audio_chunk, is_speech):
+                    if not streaming:
+                        tracer.mark(MARK_SPEECH_START)
+                        self.transcribe_client.start_streaming()
+                        streaming = True
+                    # 发送在事件循环中异步进行，交出前复制；预卷中的音频块已经是bytes，不会再复制
+                    if self.transcribe_client.send_audio_chunk(bytes(upstream_chunk)):
+                        self.mic_input.mark_sent()
                 
-            except Exception as e:
-                logger.error(f"处理过程中出错: {e}")
-                import traceback
-                traceback.print_exc()
-                self.running = False
+                if self.endpointer.update(is_speech, chunk_ms):
+                    if continuous and not self.endpointer.speech_detected:
+                        # 连续模式下没有人说话时继续聆听，不结束本轮
+                        self.endpointer.reset()
+                        capture_start = time.perf_counter()
+                        continue
+                    if self.endpointer.speech_detected:
+                        # 说话实际结束于端点判定前的尾部静音之前
+                        tracer.mark(MARK_SPEECH_END,
+                                    time.perf_counter() - self.endpointer.trailing_silence_ms / 1000)
+                    logger.info(f"端点检测结束录音: {self.endpointer.reason} "
+                                f"(时长 {self.endpointer.elapsed_ms:.0f}ms)")
+                    break
+            elif self._input_exhausted():
+                # 文件读完或网络音频流结束，已说的内容照常转录和回复，本轮结束后停止
+                logger.info("音频输入已结束")
+                if self.endpointer.speech_detected:
+                    tracer.mark(MARK_SPEECH_END)
+                break
+            else:
+                # read_view本身会阻塞等待音频，只有读取失败时才需要退避
+                time.sleep(0.01)
+        
+        # 停止录音和转录
+        if not continuous:
+            self.mic_input.stop_recording()
+        tracer.add_span(STAGE_CAPTURE, capture_start, time.perf_counter())
+        capture_metrics = self.mic_input.get_capture_metrics()
+        logger.info(f"采集指标: 读取 {capture_metrics['chunks_read']} 块, "
+                    f"输入溢出 {capture_metrics['input_overflows']} 次, "
+                    f"缓冲区溢出丢弃 {capture_metrics['overrun_frames']} 帧, "
+                    f"采集到发送延迟 平均 {capture_metrics['send_latency_avg'] * 1000:.1f}ms / "
+                    f"最大 {capture_metrics['send_latency_max'] * 1000:.1f}ms")
+        self.speech_gate.log_stats()
+        if streaming:
+            return self.transcribe_client.stop_streaming()
+        return "", None
     
-    def _is_silence(self, audio_chunk, threshold=500):
+    def _respond(self, transcript, language, cancelled=None):
         """
-        检测音频块是否为静音
+        合成并播放回复
         
         Args:
-            audio_chunk (bytes): 音频数据
-            threshold (int): 静音阈值
+            transcript (str): 要合成的文本
+            language (str): 语言代码
+            cancelled (threading.Event, optional): 用户插话时被设置，之后不再播放剩余的回复
         
         Returns:
-            bool: 如果是静音则返回True
+            bool: 是否播放了音频
+        
+        Raises:
+            Exception: 凭证、权限或配置错误，后续的回复也不会成功；其他合成错误只跳过这一轮回复
         """
-        # 将字节转换为16位整数数组
-        audio_array = np.frombuffer(audio_chunk, dtype=np.int16)
+        logger.info("正在合成语音...")
+        start_time = time.perf_counter()
+        try:
+            if PIPELINE_ENABLED:
+                # 分句并行合成，第一句播放时后续句子仍在合成
+                played = self.synthesis_pipeline.speak(transcript, language, cancelled)
+            elif POLLY_STREAMING_PLAYBACK:
+                # 边合成边播放，首个音频块到达即开始发声
+                chunks = self.polly_client.synthesize_speech_stream(transcript, language)
+                played = self.audio_output.play_stream(chunks, POLLY_PCM_SAMPLE_RATE)
+            else:
+                audio_data = self.polly_client.synthesize_speech(transcript, language)
+                played = False
+                if audio_data:
+                    # 播放合成的语音
+                    logger.info("播放合成的语音...")
+                    played = self.audio_output.play_audio(audio_data)
+        except Exception as e:
+            if is_fatal_error(e):
+                raise
+            logger.error(f"合成回复时出错，跳过这一轮回复: {e}")
+            return False
         
-        # 计算音量
-        volume = np.abs(audio_array).mean()
+        if cancelled is not None and cancelled.is_set():
+            logger.info("回复已被用户打断")
+        elif played:
+            # 等待排队的音频播放完毕，避免下一轮录音录入回复声音
+            self.audio_output.wait()
+            # 计算端到端延迟
+            end_time = time.perf_counter()
+            total_time = end_time - start_time
+            logger.info(f"端到端处理时间（从转录结束到语音播放）: {total_time:.3f}秒")
+        else:
+            logger.error("语音合成失败")
+        return played
+    
+    def _start_response(self, transcript, language, trace):
+        """
+        在后台线程中合成并播放回复，调用方随即开始聆听下一轮
+        
+        上一条回复仍未结束时：允许打断则取消它（用户已经说了新的内容），否则新回复排在它之后播放
+        
+        Args:
+            transcript (str): 要合成的文本
+            language (str): 语言代码
+            trace (UtteranceTrace): 这一轮对话的追踪记录，由回复线程负责结束
+        """
+        previous = self.response
+        if previous is not None and BARGE_IN_ENABLED:
+            self._cancel_response(previous)
         
-        return volume < threshold
+        response = ResponsePlayback(trace)
+        with self.stats_lock:
+            self.conversation_stats['turns'] += 1
+        # 回复线程沿用当前上下文，合成和播放的时间点记入这一轮的追踪记录
+        context = contextvars.copy_context()
+        response.thread = threading.Thread(target=context.run, name='responder', daemon=True,
+                                           args=(self._run_response, response, previous, transcript, language))
+        self.response = response
+        response.thread.start()
+    
+    def _run_response(self, response, previous, transcript, language):
+        """回复线程：等上一条回复结束后合成并播放，结束时恢复音量并记录这一轮的指标"""
+        tracer.attach(response.trace)
+        try:
+            if previous is not None:
+                previous.thread.join()
+            if not response.cancelled.is_set():
+                self._respond(transcript, language, response.cancelled)
+        except Exception as e:
+            logger.error(f"播放回复时出错: {e}")
+        finally:
+            with self.response_lock:
+                if response.ducked:
+                    self.audio_output.set_gain(1.0)
+                response.done.set()
+            self._record_turn(response.trace)
+            tracer.finish_utterance(response.trace)
+    
+    def _check_barge_in(self, is_speech, chunk_ms):
+        """
+        回复期间用户持续说话超过BARGE_IN_REACTION_MS时打断回复
+        
+        Args:
+            is_speech (bool): 当前音频块是否包含语音
+            chunk_ms (float): 当前音频块的时长（毫秒）
+        """
+        response = self.response
+        if not BARGE_IN_ENABLED or response is None or response.interrupted or response.done.is_set():
+            return
+        if not is_speech:
+            response.speech_ms = 0.0
+            response.speech_start = None
+            return
+        if response.speech_start is None:
+            # 本块音频开始录制的时间
+            response.speech_start = time.perf_counter() - chunk_ms / 1000
+        response.speech_ms += chunk_ms
+        if response.speech_ms >= BARGE_IN_REACTION_MS:
+            self._barge_in(response)
+    
+    def _barge_in(self, response):
+        """用户在回复期间开口：停止或压低回复"""
+        with self.response_lock:
+            if response.done.is_set():
+                return
+            response.interrupted = True
+            if self.barge_in_action == 'duck':
+                response.ducked = True
+                self.audio_output.set_gain(BARGE_IN_DUCK_GAIN)
+            else:
+                response.cancelled.set()
+                self.audio_output.stop()
+            action_time = time.perf_counter()
+            if response.trace is not None:
+                response.trace.mark(MARK_BARGE_IN_SPEECH, response.speech_start)
+                response.trace.mark(MARK_BARGE_IN, action_time)
+        with self.stats_lock:
+            self.conversation_stats['barge_ins'] += 1
+        logger.info(f"检测到用户插话，已{'压低' if response.ducked else '停止'}回复"
+                    f"（距开口 {(action_time - response.speech_start) * 1000:.0f}ms）")
+    
+    def _cancel_response(self, response):
+        """取消一条回复：不再播放剩余的片段并丢弃排队的音频"""
+        with self.response_lock:
+            if response.done.is_set():
+                return
+            response.cancelled.set()
+            self.audio_output.stop()
+    
+    def _record_turn(self, trace):
+        """把一轮对话的轮次切换延迟和打断反应时间计入统计，需要启用延迟追踪"""
+        if trace is None:
+            return
+        latencies = trace.latencies()
+        with self.stats_lock:
+            self.turn_taking.extend(latencies.get(STAGE_TURN_TAKING, ()))
+            self.barge_in_reactions.extend(latencies.get(STAGE_BARGE_IN_REACTION, ()))
+    
+    def conversation_metrics(self):
+        """
+        获取对话轮次指标
+        
+        Returns:
+            dict: 对话模式、轮数、打断次数、运行时长（秒）、每分钟轮数，
+                以及各轮的轮次切换延迟和打断反应时间（秒）
+        """
+        elapsed = time.perf_counter() - self.conversation_start if self.conversation_start else 0.0
+        with self.stats_lock:
+            turns = self.conversation_stats['turns']
+            return dict(self.conversation_stats, mode=self.conversation_mode, elapsed_seconds=elapsed,
+                        turns_per_minute=turns * 60 / elapsed if elapsed else 0.0,
+                        turn_taking=list(self.turn_taking), barge_in_reactions=list(self.barge_in_reactions))
+    
+    def log_conversation_metrics(self):
+        """输出对话轮次指标"""
+        metrics = self.conversation_metrics()
+        if not metrics['turns']:
+            return
+        turn_taking = metrics['turn_taking']
+        average = sum(turn_taking) / len(turn_taking) * 1000 if turn_taking else 0.0
+        logger.info(f"对话统计（{metrics['mode']}）: 共 {metrics['turns']} 轮, "
+                    f"每分钟 {metrics['turns_per_minute']:.1f} 轮, 打断 {metrics['barge_ins']} 次, "
+                    f"轮次切换延迟平均 {average:.0f}ms")
+    
+    def _on_stable_prefix(self, stable_text, language):
+        """部分转录结果的稳定前缀更新时，提前合成其中完整的句子"""
+        self.synthesis_pipeline.speculate(stable_text, language if language else 'en-US')
     
     def _signal_handler(self, sig, frame):
         """处理Ctrl+C信号"""
         logger.info("\n正在停止程序...")
         self.running = False
         self.mic_input.stop_recording()
+        if self._transcribe_client is not None:
+            self._transcribe_client.shutdown()
+        tracer.log_summary()
+        self.log_conversation_metrics()
+        log_aws_metrics(self.polly_client)
+        tracer.shutdown()
         sys.exit(0)
 
 